@@ -0,0 +1,190 @@
+# Copyright 2022 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Runs the AGW installation in the background.
+
+`magma-access-gateway.install` takes many minutes. Instead of running it inside a hook, the
+installer is launched as a transient systemd unit. Its output and exit status are persisted
+to disk and, once it completes, a custom `install_complete` event is dispatched back into
+the charm so the installation can carry on.
+
+The installation is split into phases whose completion is persisted as markers, so that an
+interrupted or failed installation resumes at its first incomplete phase.
+"""
+
+import logging
+import os
+import shlex
+from pathlib import Path
+from typing import List, Optional
+
+from command_policy import SERVICE_CONTROL_POLICY
+from host import Host
+from rolling_restart import boot_id
+
+logger = logging.getLogger(__name__)
+
+STATE_DIR = Path("/var/lib/magma-access-gateway-operator")
+INSTALL_UNIT = "magma-access-gateway-install"
+INSTALL_COMPLETE_EVENT = "install_complete"
+
+
+class BackgroundInstaller:
+    """Launches the AGW installer as a transient systemd unit and tracks its progress."""
+
+    def __init__(self, host: Host, unit_name: str, charm_dir: Path):
+        """Sets the unit and charm directory used to dispatch the completion event.
+
+        Args:
+            host: Machine to install the AGW on
+            unit_name: Name of the Juju unit (ex. magma-access-gateway-operator/0)
+            charm_dir: Directory of the charm containing the `dispatch` script
+        """
+        self._host = host
+        self._unit_name = unit_name
+        self._charm_dir = charm_dir
+
+    @property
+    def log_file(self) -> Path:
+        """Returns the file the installer output is written to."""
+        return STATE_DIR / "install.log"
+
+    @property
+    def exit_status_file(self) -> Path:
+        """Returns the file the installer exit status is written to."""
+        return STATE_DIR / "install.exit-status"
+
+    def start(self, command: List[str]) -> bool:
+        """Launches the installer in a transient systemd unit.
+
+        Args:
+            command: Installation command and its arguments
+
+        Returns:
+            bool: Whether the transient unit was started
+        """
+        self._host.mkdir(STATE_DIR)
+        self.clear()
+        process = self._host.run(
+            [
+                "systemd-run",
+                "--unit",
+                INSTALL_UNIT,
+                "--collect",
+                "--setenv",
+                f"PATH={os.environ.get('PATH', '')}",
+                "/bin/bash",
+                "-c",
+                self._script(command),
+            ],
+            SERVICE_CONTROL_POLICY,
+        )
+        if process.returncode != 0:
+            logger.error("Failed to start %s unit", INSTALL_UNIT)
+            return False
+        logger.info("AGW installation started in %s unit", INSTALL_UNIT)
+        return True
+
+    @property
+    def is_running(self) -> bool:
+        """Returns whether the installation unit is currently running."""
+        return self._host.is_active(INSTALL_UNIT)
+
+    @property
+    def exit_status(self) -> Optional[int]:
+        """Returns the exit status of the last installation or None if it hasn't completed."""
+        try:
+            return int(self._host.read_text(self.exit_status_file).strip())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    @property
+    def progress(self) -> str:
+        """Returns the last line written by the installer."""
+        try:
+            lines = self._host.read_text(self.log_file).splitlines()
+        except FileNotFoundError:
+            return ""
+        for line in reversed(lines):
+            if line.strip():
+                return line.strip()
+        return ""
+
+    def clear(self) -> None:
+        """Forgets the exit status of the last installation."""
+        self._host.unlink(self.exit_status_file)
+
+    def _script(self, command: List[str]) -> str:
+        """Returns the shell script run by the transient unit.
+
+        The exit status is written atomically before the completion event is dispatched so
+        that the charm can still pick it up if the dispatch fails.
+        """
+        temporary_exit_status_file = f"{self.exit_status_file}.tmp"
+        dispatch = " ".join(
+            [
+                '"$(command -v juju-exec || command -v juju-run)"',
+                shlex.quote(self._unit_name),
+                shlex.quote(
+                    f"JUJU_DISPATCH_PATH=hooks/{INSTALL_COMPLETE_EVENT} "
+                    f"{self._charm_dir / 'dispatch'}"
+                ),
+            ]
+        )
+        return (
+            f"{' '.join(shlex.quote(arg) for arg in command)} "
+            f"> {shlex.quote(str(self.log_file))} 2>&1; "
+            f"echo $? > {shlex.quote(temporary_exit_status_file)}; "
+            f"mv {shlex.quote(temporary_exit_status_file)} "
+            f"{shlex.quote(str(self.exit_status_file))}; "
+            f"{dispatch}"
+        )
+
+
+class InstallPhases:
+    """Completion markers of the installation phases, kept across hooks and reboots."""
+
+    def __init__(self, host: Host, phases: List[str]):
+        """Sets the phases of the installation.
+
+        Args:
+            host: Machine the markers are kept on
+            phases: Names of the phases, in the order they run
+        """
+        self._host = host
+        self._phases = phases
+
+    @property
+    def _markers_dir(self) -> Path:
+        """Returns the directory of the completion markers."""
+        return STATE_DIR / "phases"
+
+    def is_complete(self, phase: str) -> bool:
+        """Returns whether the phase completed."""
+        return self._host.exists(self._markers_dir / phase)
+
+    def completed_in_current_boot(self, phase: str) -> bool:
+        """Returns whether the phase completed since the machine last booted."""
+        try:
+            return self._host.read_text(self._markers_dir / phase).strip() == boot_id(self._host)
+        except FileNotFoundError:
+            return False
+
+    def complete(self, phase: str) -> None:
+        """Marks the phase as complete."""
+        self._host.write_text(self._markers_dir / phase, f"{boot_id(self._host)}\n")
+        logger.debug("Installation phase %s complete", phase)
+
+    def reset(self, phase: str) -> None:
+        """Marks the phase and the following ones as incomplete."""
+        start = self._phases.index(phase)
+        for name in self._phases[start:]:
+            self._host.unlink(self._markers_dir / name)
+
+    @property
+    def next_phase(self) -> Optional[str]:
+        """Returns the first incomplete phase, None once all of them completed."""
+        for phase in self._phases:
+            if not self.is_complete(phase):
+                return phase
+        return None
@@ -4,16 +4,20 @@
 
 """Machine Charm for Magma's Access Gateway."""
 
+import hashlib
+import io
 import ipaddress
 import json
 import logging
 import re
+import ssl
 import subprocess
+import time
+from datetime import datetime, timezone
 from ipaddress import AddressValueError
 from pathlib import Path
-from typing import List, Optional, Tuple, Union
+from typing import Dict, List, Optional, Tuple
 
-import netifaces  # type: ignore[import]
 import ruamel.yaml
 from charms.lte_core_interface.v0.lte_core_interface import LTECoreProvides
 from charms.magma_orchestrator_interface.v0.magma_orchestrator_interface import (
@@ -23,54 +27,252 @@ from charms.magma_orchestrator_interface.v0.magma_orchestrator_interface import
 from ops.charm import (
     ActionEvent,
     CharmBase,
+    CharmEvents,
     ConfigChangedEvent,
-    InstallEvent,
+    RelationCreatedEvent,
     RelationJoinedEvent,
     StartEvent,
+    UpdateStatusEvent,
+    UpgradeCharmEvent,
 )
+from ops.framework import EventBase, EventSource, StoredState
 from ops.main import main
-from ops.model import ActiveStatus, BlockedStatus, MaintenanceStatus, WaitingStatus
+from ops.model import (
+    ActiveStatus,
+    BlockedStatus,
+    MaintenanceStatus,
+    StatusBase,
+    WaitingStatus,
+)
+from ruamel.yaml.error import YAMLError
+
+from agw_installer import BackgroundInstaller, InstallPhases
+from command_policy import (
+    CHECK_POLICY,
+    HEALTH_QUERY_POLICY,
+    INSTALL_POLICY,
+    REBOOT_POLICY,
+    SERVICE_CONTROL_POLICY,
+    SNAP_POLICY,
+    CommandTimeoutError,
+)
+from config_impact import (
+    HOT_RELOAD,
+    NETWORK_REAPPLY,
+    NO_OP,
+    REINSTALL_OR_REBOOT,
+    SERVICE_RESTART,
+    classify_changes,
+    options_with_impact,
+    required_impact,
+)
+from config_overlay import (
+    MAGMA_CONFIG_DIR,
+    ConfigOverlay,
+    InvalidOverlayError,
+    affected_services,
+    deep_merge,
+    parse_overlay,
+)
+from dataplane_tuning import (
+    AUTO,
+    HUGEPAGES_SYSCTL_FILE,
+    DataplaneTuning,
+    is_valid_cpu_list,
+    is_valid_cpu_mask,
+)
+from health_check import HEALTH_SERVICES, PROBE_BUDGET, has_carrier
+from host import Host, SystemHost
+from interface_mtu import apply_mtu, mtu_limits, persist_mtus
+from log_volume import (
+    FLUENT_BIT_TEMPLATE,
+    FLUENT_BIT_UNIT,
+    JOURNALD_DROP_IN,
+    LogForwarderBuffering,
+    apply_journald_rate_limit,
+    is_valid_buffer_size,
+    is_valid_log_levels,
+    is_valid_time_span,
+    log_level_overlay,
+)
+from magmad_intervals import magmad_intervals_overlay
+from maintenance import (
+    active_sessions,
+    in_maintenance_window,
+    is_valid_maintenance_window,
+)
+from network_config import (
+    GATEWAY_CHECKS,
+    NETPLAN_DIR,
+    InterfaceAddressing,
+    NetworkApplyError,
+    NetworkConfiguration,
+    interface_services,
+)
+from nic_offloads import (
+    NIC_TUNING_UNIT,
+    SYSTEMD_SYSTEM_DIR,
+    NICOffloads,
+    format_settings,
+    is_valid_offloads,
+    is_valid_ring_sizes,
+    parse_settings,
+    persist_nic_settings,
+)
+from onboarding import (
+    BOOTSTRAP,
+    CHECK_IN,
+    CHECK_IN_MESSAGE,
+    CONFIG_INSTALL,
+    MAGMA_RESTART,
+    RELATION_CREATED,
+    OnboardingTimeline,
+    first_check_in,
+    onboarding_metrics,
+)
+from orchestrator_probe import (
+    PROBE_TIMEOUT,
+    OrchestratorProbe,
+    control_proxy_endpoints,
+    format_report,
+)
+from ovs_tuning import OVS_OPTIONS, OVSTuning
+from redis_tuning import (
+    APPENDFSYNC_POLICIES,
+    REDIS_TEMPLATE,
+    RedisTuning,
+    is_valid_maxmemory,
+    is_valid_save,
+)
+from rolling_restart import (
+    GRANTED_KEY,
+    LOCK_KEY,
+    REBOOT,
+    RESTART,
+    RESTART_SERVICES,
+    RollingRestartLock,
+)
+from service_pinning import (
+    ServicePinning,
+    is_valid_cpu_affinity,
+    is_valid_scheduling_policy,
+)
+from service_startup import ServiceStartup, format_metrics
+from sysctl_profile import (
+    MODPROBE_FILE,
+    MODULES_LOAD_FILE,
+    PROFILES,
+    SYSCTL_FILE,
+    SysctlProfile,
+)
 
 logger = logging.getLogger(__name__)
 
 ROOT_CA_PATH = "/var/opt/magma/tmp/certs/rootCA.pem"
 CERT_CERTIFIER_CERT = "/var/opt/magma/tmp/certs/certifier.pem"
 CONFIG_PATH = "/var/opt/magma/configs/control_proxy.yml"
-
-
-def install_file(file: Path, content: str) -> bool:
-    """Install file with provided text content.
-
-    Args:
-        file: Path object to write to
-        content: Text content to write to the file
-
-    Returns:
-        True if the file was written to
-    """
-    if not file.parent.exists():
-        file.parent.mkdir()
-    elif file.exists() and file.read_text() == content:
-        return False
-    file.write_text(content)
-    return True
+GATEWAY_CERT_PATH = "/var/opt/magma/gateway.crt"
+STARTUP_METRICS_FILE = "/var/lib/magma-access-gateway-operator/metrics/magma-startup.prom"
+ONBOARDING_METRICS_FILE = "/var/lib/magma-access-gateway-operator/metrics/magma-onboarding.prom"
+STATUS_MESSAGE_MAX_LENGTH = 120
+TIMEOUT_EXIT_STATUS = 124
+MINIMUM_MTU = 68
+SNAP_INSTALL_PHASE = "snap-install"
+AGW_INSTALL_PHASE = "agw-install"
+# Files written by the charm outside of the kernel, whose changes trigger a reconciliation
+MANAGED_FILES = [
+    MAGMA_CONFIG_DIR / "*.yml",
+    Path(CONFIG_PATH),
+    REDIS_TEMPLATE,
+    FLUENT_BIT_TEMPLATE,
+    JOURNALD_DROP_IN,
+    SYSCTL_FILE,
+    MODPROBE_FILE,
+    MODULES_LOAD_FILE,
+    HUGEPAGES_SYSCTL_FILE,
+    NETPLAN_DIR / "*.yaml",
+    SYSTEMD_SYSTEM_DIR / NIC_TUNING_UNIT,
+]
+# Minimum time between two searches of the magmad journal for the first check-in, in seconds
+CHECK_IN_PROBE_INTERVAL = 600.0
+
+
+class InstallCompleteEvent(EventBase):
+    """Dispatched by the background installer once the AGW installation completes."""
+
+
+class MagmaAccessGatewayOperatorCharmEvents(CharmEvents):
+    """Charm events, including the ones dispatched from outside of Juju hooks."""
+
+    install_complete = EventSource(InstallCompleteEvent)
 
 
 class MagmaAccessGatewayOperatorCharm(CharmBase):
     """Charm the service."""
 
+    on = MagmaAccessGatewayOperatorCharmEvents()
+    _stored = StoredState()
+
+    # Machine the charm operates, replaced by an in-memory host in tests
+    host: Host = SystemHost()
     HARDWARE_ID_LABEL = "Hardware ID"
     CHALLENGE_KEY_LABEL = "Challenge key"
     PIPELINED_CONFIG_FILE = "/etc/magma/pipelined.yml"
+    INTERFACES = [("sgi", "eth0"), ("s1", "eth1")]
+    CONTROL_PROXY_RELATION_SETTINGS = [
+        "cloud_address",
+        "cloud_port",
+        "bootstrap_address",
+        "bootstrap_port",
+        "fluentd_address",
+        "fluentd_port",
+        "rootca_cert",
+    ]
+    INSTALLER_NETWORKING_OPTIONS = [
+        "sgi",
+        "sgi-ipv4-address",
+        "sgi-ipv4-gateway",
+        "sgi-ipv6-address",
+        "sgi-ipv6-gateway",
+        "s1",
+        "s1-ipv4-address",
+        "s1-ipv6-address",
+    ]
 
     def __init__(self, *args):
         """Observes juju events."""
         super().__init__(*args)
+        self._stored.set_default(
+            ovs_tuned=False,
+            control_proxy={},
+            health_message="",
+            blocked_message="",
+            reconciled_hash="",
+            applied_config={},
+            drain_started=0.0,
+            pending_restarts=[],
+            startup_timings={},
+            onboarding={},
+            check_in_probed_at=0.0,
+        )
         self._lte_core_provides = LTECoreProvides(self, "lte-core")
         self.orchestrator_requirer = OrchestratorRequires(self, "magma-orchestrator")
+        self._installer = BackgroundInstaller(self.host, self.unit.name, self.charm_dir)
+        self._install_phases = InstallPhases(self.host, [SNAP_INSTALL_PHASE, AGW_INSTALL_PHASE])
+        self._restart_lock = RollingRestartLock(
+            self,
+            "agw-peers",
+            self.host,
+            self._run_disruptive_operation,
+            self._is_back_in_service,
+            self._can_run_disruptive_operation,
+        )
         self.framework.observe(self.on.install, self._on_install)
+        self.framework.observe(self.on.install_complete, self._on_install_complete)
         self.framework.observe(self.on.start, self._on_start)
         self.framework.observe(self.on.config_changed, self._on_config_changed)
+        self.framework.observe(self.on.update_status, self._on_update_status)
+        self.framework.observe(self.on.upgrade_charm, self._on_upgrade_charm)
 
         self.framework.observe(
             self.on.get_access_gateway_secrets_action, self._on_get_access_gateway_secrets
@@ -78,7 +280,21 @@ class MagmaAccessGatewayOperatorCharm(CharmBase):
         self.framework.observe(
             self.on.post_install_checks_action, self._on_post_install_checks_action
         )
+        self.framework.observe(self.on.get_nic_settings_action, self._on_get_nic_settings_action)
+        self.framework.observe(
+            self.on.get_startup_timings_action, self._on_get_startup_timings_action
+        )
+
+        self.framework.observe(
+            self.on.get_onboarding_timings_action, self._on_get_onboarding_timings_action
+        )
+        self.framework.observe(
+            self.on.probe_orchestrator_action, self._on_probe_orchestrator_action
+        )
 
+        self.framework.observe(
+            self.on["magma-orchestrator"].relation_created, self._on_orchestrator_relation_created
+        )
         self.framework.observe(
             self.orchestrator_requirer.on.orchestrator_available,
             self._on_orchestrator_available,
@@ -88,58 +304,261 @@ class MagmaAccessGatewayOperatorCharm(CharmBase):
             self.on["lte-core"].relation_joined, self._on_lte_core_relation_joined
         )
 
-    def _on_install(self, event: Union[ConfigChangedEvent, InstallEvent]) -> None:
+    def _on_install(self, event: EventBase) -> None:
         """Triggered on install event.
 
-        Handles deployment of the AGW.
+        Handles deployment of the AGW. The installation itself runs in the background and
+        reports back through the `install_complete` event. Phases which completed during a
+        previous attempt are skipped.
 
         Args:
-            event: Juju event (ConfigChangedEvent or InstallEvent)
+            event: Juju event (InstallEvent or the event triggering a reconciliation)
         """
-        if self._is_magmad_enabled:
-            return
-        self.unit.status = MaintenanceStatus("Installing AGW Snap")
-        self.install_magma_access_gateway_snap()
-        if not self._is_configuration_valid:
-            self.unit.status = BlockedStatus("Configuration is invalid. Check logs for details")
+        try:
+            if self._is_magmad_enabled:
+                return
+            if self._installer.is_running:
+                self.unit.status = MaintenanceStatus(self._installation_progress_message)
+                return
+            if self._installer.exit_status is not None:
+                self._on_install_complete(event)
+                return
+            if not self._install_snap_phase():
+                return
+            if not self._is_configuration_valid:
+                self._block("Configuration is invalid. Check logs for details")
+                return
+            if self._reboot_after_agw_installation():
+                return
+            if not self.install_magma_access_gateway():
+                self.unit.status = BlockedStatus(
+                    "Failed to start AGW installation. See logs for details"
+                )
+                return
+            self._stored.applied_config = dict(self.model.config)
+            self.unit.status = MaintenanceStatus("Installing AGW")
+        except CommandTimeoutError as e:
+            self._defer_on_timeout(event, e)
+
+    def _on_install_complete(self, event: EventBase) -> None:
+        """Triggered when the background AGW installation completes.
+
+        Reboots the machine to apply the changes once the restart lock is held, if the
+        installation succeeded. The unit has not served yet, so the reboot doesn't wait for
+        the maintenance window nor for sessions to drain.
+
+        Args:
+            event: Juju event (InstallCompleteEvent)
+        """
+        exit_status = self._installer.exit_status
+        if exit_status is None:
             return
-        self.unit.status = MaintenanceStatus("Installing AGW")
-        returncode = self.install_magma_access_gateway()
-        if returncode != 0:
-            self.unit.status = BlockedStatus("Installation script failed. See logs for details")
+        if exit_status != 0:
+            self._installer.clear()
+            if exit_status == TIMEOUT_EXIT_STATUS:
+                self.unit.status = BlockedStatus(
+                    "AGW installation timed out. See logs for details"
+                )
+            else:
+                self.unit.status = BlockedStatus(
+                    "Installation script failed. See logs for details"
+                )
             return
-        self.unit.status = MaintenanceStatus("Rebooting to apply changes")
-        self.reboot()
+        self._install_phases.complete(AGW_INSTALL_PHASE)
+        self._request_operation(REBOOT)
+        self._installer.clear()
+
+    def _install_snap_phase(self) -> bool:
+        """Installs the AGW snap unless a previous attempt already did.
+
+        Returns:
+            bool: Whether the snap is installed
+
+        Raises:
+            CommandTimeoutError: If the snap installation timed out
+        """
+        if self._install_phases.next_phase != SNAP_INSTALL_PHASE:
+            return True
+        self.unit.status = MaintenanceStatus("Installing AGW Snap")
+        if not self.install_magma_access_gateway_snap():
+            self.unit.status = BlockedStatus("Failed to install AGW snap. See logs for details")
+            return False
+        self._install_phases.complete(SNAP_INSTALL_PHASE)
+        return True
+
+    def _reboot_after_agw_installation(self) -> bool:
+        """Reboots the machine if the AGW was installed since the last boot.
+
+        If the machine rebooted since the AGW was installed and Magma is still not enabled,
+        the AGW installation phase is reset so that it runs again.
+
+        Returns:
+            bool: Whether the machine is rebooting or waiting to reboot
+        """
+        if self._install_phases.completed_in_current_boot(AGW_INSTALL_PHASE):
+            self._request_operation(REBOOT)
+            return True
+        if self._install_phases.is_complete(AGW_INSTALL_PHASE):
+            logger.warning("Magma is not enabled after the AGW installation. Installing again")
+            self._install_phases.reset(AGW_INSTALL_PHASE)
+        return False
 
     def _on_start(self, event: StartEvent) -> None:
         """Triggered on start event.
 
+        Settings which do not survive reboots, like the data plane tuning, are applied again
+        by the reconciliation since the kernel settings are part of its inputs.
+
         Args:
             event: Juju event (StartEvent)
         """
-        if not self._magma_service_is_running:
-            event.defer()
+        self._reconcile_if_changed(event)
+        self._restart_lock.release_if_ready()
+        if self._stored.blocked_message or self._restart_lock.pending_operation:
+            return
+        try:
+            if not self._magma_service_is_running:
+                event.defer()
+                return
+        except CommandTimeoutError as e:
+            self._defer_on_timeout(event, e)
             return
         self.unit.status = ActiveStatus()
 
     def _on_config_changed(self, event: ConfigChangedEvent) -> None:
         """Triggered when charm config changes.
 
-        The only config which can be changed on a running instance of Magma AGW is currently
-        the value of `block-agw-local-ips` option.
-
         Args:
             event: Juju event (ConfigChangedEvent)
         """
+        self._reconcile_if_changed(event)
+
+    def _on_upgrade_charm(self, event: UpgradeCharmEvent) -> None:
+        """Triggered when the charm is upgraded.
+
+        The charm code is an input of the reconciliation, so the new charm reconciles the
+        machine again.
+
+        Args:
+            event: Juju event (UpgradeCharmEvent)
+        """
+        self._reconcile_if_changed(event)
+
+    def _reconcile_if_changed(self, event: EventBase) -> None:
+        """Reconciles the machine with the charm config and relations.
+
+        Every hook changing the machine goes through this entry point. The reconciliation is
+        skipped when its inputs are the same as the ones of the last successful
+        reconciliation, so that hooks are near no-ops in steady state.
+
+        Args:
+            event: Juju event being handled
+        """
+        if self._reconcile_inputs_hash == self._stored.reconciled_hash:
+            logger.debug("Inputs unchanged since the last reconciliation. Skipping")
+            return
+        blocked_message = self._stored.blocked_message
+        self._stored.blocked_message = ""
+        status = self.unit.status
+        if not self._reconcile(event):
+            self._stored.blocked_message = self._stored.blocked_message or blocked_message
+            self._stored.reconciled_hash = ""
+            return
+        unblocked = blocked_message and not self._stored.blocked_message
+        if unblocked and self.unit.status == BlockedStatus(blocked_message):
+            logger.info("Configuration applied successfully, clearing: %s", blocked_message)
+            self.unit.status = ActiveStatus()
+        if self.unit.status is status or isinstance(self.unit.status, ActiveStatus):
+            self._stored.reconciled_hash = self._reconcile_inputs_hash
+            self._stored.applied_config = dict(self.model.config)
+
+    def _reconcile(self, event: EventBase) -> bool:
+        """Reconciles the machine with the charm config.
+
+        Only the settings of the options changed since the config applied last are applied,
+        from hot-reloaded tunings to service settings and addressing changes applied live
+        through netplan. All of them are applied when the config didn't change, for example
+        after a reboot. Changes are then completed by the single cheapest operation covering
+        them all: nothing when they only affect the charm or took effect live, a restart of the
+        affected services, a restart of Magma, or a reboot for the `block-agw-local-ips` option.
+        The interfaces themselves are only set by the installation. Invalid options block the
+        unit before anything is applied, whatever their impact.
+
+        Args:
+            event: Juju event being handled
+
+        Returns:
+            bool: Whether the reconciliation ran to completion
+        """
         self._on_install(event)
-        if not Path(self.PIPELINED_CONFIG_FILE).exists():
+        if not self._is_post_install_configuration_valid:
+            self._block("Configuration is invalid. Check logs for details")
+            return False
+        impacts = self._config_change_impacts
+        for option, impact in impacts.items():
+            logger.info("Option %s changed (%s)", option, impact)
+        if impacts and required_impact(impacts) == NO_OP:
+            logger.debug("Changed options are only read by the charm")
+            return True
+        if self._covers_changes(impacts, HOT_RELOAD):
+            self._apply_dataplane_tuning()
+            self._apply_mtu()
+            self._apply_nic_offloads()
+            self._apply_sysctl_profile()
+        if not self.host.exists(self.PIPELINED_CONFIG_FILE):
             logger.debug(f"{self.PIPELINED_CONFIG_FILE} doesn't exist yet. Deferring...")
             event.defer()
+            return False
+        try:
+            operation = self._apply_magma_settings(impacts)
+            self._report_install_only_changes(impacts)
+            if self._block_agw_local_ips_config != self._block_agw_local_ips_value:
+                self._set_local_agw_ips_blocking()
+                operation = REBOOT
+            if operation:
+                self._request_operation(operation)
+        except CommandTimeoutError as e:
+            self._defer_on_timeout(event, e)
+            return False
+        return True
+
+    def _on_update_status(self, event: UpdateStatusEvent) -> None:
+        """Triggered on update-status event.
+
+        Runs the operation waiting for the restart lock, or releases the lock once Magma is
+        back in service and reconciles the machine if it changed. Then reports failed Magma
+        services and carrier losses on the sgi and s1 interfaces. Only statuses set by a
+        previous health evaluation or Active are replaced, so that statuses set by other hooks
+        (invalid configuration, pending restart...) are kept.
+
+        Args:
+            event: Juju event (UpdateStatusEvent)
+        """
+        if self._restart_lock.pending_operation:
+            self._restart_lock.process_pending()
             return
-        if self._block_agw_local_ips_config != self._block_agw_local_ips_value:
-            self._set_local_agw_ips_blocking()
-            self.unit.status = MaintenanceStatus("Rebooting to apply changes")
-            self.reboot()
+        self._restart_lock.release_if_ready()
+        self._reconcile_if_changed(event)
+        current = self.unit.status
+        if not isinstance(current, ActiveStatus) and (
+            current.message != self._stored.health_message or not current.message
+        ):
+            return
+        started = time.monotonic()
+        try:
+            status = self._health_status()
+        except CommandTimeoutError as e:
+            logger.error(str(e))
+            status = WaitingStatus("Timed out querying Magma services. Will retry")
+        elapsed = time.monotonic() - started
+        if elapsed > PROBE_BUDGET:
+            logger.warning("Health evaluation took %.2f seconds", elapsed)
+        else:
+            logger.debug("Health evaluation took %.2f seconds", elapsed)
+        if isinstance(status, ActiveStatus):
+            status = ActiveStatus(self._track_onboarding())
+        self._stored.health_message = status.message
+        self.unit.status = status
 
     def _on_get_access_gateway_secrets(self, event: ActionEvent) -> None:
         """Triggered on get-access-gateway-secrets action call.
@@ -150,10 +569,10 @@ class MagmaAccessGatewayOperatorCharm(CharmBase):
         Args:
             event: Juju event (Action Event)
         """
-        if not self._magma_service_is_running:
-            event.fail("Magma is not running! Please start Magma and try again.")
-            return
         try:
+            if not self._magma_service_is_running:
+                event.fail("Magma is not running! Please start Magma and try again.")
+                return
             hardware_id, challenge_key = self._get_magma_secrets
             event.set_results(
                 {
@@ -164,6 +583,9 @@ class MagmaAccessGatewayOperatorCharm(CharmBase):
         except (subprocess.CalledProcessError, IndexError, ValueError):
             event.fail("Failed to get Magma Access Gateway secrets!")
             return
+        except CommandTimeoutError as e:
+            event.fail(f"Failed to get Magma Access Gateway secrets: {str(e)}")
+            return
         except Exception as e:
             event.fail(str(e))
             return
@@ -181,7 +603,7 @@ class MagmaAccessGatewayOperatorCharm(CharmBase):
         successful_msg = "Magma AGW post-installation checks finished successfully."
         failed_msg = "Post-installation checks failed. For more information, please check journalctl logs."  # noqa: E501
         try:
-            post_install_checks = subprocess.run(command, stdout=subprocess.PIPE)
+            post_install_checks = self.host.run(command, CHECK_POLICY)
             event.set_results(
                 {
                     "post-install-checks-output": successful_msg
@@ -192,25 +614,177 @@ class MagmaAccessGatewayOperatorCharm(CharmBase):
         except subprocess.CalledProcessError:
             event.fail("Failed to run post-install checks.")
             return
+        except CommandTimeoutError:
+            event.fail("Post-install checks timed out.")
+            return
         except Exception as e:
             event.fail(str(e))
             return
 
+    def _on_get_nic_settings_action(self, event: ActionEvent) -> None:
+        """Triggered on get-nic-settings action call.
+
+        Returns the offload features and ring sizes currently applied to the sgi and s1
+        interfaces.
+
+        Args:
+            event: Juju event (ActionEvent)
+        """
+        results = {}
+        try:
+            for interface_name, new_interface_name in self.INTERFACES:
+                interface = self._present_interface(interface_name, new_interface_name)
+                if not interface:
+                    continue
+                nic = NICOffloads(self.host, interface)
+                features = nic.features() or {}
+                maximums, current = nic.ring_sizes() or ({}, {})
+                results[interface_name] = {
+                    "interface": interface,
+                    "offloads": format_settings(features),
+                    "ring-sizes": format_settings(current),
+                    "max-ring-sizes": format_settings(maximums),
+                }
+        except CommandTimeoutError as e:
+            event.fail(f"Failed to get NIC settings: {str(e)}")
+            return
+        if not results:
+            event.fail("Neither the sgi nor the s1 interface is present.")
+            return
+        event.set_results(results)
+
+    def _on_get_startup_timings_action(self, event: ActionEvent) -> None:
+        """Triggered on get-startup-timings action call.
+
+        Returns the time each Magma service and the whole stack took to become active during
+        the last restart.
+
+        Args:
+            event: Juju event (ActionEvent)
+        """
+        timings = self._stored.startup_timings
+        if not timings:
+            event.fail("Magma has not been restarted by the charm yet.")
+            return
+        services = timings["services"]
+        results = {
+            "services": " ".join(
+                f"{service}={seconds}"
+                for service, seconds in services.items()
+                if seconds is not None
+            )
+        }
+        failed = [service for service, seconds in services.items() if seconds is None]
+        if failed:
+            results["failed"] = ",".join(failed)
+        else:
+            results["total"] = str(timings["total"])
+        event.set_results(results)
+
     def _on_orchestrator_available(self, event: OrchestratorAvailableEvent):
         """Triggered when a related orchestrator is made available.
 
         The AGW will be configured to connect to the orchestrator with the data from
-        the event. Services will then be restarted.
+        the event. Services will then be restarted. Changed data starts the onboarding
+        timeline, which goes on until the first successful check-in. The rest of the machine
+        is then reconciled with the new relation data.
         """
+        self._connect_to_orchestrator(event)
+        self._reconcile_if_changed(event)
+
+    def _connect_to_orchestrator(self, event: OrchestratorAvailableEvent) -> None:
+        """Installs the orchestrator configuration and restarts Magma if it changed.
+
+        Args:
+            event: Juju event (OrchestratorAvailableEvent)
+        """
+        arrived = time.time()
         if self._certifier_pem_changed(event.certifier_pem_certificate):
             self._remove_agw_cert_files()
-        if self._install_configurations(event):
-            self.unit.status = MaintenanceStatus("Restarting Access Gateway to apply changes")
-            self._restart_magma()
-        if not self._magma_service_is_running:
-            event.defer()
+        try:
+            if self._install_configurations(event):
+                self._start_onboarding(arrived)
+                self._restart_lock.request(RESTART)
+            if self._restart_lock.is_waiting_for_lock:
+                self.unit.status = WaitingStatus(
+                    f"Waiting for lock to {self._restart_lock.pending_operation}"
+                )
+            if self._restart_lock.pending_operation:
+                return
+            if not self._magma_service_is_running:
+                event.defer()
+                return
+        except CommandTimeoutError as e:
+            self._defer_on_timeout(event, e)
             return
-        self.unit.status = ActiveStatus()
+        self.unit.status = ActiveStatus(self._track_onboarding())
+
+    def _on_orchestrator_relation_created(self, event: RelationCreatedEvent) -> None:
+        """Triggered when the magma-orchestrator relation is created.
+
+        Records the beginning of the onboarding with the orchestrator.
+
+        Args:
+            event: Juju event (RelationCreatedEvent)
+        """
+        self._stored.onboarding = {RELATION_CREATED: time.time()}
+
+    def _on_get_onboarding_timings_action(self, event: ActionEvent) -> None:
+        """Triggered on get-onboarding-timings action call.
+
+        Returns the duration of each stage of the onboarding with the orchestrator, from the
+        relation being created to the first successful check-in.
+
+        Args:
+            event: Juju event (ActionEvent)
+        """
+        timeline = OnboardingTimeline(self._stored.onboarding)
+        if not timeline.is_started:
+            event.fail("No orchestrator data received yet.")
+            return
+        results = {
+            "stages": {
+                stage: str(seconds)
+                for stage, seconds in timeline.durations().items()
+                if seconds is not None
+            }
+        }
+        if timeline.next_stage:
+            results["waiting-for"] = timeline.next_stage
+        else:
+            results["total"] = str(timeline.total)
+        event.set_results(results)
+
+    def _on_probe_orchestrator_action(self, event: ActionEvent) -> None:
+        """Triggered on probe-orchestrator action call.
+
+        Returns the DNS resolution, TCP connect and TLS handshake time percentiles of each
+        endpoint of the installed control_proxy.yml.
+
+        Args:
+            event: Juju event (ActionEvent)
+        """
+        try:
+            endpoints = control_proxy_endpoints(self.host.read_text(CONFIG_PATH))
+        except FileNotFoundError:
+            event.fail("Orchestrator configuration is not installed yet.")
+            return
+        except ValueError as e:
+            event.fail(str(e))
+            return
+        if not endpoints:
+            event.fail("No orchestrator endpoint in the control_proxy configuration.")
+            return
+        root_ca = self.host.read_text(ROOT_CA_PATH) if self.host.exists(ROOT_CA_PATH) else None
+        try:
+            probe = OrchestratorProbe(
+                root_ca=root_ca, timeout=event.params.get("timeout", PROBE_TIMEOUT)
+            )
+        except ssl.SSLError as e:
+            event.fail(f"Invalid orchestrator root CA certificate: {str(e)}")
+            return
+        reports = probe.probe(endpoints, samples=event.params.get("samples", 5))
+        event.set_results({name: format_report(report) for name, report in reports.items()})
 
     def _on_lte_core_relation_joined(self, event: RelationJoinedEvent):
         """Triggered when lte-core relation is joined.
@@ -226,49 +800,61 @@ class MagmaAccessGatewayOperatorCharm(CharmBase):
         if not self.unit.is_leader():
             return
         try:
-            ip = netifaces.ifaddresses("eth1")[netifaces.AF_INET][0]["addr"]
+            ip = self.host.ipv4_addresses("eth1")[0]
             self._lte_core_provides.set_lte_core_information(ip, relation_id=event.relation.id)
             self.unit.status = ActiveStatus()
-        except (ValueError, AddressValueError) as e:
+        except (IndexError, ValueError, AddressValueError) as e:
             logger.error(f"Failed to fetch IP address of eth1 interface: {str(e)}")
             self.unit.status = WaitingStatus("Waiting for the MME interface to be ready")
             event.defer()
             return
 
-    @staticmethod
-    def install_magma_access_gateway_snap() -> None:
-        """Installs Magma Access Gateway snap."""
-        subprocess.run(
+    def install_magma_access_gateway_snap(self) -> bool:
+        """Installs Magma Access Gateway snap.
+
+        Returns:
+            bool: Whether the snap was installed
+        """
+        process = self.host.run(
             ["snap", "install", "magma-access-gateway", "--classic", "--edge"],
-            stdout=subprocess.PIPE,
+            SNAP_POLICY,
         )
+        if process.returncode != 0:
+            logger.error("Failed to install AGW snap: return code %s", process.returncode)
+            return False
+        return True
+
+    def install_magma_access_gateway(self) -> bool:
+        """Starts the installation of Magma access gateway on the host in the background.
 
-    def install_magma_access_gateway(self) -> int:
-        """Installs Magma access gateway on the host.
+        The installation script is bounded by the installation timeout policy.
 
         Returns:
-            Return code of the installation script
+            bool: Whether the installation was started
         """
-        command = ["magma-access-gateway.install"]
+        command = ["timeout", str(INSTALL_POLICY.timeout), "magma-access-gateway.install"]
         command.extend(self._install_arguments)
-        install_process = subprocess.run(
-            command,
-            stdout=subprocess.PIPE,
-        )
-        logger.info(install_process.stdout)
-        return install_process.returncode
+        return self._installer.start(command)
+
+    @property
+    def _installation_progress_message(self) -> str:
+        """Returns a status message reporting the progress of the AGW installation."""
+        progress = self._installer.progress
+        if not progress:
+            return "Installing AGW"
+        return f"Installing AGW: {progress}"[:STATUS_MESSAGE_MAX_LENGTH]
 
     def _set_local_agw_ips_blocking(self) -> None:
         """Sets value for the `block_agw_local_ips` param in pipelined.yaml."""
         yaml = ruamel.yaml.YAML()
-        with open(self.PIPELINED_CONFIG_FILE, "r") as pipelined_config_orig:
-            pipelined_config = yaml.load(pipelined_config_orig)
+        pipelined_config = yaml.load(self.host.read_text(self.PIPELINED_CONFIG_FILE))
         pipelined_config["access_control"][
             "block_agw_local_ips"
         ] = self._block_agw_local_ips_config
         logger.debug(f"block_agw_local_ips set to {self._block_agw_local_ips_config}")
-        with open(self.PIPELINED_CONFIG_FILE, "w") as pipelined_config_updated:
-            yaml.dump(pipelined_config, pipelined_config_updated)
+        pipelined_config_updated = io.StringIO()
+        yaml.dump(pipelined_config, pipelined_config_updated)
+        self.host.write_text(self.PIPELINED_CONFIG_FILE, pipelined_config_updated.getvalue())
 
     @property
     def _block_agw_local_ips_value(self) -> bool:
@@ -278,26 +864,63 @@ class MagmaAccessGatewayOperatorCharm(CharmBase):
             bool: Value of the `block_agw_local_ips` config from the pipelined.yml
         """
         yaml = ruamel.yaml.YAML()
-        with open(self.PIPELINED_CONFIG_FILE, "r") as pipelined_config_orig:
-            pipelined_config = yaml.load(pipelined_config_orig)
+        pipelined_config = yaml.load(self.host.read_text(self.PIPELINED_CONFIG_FILE))
         return pipelined_config["access_control"]["block_agw_local_ips"]
 
-    @staticmethod
-    def reboot() -> None:
+    def _request_operation(self, operation: str) -> None:
+        """Runs a disruptive operation once the restart lock is held and the operation can run.
+
+        Args:
+            operation: Operation to run (`restart services`, `restart` or `reboot`)
+        """
+        self._restart_lock.request(operation)
+        if self._restart_lock.is_waiting_for_lock:
+            self.unit.status = WaitingStatus(
+                f"Waiting for lock to {self._restart_lock.pending_operation}"
+            )
+
+    def reboot(self) -> None:
         """Sends the command to reboot the machine in 1 minute."""
-        subprocess.run(
-            ["shutdown", "--reboot", "+1"],
-            stdout=subprocess.PIPE,
-        )
+        self.host.run(["shutdown", "--reboot", "+1"], REBOOT_POLICY)
 
     @property
     def _is_configuration_valid(self) -> bool:
         """Validates configuration."""
+        if not self._is_post_install_configuration_valid:
+            return False
         if self.model.config["skip-networking"]:
             return True
         valid = self._is_valid_interface("sgi", "eth0")
         if not self._is_valid_interface("s1", "eth1"):
             valid = False
+        return valid
+
+    @property
+    def _is_post_install_configuration_valid(self) -> bool:
+        """Validates the options applied after the installation.
+
+        Interface names are only applied by the installation, changing them afterwards is
+        reported separately.
+        """
+        if not all(
+            [
+                self._is_valid_dataplane_tuning_configuration,
+                self._is_valid_ovs_tuning_configuration,
+                self._is_valid_nic_offload_configuration,
+                self._is_valid_service_pinning_configuration,
+                self._is_valid_config_overlay,
+                self._is_valid_sysctl_profile,
+                self._is_valid_redis_tuning_configuration,
+                self._is_valid_log_volume_configuration,
+                self._is_valid_control_proxy_configuration,
+                self._is_valid_magmad_intervals_configuration,
+                self._is_valid_maintenance_configuration,
+            ]
+        ):
+            return False
+        if self.model.config["skip-networking"]:
+            return True
+        valid = True
         if not self._is_valid_sgi_interface_addressing_configuration:
             valid = False
         if not self._is_valid_s1_interface_addressing_configuration:
@@ -305,6 +928,17 @@ class MagmaAccessGatewayOperatorCharm(CharmBase):
         if not self._are_valid_dns(self.model.config["dns"]):
             logger.warning("Invalid DNS configuration")
             valid = False
+        if self._config_str("gateway-check") not in GATEWAY_CHECKS:
+            logger.warning(
+                "Invalid gateway-check: %s. Valid checks are %s",
+                self._config_str("gateway-check"),
+                ", ".join(GATEWAY_CHECKS),
+            )
+            valid = False
+        if not self._is_valid_mtu("sgi", "eth0"):
+            valid = False
+        if not self._is_valid_mtu("s1", "eth1"):
+            valid = False
         return valid
 
     def _is_valid_interface(self, interface_name: str, new_interface_name: str) -> bool:
@@ -327,37 +961,242 @@ class MagmaAccessGatewayOperatorCharm(CharmBase):
             logger.warning("%s interface name is required", interface_name)
             return False
         if (
-            interface not in netifaces.interfaces()
-            and new_interface_name not in netifaces.interfaces()  # noqa: W503
+            interface not in self.host.interfaces()
+            and new_interface_name not in self.host.interfaces()  # noqa: W503
         ):
             logger.warning("%s interface not found", interface)
             return False
         return True
 
-    @staticmethod
-    def _certifier_pem_changed(new_cert: str) -> bool:
+    @property
+    def _is_valid_dataplane_tuning_configuration(self) -> bool:
+        """Validates IRQ affinity, RPS/XPS and hugepages configuration."""
+        valid = True
+        irq_affinity = self.model.config["irq-affinity"]
+        if irq_affinity and irq_affinity != AUTO and not is_valid_cpu_list(irq_affinity):
+            logger.warning("Invalid CPU list for irq-affinity: %s", irq_affinity)
+            valid = False
+        for option in ("rps-cpus", "xps-cpus"):
+            mask = self.model.config[option]
+            if mask and mask != AUTO and not is_valid_cpu_mask(mask):
+                logger.warning("Invalid CPU mask for %s: %s", option, mask)
+                valid = False
+        if self.model.config["hugepages"] < 0:
+            logger.warning("hugepages must not be negative")
+            valid = False
+        return valid
+
+    def _is_valid_mtu(self, interface_name: str, new_interface_name: str) -> bool:
+        """Validates the MTU of an interface against the range supported by the NIC.
+
+        Args:
+            interface_name: Name of the interface option (sgi or s1)
+            new_interface_name: Name of the interface that will be set by Magma
+
+        Returns:
+            True if the MTU is not set or is supported by the interface
+        """
+        mtu = self.model.config[f"{interface_name}-mtu"]
+        if not mtu:
+            return True
+        if mtu < MINIMUM_MTU:
+            logger.warning("Invalid MTU for interface %s: %d", interface_name, mtu)
+            return False
+        interface = self._present_interface(interface_name, new_interface_name)
+        if not interface:
+            return True
+        try:
+            limits = mtu_limits(self.host, interface)
+        except CommandTimeoutError as e:
+            logger.warning(str(e))
+            return False
+        if limits and not limits[0] <= mtu <= limits[1]:
+            logger.warning(
+                "MTU %d is not supported by interface %s (%d-%d)", mtu, interface, *limits
+            )
+            return False
+        return True
+
+    @property
+    def _is_valid_ovs_tuning_configuration(self) -> bool:
+        """Validates Open vSwitch tuning configuration."""
+        valid = True
+        for option in OVS_OPTIONS:
+            if self.model.config[option] < 0:
+                logger.warning("%s must not be negative", option)
+                valid = False
+        return valid
+
+    @property
+    def _is_valid_nic_offload_configuration(self) -> bool:
+        """Validates NIC offload features and ring sizes configuration."""
+        valid = True
+        for interface_name, _ in self.INTERFACES:
+            offloads = self.model.config[f"{interface_name}-offloads"]
+            if not is_valid_offloads(offloads):
+                logger.warning("Invalid offload features for %s: %s", interface_name, offloads)
+                valid = False
+            ring_sizes = self.model.config[f"{interface_name}-ring-sizes"]
+            if not is_valid_ring_sizes(ring_sizes):
+                logger.warning("Invalid ring sizes for %s: %s", interface_name, ring_sizes)
+                valid = False
+        return valid
+
+    @property
+    def _is_valid_service_pinning_configuration(self) -> bool:
+        """Validates CPU affinity and scheduling policy configuration of Magma services."""
+        valid = True
+        cpu_affinity = self.model.config["service-cpu-affinity"]
+        if not is_valid_cpu_affinity(cpu_affinity):
+            logger.warning("Invalid service-cpu-affinity: %s", cpu_affinity)
+            valid = False
+        scheduling_policy = self.model.config["service-scheduling-policy"]
+        if not is_valid_scheduling_policy(scheduling_policy):
+            logger.warning("Invalid service-scheduling-policy: %s", scheduling_policy)
+            valid = False
+        return valid
+
+    @property
+    def _is_valid_config_overlay(self) -> bool:
+        """Validates the overlay of Magma service configuration files.
+
+        The overlay must not set `block_agw_local_ips`, which is managed by the
+        `block-agw-local-ips` option.
+        """
+        try:
+            overlay = parse_overlay(self.model.config["config-overlay"])
+        except InvalidOverlayError as e:
+            logger.warning("Invalid config-overlay: %s", str(e))
+            return False
+        access_control = overlay.get("pipelined.yml", {}).get("access_control")
+        if isinstance(access_control, dict) and "block_agw_local_ips" in access_control:
+            logger.warning("block_agw_local_ips must be set with the block-agw-local-ips option")
+            return False
+        return True
+
+    @property
+    def _is_valid_sysctl_profile(self) -> bool:
+        """Validates the kernel network tuning profile."""
+        profile = self.model.config["sysctl-profile"]
+        if profile and profile not in PROFILES:
+            logger.warning(
+                "Invalid sysctl-profile: %s. Valid profiles are %s", profile, ", ".join(PROFILES)
+            )
+            return False
+        return True
+
+    @property
+    def _is_valid_redis_tuning_configuration(self) -> bool:
+        """Validates redis persistence and memory configuration."""
+        valid = True
+        if not is_valid_save(self.model.config["redis-save"]):
+            logger.warning("Invalid redis-save: %s", self.model.config["redis-save"])
+            valid = False
+        appendfsync = self.model.config["redis-appendfsync"]
+        if appendfsync and appendfsync not in APPENDFSYNC_POLICIES:
+            logger.warning("Invalid redis-appendfsync: %s", appendfsync)
+            valid = False
+        if not is_valid_maxmemory(self.model.config["redis-maxmemory"]):
+            logger.warning("Invalid redis-maxmemory: %s", self.model.config["redis-maxmemory"])
+            valid = False
+        return valid
+
+    @property
+    def _is_valid_log_volume_configuration(self) -> bool:
+        """Validates log levels, journald rate limits and log forwarder configuration."""
+        valid = True
+        if not is_valid_log_levels(self.model.config["service-log-level"]):
+            logger.warning("Invalid service-log-level: %s", self.model.config["service-log-level"])
+            valid = False
+        if not is_valid_time_span(self.model.config["journald-rate-limit-interval"]):
+            logger.warning(
+                "Invalid journald-rate-limit-interval: %s",
+                self.model.config["journald-rate-limit-interval"],
+            )
+            valid = False
+        if not is_valid_buffer_size(self.model.config["log-forwarder-buffer-size"]):
+            logger.warning(
+                "Invalid log-forwarder-buffer-size: %s",
+                self.model.config["log-forwarder-buffer-size"],
+            )
+            valid = False
+        for option in ["journald-rate-limit-burst", "log-forwarder-flush-interval"]:
+            if self.model.config[option] < 0:
+                logger.warning("%s must not be negative", option)
+                valid = False
+        return valid
+
+    @property
+    def _is_valid_control_proxy_configuration(self) -> bool:
+        """Validates the control_proxy settings.
+
+        Settings must be scalars and must not override the orchestrator connection details,
+        which come from the magma-orchestrator relation.
+        """
+        try:
+            settings = self._control_proxy_settings
+        except YAMLError as e:
+            logger.warning("Invalid control-proxy-config: %s", str(e))
+            return False
+        if not isinstance(settings, dict):
+            logger.warning("control-proxy-config must be a mapping of control_proxy settings")
+            return False
+        valid = True
+        for key, value in settings.items():
+            if key in self.CONTROL_PROXY_RELATION_SETTINGS:
+                logger.warning("%s is set by the magma-orchestrator relation", key)
+                valid = False
+            elif not isinstance(value, (str, int, float, bool)):
+                logger.warning("Invalid value for control_proxy setting %s: %s", key, value)
+                valid = False
+        return valid
+
+    @property
+    def _is_valid_magmad_intervals_configuration(self) -> bool:
+        """Validates magmad check-in and metrics upload intervals configuration."""
+        valid = True
+        for option in ["checkin-interval", "metrics-upload-interval"]:
+            if self.model.config[option] < 0:
+                logger.warning("%s must not be negative", option)
+                valid = False
+        if not 0 <= self.model.config["interval-jitter"] <= 100:
+            logger.warning("interval-jitter must be between 0 and 100")
+            valid = False
+        return valid
+
+    @property
+    def _is_valid_maintenance_configuration(self) -> bool:
+        """Validates the maintenance window and drain configuration."""
+        if not is_valid_maintenance_window(str(self.model.config.get("maintenance-window") or "")):
+            logger.warning("Invalid maintenance window")
+            return False
+        if int(self.model.config.get("drain-timeout", 0)) < 0:
+            logger.warning("Drain timeout must not be negative")
+            return False
+        if int(self.model.config.get("drain-session-threshold", 0)) < 0:
+            logger.warning("Drain session threshold must not be negative")
+            return False
+        return True
+
+    def _certifier_pem_changed(self, new_cert: str) -> bool:
         """Returns whether the orc8r-certifier cert has changed.
 
         Returns:
             bool: Whether the orc8r-certifier cert has changed
         """
         return (
-            Path(CERT_CERTIFIER_CERT).exists()
-            and Path(CERT_CERTIFIER_CERT).read_text() != new_cert  # noqa: W503
+            self.host.exists(CERT_CERTIFIER_CERT)
+            and self.host.read_text(CERT_CERTIFIER_CERT) != new_cert  # noqa: W503
         )
 
-    @staticmethod
-    def _remove_agw_cert_files() -> None:
+    def _remove_agw_cert_files(self) -> None:
         """Removes the AGW certificates for the disk."""
         for file in [
-            "/var/opt/magma/gateway.crt",
+            GATEWAY_CERT_PATH,
             "/var/opt/magma/gateway.key",
             "/var/opt/magma/gw_challenge.key",
         ]:
-            try:
-                Path(file).unlink()
-            except FileNotFoundError:
-                logger.debug("File does not exist: " + file)
+            self.host.unlink(file)
 
     @property
     def _is_valid_sgi_interface_addressing_configuration(self) -> bool:
@@ -492,17 +1331,135 @@ class MagmaAccessGatewayOperatorCharm(CharmBase):
         if not config.pop("block-agw-local-ips"):
             arguments.extend(["--unblock-local-ips"])
         for key, value in config.items():
-            arguments.extend([f"--{key}", value])
+            if key in self.INSTALLER_NETWORKING_OPTIONS:
+                arguments.extend([f"--{key}", value])
         return arguments
 
+    def _apply_magma_settings(self, impacts: Dict[str, str]) -> str:
+        """Applies the settings of the installed Magma covering the changed options.
+
+        Args:
+            impacts: Impact class of each changed option
+
+        Returns:
+            str: Cheapest operation completing the changes (`restart services` or `restart`),
+                empty when they took effect live
+        """
+        hot_reload = self._covers_changes(impacts, HOT_RELOAD)
+        service_restart = self._covers_changes(impacts, SERVICE_RESTART)
+        if NETWORK_REAPPLY in impacts.values():
+            self._apply_network_configuration()
+        if hot_reload:
+            self._apply_ovs_tuning()
+        if service_restart:
+            self._apply_service_pinning()
+            self._apply_config_overlay()
+            self._apply_redis_tuning()
+        if hot_reload or service_restart:
+            self._apply_log_volume()
+        if service_restart and self._update_control_proxy_config():
+            return RESTART
+        return RESTART_SERVICES if self._stored.pending_restarts else ""
+
+    @property
+    def _config_change_impacts(self) -> Dict[str, str]:
+        """Returns the impact class of each option changed since the config applied last.
+
+        The config used by the installation is the first applied one.
+        """
+        config = dict(self.model.config)
+        return classify_changes(dict(self._stored.applied_config) or config, config)
+
+    @staticmethod
+    def _covers_changes(impacts: Dict[str, str], impact: str) -> bool:
+        """Returns whether the settings of an impact class must be applied.
+
+        They are applied when an option of the class changed or when no option changed, in
+        which case the reconciliation is triggered by a change of the machine itself.
+
+        Args:
+            impacts: Impact class of each changed option
+            impact: Impact class of the settings
+        """
+        return not impacts or impact in impacts.values()
+
+    def _report_install_only_changes(self, impacts: Dict[str, str]) -> None:
+        """Blocks on changed options which only the installation applies.
+
+        Args:
+            impacts: Impact class of each changed option
+        """
+        options = [
+            option
+            for option in options_with_impact(impacts, REINSTALL_OR_REBOOT)
+            if option != "block-agw-local-ips"
+        ]
+        if options:
+            self._block(
+                f"Options can't be changed after installation: {', '.join(sorted(options))}"[
+                    :STATUS_MESSAGE_MAX_LENGTH
+                ]
+            )
+
+    @property
+    def _reconcile_inputs_hash(self) -> str:
+        """Returns a hash of everything the reconciliation depends on.
+
+        Inputs are the charm code and config, the relation databags without the restart lock
+        keys, and host facts: the interfaces, whether Magma is installed, the files the charm
+        manages and the kernel settings it applies, which a reboot resets. Only the leader can
+        read the databags of its own application.
+        """
+        inputs = {
+            "charm": self._charm_code_digest(),
+            "config": dict(self.model.config),
+            "relations": {
+                f"{name}:{relation.id}": {
+                    entity.name: {
+                        key: value
+                        for key, value in data.items()
+                        if key not in (LOCK_KEY, GRANTED_KEY)
+                    }
+                    for entity, data in relation.data.items()
+                    if entity != self.app or self.unit.is_leader()
+                }
+                for name, relations in self.model.relations.items()
+                for relation in relations
+            },
+            "interfaces": sorted(self.host.interfaces()),
+            "magma_enabled": self._is_magmad_enabled,
+            "managed_files": {file: self.host.mtime(file) for file in self._managed_files},
+            "kernel_settings": {
+                str(file): self.host.read_text(file).strip()
+                for file in DataplaneTuning(self.host, self._dataplane_interfaces).live_files(
+                    irq_affinity=self._config_str("irq-affinity"),
+                    rps_cpus=self._config_str("rps-cpus"),
+                    xps_cpus=self._config_str("xps-cpus"),
+                    hugepages=int(self.model.config["hugepages"]),
+                )
+                if self.host.exists(file)
+            },
+        }
+        return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode()).hexdigest()
+
+    @property
+    def _managed_files(self) -> List[str]:
+        """Returns the files currently written by the charm outside of the kernel."""
+        files = [file for pattern in MANAGED_FILES for file in self.host.glob(pattern)]
+        return files + ServicePinning(self.host).managed_drop_ins()
+
+    @staticmethod
+    def _charm_code_digest() -> str:
+        """Returns a digest of the charm modules, which changes when the charm is upgraded."""
+        digest = hashlib.sha256()
+        for module in sorted(Path(__file__).parent.glob("*.py")):
+            digest.update(module.read_bytes())
+        return digest.hexdigest()
+
     @property
     def _magma_service_is_running(self) -> bool:
         """Checks whether magma is running."""
-        magma_service = subprocess.run(
-            ["systemctl", "is-active", "magma@magmad"],
-            stdout=subprocess.PIPE,
-        )
-        return magma_service.returncode == 0
+        return self.host.is_active("magma@magmad")
 
     @property
     def _get_magma_secrets(self) -> Tuple[Optional[str], Optional[str]]:
@@ -515,8 +1472,16 @@ class MagmaAccessGatewayOperatorCharm(CharmBase):
         Returns:
             str: Hardware ID
             str: Challenge key
+
+        Raises:
+            CalledProcessError: If the script failed
+            CommandTimeoutError: If the script timed out
         """
-        gateway_info = subprocess.check_output(["show_gateway_info.py"]).decode().split("\n")
+        command = ["show_gateway_info.py"]
+        process = self.host.run(command, CHECK_POLICY)
+        if process.returncode != 0:
+            raise subprocess.CalledProcessError(process.returncode, command)
+        gateway_info = process.stdout.decode().split("\n")
         gateway_info = list(filter(None, gateway_info))
         gateway_info = list(filter(lambda x: (not re.search("^-(-*)", x)), gateway_info))
         hardware_id = gateway_info[gateway_info.index(self.HARDWARE_ID_LABEL) + 1]
@@ -526,11 +1491,7 @@ class MagmaAccessGatewayOperatorCharm(CharmBase):
     @property
     def _is_magmad_enabled(self) -> bool:
         """Validates if magmad service is enabled."""
-        magma_service = subprocess.run(
-            ["systemctl", "is-enabled", "magma@magmad"],
-            stdout=subprocess.PIPE,
-        )
-        return not magma_service.returncode
+        return self.host.is_enabled("magma@magmad")
 
     def _install_configurations(self, event: OrchestratorAvailableEvent) -> bool:
         """Install or update configuration files.
@@ -538,19 +1499,22 @@ class MagmaAccessGatewayOperatorCharm(CharmBase):
         Returns:
             True if any changes were applied
         """
+        self._stored.control_proxy = {
+            "orchestrator_address": event.orchestrator_address,
+            "orchestrator_port": event.orchestrator_port,
+            "bootstrapper_address": event.bootstrapper_address,
+            "bootstrapper_port": event.bootstrapper_port,
+            "fluentd_address": event.fluentd_address,
+            "fluentd_port": event.fluentd_port,
+        }
         config = self._generate_config(
-            orchestrator_address=event.orchestrator_address,
-            orchestrator_port=event.orchestrator_port,
-            bootstrapper_address=event.bootstrapper_address,
-            bootstrapper_port=event.bootstrapper_port,
-            fluentd_address=event.fluentd_address,
-            fluentd_port=event.fluentd_port,
+            **self._stored.control_proxy, extra_config=self._control_proxy_extra_config
         )
         return any(
             [
-                install_file(Path(ROOT_CA_PATH), event.root_ca_certificate),
-                install_file(Path(CERT_CERTIFIER_CERT), event.certifier_pem_certificate),
-                install_file(Path(CONFIG_PATH), config),
+                self.host.install(ROOT_CA_PATH, event.root_ca_certificate),
+                self.host.install(CERT_CERTIFIER_CERT, event.certifier_pem_certificate),
+                self.host.install(CONFIG_PATH, config),
             ]
         )
 
@@ -562,6 +1526,7 @@ class MagmaAccessGatewayOperatorCharm(CharmBase):
         bootstrapper_port: int,
         fluentd_address: str,
         fluentd_port: int,
+        extra_config: str = "",
     ) -> str:
         return (
             f"cloud_address: {orchestrator_address}\n"
@@ -572,19 +1537,641 @@ class MagmaAccessGatewayOperatorCharm(CharmBase):
             f"fluentd_port: {fluentd_port}\n"
             "\n"
             f"rootca_cert: {ROOT_CA_PATH}\n"
+            f"{extra_config}"
         )
 
-    @staticmethod
-    def _restart_magma() -> None:
-        subprocess.run(
-            ["service", "magma@*", "stop"],
-            stdout=subprocess.PIPE,
+    @property
+    def _control_proxy_extra_config(self) -> str:
+        """Returns the control_proxy settings of the charm configuration as YAML.
+
+        Invalid settings are left out.
+        """
+        if not self._is_valid_control_proxy_configuration:
+            return ""
+        settings = self._control_proxy_settings
+        if not settings:
+            return ""
+        extra_config = io.StringIO()
+        extra_config.write("\n")
+        ruamel.yaml.YAML().dump(settings, extra_config)
+        return extra_config.getvalue()
+
+    @property
+    def _control_proxy_settings(self) -> dict:
+        """Returns the control_proxy settings set in the `control-proxy-config` option."""
+        return ruamel.yaml.YAML(typ="safe").load(self.model.config["control-proxy-config"]) or {}
+
+    def _update_control_proxy_config(self) -> bool:
+        """Renders control_proxy.yml again when the control_proxy settings change.
+
+        Nothing is done until an orchestrator made its connection details available.
+
+        Returns:
+            bool: Whether the file changed, in which case Magma must be restarted
+        """
+        if not self._stored.control_proxy:
+            return False
+        if not self._is_valid_control_proxy_configuration:
+            self._block("Configuration is invalid. Check logs for details")
+            return False
+        config = self._generate_config(
+            **self._stored.control_proxy, extra_config=self._control_proxy_extra_config
+        )
+        return self.host.install(CONFIG_PATH, config)
+
+    def _schedule_restart(self, units: List[str]) -> None:
+        """Schedules the restart of services once the restart lock is held.
+
+        Args:
+            units: Services to restart
+        """
+        pending = list(self._stored.pending_restarts)
+        self._stored.pending_restarts = pending + [unit for unit in units if unit not in pending]
+
+    def _restart_scheduled_services(self, operation: str) -> None:
+        """Restarts the running services scheduled for a restart.
+
+        Restarting Magma restarts all of its services, so only the other services are
+        restarted along with it.
+
+        Args:
+            operation: Operation running (`restart services` or `restart`)
+        """
+        units = [
+            unit
+            for unit in self._stored.pending_restarts
+            if operation == RESTART_SERVICES or not unit.startswith("magma@")
+        ]
+        if units:
+            self.host.run(["systemctl", "try-restart", *units], SERVICE_CONTROL_POLICY)
+            logger.info("Restarted %s to apply changes", ", ".join(units))
+        self._stored.pending_restarts = []
+
+    def _restart_magma(self) -> None:
+        """Restarts Magma and records the time its services took to become active."""
+        timings = ServiceStartup(self.host).restart()
+        self._stored.startup_timings = {
+            "services": timings.services,
+            "total": timings.total,
+            "completed_at": time.time(),
+        }
+        self.host.write_text(STARTUP_METRICS_FILE, format_metrics(timings))
+
+    def _apply_dataplane_tuning(self) -> bool:
+        """Applies the IRQ affinity, RPS/XPS and hugepages tuning of the s1 and sgi NICs.
+
+        Returns:
+            bool: Whether the tuning was applied successfully
+        """
+        if not self._is_valid_dataplane_tuning_configuration:
+            self._block("Configuration is invalid. Check logs for details")
+            return False
+        try:
+            failed = DataplaneTuning(self.host, self._dataplane_interfaces).apply(
+                irq_affinity=self.model.config["irq-affinity"],
+                rps_cpus=self.model.config["rps-cpus"],
+                xps_cpus=self.model.config["xps-cpus"],
+                hugepages=self.model.config["hugepages"],
+            )
+        except CommandTimeoutError as e:
+            logger.error(str(e))
+            failed = ["irq-affinity"]
+        if failed:
+            self._block(
+                f"Failed to apply data plane tuning: {', '.join(failed)}. See logs for details"
+            )
+            return False
+        return True
+
+    def _apply_ovs_tuning(self) -> None:
+        """Reconciles the Open vSwitch performance settings with the charm configuration.
+
+        Nothing is done until one of the OVS options is set for the first time, so that
+        Open vSwitch defaults are left alone on units which do not use them.
+        """
+        if not self._is_valid_ovs_tuning_configuration:
+            self._block("Configuration is invalid. Check logs for details")
+            return
+        options = {option: self.model.config[option] for option in OVS_OPTIONS}
+        if not any(options.values()) and not self._stored.ovs_tuned:
+            return
+        try:
+            applied = OVSTuning(self.host).apply(options)
+        except CommandTimeoutError as e:
+            logger.error(str(e))
+            applied = False
+        if applied is None:
+            return
+        if not applied:
+            self._block("Failed to apply OVS tuning. See logs for details")
+            return
+        self._stored.ovs_tuned = any(options.values())
+
+    def _apply_nic_offloads(self) -> bool:
+        """Applies the offload features and ring sizes of the sgi and s1 NICs.
+
+        The settings are persisted in a systemd unit so that they survive reboots.
+
+        Returns:
+            bool: Whether the settings were applied successfully
+        """
+        if not self._is_valid_nic_offload_configuration:
+            self._block("Configuration is invalid. Check logs for details")
+            return False
+        settings = {}
+        for interface_name, new_interface_name in self.INTERFACES:
+            interface = self._present_interface(interface_name, new_interface_name)
+            offloads = parse_settings(self.model.config[f"{interface_name}-offloads"])
+            ring_sizes = {
+                ring: int(size)
+                for ring, size in parse_settings(
+                    self.model.config[f"{interface_name}-ring-sizes"]
+                ).items()
+            }
+            if interface and (offloads or ring_sizes):
+                settings[interface] = (offloads, ring_sizes)
+        try:
+            applied = all(
+                [
+                    NICOffloads(self.host, interface).apply(offloads, ring_sizes)
+                    for interface, (offloads, ring_sizes) in settings.items()
+                ]
+            )
+            persist_nic_settings(self.host, settings)
+        except (CommandTimeoutError, OSError) as e:
+            logger.error("Failed to apply NIC offloads: %s", str(e))
+            applied = False
+        if not applied:
+            self._block("Failed to apply NIC offloads and ring sizes. See logs for details")
+        return applied
+
+    def _apply_service_pinning(self) -> None:
+        """Applies the CPU affinity and scheduling policy of the Magma services.
+
+        Only the services whose systemd drop-in changed are scheduled for a restart.
+        """
+        if not self._is_valid_service_pinning_configuration:
+            self._block("Configuration is invalid. Check logs for details")
+            return
+        pinning = ServicePinning(self.host)
+        try:
+            self._schedule_restart(
+                pinning.reload(
+                    pinning.apply(
+                        self.model.config["service-cpu-affinity"],
+                        self.model.config["service-scheduling-policy"],
+                    )
+                )
+            )
+        except (CommandTimeoutError, OSError) as e:
+            logger.error("Failed to apply CPU pinning: %s", str(e))
+            self._block("Failed to apply CPU pinning. See logs for details")
+
+    def _apply_config_overlay(self) -> None:
+        """Merges the log levels, magmad intervals and configuration overlay into Magma files.
+
+        The configuration overlay takes precedence over the other settings. Only the services
+        whose configuration file changed are scheduled for a restart.
+        """
+        if not all(
+            [
+                self._is_valid_config_overlay,
+                self._is_valid_log_volume_configuration,
+                self._is_valid_magmad_intervals_configuration,
+            ]
+        ):
+            self._block("Configuration is invalid. Check logs for details")
+            return
+        try:
+            values = log_level_overlay(self.host, self.model.config["service-log-level"])
+            deep_merge(
+                values,
+                magmad_intervals_overlay(
+                    checkin_interval=self.model.config["checkin-interval"],
+                    metrics_upload_interval=self.model.config["metrics-upload-interval"],
+                    jitter=self.model.config["interval-jitter"],
+                    unit_name=self.unit.name,
+                ),
+            )
+            deep_merge(values, parse_overlay(self.model.config["config-overlay"]))
+            overlay = ConfigOverlay(self.host, values)
+            missing_files = overlay.missing_files
+            if missing_files:
+                self._block(
+                    f"Unknown Magma configuration files: "
+                    f"{', '.join(missing_files)}"[:STATUS_MESSAGE_MAX_LENGTH]
+                )
+                return
+            self._schedule_restart(affected_services(overlay.apply()))
+        except (CommandTimeoutError, OSError) as e:
+            logger.error("Failed to apply configuration overlay: %s", str(e))
+            self._block("Failed to apply configuration overlay. See logs for details")
+
+    def _apply_log_volume(self) -> None:
+        """Applies the journald rate limits and the log forwarder buffering.
+
+        Log levels are applied with the configuration overlay. The log forwarder is scheduled
+        for a restart when its buffering changed.
+        """
+        if not self._is_valid_log_volume_configuration:
+            self._block("Configuration is invalid. Check logs for details")
+            return
+        forwarder = LogForwarderBuffering(self.host)
+        try:
+            apply_journald_rate_limit(
+                self.host,
+                interval=self.model.config["journald-rate-limit-interval"],
+                burst=self.model.config["journald-rate-limit-burst"],
+            )
+            if forwarder.apply(
+                flush_interval=self.model.config["log-forwarder-flush-interval"],
+                buffer_size=self.model.config["log-forwarder-buffer-size"],
+            ):
+                self._schedule_restart([FLUENT_BIT_UNIT])
+        except (CommandTimeoutError, OSError) as e:
+            logger.error("Failed to apply log settings: %s", str(e))
+            self._block("Failed to apply log settings. See logs for details")
+
+    def _apply_redis_tuning(self) -> None:
+        """Applies the redis persistence and memory settings.
+
+        Only redis and the Magma services depending on it are scheduled for a restart, and
+        only when the settings changed.
+        """
+        if not self._is_valid_redis_tuning_configuration:
+            self._block("Configuration is invalid. Check logs for details")
+            return
+        redis = RedisTuning(self.host)
+        try:
+            if redis.apply(
+                save=self.model.config["redis-save"],
+                appendfsync=self.model.config["redis-appendfsync"],
+                maxmemory=self.model.config["redis-maxmemory"],
+            ):
+                self._schedule_restart(redis.affected_services())
+        except (CommandTimeoutError, OSError) as e:
+            logger.error("Failed to apply redis settings: %s", str(e))
+            self._block("Failed to apply redis settings. See logs for details")
+
+    def _apply_sysctl_profile(self) -> None:
+        """Applies the kernel network tuning profile and verifies the kernel values."""
+        if not self._is_valid_sysctl_profile:
+            self._block("Configuration is invalid. Check logs for details")
+            return
+        try:
+            mismatched = SysctlProfile(self.host, self.model.config["sysctl-profile"]).apply()
+        except (CommandTimeoutError, OSError) as e:
+            logger.error("Failed to apply sysctl profile: %s", str(e))
+            mismatched = ["sysctl-profile"]
+        if mismatched:
+            logger.error("Sysctls not applied: %s", ", ".join(mismatched))
+            self._block("Failed to apply sysctl profile. See logs for details")
+
+    def _apply_mtu(self) -> None:
+        """Applies the MTU of the sgi and s1 interfaces live and persists it in netplan.
+
+        The drop-in names the interfaces eth0 and eth1, the names given by the installation, so
+        that it still matches them once the installation reboot renamed them. MTU is not managed
+        when the installer skipped networking configuration.
+        """
+        if self.model.config["skip-networking"]:
+            return
+        if not self._is_valid_mtu("sgi", "eth0") or not self._is_valid_mtu("s1", "eth1"):
+            self._block("Configuration is invalid. Check logs for details")
+            return
+        live_mtus = {}
+        persisted_mtus = {}
+        for interface_name, new_interface_name in self.INTERFACES:
+            mtu = self.model.config[f"{interface_name}-mtu"]
+            interface = self._present_interface(interface_name, new_interface_name)
+            if mtu and interface:
+                live_mtus[interface] = mtu
+            if mtu:
+                persisted_mtus[new_interface_name] = mtu
+        try:
+            applied = all(
+                [apply_mtu(self.host, interface, mtu) for interface, mtu in live_mtus.items()]
+            )
+            persist_mtus(self.host, persisted_mtus)
+        except (CommandTimeoutError, OSError) as e:
+            logger.error("Failed to apply MTU: %s", str(e))
+            applied = False
+        if not applied:
+            self._block("Failed to apply MTU. See logs for details")
+
+    def _apply_network_configuration(self) -> None:
+        """Applies the addressing of the sgi and s1 interfaces live through netplan.
+
+        The services bound to the interfaces whose configuration changed are scheduled for a
+        restart.
+        """
+        if self.model.config["skip-networking"]:
+            return
+        sgi = self._present_interface("sgi", "eth0")
+        s1 = self._present_interface("s1", "eth1")
+        if not self._is_configuration_valid or not sgi or not s1:
+            self._block("Configuration is invalid. Check logs for details")
+            return
+        addressing = {
+            "sgi": InterfaceAddressing(
+                name=sgi,
+                ipv4_address=self._config_str("sgi-ipv4-address"),
+                ipv4_gateway=self._config_str("sgi-ipv4-gateway"),
+                ipv6_address=self._config_str("sgi-ipv6-address"),
+                ipv6_gateway=self._config_str("sgi-ipv6-gateway"),
+                dns=json.loads(self._config_str("dns")),
+            ),
+            "s1": InterfaceAddressing(
+                name=s1,
+                ipv4_address=self._config_str("s1-ipv4-address"),
+                ipv6_address=self._config_str("s1-ipv6-address"),
+            ),
+        }
+        network_configuration = NetworkConfiguration(
+            self.host, list(addressing.values()), self._config_str("gateway-check")
         )
-        subprocess.run(
-            ["service", "magma@magmad", "start"],
-            stdout=subprocess.PIPE,
+        try:
+            changed = network_configuration.apply()
+        except NetworkApplyError:
+            self._block("Failed to apply network configuration. Rolled back, see logs for details")
+            return
+        except (CommandTimeoutError, OSError) as e:
+            logger.error("Failed to apply network configuration: %s", str(e))
+            self._block("Failed to apply network configuration. See logs for details")
+            return
+        self._schedule_restart(
+            interface_services(
+                [option for option, interface in addressing.items() if interface.name in changed]
+            )
         )
 
+    def _config_str(self, option: str) -> str:
+        """Returns the value of a string option, empty when it is not set.
+
+        Args:
+            option: Name of the option
+        """
+        value = self.model.config.get(option)
+        return value if isinstance(value, str) else ""
+
+    @property
+    def _dataplane_interfaces(self) -> List[str]:
+        """Returns the names of the sgi and s1 interfaces present on the machine."""
+        interfaces = []
+        for interface_name, new_interface_name in self.INTERFACES:
+            interface = self._present_interface(interface_name, new_interface_name)
+            if interface:
+                interfaces.append(interface)
+        return interfaces
+
+    def _present_interface(self, interface_name: str, new_interface_name: str) -> Optional[str]:
+        """Returns the name under which a configured interface is present on the machine.
+
+        The installation renames the interfaces to eth0 (sgi) and eth1 (s1) unless
+        networking configuration is skipped.
+
+        Args:
+            interface_name: Name of the interface option (sgi or s1)
+            new_interface_name: Name of the interface that will be set by Magma
+
+        Returns:
+            str: Name of the interface or None if it is not present
+        """
+        present = self.host.interfaces()
+        interface = self.model.config.get(interface_name)
+        if interface in present:
+            return interface
+        if new_interface_name in present and not self.model.config["skip-networking"]:
+            return new_interface_name
+        return None
+
+    def _health_status(self) -> StatusBase:
+        """Evaluates the health of the Magma services and of the sgi and s1 interfaces.
+
+        Returns:
+            StatusBase: Blocked if a service failed or an interface has no carrier, Waiting if
+                a service is not active yet, Active otherwise
+        """
+        states = self.host.active_states(HEALTH_SERVICES)
+        failed = [unit for unit in HEALTH_SERVICES if states.get(unit) == "failed"]
+        if failed:
+            return BlockedStatus(
+                f"Magma services failed: {', '.join(failed)}"[:STATUS_MESSAGE_MAX_LENGTH]
+            )
+        for interface_name, new_interface_name in self.INTERFACES:
+            interface = self._present_interface(interface_name, new_interface_name)
+            if not interface:
+                return BlockedStatus(f"{interface_name} interface not found")
+            if not has_carrier(self.host, interface):
+                return BlockedStatus(f"No carrier on {interface_name} interface ({interface})")
+        inactive = [unit for unit in HEALTH_SERVICES if states.get(unit) != "active"]
+        if inactive:
+            return WaitingStatus(
+                f"Waiting for Magma services: {', '.join(inactive)}"[:STATUS_MESSAGE_MAX_LENGTH]
+            )
+        return ActiveStatus()
+
+    def _run_disruptive_operation(self, operation: str) -> None:
+        """Restarts services or reboots the machine once the restart lock is held.
+
+        The unit goes back to active once Magma is running again after a restart, unless a
+        setting failed to apply.
+
+        Args:
+            operation: Operation to run (`restart services`, `restart` or `reboot`)
+        """
+        if operation == REBOOT:
+            self._stored.pending_restarts = []
+            self.unit.status = MaintenanceStatus("Rebooting to apply changes")
+            self.reboot()
+            return
+        self.unit.status = MaintenanceStatus("Restarting Access Gateway to apply changes")
+        self._restart_scheduled_services(operation)
+        if operation == RESTART:
+            self._restart_magma()
+        if self._stored.blocked_message:
+            self.unit.status = BlockedStatus(self._stored.blocked_message)
+        elif self._is_back_in_service():
+            self.unit.status = ActiveStatus(self._track_onboarding())
+
+    def _can_run_disruptive_operation(self, operation: str) -> bool:
+        """Returns whether a disruptive operation can run now.
+
+        Operations wait for the maintenance window, then for the number of active sessions to
+        fall below the drain threshold or for the drain timeout to expire. The status reports
+        what the operation waits for. The reboot completing the AGW installation runs as soon
+        as the restart lock is held since the unit has not served yet.
+
+        Args:
+            operation: Operation to run (`restart services`, `restart` or `reboot`)
+        """
+        if operation == REBOOT and self._install_phases.completed_in_current_boot(
+            AGW_INSTALL_PHASE
+        ):
+            return True
+        if not self._is_valid_maintenance_configuration:
+            self._block("Configuration is invalid. Check logs for details")
+            return False
+        window = str(self.model.config.get("maintenance-window") or "")
+        if not in_maintenance_window(window, datetime.now(timezone.utc)):
+            self.unit.status = WaitingStatus(f"Waiting for maintenance window to {operation}")
+            return False
+        drain_timeout = int(self.model.config.get("drain-timeout", 0))
+        if not drain_timeout:
+            return True
+        if not self._stored.drain_started:
+            self._stored.drain_started = time.time()
+            logger.info("Draining sessions before %s", operation)
+        remaining = int(self._stored.drain_started + drain_timeout - time.time())
+        sessions = active_sessions(self.host)
+        threshold = int(self.model.config.get("drain-session-threshold", 0))
+        if sessions is not None and sessions <= threshold:
+            logger.info("Drained down to %d sessions", sessions)
+        elif remaining <= 0:
+            logger.warning("Drain timed out with %s active sessions", sessions)
+        else:
+            self.unit.status = WaitingStatus(
+                f"Draining before {operation}: {'unknown' if sessions is None else sessions} "
+                f"active sessions, {remaining}s left"
+            )
+            return False
+        self._stored.drain_started = 0.0
+        return True
+
+    def _start_onboarding(self, arrived: float) -> None:
+        """Starts the onboarding timeline once the orchestrator configuration is installed.
+
+        An onboarding in progress goes on: the configuration changed before the first
+        check-in.
+
+        Args:
+            arrived: Time at which the orchestrator data arrived
+        """
+        timeline = OnboardingTimeline(self._stored.onboarding)
+        if timeline.next_stage:
+            return
+        timeline.start(arrived)
+        timeline.mark(CONFIG_INSTALL, time.time())
+        self._save_onboarding(timeline)
+
+    def _track_onboarding(self) -> str:
+        """Records the onboarding stages which ended since the last hook.
+
+        Returns:
+            str: Message reporting the onboarding stage in progress, empty once checked in
+        """
+        timeline = OnboardingTimeline(self._stored.onboarding)
+        probes = {
+            MAGMA_RESTART: self._magma_restarted_at,
+            BOOTSTRAP: self._bootstrapped_at,
+            CHECK_IN: self._checked_in_at,
+        }
+        stage = timeline.next_stage
+        while stage in probes:
+            at = probes[stage](timeline)
+            if at is None:
+                break
+            timeline.mark(stage, at)
+            logger.info("Onboarding stage %s ended", stage)
+            stage = timeline.next_stage
+        if timeline.marks != dict(self._stored.onboarding):
+            self._save_onboarding(timeline)
+        if stage in [BOOTSTRAP, CHECK_IN]:
+            return f"Waiting for orchestrator {stage}"
+        return ""
+
+    def _save_onboarding(self, timeline: OnboardingTimeline) -> None:
+        """Persists the onboarding timeline and exports its metrics."""
+        self._stored.onboarding = timeline.marks
+        self.host.write_text(ONBOARDING_METRICS_FILE, onboarding_metrics(timeline))
+
+    def _magma_restarted_at(self, timeline: OnboardingTimeline) -> Optional[float]:
+        """Returns when Magma was restarted with the orchestrator configuration, if it was.
+
+        The restart ends when the startup of the Magma services completes. When a reboot ran
+        instead of the restart, Magma is restarted once magmad is back to active.
+        """
+        if self._restart_lock.pending_operation or not self._is_back_in_service():
+            return None
+        completed_at = self._stored.startup_timings.get("completed_at")
+        if completed_at is not None and completed_at >= timeline.marks[CONFIG_INSTALL]:
+            return completed_at
+        return time.time()
+
+    def _bootstrapped_at(self, timeline: OnboardingTimeline) -> Optional[float]:
+        """Returns when magmad bootstrapped with the orchestrator, if it did.
+
+        magmad writes the gateway certificate when it bootstraps. A certificate older than the
+        restart was kept from a previous onboarding with the same orchestrator.
+        """
+        mtime = self.host.mtime(GATEWAY_CERT_PATH)
+        if mtime is None:
+            return None
+        return min(max(mtime / 1e9, timeline.marks[MAGMA_RESTART]), time.time())
+
+    def _checked_in_at(self, timeline: OnboardingTimeline) -> Optional[float]:
+        """Returns when magmad first checked in with the orchestrator, if it did.
+
+        The check-ins are looked up in the magmad journal, which keeps their time, so the
+        journal is searched at most every `CHECK_IN_PROBE_INTERVAL` seconds.
+        """
+        now = time.time()
+        if now - self._stored.check_in_probed_at < CHECK_IN_PROBE_INTERVAL:
+            return None
+        self._stored.check_in_probed_at = now
+        bootstrapped_at = timeline.marks[BOOTSTRAP]
+        try:
+            journal = self.host.run(
+                [
+                    "journalctl",
+                    "--unit",
+                    "magma@magmad",
+                    "--since",
+                    f"@{int(bootstrapped_at)}",
+                    "--grep",
+                    CHECK_IN_MESSAGE,
+                    "--output",
+                    "short-unix",
+                    "--quiet",
+                    "--no-pager",
+                ],
+                HEALTH_QUERY_POLICY,
+            )
+        except CommandTimeoutError as e:
+            logger.warning(str(e))
+            return None
+        checked_in_at = first_check_in(journal.stdout.decode())
+        if checked_in_at is None:
+            return None
+        return min(max(checked_in_at, bootstrapped_at), now)
+
+    def _is_back_in_service(self) -> bool:
+        """Returns whether Magma is back to active after a restart or a reboot."""
+        try:
+            return self._magma_service_is_running
+        except CommandTimeoutError:
+            return False
+
+    def _block(self, message: str) -> None:
+        """Sets a Blocked status which the next successful reconciliation clears.
+
+        Args:
+            message: Status message
+        """
+        self._stored.blocked_message = message
+        self.unit.status = BlockedStatus(message)
+
+    def _defer_on_timeout(self, event: EventBase, error: CommandTimeoutError) -> None:
+        """Reports a command timeout in the unit status and defers the event for a retry.
+
+        Args:
+            event: Juju event being handled when the command timed out
+            error: Timeout error raised by the command
+        """
+        logger.error(str(error))
+        self.unit.status = WaitingStatus(f"Timed out running `{error.command[0]}`. Will retry")
+        event.defer()
+
     @property
     def _block_agw_local_ips_config(self) -> bool:
         """Returns the value of the `block-agw-local-ips` Juju config.
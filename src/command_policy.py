@@ -0,0 +1,91 @@
+# Copyright 2022 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Timeout and retry policies for commands executed on the host.
+
+Every command the charm runs belongs to a class (snap operations, systemd queries, service
+control...). Each class gets a policy defining how long a single attempt may take, how many
+times it is retried and how long to wait between attempts. This keeps hook latency bounded
+even when a command hangs.
+"""
+
+import logging
+import subprocess
+import time
+from typing import List, NamedTuple
+
+logger = logging.getLogger(__name__)
+
+
+class CommandTimeoutError(Exception):
+    """Raised when a command kept timing out after all its retries."""
+
+    def __init__(self, command: List[str], timeout: float):
+        """Stores the command which timed out and its per-attempt timeout."""
+        self.command = command
+        self.timeout = timeout
+        super().__init__(f"Command `{' '.join(command)}` timed out after {timeout} seconds")
+
+
+class CommandPolicy(NamedTuple):
+    """Timeout and retry policy of a class of commands.
+
+    Attributes:
+        timeout: Maximum duration of a single attempt, in seconds
+        retries: Number of additional attempts after the first one
+        backoff: Delay before the first retry, in seconds. Doubles after each retry.
+        retry_on_failure: Whether a non-zero return code should be retried as well
+    """
+
+    timeout: float
+    retries: int = 0
+    backoff: float = 0
+    retry_on_failure: bool = False
+
+
+# Snap operations run inside hooks: a single retry keeps them under about ten minutes
+SNAP_POLICY = CommandPolicy(timeout=300, retries=1, backoff=10, retry_on_failure=True)
+INSTALL_POLICY = CommandPolicy(timeout=3600)
+SYSTEMCTL_QUERY_POLICY = CommandPolicy(timeout=10, retries=2, backoff=1)
+SERVICE_CONTROL_POLICY = CommandPolicy(timeout=120, retries=1, backoff=5)
+REBOOT_POLICY = CommandPolicy(timeout=30, retries=2, backoff=2)
+CHECK_POLICY = CommandPolicy(timeout=300)
+OVS_POLICY = CommandPolicy(timeout=30, retries=2, backoff=1)
+NETWORK_POLICY = CommandPolicy(timeout=15, retries=1, backoff=1)
+# Health probes run on every update-status hook: a slow probe is not retried
+HEALTH_QUERY_POLICY = CommandPolicy(timeout=5)
+
+
+def run_command(command: List[str], policy: CommandPolicy) -> subprocess.CompletedProcess:
+    """Runs a command on the host according to the given policy.
+
+    Args:
+        command: Command to run
+        policy: Timeout and retry policy to apply
+
+    Returns:
+        subprocess.CompletedProcess: Result of the last attempt
+
+    Raises:
+        CommandTimeoutError: If the last attempt timed out
+    """
+    attempt = 0
+    while True:
+        try:
+            process = subprocess.run(command, stdout=subprocess.PIPE, timeout=policy.timeout)
+        except subprocess.TimeoutExpired:
+            if attempt >= policy.retries:
+                raise CommandTimeoutError(command, policy.timeout)
+            logger.warning("Command `%s` timed out", " ".join(command))
+        else:
+            if not policy.retry_on_failure or process.returncode == 0:
+                return process
+            if attempt >= policy.retries:
+                return process
+            logger.debug(
+                "Command `%s` failed with return code %s", " ".join(command), process.returncode
+            )
+        delay = policy.backoff * 2**attempt
+        attempt += 1
+        logger.debug("Retrying `%s` in %s seconds (attempt %d)", " ".join(command), delay, attempt)
+        time.sleep(delay)
@@ -0,0 +1,107 @@
+# Copyright 2022 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Impact of charm config changes on an installed AGW.
+
+Each option belongs to an impact class, from options which are only read by the charm to
+options which need the machine to be reinstalled or rebooted. Diffing the config applied last
+with the new one tells the charm the cheapest action covering all the changed options.
+"""
+
+from typing import Any, Dict, List, Mapping
+
+NO_OP = "no-op"
+HOT_RELOAD = "hot-reload"
+SERVICE_RESTART = "service-restart"
+NETWORK_REAPPLY = "network-reapply"
+REINSTALL_OR_REBOOT = "reinstall-or-reboot"
+# Impact classes from the cheapest to the most disruptive
+IMPACTS = [NO_OP, HOT_RELOAD, SERVICE_RESTART, NETWORK_REAPPLY, REINSTALL_OR_REBOOT]
+
+_OPTIONS_BY_IMPACT = {
+    NO_OP: [
+        "max-concurrent-restarts",
+        "maintenance-window",
+        "drain-timeout",
+        "drain-session-threshold",
+        "gateway-check",
+    ],
+    HOT_RELOAD: [
+        "irq-affinity",
+        "rps-cpus",
+        "xps-cpus",
+        "hugepages",
+        "ovs-n-handler-threads",
+        "ovs-n-revalidator-threads",
+        "ovs-flow-limit",
+        "ovs-max-idle",
+        "sgi-mtu",
+        "s1-mtu",
+        "sgi-offloads",
+        "s1-offloads",
+        "sgi-ring-sizes",
+        "s1-ring-sizes",
+        "sysctl-profile",
+        "journald-rate-limit-interval",
+        "journald-rate-limit-burst",
+    ],
+    SERVICE_RESTART: [
+        "service-cpu-affinity",
+        "service-scheduling-policy",
+        "config-overlay",
+        "redis-save",
+        "redis-appendfsync",
+        "redis-maxmemory",
+        "service-log-level",
+        "log-forwarder-flush-interval",
+        "log-forwarder-buffer-size",
+        "control-proxy-config",
+        "checkin-interval",
+        "metrics-upload-interval",
+        "interval-jitter",
+    ],
+    NETWORK_REAPPLY: [
+        "sgi-ipv4-address",
+        "sgi-ipv4-gateway",
+        "sgi-ipv6-address",
+        "sgi-ipv6-gateway",
+        "s1-ipv4-address",
+        "s1-ipv6-address",
+        "dns",
+    ],
+    REINSTALL_OR_REBOOT: ["sgi", "s1", "skip-networking", "block-agw-local-ips"],
+}
+OPTION_IMPACTS = {
+    option: impact for impact, options in _OPTIONS_BY_IMPACT.items() for option in options
+}
+
+
+def option_impact(option: str) -> str:
+    """Returns the impact class of an option. Unknown options are assumed to need a reboot."""
+    return OPTION_IMPACTS.get(option, REINSTALL_OR_REBOOT)
+
+
+def classify_changes(old: Mapping[str, Any], new: Mapping[str, Any]) -> Dict[str, str]:
+    """Returns the impact class of each option which differs between two configs.
+
+    Args:
+        old: Config applied last
+        new: New config
+
+    Returns:
+        dict: Impact class of each changed option
+    """
+    options = sorted(set(old) | set(new))
+    return {
+        option: option_impact(option) for option in options if old.get(option) != new.get(option)
+    }
+
+
+def required_impact(impacts: Dict[str, str]) -> str:
+    """Returns the most disruptive impact class, which covers all the others."""
+    return max(impacts.values(), key=IMPACTS.index, default=NO_OP)
+
+
+def options_with_impact(impacts: Dict[str, str], impact: str) -> List[str]:
+    """Returns the changed options of an impact class."""
+    return [option for option, value in impacts.items() if value == impact]
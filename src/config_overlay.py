@@ -0,0 +1,137 @@
+# Copyright 2022 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Overlays of the Magma service configuration files.
+
+An overlay is a YAML mapping keyed by configuration file (ex. `pipelined.yml`) whose values are
+deep-merged into the files of `/etc/magma`. Files are loaded and dumped in round-trip mode so
+that their comments and ordering are preserved, and only written when the merge changes them.
+"""
+
+import io
+import logging
+import re
+from pathlib import Path
+from typing import Dict, List
+
+import ruamel.yaml
+from ruamel.yaml.error import YAMLError
+
+from host import Host
+
+logger = logging.getLogger(__name__)
+
+MAGMA_CONFIG_DIR = Path("/etc/magma")
+CONFIG_FILE_REGEX = re.compile(r"^[a-z_]+\.yml$")
+# Configuration files read by a service with a different name
+FILE_SERVICES = {"metricsd.yml": "magmad"}
+
+
+class InvalidOverlayError(Exception):
+    """Raised when the overlay is not a mapping of Magma configuration files to mappings."""
+
+
+def parse_overlay(overlay: str) -> Dict[str, dict]:
+    """Parses a configuration overlay.
+
+    Args:
+        overlay: YAML mapping of configuration files to the values to merge into them
+
+    Returns:
+        dict: Values to merge into each configuration file
+
+    Raises:
+        InvalidOverlayError: If the overlay is not valid
+    """
+    try:
+        parsed = ruamel.yaml.YAML(typ="safe").load(overlay)
+    except YAMLError as e:
+        raise InvalidOverlayError(f"Invalid YAML: {str(e)}") from e
+    if parsed is None:
+        return {}
+    if not isinstance(parsed, dict):
+        raise InvalidOverlayError("Overlay must be a mapping of configuration files")
+    for file, values in parsed.items():
+        if not isinstance(file, str) or not CONFIG_FILE_REGEX.match(file):
+            raise InvalidOverlayError(f"Invalid configuration file name: {file}")
+        if not isinstance(values, dict):
+            raise InvalidOverlayError(f"Values of {file} must be a mapping")
+    return parsed
+
+
+def deep_merge(target: dict, overlay: dict) -> bool:
+    """Merges the overlay into the target mapping, recursing into nested mappings.
+
+    Values other than mappings, including lists, replace the ones of the target.
+
+    Args:
+        target: Mapping to update in place
+        overlay: Values to merge
+
+    Returns:
+        bool: Whether the target changed
+    """
+    changed = False
+    for key, value in overlay.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            changed = deep_merge(target[key], value) or changed
+        elif key not in target or target[key] != value:
+            target[key] = value
+            changed = True
+    return changed
+
+
+def service_unit(file: str) -> str:
+    """Returns the Magma service reading the configuration file (ex. `magma@pipelined`)."""
+    return f"magma@{FILE_SERVICES.get(file, Path(file).stem)}"
+
+
+def affected_services(files: List[str]) -> List[str]:
+    """Returns the Magma services to restart for changes of their configuration files.
+
+    Args:
+        files: Configuration files which changed
+
+    Returns:
+        list: Services reading the files
+    """
+    return sorted({service_unit(file) for file in files})
+
+
+class ConfigOverlay:
+    """Merges overlays into the Magma configuration files."""
+
+    def __init__(self, host: Host, overlay: Dict[str, dict]):
+        """Sets the overlay to apply.
+
+        Args:
+            host: Machine the configuration files are on
+            overlay: Values to merge into each configuration file
+        """
+        self._host = host
+        self._overlay = overlay
+
+    @property
+    def missing_files(self) -> List[str]:
+        """Returns the configuration files of the overlay which do not exist."""
+        return [file for file in self._overlay if not self._host.exists(MAGMA_CONFIG_DIR / file)]
+
+    def apply(self) -> List[str]:
+        """Merges the overlay into the configuration files.
+
+        Returns:
+            list: Configuration files which changed
+        """
+        yaml = ruamel.yaml.YAML()
+        changed = []
+        for file, values in self._overlay.items():
+            path = MAGMA_CONFIG_DIR / file
+            config = yaml.load(self._host.read_text(path)) or {}
+            if not deep_merge(config, values):
+                continue
+            content = io.StringIO()
+            yaml.dump(config, content)
+            self._host.write_text(path, content.getvalue())
+            logger.info("Applied configuration overlay to %s", path)
+            changed.append(file)
+        return changed
@@ -0,0 +1,310 @@
+# Copyright 2022 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Data plane tuning of the s1 and sgi network interfaces.
+
+Spreads the interrupts of the NIC queues across CPUs, sets the RPS/XPS masks of the queues
+and reserves hugepages. All settings are idempotent: values are only written when they differ
+from the current ones. Clearing the IRQ affinity or the hugepages starts irqbalance again or
+releases the hugepages, if the charm had disabled or reserved them.
+"""
+
+import logging
+import re
+from pathlib import Path
+from typing import Callable, List, Optional, Set, Tuple
+
+from command_policy import SERVICE_CONTROL_POLICY
+from host import Host
+
+logger = logging.getLogger(__name__)
+
+SYS_CLASS_NET = Path("/sys/class/net")
+PROC_IRQ = Path("/proc/irq")
+ONLINE_CPUS_FILE = Path("/sys/devices/system/cpu/online")
+HUGEPAGES_FILE = Path("/proc/sys/vm/nr_hugepages")
+HUGEPAGES_SYSCTL_FILE = Path("/etc/sysctl.d/60-magma-access-gateway-hugepages.conf")
+IRQBALANCE_DISABLED_FILE = Path("/var/lib/magma-access-gateway-operator/irqbalance-disabled")
+AUTO = "auto"
+CPU_LIST_REGEX = re.compile(r"^\d+(-\d+)?(,\d+(-\d+)?)*$")
+CPU_MASK_REGEX = re.compile(r"^[0-9a-fA-F]+(,[0-9a-fA-F]+)*$")
+
+
+def parse_cpu_list(cpu_list: str) -> List[int]:
+    """Parses a CPU list (ex. `0-3,6`) into the list of CPUs it contains.
+
+    Args:
+        cpu_list: CPU list in the format used by the kernel
+
+    Returns:
+        list: Sorted CPU numbers
+    """
+    cpus: Set[int] = set()
+    for cpu_range in cpu_list.strip().split(","):
+        if not cpu_range:
+            continue
+        first, _, last = cpu_range.partition("-")
+        cpus.update(range(int(first), int(last or first) + 1))
+    return sorted(cpus)
+
+
+def cpu_mask(cpus: List[int]) -> str:
+    """Returns the hexadecimal CPU mask, grouped by 32 bits, containing the given CPUs.
+
+    Args:
+        cpus: CPU numbers
+
+    Returns:
+        str: CPU mask in the format used by the kernel (ex. `ff` or `1,00000000`)
+    """
+    mask = 0
+    for cpu in cpus:
+        mask |= 1 << cpu
+    hex_mask = f"{mask:x}"
+    groups: List[str] = []
+    while len(hex_mask) > 8:
+        groups.insert(0, hex_mask[-8:])
+        hex_mask = hex_mask[:-8]
+    groups.insert(0, hex_mask)
+    return ",".join(groups)
+
+
+def is_valid_cpu_list(cpu_list: str) -> bool:
+    """Returns whether the string is a valid CPU list (ex. `0-3,6`)."""
+    return bool(CPU_LIST_REGEX.match(cpu_list))
+
+
+def is_valid_cpu_mask(mask: str) -> bool:
+    """Returns whether the string is a valid hexadecimal CPU mask (ex. `f` or `1,00000000`)."""
+    return bool(CPU_MASK_REGEX.match(mask))
+
+
+def online_cpus(host: Host) -> List[int]:
+    """Returns the CPUs currently online."""
+    return parse_cpu_list(host.read_text(ONLINE_CPUS_FILE))
+
+
+def write_if_changed(host: Host, file: Path, content: str) -> bool:
+    """Writes the content to a kernel or sysfs file if its current value differs.
+
+    Args:
+        host: Machine the file is on
+        file: File to write
+        content: Value to write
+
+    Returns:
+        bool: Whether the file was written to
+    """
+    if host.read_text(file).strip() == content:
+        return False
+    host.write_text(file, content)
+    return True
+
+
+def mask_value(mask: str) -> int:
+    """Returns the integer value of a hexadecimal CPU mask so that masks can be compared."""
+    return int(mask.replace(",", ""), 16)
+
+
+class DataplaneTuning:
+    """Applies IRQ affinity, RPS/XPS and hugepages settings."""
+
+    def __init__(self, host: Host, interfaces: List[str]):
+        """Sets the network interfaces to tune.
+
+        Args:
+            host: Machine to tune
+            interfaces: Names of the s1 and sgi interfaces present on the machine
+        """
+        self._host = host
+        self._interfaces = interfaces
+
+    def apply(self, irq_affinity: str, rps_cpus: str, xps_cpus: str, hugepages: int) -> List[str]:
+        """Applies the data plane tuning.
+
+        Args:
+            irq_affinity: `auto` to spread the queue IRQs over all online CPUs, a CPU list
+                to spread them over those CPUs only or an empty string to hand them back to
+                irqbalance
+            rps_cpus: `auto`, a CPU mask applied to every RX queue or an empty string
+            xps_cpus: `auto`, a CPU mask applied to every TX queue or an empty string
+            hugepages: Number of hugepages to reserve (0 releases the reserved hugepages)
+
+        Returns:
+            list: Names of the settings which failed to apply
+        """
+        failed = []
+        settings: List[Tuple[str, bool, Callable[[], None], Optional[Callable[[], None]]]] = [
+            (
+                "irq-affinity",
+                bool(irq_affinity),
+                lambda: self._apply_irq_affinity(irq_affinity),
+                self._start_irqbalance,
+            ),
+            ("rps-cpus", bool(rps_cpus), lambda: self._apply_rps(rps_cpus), None),
+            ("xps-cpus", bool(xps_cpus), lambda: self._apply_xps(xps_cpus), None),
+            (
+                "hugepages",
+                hugepages > 0,
+                lambda: self._apply_hugepages(hugepages),
+                self._release_hugepages,
+            ),
+        ]
+        for name, enabled, apply, revert in settings:
+            action = apply if enabled else revert
+            if not action:
+                continue
+            try:
+                action()
+            except OSError as e:
+                logger.error("Failed to apply %s: %s", name, str(e))
+                failed.append(name)
+        return failed
+
+    def live_files(
+        self, irq_affinity: str, rps_cpus: str, xps_cpus: str, hugepages: int
+    ) -> List[Path]:
+        """Returns the kernel and sysfs files the tuning writes to, which reboots reset.
+
+        Files of the settings left alone are not returned, as other tools (ex. irqbalance)
+        may change them.
+
+        Args:
+            irq_affinity: IRQ affinity setting, as passed to `apply`
+            rps_cpus: RPS setting, as passed to `apply`
+            xps_cpus: XPS setting, as passed to `apply`
+            hugepages: Number of hugepages to reserve
+
+        Returns:
+            list: Files written by the tuning
+        """
+        files = [HUGEPAGES_FILE] if hugepages > 0 else []
+        for interface in self._interfaces:
+            if irq_affinity:
+                files.extend(
+                    PROC_IRQ / str(irq) / "smp_affinity_list"
+                    for irq in self.interface_irqs(interface)
+                )
+            if rps_cpus:
+                files.extend(queue / "rps_cpus" for queue in self.queues(interface, "rx-"))
+            if xps_cpus:
+                files.extend(queue / "xps_cpus" for queue in self.queues(interface, "tx-"))
+        return files
+
+    def interface_irqs(self, interface: str) -> List[int]:
+        """Returns the MSI interrupts of the network interface, sorted by number.
+
+        Args:
+            interface: Name of the network interface
+
+        Returns:
+            list: IRQ numbers
+        """
+        msi_irqs = self._host.list_dir(SYS_CLASS_NET / interface / "device" / "msi_irqs")
+        return sorted(int(irq) for irq in msi_irqs if irq.isdigit())
+
+    def queues(self, interface: str, prefix: str) -> List[Path]:
+        """Returns the RX (`rx-`) or TX (`tx-`) queues of the network interface.
+
+        Args:
+            interface: Name of the network interface
+            prefix: Queue prefix (`rx-` or `tx-`)
+
+        Returns:
+            list: sysfs directories of the queues, sorted by queue number
+        """
+        queues_dir = SYS_CLASS_NET / interface / "queues"
+        queues = [queue for queue in self._host.list_dir(queues_dir) if queue.startswith(prefix)]
+        return [
+            queues_dir / queue
+            for queue in sorted(queues, key=lambda queue: int(queue.split("-")[-1]))
+        ]
+
+    def _apply_irq_affinity(self, irq_affinity: str) -> None:
+        """Spreads the interrupts of each interface round-robin over the CPUs.
+
+        irqbalance is stopped when IRQs are pinned as it would otherwise move them again.
+        """
+        cpus = online_cpus(self._host) if irq_affinity == AUTO else parse_cpu_list(irq_affinity)
+        irqs = [irq for interface in self._interfaces for irq in self.interface_irqs(interface)]
+        if not irqs:
+            return
+        self._stop_irqbalance()
+        for index, irq in enumerate(irqs):
+            cpu = str(cpus[index % len(cpus)])
+            if write_if_changed(self._host, PROC_IRQ / str(irq) / "smp_affinity_list", cpu):
+                logger.info("IRQ %d pinned to CPU %s", irq, cpu)
+
+    def _apply_rps(self, rps_cpus: str) -> None:
+        """Sets the RPS mask of the RX queues.
+
+        In `auto` mode, RPS spreads packets over all online CPUs only when the NIC has fewer
+        RX queues than CPUs. Otherwise the hardware queues already spread the load.
+        """
+        cpus = online_cpus(self._host)
+        for interface in self._interfaces:
+            rx_queues = self.queues(interface, "rx-")
+            if rps_cpus != AUTO:
+                mask = rps_cpus
+            elif len(rx_queues) < len(cpus):
+                mask = cpu_mask(cpus)
+            else:
+                mask = "0"
+            for queue in rx_queues:
+                self._write_mask(queue / "rps_cpus", mask)
+
+    def _apply_xps(self, xps_cpus: str) -> None:
+        """Sets the XPS mask of the TX queues.
+
+        In `auto` mode, each TX queue is mapped to one CPU, round-robin.
+        """
+        cpus = online_cpus(self._host)
+        for interface in self._interfaces:
+            for index, queue in enumerate(self.queues(interface, "tx-")):
+                mask = cpu_mask([cpus[index % len(cpus)]]) if xps_cpus == AUTO else xps_cpus
+                self._write_mask(queue / "xps_cpus", mask)
+
+    def _write_mask(self, file: Path, mask: str) -> None:
+        """Writes a CPU mask to a queue if it differs from the current one."""
+        if not self._host.exists(file):
+            return
+        current = self._host.read_text(file).strip()
+        if current and mask_value(current) == mask_value(mask):
+            return
+        self._host.write_text(file, mask)
+        logger.info("%s set to %s", file, mask)
+
+    def _apply_hugepages(self, hugepages: int) -> None:
+        """Reserves hugepages now and persists the reservation across reboots."""
+        self._host.install(HUGEPAGES_SYSCTL_FILE, f"vm.nr_hugepages = {hugepages}\n")
+        if write_if_changed(self._host, HUGEPAGES_FILE, str(hugepages)):
+            logger.info("Reserved %d hugepages", hugepages)
+
+    def _release_hugepages(self) -> None:
+        """Releases the hugepages reserved by the charm and stops reserving them at boot."""
+        if not self._host.exists(HUGEPAGES_SYSCTL_FILE):
+            return
+        self._host.unlink(HUGEPAGES_SYSCTL_FILE)
+        write_if_changed(self._host, HUGEPAGES_FILE, "0")
+        logger.info("Released hugepages")
+
+    def _stop_irqbalance(self) -> None:
+        """Stops and disables irqbalance if it is running."""
+        if not self._host.is_active("irqbalance"):
+            return
+        self._host.run(["systemctl", "disable", "--now", "irqbalance"], SERVICE_CONTROL_POLICY)
+        self._host.write_text(IRQBALANCE_DISABLED_FILE, "")
+        logger.info("irqbalance disabled to keep IRQ affinity")
+
+    def _start_irqbalance(self) -> None:
+        """Enables and starts irqbalance again if the charm disabled it."""
+        if not self._host.exists(IRQBALANCE_DISABLED_FILE):
+            return
+        process = self._host.run(
+            ["systemctl", "enable", "--now", "irqbalance"], SERVICE_CONTROL_POLICY
+        )
+        if process.returncode != 0:
+            logger.error("Failed to start irqbalance")
+            return
+        self._host.unlink(IRQBALANCE_DISABLED_FILE)
+        logger.info("irqbalance enabled again to balance IRQs")
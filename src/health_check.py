@@ -0,0 +1,42 @@
+# Copyright 2022 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Cheap health probes of the running AGW, meant to be run on every update-status hook.
+
+The state of all the Magma services is read with a single query of the host (one
+`systemctl show` call) and the carrier of the network interfaces is read from sysfs, so that a
+probe costs one short-lived process regardless of the number of services.
+"""
+
+import logging
+from pathlib import Path
+
+from host import Host
+
+logger = logging.getLogger(__name__)
+
+SYS_CLASS_NET = Path("/sys/class/net")
+HEALTH_SERVICES = [
+    "magma@magmad",
+    "magma@mme",
+    "magma@pipelined",
+    "magma@sessiond",
+    "magma@mobilityd",
+]
+# Duration above which a probe is reported as too slow for update-status, in seconds
+PROBE_BUDGET = 1.0
+
+
+def has_carrier(host: Host, interface: str) -> bool:
+    """Returns whether the network interface has a link.
+
+    The kernel refuses to report the carrier of interfaces which are administratively down.
+
+    Args:
+        host: Machine the interface belongs to
+        interface: Name of the network interface
+    """
+    try:
+        return host.read_text(SYS_CLASS_NET / interface / "carrier").strip() == "1"
+    except OSError:
+        return False
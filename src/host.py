@@ -0,0 +1,300 @@
+# Copyright 2022 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Access to the machine the charm runs on.
+
+The charm and its helper modules reach the host through a `Host`: commands, systemd units,
+network interfaces and files. `SystemHost` reaches the machine the charm is deployed on.
+"""
+
+import abc
+import glob
+import os
+import subprocess
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+import netifaces
+
+from command_policy import (
+    HEALTH_QUERY_POLICY,
+    SERVICE_CONTROL_POLICY,
+    SYSTEMCTL_QUERY_POLICY,
+    CommandPolicy,
+    run_command,
+)
+
+ACTIVE = "active"
+INACTIVE = "inactive"
+FAILED = "failed"
+ACTIVATING = "activating"
+DEACTIVATING = "deactivating"
+
+FilePath = Union[str, Path]
+
+
+def _service_name(unit: str) -> str:
+    """Returns the name of a unit without the `.service` suffix systemd reports."""
+    return unit[: -len(".service")] if unit.endswith(".service") else unit
+
+
+class Host(abc.ABC):
+    """Commands, systemd units, network interfaces and files of a machine."""
+
+    @abc.abstractmethod
+    def run(self, command: List[str], policy: CommandPolicy) -> subprocess.CompletedProcess:
+        """Runs a command according to the given policy.
+
+        Raises:
+            CommandTimeoutError: If the last attempt timed out
+        """
+
+    @abc.abstractmethod
+    def is_active(self, unit: str) -> bool:
+        """Returns whether the systemd unit is active."""
+
+    @abc.abstractmethod
+    def is_enabled(self, unit: str) -> bool:
+        """Returns whether the systemd unit is enabled."""
+
+    @abc.abstractmethod
+    def start(self, unit: str) -> None:
+        """Starts the service."""
+
+    @abc.abstractmethod
+    def stop(self, unit: str) -> None:
+        """Stops the services matching the pattern (ex. `magma@*`)."""
+
+    @abc.abstractmethod
+    def start_no_block(self, units: List[str]) -> None:
+        """Queues the start of the services without waiting for them to be active."""
+
+    @abc.abstractmethod
+    def active_units(self, pattern: str) -> List[str]:
+        """Returns the active services matching the pattern (ex. `magma@*`)."""
+
+    @abc.abstractmethod
+    def active_states(self, units: List[str]) -> Dict[str, str]:
+        """Returns the active state of the services (ex. `activating`, `active`).
+
+        Services the host doesn't know about are left out.
+        """
+
+    @abc.abstractmethod
+    def ordering(self, units: List[str]) -> Dict[str, List[str]]:
+        """Returns the units each service is ordered after (`After=`)."""
+
+    @abc.abstractmethod
+    def interfaces(self) -> List[str]:
+        """Returns the names of the network interfaces."""
+
+    @abc.abstractmethod
+    def ipv4_addresses(self, interface: str) -> List[str]:
+        """Returns the IPv4 addresses assigned to the network interface.
+
+        Raises:
+            ValueError: If the network interface doesn't exist
+        """
+
+    @abc.abstractmethod
+    def exists(self, path: FilePath) -> bool:
+        """Returns whether the file or directory exists."""
+
+    @abc.abstractmethod
+    def read_text(self, path: FilePath) -> str:
+        """Returns the content of the file.
+
+        Raises:
+            FileNotFoundError: If the file doesn't exist
+        """
+
+    @abc.abstractmethod
+    def write_text(self, path: FilePath, content: str) -> None:
+        """Writes the file, creating its directory if needed."""
+
+    @abc.abstractmethod
+    def unlink(self, path: FilePath) -> None:
+        """Removes the file if it exists."""
+
+    @abc.abstractmethod
+    def chmod(self, path: FilePath, mode: int) -> None:
+        """Changes the permissions of the file."""
+
+    @abc.abstractmethod
+    def mkdir(self, path: FilePath) -> None:
+        """Creates the directory and its parents if they don't exist."""
+
+    @abc.abstractmethod
+    def list_dir(self, path: FilePath) -> List[str]:
+        """Returns the names of the entries of the directory, empty if it doesn't exist."""
+
+    @abc.abstractmethod
+    def glob(self, pattern: FilePath) -> List[str]:
+        """Returns the paths matching the pattern (ex. `/etc/netplan/*.yaml`), sorted."""
+
+    @abc.abstractmethod
+    def mtime(self, path: FilePath) -> Optional[int]:
+        """Returns the modification time of the file in nanoseconds, None if it doesn't exist."""
+
+    def install(self, path: FilePath, content: str) -> bool:
+        """Writes the file unless it already has the content.
+
+        Args:
+            path: File to write
+            content: Text content of the file
+
+        Returns:
+            bool: Whether the file was written
+        """
+        if self.exists(path) and self.read_text(path) == content:
+            return False
+        self.write_text(path, content)
+        return True
+
+
+class SystemHost(Host):
+    """The machine the charm runs on."""
+
+    def run(self, command: List[str], policy: CommandPolicy) -> subprocess.CompletedProcess:
+        """Runs a command according to the given policy.
+
+        Raises:
+            CommandTimeoutError: If the last attempt timed out
+        """
+        return run_command(command, policy)
+
+    def is_active(self, unit: str) -> bool:
+        """Returns whether the systemd unit is active."""
+        return (
+            run_command(["systemctl", "is-active", unit], SYSTEMCTL_QUERY_POLICY).returncode == 0
+        )
+
+    def is_enabled(self, unit: str) -> bool:
+        """Returns whether the systemd unit is enabled."""
+        return (
+            run_command(["systemctl", "is-enabled", unit], SYSTEMCTL_QUERY_POLICY).returncode == 0
+        )
+
+    def start(self, unit: str) -> None:
+        """Starts the service."""
+        run_command(["service", unit, "start"], SERVICE_CONTROL_POLICY)
+
+    def stop(self, unit: str) -> None:
+        """Stops the services matching the pattern (ex. `magma@*`)."""
+        run_command(["service", unit, "stop"], SERVICE_CONTROL_POLICY)
+
+    def start_no_block(self, units: List[str]) -> None:
+        """Queues the start of the services without waiting for them to be active."""
+        run_command(["systemctl", "start", "--no-block", *units], SERVICE_CONTROL_POLICY)
+
+    def active_units(self, pattern: str) -> List[str]:
+        """Returns the active services matching the pattern (ex. `magma@*`)."""
+        process = run_command(
+            ["systemctl", "list-units", "--plain", "--no-legend", "--state=active", pattern],
+            SYSTEMCTL_QUERY_POLICY,
+        )
+        if process.returncode != 0:
+            return []
+        lines = process.stdout.decode().splitlines()
+        return [_service_name(line.split()[0]) for line in lines if line.strip()]
+
+    def active_states(self, units: List[str]) -> Dict[str, str]:
+        """Returns the active state of the services (ex. `activating`, `active`).
+
+        The states are read with a single `systemctl show` call. It runs on every
+        update-status hook, so a slow call is not retried.
+        """
+        process = run_command(
+            ["systemctl", "show", "--property=ActiveState", *units], HEALTH_QUERY_POLICY
+        )
+        if process.returncode != 0:
+            return {}
+        blocks = process.stdout.decode().strip().split("\n\n")
+        states = {}
+        for unit, block in zip(units, blocks):
+            for line in block.splitlines():
+                key, _, value = line.partition("=")
+                if key == "ActiveState":
+                    states[unit] = value
+        return states
+
+    def ordering(self, units: List[str]) -> Dict[str, List[str]]:
+        """Returns the units each service is ordered after (`After=`)."""
+        process = run_command(
+            ["systemctl", "show", "--property=Id", "--property=After", *units],
+            SYSTEMCTL_QUERY_POLICY,
+        )
+        if process.returncode != 0:
+            return {}
+        ordering = {}
+        for block in process.stdout.decode().strip().split("\n\n"):
+            properties = dict(line.partition("=")[::2] for line in block.splitlines())
+            if properties.get("Id"):
+                ordering[_service_name(properties["Id"])] = [
+                    _service_name(unit) for unit in properties.get("After", "").split()
+                ]
+        return ordering
+
+    def interfaces(self) -> List[str]:
+        """Returns the names of the network interfaces."""
+        return netifaces.interfaces()
+
+    def ipv4_addresses(self, interface: str) -> List[str]:
+        """Returns the IPv4 addresses assigned to the network interface.
+
+        Raises:
+            ValueError: If the network interface doesn't exist
+        """
+        addresses = netifaces.ifaddresses(interface).get(netifaces.AF_INET, [])
+        return [address["addr"] for address in addresses]
+
+    def exists(self, path: FilePath) -> bool:
+        """Returns whether the file or directory exists."""
+        return Path(path).exists()
+
+    def read_text(self, path: FilePath) -> str:
+        """Returns the content of the file.
+
+        Raises:
+            FileNotFoundError: If the file doesn't exist
+        """
+        with open(path, "r") as file:
+            return file.read()
+
+    def write_text(self, path: FilePath, content: str) -> None:
+        """Writes the file, creating its directory if needed."""
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w") as file:
+            file.write(content)
+
+    def unlink(self, path: FilePath) -> None:
+        """Removes the file if it exists."""
+        try:
+            Path(path).unlink()
+        except FileNotFoundError:
+            pass
+
+    def chmod(self, path: FilePath, mode: int) -> None:
+        """Changes the permissions of the file."""
+        Path(path).chmod(mode)
+
+    def mkdir(self, path: FilePath) -> None:
+        """Creates the directory and its parents if they don't exist."""
+        Path(path).mkdir(parents=True, exist_ok=True)
+
+    def list_dir(self, path: FilePath) -> List[str]:
+        """Returns the names of the entries of the directory, empty if it doesn't exist."""
+        if not Path(path).is_dir():
+            return []
+        return sorted(entry.name for entry in Path(path).iterdir())
+
+    def glob(self, pattern: FilePath) -> List[str]:
+        """Returns the paths matching the pattern (ex. `/etc/netplan/*.yaml`), sorted."""
+        return sorted(glob.glob(str(pattern)))
+
+    def mtime(self, path: FilePath) -> Optional[int]:
+        """Returns the modification time of the file in nanoseconds, None if it doesn't exist."""
+        try:
+            return os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return None
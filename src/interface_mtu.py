@@ -0,0 +1,97 @@
+# Copyright 2022 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""MTU management of the s1 and sgi interfaces.
+
+The MTU is applied live with `ip link` and persisted in a netplan drop-in which netplan merges
+with the configuration generated by the AGW installer.
+"""
+
+import io
+import json
+import logging
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import ruamel.yaml
+
+from command_policy import NETWORK_POLICY
+from host import Host
+
+logger = logging.getLogger(__name__)
+
+SYS_CLASS_NET = Path("/sys/class/net")
+NETPLAN_MTU_FILE = Path("/etc/netplan/99-magma-access-gateway-mtu.yaml")
+
+
+def mtu_limits(host: Host, interface: str) -> Optional[Tuple[int, int]]:
+    """Returns the minimum and maximum MTU supported by the network interface.
+
+    Args:
+        host: Machine the interface belongs to
+        interface: Name of the network interface
+
+    Returns:
+        tuple: Minimum and maximum MTU or None if the driver doesn't report them
+    """
+    process = host.run(
+        ["ip", "-details", "-json", "link", "show", "dev", interface], NETWORK_POLICY
+    )
+    if process.returncode != 0:
+        return None
+    try:
+        link = json.loads(process.stdout)[0]
+        return int(link["min_mtu"]), int(link["max_mtu"])
+    except (ValueError, IndexError, KeyError):
+        return None
+
+
+def current_mtu(host: Host, interface: str) -> int:
+    """Returns the current MTU of the network interface."""
+    return int(host.read_text(SYS_CLASS_NET / interface / "mtu"))
+
+
+def apply_mtu(host: Host, interface: str, mtu: int) -> bool:
+    """Sets the MTU of the network interface if it differs from the current one.
+
+    Args:
+        host: Machine the interface belongs to
+        interface: Name of the network interface
+        mtu: MTU to set
+
+    Returns:
+        bool: Whether the MTU is applied
+    """
+    if current_mtu(host, interface) == mtu:
+        return True
+    process = host.run(["ip", "link", "set", "dev", interface, "mtu", str(mtu)], NETWORK_POLICY)
+    if process.returncode != 0:
+        logger.error("Failed to set MTU of %s to %d", interface, mtu)
+        return False
+    logger.info("MTU of %s set to %d", interface, mtu)
+    return True
+
+
+def persist_mtus(host: Host, mtus: Dict[str, int]) -> bool:
+    """Persists the MTU of the network interfaces in a netplan drop-in.
+
+    Args:
+        host: Machine the interfaces belong to
+        mtus: MTU of each network interface. The drop-in is removed when empty.
+
+    Returns:
+        bool: Whether the drop-in changed
+    """
+    if not mtus:
+        if not host.exists(NETPLAN_MTU_FILE):
+            return False
+        host.unlink(NETPLAN_MTU_FILE)
+        return True
+    ethernets = {interface: {"mtu": mtu} for interface, mtu in sorted(mtus.items())}
+    netplan = io.StringIO()
+    netplan.write("# Managed by the magma-access-gateway-operator charm\n")
+    ruamel.yaml.YAML().dump({"network": {"version": 2, "ethernets": ethernets}}, netplan)
+    if not host.install(NETPLAN_MTU_FILE, netplan.getvalue()):
+        return False
+    host.chmod(NETPLAN_MTU_FILE, 0o600)
+    return True
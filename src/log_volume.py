@@ -0,0 +1,181 @@
+# Copyright 2022 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Log volume controls of the Magma services, journald and the log forwarder.
+
+Log levels are set in the `log_level` key of the service configuration files and merged with
+the configuration overlay. journald rate limits are set in a journald drop-in. The flush interval
+and buffer size of the td-agent-bit forwarder are set in its template, which `magma@td-agent-bit`
+renders each time it starts. The original template is kept aside so that it can be restored.
+"""
+
+import logging
+import re
+from pathlib import Path
+from typing import Dict, List
+
+import ruamel.yaml
+
+from command_policy import SERVICE_CONTROL_POLICY
+from config_overlay import MAGMA_CONFIG_DIR
+from host import Host
+from service_pinning import DEFAULT_GROUP, SERVICE_GROUPS_REGEX, parse_service_groups
+
+logger = logging.getLogger(__name__)
+
+LOG_LEVELS = ["DEBUG", "INFO", "WARNING", "ERROR"]
+JOURNALD_DROP_IN = Path("/etc/systemd/journald.conf.d/60-magma-access-gateway.conf")
+FLUENT_BIT_TEMPLATE = Path("/etc/magma/templates/td-agent-bit.conf.template")
+FLUENT_BIT_UNIT = "magma@td-agent-bit"
+TIME_SPAN_REGEX = re.compile(r"^\d+(us|ms|s|min|h)?$")
+BUFFER_SIZE_REGEX = re.compile(r"^\d+[KMG]?B?$", re.IGNORECASE)
+HEADER = "# Managed by the magma-access-gateway-operator charm\n"
+
+
+def is_valid_log_levels(value: str) -> bool:
+    """Returns whether the string assigns valid log levels to groups of services."""
+    if not all(SERVICE_GROUPS_REGEX.match(group) for group in value.split()):
+        return False
+    return all(level in LOG_LEVELS for level in parse_service_groups(value).values())
+
+
+def is_valid_time_span(value: str) -> bool:
+    """Returns whether the string is a valid systemd time span (ex. `30s`)."""
+    return not value or bool(TIME_SPAN_REGEX.match(value))
+
+
+def is_valid_buffer_size(value: str) -> bool:
+    """Returns whether the string is a valid fluent-bit size (ex. `5MB`)."""
+    return not value or bool(BUFFER_SIZE_REGEX.match(value))
+
+
+def log_level_overlay(host: Host, value: str) -> Dict[str, dict]:
+    """Returns the configuration overlay setting the log level of groups of services.
+
+    `*` sets the log level of every service whose configuration file has a `log_level` key.
+
+    Args:
+        host: Machine the configuration files are on
+        value: Log level of each group of services (ex. `mme=WARNING *=ERROR`)
+
+    Returns:
+        dict: Configuration overlay
+    """
+    levels = parse_service_groups(value)
+    overlay = {}
+    if DEFAULT_GROUP in levels:
+        yaml = ruamel.yaml.YAML(typ="safe")
+        for file in host.glob(MAGMA_CONFIG_DIR / "*.yml"):
+            config = yaml.load(host.read_text(file))
+            if isinstance(config, dict) and "log_level" in config:
+                overlay[Path(file).name] = {"log_level": levels[DEFAULT_GROUP]}
+    for service, level in levels.items():
+        if service != DEFAULT_GROUP:
+            overlay[f"{service}.yml"] = {"log_level": level}
+    return overlay
+
+
+def apply_journald_rate_limit(host: Host, interval: str, burst: int) -> bool:
+    """Writes the journald rate limits and restarts journald if they changed.
+
+    Restarting journald doesn't stop the services logging to it, so it is not deferred to a
+    maintenance window like the restarts of the Magma services.
+
+    Args:
+        host: Machine journald runs on
+        interval: Rate limiting interval (ex. `30s`). Empty leaves the journald default.
+        burst: Messages allowed per service during the interval. 0 leaves the default.
+
+    Returns:
+        bool: Whether the rate limits changed
+    """
+    settings = []
+    if interval:
+        settings.append(f"RateLimitIntervalSec={interval}\n")
+    if burst:
+        settings.append(f"RateLimitBurst={burst}\n")
+    if settings:
+        if not host.install(JOURNALD_DROP_IN, HEADER + "[Journal]\n" + "".join(settings)):
+            return False
+    elif host.exists(JOURNALD_DROP_IN):
+        host.unlink(JOURNALD_DROP_IN)
+    else:
+        return False
+    host.run(["systemctl", "restart", "systemd-journald"], SERVICE_CONTROL_POLICY)
+    logger.info("Restarted systemd-journald to apply rate limits")
+    return True
+
+
+def set_section_option(lines: List[str], section: str, key: str, value: str) -> List[str]:
+    """Sets an option in every section of a fluent-bit configuration.
+
+    Args:
+        lines: Lines of the configuration
+        section: Name of the sections (ex. `INPUT`)
+        key: Name of the option
+        value: Value of the option
+
+    Returns:
+        list: Lines of the updated configuration
+    """
+    updated = []
+    in_section = False
+    for line in lines:
+        stripped = line.strip()
+        if stripped.startswith("["):
+            in_section = stripped.upper() == f"[{section}]"
+            updated.append(line)
+            if in_section:
+                updated.append(f"    {key} {value}")
+            continue
+        if in_section and stripped.split(" ", 1)[0].lower() == key.lower():
+            continue
+        updated.append(line)
+    return updated
+
+
+class LogForwarderBuffering:
+    """Sets the flush interval and buffer size of the td-agent-bit log forwarder."""
+
+    def __init__(self, host: Host):
+        """Sets the machine the log forwarder runs on.
+
+        Args:
+            host: Machine the log forwarder runs on
+        """
+        self._host = host
+
+    @property
+    def _original_template(self) -> Path:
+        """Returns the copy of the template as installed."""
+        return FLUENT_BIT_TEMPLATE.with_name(f"{FLUENT_BIT_TEMPLATE.name}.orig")
+
+    def apply(self, flush_interval: int, buffer_size: str) -> bool:
+        """Renders the forwarder template from the original one and the settings.
+
+        Args:
+            flush_interval: Seconds between flushes. 0 leaves the installer setting.
+            buffer_size: Memory buffer limit of each input (ex. `5MB`). Empty leaves the
+                installer setting.
+
+        Returns:
+            bool: Whether the template changed
+        """
+        original = self._original_template
+        if not flush_interval and not buffer_size:
+            if not self._host.exists(original):
+                return False
+            self._host.write_text(FLUENT_BIT_TEMPLATE, self._host.read_text(original))
+            self._host.unlink(original)
+            return True
+        if not self._host.exists(original):
+            self._host.write_text(original, self._host.read_text(FLUENT_BIT_TEMPLATE))
+        lines = self._host.read_text(original).splitlines()
+        if flush_interval:
+            lines = set_section_option(lines, "SERVICE", "Flush", str(flush_interval))
+        if buffer_size:
+            lines = set_section_option(lines, "INPUT", "Mem_Buf_Limit", buffer_size)
+        if not self._host.install(FLUENT_BIT_TEMPLATE, "\n".join(lines) + "\n"):
+            return False
+        logger.info("Updated log forwarder buffering in %s", FLUENT_BIT_TEMPLATE)
+        return True
@@ -0,0 +1,59 @@
+# Copyright 2022 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Check-in and metrics upload intervals of magmad, jittered per unit.
+
+Gateways configured with the same intervals check in with the Orchestrator at the same time
+after a mass reboot. Each unit lengthens its intervals by a deterministic fraction of the
+configured jitter, derived from its name, which spreads the load on the Orchestrator.
+"""
+
+import hashlib
+from typing import Dict
+
+
+def jitter_fraction(unit_name: str) -> float:
+    """Returns a deterministic fraction in [0, 1) derived from the unit name."""
+    digest = hashlib.sha256(unit_name.encode()).digest()
+    return int.from_bytes(digest[:8], "big") / 2**64
+
+
+def jittered_interval(interval: int, jitter: int, unit_name: str) -> int:
+    """Returns the interval lengthened by the unit's share of the jitter.
+
+    Args:
+        interval: Configured interval, in seconds
+        jitter: Maximum jitter, in percent of the interval
+        unit_name: Name of the unit (ex. `magma-access-gateway-operator/0`)
+
+    Returns:
+        int: Jittered interval, in seconds
+    """
+    return interval + int(interval * jitter / 100 * jitter_fraction(unit_name))
+
+
+def magmad_intervals_overlay(
+    checkin_interval: int, metrics_upload_interval: int, jitter: int, unit_name: str
+) -> Dict[str, dict]:
+    """Returns the configuration overlay setting the jittered magmad intervals.
+
+    Args:
+        checkin_interval: Check-in interval, in seconds. 0 leaves the installer setting.
+        metrics_upload_interval: Metrics upload interval, in seconds. 0 leaves the installer
+            setting.
+        jitter: Maximum jitter, in percent of the intervals
+        unit_name: Name of the unit
+
+    Returns:
+        dict: Configuration overlay
+    """
+    overlay = {}
+    if checkin_interval:
+        overlay["magmad.yml"] = {
+            "checkin_interval": jittered_interval(checkin_interval, jitter, unit_name)
+        }
+    if metrics_upload_interval:
+        overlay["metricsd.yml"] = {
+            "sync_interval": jittered_interval(metrics_upload_interval, jitter, unit_name)
+        }
+    return overlay
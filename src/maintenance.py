@@ -0,0 +1,99 @@
+# Copyright 2022 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Maintenance windows and session drain before disruptive operations.
+
+A maintenance window is a daily UTC time range, optionally limited to some days of the week
+(ex. `sat,sun 02:00-04:00`). Ranges ending before they start span midnight. The number of
+active sessions is the number of subscribers holding an IP address in mobilityd.
+"""
+
+import logging
+import re
+from datetime import datetime, time
+from typing import List, Optional, Tuple
+
+from command_policy import HEALTH_QUERY_POLICY, CommandTimeoutError
+from host import Host
+
+logger = logging.getLogger(__name__)
+
+WEEKDAYS = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+WINDOW_REGEX = re.compile(
+    rf"^(?:(?P<days>(?:{'|'.join(WEEKDAYS)})(?:,(?:{'|'.join(WEEKDAYS)}))*) )?"
+    r"(?P<start>\d{2}:\d{2})-(?P<end>\d{2}:\d{2})$"
+)
+SUBSCRIBER_TABLE_COMMAND = ["mobility_cli.py", "get_subscriber_table"]
+IMSI_REGEX = re.compile(r"^IMSI\d+", re.MULTILINE)
+
+
+def _parse_time(value: str) -> time:
+    """Parses a `HH:MM` time."""
+    return datetime.strptime(value, "%H:%M").time()
+
+
+def parse_maintenance_window(window: str) -> Tuple[List[int], time, time]:
+    """Parses a maintenance window.
+
+    Args:
+        window: Maintenance window (ex. `sat,sun 02:00-04:00`)
+
+    Returns:
+        list: Days of the week of the window, Monday being 0. Empty for every day.
+        time: Start of the window
+        time: End of the window
+
+    Raises:
+        ValueError: If the maintenance window is not valid
+    """
+    match = WINDOW_REGEX.match(window.strip().lower())
+    if not match:
+        raise ValueError(f"Invalid maintenance window: {window}")
+    days = [WEEKDAYS.index(day) for day in (match.group("days") or "").split(",") if day]
+    return days, _parse_time(match.group("start")), _parse_time(match.group("end"))
+
+
+def is_valid_maintenance_window(window: str) -> bool:
+    """Returns whether the string is a valid maintenance window. Empty means any time."""
+    if not window:
+        return True
+    try:
+        parse_maintenance_window(window)
+    except ValueError:
+        return False
+    return True
+
+
+def in_maintenance_window(window: str, now: datetime) -> bool:
+    """Returns whether the time is within the maintenance window.
+
+    Args:
+        window: Maintenance window (ex. `sat,sun 02:00-04:00`). Empty means any time.
+        now: Time to check, in UTC
+
+    Returns:
+        bool: Whether the time is within the maintenance window
+    """
+    if not window:
+        return True
+    days, start, end = parse_maintenance_window(window)
+    current = now.time()
+    if start <= end:
+        return (not days or now.weekday() in days) and start <= current < end
+    # The window spans midnight: after midnight, it started the day before
+    if current >= start:
+        return not days or now.weekday() in days
+    return current < end and (not days or (now.weekday() - 1) % 7 in days)
+
+
+def active_sessions(host: Host) -> Optional[int]:
+    """Returns the number of subscribers with an active session, None if unknown."""
+    try:
+        process = host.run(SUBSCRIBER_TABLE_COMMAND, HEALTH_QUERY_POLICY)
+    except (CommandTimeoutError, OSError) as e:
+        logger.error("Failed to count active sessions: %s", str(e))
+        return None
+    if process.returncode != 0:
+        logger.error("Failed to count active sessions")
+        return None
+    return len(IMSI_REGEX.findall(process.stdout.decode()))
@@ -0,0 +1,294 @@
+# Copyright 2022 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Live addressing changes of the sgi and s1 interfaces through netplan.
+
+The charm takes over the netplan definition of the interfaces: it renders them in a netplan file
+of its own, keeping the MAC address match and the name set by the installer, and removes them
+from the other netplan files. The new configuration is applied with `netplan apply` and
+verified. If applying or verifying fails, the previous files are restored and applied again.
+
+Gateways are verified by pinging them or, for gateways filtering ICMP, by checking that the link
+is up and the default routes go through them.
+"""
+
+import io
+import ipaddress
+import json
+import logging
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional
+
+import ruamel.yaml
+
+from command_policy import NETWORK_POLICY, CommandTimeoutError
+from health_check import has_carrier
+from host import Host
+
+logger = logging.getLogger(__name__)
+
+NETPLAN_DIR = Path("/etc/netplan")
+NETPLAN_NETWORK_FILE = NETPLAN_DIR / "90-magma-access-gateway-network.yaml"
+SYS_CLASS_NET = Path("/sys/class/net")
+HEADER = "# Managed by the magma-access-gateway-operator charm\n"
+# Services bound to each interface, restarted when its addressing changes
+INTERFACE_SERVICES = {"sgi": ["magma@pipelined"], "s1": ["magma@mme", "sctpd"]}
+PING = "ping"
+ROUTE = "route"
+GATEWAY_CHECKS = [PING, ROUTE]
+
+
+class NetworkApplyError(Exception):
+    """Raised when the network configuration could not be applied and was rolled back."""
+
+
+class InterfaceAddressing(NamedTuple):
+    """Addressing of a network interface.
+
+    Attributes:
+        name: Name of the interface on the machine (ex. `eth0`)
+        ipv4_address: IPv4 address and netmask. DHCP is used when empty.
+        ipv4_gateway: IPv4 gateway
+        ipv6_address: IPv6 address and netmask
+        ipv6_gateway: IPv6 gateway
+        dns: DNS servers
+    """
+
+    name: str
+    ipv4_address: str = ""
+    ipv4_gateway: str = ""
+    ipv6_address: str = ""
+    ipv6_gateway: str = ""
+    dns: List[str] = []
+
+
+def mac_address(host: Host, interface: str) -> str:
+    """Returns the MAC address of the network interface."""
+    return host.read_text(SYS_CLASS_NET / interface / "address").strip()
+
+
+def render_interface(host: Host, addressing: InterfaceAddressing) -> dict:
+    """Returns the netplan definition of an interface.
+
+    Args:
+        host: Machine the interface belongs to
+        addressing: Addressing of the interface
+
+    Returns:
+        dict: netplan definition matching the interface by MAC address
+    """
+    definition: dict = {
+        "match": {"macaddress": mac_address(host, addressing.name)},
+        "set-name": addressing.name,
+        "dhcp4": not addressing.ipv4_address,
+    }
+    addresses = [
+        address for address in [addressing.ipv4_address, addressing.ipv6_address] if address
+    ]
+    if addresses:
+        definition["addresses"] = addresses
+    gateways = [
+        gateway for gateway in [addressing.ipv4_gateway, addressing.ipv6_gateway] if gateway
+    ]
+    if gateways:
+        definition["routes"] = [{"to": "default", "via": gateway} for gateway in gateways]
+    if addressing.dns:
+        definition["nameservers"] = {"addresses": list(addressing.dns)}
+    return definition
+
+
+def render_netplan(host: Host, interfaces: List[InterfaceAddressing]) -> str:
+    """Returns the netplan file defining the interfaces."""
+    ethernets = {addressing.name: render_interface(host, addressing) for addressing in interfaces}
+    netplan = io.StringIO()
+    netplan.write(HEADER)
+    ruamel.yaml.YAML().dump({"network": {"version": 2, "ethernets": ethernets}}, netplan)
+    return netplan.getvalue()
+
+
+def has_addresses(host: Host, addressing: InterfaceAddressing) -> bool:
+    """Returns whether the static addresses are assigned to the interface."""
+    process = host.run(["ip", "-json", "address", "show", "dev", addressing.name], NETWORK_POLICY)
+    if process.returncode != 0:
+        return False
+    try:
+        assigned = {
+            ipaddress.ip_interface(f"{address['local']}/{address['prefixlen']}")
+            for link in json.loads(process.stdout)
+            for address in link.get("addr_info", [])
+        }
+    except (ValueError, KeyError):
+        return False
+    expected = [addressing.ipv4_address, addressing.ipv6_address]
+    return all(ipaddress.ip_interface(address) in assigned for address in expected if address)
+
+
+def reaches_gateways(host: Host, addressing: InterfaceAddressing) -> bool:
+    """Returns whether the gateways of the interface answer to ping."""
+    for gateway in [addressing.ipv4_gateway, addressing.ipv6_gateway]:
+        if not gateway:
+            continue
+        process = host.run(
+            ["ping", "-c", "1", "-W", "2", "-I", addressing.name, gateway], NETWORK_POLICY
+        )
+        if process.returncode != 0:
+            logger.error("Gateway %s is not reachable through %s", gateway, addressing.name)
+            return False
+    return True
+
+
+def routes_through_gateways(host: Host, addressing: InterfaceAddressing) -> bool:
+    """Returns whether the link is up and the default routes go through the gateways."""
+    if not has_carrier(host, addressing.name):
+        logger.error("No carrier on %s", addressing.name)
+        return False
+    for gateway in [addressing.ipv4_gateway, addressing.ipv6_gateway]:
+        if not gateway:
+            continue
+        family = f"-{ipaddress.ip_address(gateway).version}"
+        process = host.run(
+            ["ip", family, "-json", "route", "show", "default", "dev", addressing.name],
+            NETWORK_POLICY,
+        )
+        if process.returncode != 0:
+            return False
+        try:
+            gateways = {
+                ipaddress.ip_address(route["gateway"])
+                for route in json.loads(process.stdout)
+                if "gateway" in route
+            }
+        except ValueError:
+            return False
+        if ipaddress.ip_address(gateway) not in gateways:
+            logger.error("No default route through %s on %s", gateway, addressing.name)
+            return False
+    return True
+
+
+def interface_services(interfaces: List[str]) -> List[str]:
+    """Returns the services to restart for addressing changes of the interfaces.
+
+    Args:
+        interfaces: Interface options whose configuration changed (`sgi` or `s1`)
+
+    Returns:
+        list: Services bound to the interfaces
+    """
+    return [unit for interface in interfaces for unit in INTERFACE_SERVICES[interface]]
+
+
+class NetworkConfiguration:
+    """Renders, applies and verifies the netplan configuration of the interfaces."""
+
+    def __init__(
+        self, host: Host, interfaces: List[InterfaceAddressing], gateway_check: str = PING
+    ):
+        """Sets the addressing to apply.
+
+        Args:
+            host: Machine the interfaces belong to
+            interfaces: Addressing of each interface
+            gateway_check: How the gateways are verified (`ping` or `route`)
+        """
+        self._host = host
+        self._interfaces = interfaces
+        self._gateway_check = gateway_check
+
+    def apply(self) -> List[str]:
+        """Applies the addressing of the interfaces and rolls it back if it doesn't work.
+
+        Returns:
+            list: Interfaces whose configuration changed
+
+        Raises:
+            NetworkApplyError: If the configuration was rolled back
+        """
+        previous = self._rendered_definitions()
+        backups = self._write()
+        if not backups:
+            return []
+        changed = [
+            addressing.name
+            for addressing in self._interfaces
+            if previous.get(addressing.name) != render_interface(self._host, addressing)
+        ]
+        try:
+            applied = self._host.run(["netplan", "apply"], NETWORK_POLICY).returncode == 0
+            applied = applied and self.verify()
+        except CommandTimeoutError as e:
+            logger.error(str(e))
+            applied = False
+        if applied:
+            logger.info("Applied network configuration of %s", ", ".join(changed))
+            return changed
+        logger.error("Failed to apply network configuration. Rolling back")
+        self._restore(backups)
+        self._host.run(["netplan", "apply"], NETWORK_POLICY)
+        raise NetworkApplyError("Network configuration was rolled back")
+
+    def verify(self) -> bool:
+        """Returns whether the interfaces have their addresses and reach their gateways."""
+        check_gateways = (
+            routes_through_gateways if self._gateway_check == ROUTE else reaches_gateways
+        )
+        return all(
+            has_addresses(self._host, addressing) and check_gateways(self._host, addressing)
+            for addressing in self._interfaces
+        )
+
+    def _rendered_definitions(self) -> Dict[str, dict]:
+        """Returns the definitions of the charm netplan file, empty before the takeover."""
+        if not self._host.exists(NETPLAN_NETWORK_FILE):
+            return {}
+        netplan = ruamel.yaml.YAML(typ="safe").load(self._host.read_text(NETPLAN_NETWORK_FILE))
+        return netplan["network"]["ethernets"]
+
+    def _write(self) -> Dict[str, Optional[str]]:
+        """Writes the charm netplan file and removes the interfaces from the other files.
+
+        Returns:
+            dict: Previous content of each changed file, None for files which didn't exist
+        """
+        names = {addressing.name for addressing in self._interfaces}
+        yaml = ruamel.yaml.YAML()
+        backups: Dict[str, Optional[str]] = {}
+        for file in self._host.glob(NETPLAN_DIR / "*.yaml"):
+            content = self._host.read_text(file)
+            if content.startswith(HEADER):
+                continue
+            netplan = yaml.load(content) or {}
+            ethernets = (netplan.get("network") or {}).get("ethernets") or {}
+            taken_over = [
+                name
+                for name, definition in ethernets.items()
+                if name in names or (definition or {}).get("set-name") in names
+            ]
+            if not taken_over:
+                continue
+            for name in taken_over:
+                del ethernets[name]
+            updated = io.StringIO()
+            yaml.dump(netplan, updated)
+            backups[file] = content
+            self._host.write_text(file, updated.getvalue())
+            logger.info("Moved definition of %s out of %s", ", ".join(taken_over), file)
+        content = render_netplan(self._host, self._interfaces)
+        previous = (
+            self._host.read_text(NETPLAN_NETWORK_FILE)
+            if self._host.exists(NETPLAN_NETWORK_FILE)
+            else None
+        )
+        if previous != content:
+            backups[str(NETPLAN_NETWORK_FILE)] = previous
+            self._host.write_text(NETPLAN_NETWORK_FILE, content)
+            self._host.chmod(NETPLAN_NETWORK_FILE, 0o600)
+        return backups
+
+    def _restore(self, backups: Dict[str, Optional[str]]) -> None:
+        """Restores the netplan files as they were before writing the configuration."""
+        for file, content in backups.items():
+            if content is None:
+                self._host.unlink(file)
+            else:
+                self._host.write_text(file, content)
@@ -0,0 +1,243 @@
+# Copyright 2022 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Offload features and ring buffer sizes of the s1 and sgi network interfaces.
+
+Settings are applied with ethtool, which talks to the kernel over its netlink interface, and
+persisted in a oneshot systemd unit which applies them again at boot, before the network is
+configured.
+"""
+
+import logging
+import re
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from command_policy import NETWORK_POLICY, SERVICE_CONTROL_POLICY
+from host import Host
+
+logger = logging.getLogger(__name__)
+
+ETHTOOL = "/sbin/ethtool"
+NIC_TUNING_UNIT = "magma-access-gateway-nic-tuning.service"
+SYSTEMD_SYSTEM_DIR = Path("/etc/systemd/system")
+OFFLOAD_FEATURES = {
+    "rx": "rx-checksumming",
+    "tx": "tx-checksumming",
+    "sg": "scatter-gather",
+    "tso": "tcp-segmentation-offload",
+    "gso": "generic-segmentation-offload",
+    "gro": "generic-receive-offload",
+    "lro": "large-receive-offload",
+    "rxvlan": "rx-vlan-offload",
+    "txvlan": "tx-vlan-offload",
+    "rxhash": "receive-hashing",
+}
+RING_PARAMETERS = {"rx": "RX", "tx": "TX"}
+SETTINGS_REGEX = re.compile(r"^[a-z]+=[a-z0-9]+(,[a-z]+=[a-z0-9]+)*$")
+
+
+def parse_settings(settings: str) -> Dict[str, str]:
+    """Parses a comma separated list of settings (ex. `gro=on,tso=off`).
+
+    Args:
+        settings: Settings as set in the charm configuration
+
+    Returns:
+        dict: Value of each setting
+    """
+    parsed = {}
+    for setting in settings.split(","):
+        if setting:
+            key, _, value = setting.partition("=")
+            parsed[key.strip()] = value.strip()
+    return parsed
+
+
+def format_settings(settings: Dict) -> str:
+    """Formats settings as a comma separated list (ex. `gro=on,tso=off`)."""
+    return ",".join(f"{key}={value}" for key, value in settings.items())
+
+
+def is_valid_offloads(offloads: str) -> bool:
+    """Returns whether the string is a valid list of offload features (ex. `gro=on,tso=off`)."""
+    if not offloads:
+        return True
+    if not SETTINGS_REGEX.match(offloads):
+        return False
+    return all(
+        feature in OFFLOAD_FEATURES and value in ("on", "off")
+        for feature, value in parse_settings(offloads).items()
+    )
+
+
+def is_valid_ring_sizes(ring_sizes: str) -> bool:
+    """Returns whether the string is a valid list of ring sizes (ex. `rx=4096,tx=4096`)."""
+    if not ring_sizes:
+        return True
+    if not SETTINGS_REGEX.match(ring_sizes):
+        return False
+    return all(
+        ring in RING_PARAMETERS and size.isdigit() and int(size) > 0
+        for ring, size in parse_settings(ring_sizes).items()
+    )
+
+
+def ethtool_commands(
+    interface: str, offloads: Dict[str, str], ring_sizes: Dict[str, int]
+) -> List[List[str]]:
+    """Returns the ethtool commands applying the offload features and ring sizes.
+
+    Args:
+        interface: Name of the network interface
+        offloads: State (`on` or `off`) of each offload feature
+        ring_sizes: Size of the `rx` and `tx` rings
+
+    Returns:
+        list: ethtool commands
+    """
+    commands = []
+    if offloads:
+        features = [word for feature, state in offloads.items() for word in (feature, state)]
+        commands.append([ETHTOOL, "-K", interface, *features])
+    if ring_sizes:
+        rings = [word for ring, size in ring_sizes.items() for word in (ring, str(size))]
+        commands.append([ETHTOOL, "-G", interface, *rings])
+    return commands
+
+
+class NICOffloads:
+    """Reads and applies the offload features and ring sizes of a network interface."""
+
+    def __init__(self, host: Host, interface: str):
+        """Sets the network interface to configure.
+
+        Args:
+            host: Machine the interface belongs to
+            interface: Name of the network interface
+        """
+        self._host = host
+        self._interface = interface
+
+    def features(self) -> Optional[Dict[str, str]]:
+        """Returns the state of the supported offload features, or None if unavailable."""
+        process = self._host.run([ETHTOOL, "-k", self._interface], NETWORK_POLICY)
+        if process.returncode != 0:
+            return None
+        states = {}
+        for line in process.stdout.decode().splitlines():
+            name, _, state = line.partition(":")
+            if state.strip():
+                states[name.strip()] = state.split()[0]
+        return {
+            feature: states[name] for feature, name in OFFLOAD_FEATURES.items() if name in states
+        }
+
+    def ring_sizes(self) -> Optional[Tuple[Dict[str, int], Dict[str, int]]]:
+        """Returns the maximum and current ring sizes, or None if unavailable."""
+        process = self._host.run([ETHTOOL, "-g", self._interface], NETWORK_POLICY)
+        if process.returncode != 0:
+            return None
+        maximums: Dict[str, int] = {}
+        current: Dict[str, int] = {}
+        section = maximums
+        for line in process.stdout.decode().splitlines():
+            name, _, value = line.partition(":")
+            if name.startswith("Current hardware settings"):
+                section = current
+            for ring, label in RING_PARAMETERS.items():
+                if name.strip() == label and value.strip().isdigit():
+                    section[ring] = int(value)
+        return maximums, current
+
+    def apply(self, offloads: Dict[str, str], ring_sizes: Dict[str, int]) -> bool:
+        """Applies the offload features and ring sizes which differ from the current ones.
+
+        Args:
+            offloads: State (`on` or `off`) of each offload feature
+            ring_sizes: Size of the `rx` and `tx` rings
+
+        Returns:
+            bool: Whether the settings were applied
+        """
+        changed_offloads = {}
+        if offloads:
+            features = self.features() or {}
+            changed_offloads = {
+                feature: state
+                for feature, state in offloads.items()
+                if features.get(feature) != state
+            }
+        changed_ring_sizes = {}
+        if ring_sizes:
+            maximums, current = self.ring_sizes() or ({}, {})
+            for ring, size in ring_sizes.items():
+                if ring in maximums and size > maximums[ring]:
+                    logger.error(
+                        "%s ring size %d exceeds the maximum of %s (%d)",
+                        ring,
+                        size,
+                        self._interface,
+                        maximums[ring],
+                    )
+                    return False
+                if current.get(ring) != size:
+                    changed_ring_sizes[ring] = size
+        for command in ethtool_commands(self._interface, changed_offloads, changed_ring_sizes):
+            if self._host.run(command, NETWORK_POLICY).returncode != 0:
+                logger.error("Failed to run `%s`", " ".join(command))
+                return False
+            logger.info("Applied `%s`", " ".join(command))
+        return True
+
+
+def persist_nic_settings(
+    host: Host, settings: Dict[str, Tuple[Dict[str, str], Dict[str, int]]]
+) -> bool:
+    """Persists the NIC settings in a oneshot systemd unit applying them at boot.
+
+    Args:
+        host: Machine the network interfaces belong to
+        settings: Offload features and ring sizes of each network interface. The unit is
+            disabled and removed when empty.
+
+    Returns:
+        bool: Whether the unit changed
+    """
+    unit_file = SYSTEMD_SYSTEM_DIR / NIC_TUNING_UNIT
+    if not settings:
+        if not host.exists(unit_file):
+            return False
+        host.run(["systemctl", "disable", NIC_TUNING_UNIT], SERVICE_CONTROL_POLICY)
+        host.unlink(unit_file)
+        host.run(["systemctl", "daemon-reload"], SERVICE_CONTROL_POLICY)
+        return True
+    devices = " ".join(
+        f"sys-subsystem-net-devices-{interface}.device" for interface in sorted(settings)
+    )
+    exec_start = "".join(
+        f"ExecStart={' '.join(command)}\n"
+        for interface, (offloads, ring_sizes) in sorted(settings.items())
+        for command in ethtool_commands(interface, offloads, ring_sizes)
+    )
+    content = (
+        "# Managed by the magma-access-gateway-operator charm\n"
+        "[Unit]\n"
+        "Description=Magma Access Gateway NIC offloads and ring sizes\n"
+        f"After={devices}\n"
+        "Before=network-pre.target\n"
+        "Wants=network-pre.target\n"
+        "\n"
+        "[Service]\n"
+        "Type=oneshot\n"
+        "RemainAfterExit=yes\n"
+        f"{exec_start}"
+        "\n"
+        "[Install]\n"
+        "WantedBy=multi-user.target\n"
+    )
+    if not host.install(unit_file, content):
+        return False
+    host.run(["systemctl", "daemon-reload"], SERVICE_CONTROL_POLICY)
+    host.run(["systemctl", "enable", NIC_TUNING_UNIT], SERVICE_CONTROL_POLICY)
+    return True
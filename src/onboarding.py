@@ -0,0 +1,130 @@
+# Copyright 2022 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Timeline of the onboarding of the AGW with an orchestrator.
+
+Onboarding goes through stages, from the orchestrator relation being created to the first
+successful check-in of magmad. The timeline keeps the time at which each stage ended, so that
+the duration of every stage survives across hooks and can be reported once the AGW is in
+service.
+"""
+
+from typing import Dict, List, Optional
+
+RELATION_CREATED = "relation-created"
+RELATION_DATA = "relation-data"
+CONFIG_INSTALL = "config-install"
+MAGMA_RESTART = "restart"
+BOOTSTRAP = "bootstrap"
+CHECK_IN = "check-in"
+# Stages in the order they complete, each one starting when the previous one ended
+STAGES = [RELATION_DATA, CONFIG_INSTALL, MAGMA_RESTART, BOOTSTRAP, CHECK_IN]
+# Logged by magmad each time it checks in with the orchestrator
+CHECK_IN_MESSAGE = "Checkin Successful"
+
+
+class OnboardingTimeline:
+    """Time at which each onboarding stage ended."""
+
+    def __init__(self, marks: Dict[str, float]):
+        """Loads the timeline.
+
+        Args:
+            marks: Time at which the relation was created and each stage ended, in seconds
+                since the epoch
+        """
+        self.marks = dict(marks)
+
+    @property
+    def is_started(self) -> bool:
+        """Returns whether the orchestrator data arrived."""
+        return RELATION_DATA in self.marks
+
+    @property
+    def next_stage(self) -> Optional[str]:
+        """Returns the stage in progress, None if onboarding isn't started or is complete."""
+        if not self.is_started:
+            return None
+        return next((stage for stage in STAGES if stage not in self.marks), None)
+
+    def start(self, arrived: float) -> None:
+        """Starts a new onboarding when the orchestrator data arrived.
+
+        The time the relation was created is kept if no onboarding happened since.
+
+        Args:
+            arrived: Time at which the orchestrator data arrived
+        """
+        joined = self.marks.get(RELATION_CREATED) if not self.is_started else None
+        self.marks = {RELATION_DATA: arrived}
+        if joined is not None:
+            self.marks[RELATION_CREATED] = joined
+
+    def mark(self, stage: str, at: float) -> None:
+        """Records the end of the stage in progress.
+
+        Raises:
+            ValueError: If the stage isn't the one in progress
+        """
+        if stage != self.next_stage:
+            raise ValueError(f"{stage} is not the onboarding stage in progress")
+        self.marks[stage] = at
+
+    def durations(self) -> Dict[str, Optional[float]]:
+        """Returns the duration of each stage in seconds, None if it isn't known (yet)."""
+        durations: Dict[str, Optional[float]] = {}
+        for previous, stage in zip([RELATION_CREATED, *STAGES], STAGES):
+            if previous in self.marks and stage in self.marks:
+                durations[stage] = round(self.marks[stage] - self.marks[previous], 3)
+            else:
+                durations[stage] = None
+        return durations
+
+    @property
+    def total(self) -> Optional[float]:
+        """Returns the time from the relation creation (or data) to the first check-in."""
+        if CHECK_IN not in self.marks:
+            return None
+        begin = self.marks.get(RELATION_CREATED, self.marks[RELATION_DATA])
+        return round(self.marks[CHECK_IN] - begin, 3)
+
+
+def first_check_in(journal: str) -> Optional[float]:
+    """Returns the time of the first check-in found in the magmad journal, if any.
+
+    Args:
+        journal: Check-in messages of magmad, in the `short-unix` output format of journalctl
+            (ex. `1700000000.123456 agw magmad[42]: Checkin Successful!`)
+
+    Returns:
+        float: Time of the first check-in, in seconds since the epoch
+    """
+    for line in journal.splitlines():
+        timestamp, _, message = line.partition(" ")
+        if CHECK_IN_MESSAGE not in message:
+            continue
+        try:
+            return float(timestamp)
+        except ValueError:
+            continue
+    return None
+
+
+def onboarding_metrics(timeline: OnboardingTimeline) -> str:
+    """Returns the known stage durations and total in the Prometheus text format."""
+    lines: List[str] = [
+        "# HELP magma_onboarding_stage_duration_seconds Duration of the onboarding stage.",
+        "# TYPE magma_onboarding_stage_duration_seconds gauge",
+    ]
+    for stage, seconds in timeline.durations().items():
+        if seconds is not None:
+            lines.append(f'magma_onboarding_stage_duration_seconds{{stage="{stage}"}} {seconds}')
+    if timeline.total is not None:
+        lines.extend(
+            [
+                "# HELP magma_onboarding_duration_seconds Time to the first successful check-in.",
+                "# TYPE magma_onboarding_duration_seconds gauge",
+                f"magma_onboarding_duration_seconds {timeline.total}",
+            ]
+        )
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,187 @@
+# Copyright 2022 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Latency probes of the orchestrator endpoints.
+
+Each endpoint of control_proxy.yml (orchestrator, bootstrapper and fluentd) is probed in three
+steps: resolution of its name, TCP connection to the resolved address and TLS handshake,
+verified with the orchestrator root CA. Endpoints are probed concurrently, while the samples of
+an endpoint are taken one after the other so that they don't compete with each other.
+"""
+
+import logging
+import socket
+import ssl
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, NamedTuple, Optional
+
+import ruamel.yaml
+from ruamel.yaml.error import YAMLError
+
+logger = logging.getLogger(__name__)
+
+# control_proxy.yml address and port settings of each endpoint
+ENDPOINT_SETTINGS = {
+    "orchestrator": ("cloud_address", "cloud_port"),
+    "bootstrapper": ("bootstrap_address", "bootstrap_port"),
+    "fluentd": ("fluentd_address", "fluentd_port"),
+}
+DNS = "dns"
+TCP = "tcp"
+TLS = "tls"
+STEPS = [DNS, TCP, TLS]
+PERCENTILES = [50, 90, 99]
+# Time after which a connection or handshake is given up on, in seconds
+PROBE_TIMEOUT = 5.0
+
+
+class Endpoint(NamedTuple):
+    """Address and port of an orchestrator endpoint."""
+
+    host: str
+    port: int
+
+    def __str__(self) -> str:
+        """Returns the endpoint as host:port."""
+        return f"{self.host}:{self.port}"
+
+
+class ProbeReport(NamedTuple):
+    """Samples taken against an endpoint.
+
+    Attributes:
+        endpoint: Probed endpoint
+        samples: Milliseconds each step took, for each successful sample
+        errors: Error of each failed sample
+    """
+
+    endpoint: Endpoint
+    samples: Dict[str, List[float]]
+    errors: List[str]
+
+
+def control_proxy_endpoints(control_proxy: str) -> Dict[str, Endpoint]:
+    """Returns the endpoints set in control_proxy.yml.
+
+    Args:
+        control_proxy: Content of control_proxy.yml
+
+    Raises:
+        ValueError: If the content isn't a YAML mapping
+    """
+    try:
+        settings = ruamel.yaml.YAML(typ="safe").load(control_proxy)
+    except YAMLError as e:
+        raise ValueError(f"Invalid control_proxy configuration: {str(e)}")
+    if not isinstance(settings, dict):
+        raise ValueError("Invalid control_proxy configuration: not a mapping")
+    return {
+        name: Endpoint(host=str(settings[address]), port=int(settings[port]))
+        for name, (address, port) in ENDPOINT_SETTINGS.items()
+        if settings.get(address) and settings.get(port)
+    }
+
+
+def percentile(values: List[float], rank: int) -> float:
+    """Returns the nearest-rank percentile of the values.
+
+    Args:
+        values: Values, not necessarily sorted
+        rank: Percentile between 1 and 100
+    """
+    ordered = sorted(values)
+    index = max(0, -(-rank * len(ordered) // 100) - 1)
+    return ordered[index]
+
+
+def format_report(report: ProbeReport) -> Dict[str, str]:
+    """Returns the percentiles of each step of the report, in milliseconds."""
+    results = {
+        "endpoint": str(report.endpoint),
+        "samples": str(len(report.samples[DNS])),
+        "failures": str(len(report.errors)),
+    }
+    for step in STEPS:
+        if report.samples[step]:
+            results[step] = " ".join(
+                f"p{rank}={percentile(report.samples[step], rank):.1f}ms" for rank in PERCENTILES
+            )
+    if report.errors:
+        results["last-error"] = report.errors[-1]
+    return results
+
+
+class OrchestratorProbe:
+    """Measures the time taken to reach the orchestrator endpoints."""
+
+    def __init__(self, root_ca: Optional[str] = None, timeout: float = PROBE_TIMEOUT):
+        """Sets the certificate authority the endpoints are verified with.
+
+        Args:
+            root_ca: PEM certificate of the orchestrator root CA, the system CAs if None
+            timeout: Time after which a connection or handshake is given up on, in seconds
+
+        Raises:
+            ssl.SSLError: If the root CA certificate is invalid
+        """
+        self._context = ssl.create_default_context(cadata=root_ca)
+        self._timeout = timeout
+
+    def probe(self, endpoints: Dict[str, Endpoint], samples: int) -> Dict[str, ProbeReport]:
+        """Probes the endpoints concurrently.
+
+        Args:
+            endpoints: Endpoints to probe, by name
+            samples: Number of samples to take against each endpoint
+
+        Returns:
+            dict: Report of each endpoint, by name
+        """
+        with ThreadPoolExecutor(max_workers=max(len(endpoints), 1)) as executor:
+            futures = {
+                name: executor.submit(self._probe_endpoint, endpoint, samples)
+                for name, endpoint in endpoints.items()
+            }
+            return {name: future.result() for name, future in futures.items()}
+
+    def _probe_endpoint(self, endpoint: Endpoint, samples: int) -> ProbeReport:
+        """Takes samples against an endpoint, one after the other."""
+        report = ProbeReport(endpoint=endpoint, samples={step: [] for step in STEPS}, errors=[])
+        for _ in range(samples):
+            try:
+                durations = self._sample(endpoint)
+            except (OSError, ValueError) as e:
+                logger.warning("Failed to probe %s: %s", endpoint, str(e))
+                report.errors.append(str(e) or type(e).__name__)
+                continue
+            for step in STEPS:
+                report.samples[step].append(durations[step])
+        return report
+
+    def _sample(self, endpoint: Endpoint) -> Dict[str, float]:
+        """Resolves, connects and handshakes with the endpoint.
+
+        Resolution isn't bounded by the timeout, it is left to the system resolver settings.
+
+        Returns:
+            dict: Milliseconds each step took
+
+        Raises:
+            OSError: If a step failed or timed out
+        """
+        started = time.perf_counter()
+        addresses = socket.getaddrinfo(endpoint.host, endpoint.port, type=socket.SOCK_STREAM)
+        resolved = time.perf_counter()
+        family, kind, proto, _, address = addresses[0]
+        with socket.socket(family, kind, proto) as sock:
+            sock.settimeout(self._timeout)
+            sock.connect(address)
+            connected = time.perf_counter()
+            with self._context.wrap_socket(sock, server_hostname=endpoint.host):
+                handshaken = time.perf_counter()
+        return {
+            DNS: round((resolved - started) * 1000, 3),
+            TCP: round((connected - resolved) * 1000, 3),
+            TLS: round((handshaken - connected) * 1000, 3),
+        }
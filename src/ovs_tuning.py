@@ -0,0 +1,127 @@
+# Copyright 2022 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Open vSwitch performance tuning.
+
+The upcall handler and revalidator threading and the datapath flow limits of ovs-vswitchd are
+set in the `other_config` column of the `Open_vSwitch` table. ovs-vswitchd picks them up
+without a restart.
+"""
+
+import logging
+import re
+from typing import Dict, Optional
+
+from command_policy import OVS_POLICY
+from host import Host
+
+logger = logging.getLogger(__name__)
+
+OVS_OPTIONS = {
+    "ovs-n-handler-threads": "n-handler-threads",
+    "ovs-n-revalidator-threads": "n-revalidator-threads",
+    "ovs-flow-limit": "flow-limit",
+    "ovs-max-idle": "max-idle",
+}
+OTHER_CONFIG_REGEX = re.compile(r'([\w-]+)=(?:"((?:[^"\\]|\\.)*)"|([^,}\s]*))')
+
+
+def parse_other_config(output: str) -> Dict[str, str]:
+    """Parses an `ovs-vsctl get` map (ex. `{flow-limit="200000", max-idle="10000"}`).
+
+    Args:
+        output: Output of `ovs-vsctl get Open_vSwitch . other_config`
+
+    Returns:
+        dict: Keys and values of the map
+    """
+    return {
+        match.group(1): match.group(2) if match.group(2) is not None else match.group(3)
+        for match in OTHER_CONFIG_REGEX.finditer(output)
+    }
+
+
+class OVSTuning:
+    """Reconciles ovs-vswitchd `other_config` performance settings."""
+
+    def __init__(self, host: Host):
+        """Sets the machine Open vSwitch runs on.
+
+        Args:
+            host: Machine Open vSwitch runs on
+        """
+        self._host = host
+
+    def current(self) -> Optional[Dict[str, str]]:
+        """Returns the current `other_config` of Open vSwitch.
+
+        Returns:
+            dict: Current settings or None if Open vSwitch is not available
+        """
+        try:
+            process = self._host.run(
+                ["ovs-vsctl", "get", "Open_vSwitch", ".", "other_config"], OVS_POLICY
+            )
+        except FileNotFoundError:
+            logger.debug("ovs-vsctl not found, Open vSwitch is not installed yet")
+            return None
+        if process.returncode != 0:
+            logger.debug("Open vSwitch database is not available")
+            return None
+        return parse_other_config(process.stdout.decode())
+
+    def apply(self, options: Dict[str, int]) -> Optional[bool]:
+        """Sets or removes the OVS settings so that they match the charm options.
+
+        Args:
+            options: Charm options (ex. `ovs-flow-limit`) and their value. 0 removes the
+                setting so that Open vSwitch falls back to its default.
+
+        Returns:
+            bool: Whether the settings took effect or None if Open vSwitch is not available
+        """
+        current = self.current()
+        if current is None:
+            return None
+        to_set = {
+            OVS_OPTIONS[option]: str(value)
+            for option, value in options.items()
+            if value and current.get(OVS_OPTIONS[option]) != str(value)
+        }
+        to_remove = [
+            OVS_OPTIONS[option]
+            for option, value in options.items()
+            if not value and OVS_OPTIONS[option] in current
+        ]
+        if not to_set and not to_remove:
+            return True
+        command = ["ovs-vsctl"]
+        if to_set:
+            command.extend(["set", "Open_vSwitch", "."])
+            command.extend(f"other_config:{key}={value}" for key, value in to_set.items())
+        for key in to_remove:
+            if len(command) > 1:
+                command.append("--")
+            command.extend(["remove", "Open_vSwitch", ".", "other_config", key])
+        if self._host.run(command, OVS_POLICY).returncode != 0:
+            logger.error("Failed to apply OVS settings: %s", " ".join(command))
+            return False
+        return self._verify(options)
+
+    def _verify(self, options: Dict[str, int]) -> bool:
+        """Checks that the settings stored in the OVS database match the charm options."""
+        current = self.current() or {}
+        verified = True
+        for option, value in options.items():
+            expected = str(value) if value else None
+            if current.get(OVS_OPTIONS[option]) != expected:
+                logger.error(
+                    "OVS setting %s is %s instead of %s",
+                    OVS_OPTIONS[option],
+                    current.get(OVS_OPTIONS[option]),
+                    expected,
+                )
+                verified = False
+        if verified:
+            logger.info("OVS settings applied: %s", current)
+        return verified
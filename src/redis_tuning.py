@@ -0,0 +1,117 @@
+# Copyright 2022 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Persistence and memory settings of the redis instance storing the AGW state.
+
+`magma@redis` generates its configuration from a template each time it starts, so the settings
+are written to a block at the end of the template, where they override the directives set by
+the installer.
+"""
+
+import logging
+import re
+from pathlib import Path
+from typing import List
+
+from command_policy import SYSTEMCTL_QUERY_POLICY
+from host import Host
+
+logger = logging.getLogger(__name__)
+
+REDIS_TEMPLATE = Path("/etc/magma/templates/redis.conf.template")
+REDIS_UNIT = "magma@redis.service"
+BLOCK_BEGIN = "# BEGIN magma-access-gateway-operator"
+BLOCK_END = "# END magma-access-gateway-operator"
+SAVE_OFF = "off"
+APPENDFSYNC_POLICIES = ["always", "everysec", "no"]
+SAVE_REGEX = re.compile(r"^\d+ \d+( \d+ \d+)*$")
+MAXMEMORY_REGEX = re.compile(r"^\d+(kb|mb|gb)?$", re.IGNORECASE)
+BLOCK_REGEX = re.compile(rf"\n?{re.escape(BLOCK_BEGIN)}\n.*?{re.escape(BLOCK_END)}\n?", re.DOTALL)
+
+
+def is_valid_save(save: str) -> bool:
+    """Returns whether the string is a valid list of save points (ex. `900 1 300 10`)."""
+    return not save or save == SAVE_OFF or bool(SAVE_REGEX.match(save))
+
+
+def is_valid_maxmemory(maxmemory: str) -> bool:
+    """Returns whether the string is a valid redis memory size (ex. `2gb`)."""
+    return not maxmemory or bool(MAXMEMORY_REGEX.match(maxmemory))
+
+
+def redis_directives(save: str, appendfsync: str, maxmemory: str) -> List[str]:
+    """Returns the redis directives for the settings. Empty settings are left alone.
+
+    Args:
+        save: Snapshot save points (ex. `900 1 300 10`) or `off` to disable snapshots
+        appendfsync: fsync policy of the append only file
+        maxmemory: Memory limit (ex. `2gb`)
+
+    Returns:
+        list: redis configuration directives
+    """
+    directives = []
+    if save:
+        directives.append('save ""')
+        points = save.split() if save != SAVE_OFF else []
+        directives += [f"save {points[i]} {points[i + 1]}" for i in range(0, len(points), 2)]
+    if appendfsync:
+        directives.append(f"appendfsync {appendfsync}")
+    if maxmemory:
+        directives.append(f"maxmemory {maxmemory.lower()}")
+    return directives
+
+
+class RedisTuning:
+    """Writes the redis settings to the template and restarts redis and its dependents."""
+
+    def __init__(self, host: Host):
+        """Sets the machine redis runs on.
+
+        Args:
+            host: Machine redis runs on
+        """
+        self._host = host
+
+    def apply(self, save: str, appendfsync: str, maxmemory: str) -> bool:
+        """Reconciles the block of the redis template with the settings.
+
+        Args:
+            save: Snapshot save points (ex. `900 1 300 10`) or `off` to disable snapshots
+            appendfsync: fsync policy of the append only file
+            maxmemory: Memory limit (ex. `2gb`)
+
+        Returns:
+            bool: Whether the template changed
+        """
+        directives = redis_directives(save, appendfsync, maxmemory)
+        if not directives and not self._host.exists(REDIS_TEMPLATE):
+            return False
+        template = self._host.read_text(REDIS_TEMPLATE)
+        block = "\n".join([BLOCK_BEGIN, *directives, BLOCK_END]) + "\n" if directives else ""
+        if BLOCK_REGEX.search(template):
+            content = BLOCK_REGEX.sub(lambda _: "\n" + block, template, count=1)
+        elif directives:
+            content = template + ("" if template.endswith("\n") else "\n") + block
+        else:
+            return False
+        if content == template:
+            return False
+        self._host.write_text(REDIS_TEMPLATE, content)
+        logger.info("Updated redis settings in %s", REDIS_TEMPLATE)
+        return True
+
+    def dependents(self) -> List[str]:
+        """Returns the Magma services depending on redis."""
+        process = self._host.run(
+            ["systemctl", "list-dependencies", "--reverse", "--plain", REDIS_UNIT],
+            SYSTEMCTL_QUERY_POLICY,
+        )
+        if process.returncode != 0:
+            return []
+        units = [line.strip() for line in process.stdout.decode().splitlines()[1:]]
+        return [unit for unit in units if unit.startswith("magma@")]
+
+    def affected_services(self) -> List[str]:
+        """Returns redis and the Magma services depending on it, to restart for the settings."""
+        return [REDIS_UNIT, *self.dependents()]
@@ -0,0 +1,216 @@
+# Copyright 2022 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Leader-granted lock coordinating disruptive operations across AGW units.
+
+Units request the lock in their peer relation unit databag before restarting Magma services or
+rebooting. The leader grants it to at most `max-concurrent-restarts` units at a time by
+listing them in the application databag. A unit keeps the lock until its Magma services
+are back to active, which keeps most of the gateways serving during fleet-wide changes.
+"""
+
+import json
+import logging
+from typing import Callable, List, Optional, Set
+
+from ops.charm import CharmBase
+from ops.framework import EventBase, Object, StoredState
+from ops.model import WaitingStatus
+
+from command_policy import CommandTimeoutError
+from host import Host
+
+logger = logging.getLogger(__name__)
+
+LOCK_KEY = "restart-lock"
+GRANTED_KEY = "restart-lock-granted"
+REQUESTED = "requested"
+RESTART_SERVICES = "restart services"
+RESTART = "restart"
+REBOOT = "reboot"
+# Operations from the least to the most disruptive. A more disruptive operation covers the others.
+OPERATIONS = [RESTART_SERVICES, RESTART, REBOOT]
+BOOT_ID_FILE = "/proc/sys/kernel/random/boot_id"
+
+
+def boot_id(host: Host) -> str:
+    """Returns the identifier of the current boot of the machine."""
+    return host.read_text(BOOT_ID_FILE).strip()
+
+
+class RollingRestartLock(Object):
+    """Runs disruptive operations only once the leader granted this unit the lock."""
+
+    _stored = StoredState()
+
+    def __init__(
+        self,
+        charm: CharmBase,
+        relation_name: str,
+        host: Host,
+        run_operation: Callable[[str], None],
+        is_ready: Callable[[], bool],
+        can_run: Optional[Callable[[str], bool]] = None,
+    ):
+        """Observes peer relation and leadership events.
+
+        Args:
+            charm: Charm owning the lock
+            relation_name: Name of the peer relation
+            host: Machine the operations run on
+            run_operation: Callback running the given operation (`restart services`, `restart`
+                or `reboot`)
+            is_ready: Callback returning whether the unit is back in service
+            can_run: Callback returning whether the given operation can run now. Operations
+                which can't run yet stay pending until `process_pending` is called again.
+        """
+        super().__init__(charm, relation_name)
+        self._relation_name = relation_name
+        self._host = host
+        self._run_operation = run_operation
+        self._is_ready = is_ready
+        self._can_run = can_run or (lambda operation: True)
+        self._stored.set_default(pending_operation="", boot_id="")
+        self.framework.observe(charm.on[relation_name].relation_changed, self._on_lock_changed)
+        self.framework.observe(charm.on[relation_name].relation_departed, self._on_lock_changed)
+        self.framework.observe(charm.on.leader_elected, self._on_lock_changed)
+
+    @property
+    def pending_operation(self) -> str:
+        """Returns the operation waiting for the lock, if any."""
+        return self._stored.pending_operation
+
+    @property
+    def is_held(self) -> bool:
+        """Returns whether this unit requested or holds the lock."""
+        relation = self.model.get_relation(self._relation_name)
+        if not relation:
+            return False
+        return relation.data[self.model.unit].get(LOCK_KEY) == REQUESTED
+
+    @property
+    def is_waiting_for_lock(self) -> bool:
+        """Returns whether an operation waits for the leader to grant this unit the lock."""
+        if not self._stored.pending_operation:
+            return False
+        if not self.model.get_relation(self._relation_name):
+            return False
+        return self.model.unit.name not in self._granted_units
+
+    def request(self, operation: str) -> None:
+        """Requests the lock and runs the operation as soon as it is granted.
+
+        Without a peer relation there is nothing to coordinate with, so the operation runs
+        as soon as it can. A pending operation is only replaced by a more disruptive one.
+
+        Args:
+            operation: Operation to run (`restart services`, `restart` or `reboot`)
+        """
+        pending = self._stored.pending_operation
+        if not pending or OPERATIONS.index(operation) > OPERATIONS.index(pending):
+            self._stored.pending_operation = operation
+        relation = self.model.get_relation(self._relation_name)
+        if relation:
+            relation.data[self.model.unit][LOCK_KEY] = REQUESTED
+            logger.info("Requested lock to %s", operation)
+        self._process()
+
+    def process_pending(self) -> None:
+        """Runs the pending operation if the lock is granted and the operation can run now."""
+        self._process()
+
+    def release_if_ready(self) -> None:
+        """Releases the lock once the operation ran and the unit is back in service.
+
+        After a reboot, the lock is only released once the machine actually rebooted.
+        """
+        if self._stored.pending_operation or not self.is_held:
+            return
+        if self._stored.boot_id and self._stored.boot_id == boot_id(self._host):
+            return
+        if not self._is_ready():
+            return
+        relation = self.model.get_relation(self._relation_name)
+        if not relation:
+            return
+        del relation.data[self.model.unit][LOCK_KEY]
+        self._stored.boot_id = ""
+        logger.info("Released restart lock")
+        if self.model.unit.is_leader():
+            self._grant()
+
+    def _on_lock_changed(self, event: EventBase) -> None:
+        """Triggered when peers request or release the lock, or when leadership changes.
+
+        Args:
+            event: Juju event (RelationChangedEvent, RelationDepartedEvent or
+                LeaderElectedEvent)
+        """
+        self._process()
+
+    def _process(self) -> None:
+        """Grants the lock if leader and runs the pending operation once granted.
+
+        An operation which times out stays pending and is retried the next time pending
+        operations are processed.
+        """
+        if self.model.unit.is_leader():
+            self._grant()
+        operation = self._stored.pending_operation
+        if not operation:
+            self.release_if_ready()
+            return
+        if self.is_waiting_for_lock:
+            logger.info("Waiting for lock to %s", operation)
+            return
+        if not self._can_run(operation):
+            return
+        try:
+            self._run_operation(operation)
+        except CommandTimeoutError as e:
+            logger.error(str(e))
+            self.model.unit.status = WaitingStatus(f"Timed out trying to {operation}. Will retry")
+            return
+        if operation == REBOOT and self.is_held:
+            self._stored.boot_id = boot_id(self._host)
+        self._stored.pending_operation = ""
+        self.release_if_ready()
+
+    def _grant(self) -> None:
+        """Grants the lock to requesting units, up to the allowed number of concurrent units."""
+        relation = self.model.get_relation(self._relation_name)
+        if not relation:
+            return
+        requesting = self._requesting_units
+        granted = [unit for unit in self._granted_units if unit in requesting]
+        for unit in sorted(requesting - set(granted)):
+            if len(granted) >= self._max_concurrent_units:
+                break
+            granted.append(unit)
+        relation.data[self.model.app][GRANTED_KEY] = json.dumps(granted)
+
+    @property
+    def _requesting_units(self) -> Set[str]:
+        """Returns the names of the units requesting or holding the lock."""
+        relation = self.model.get_relation(self._relation_name)
+        if not relation:
+            return set()
+        return {
+            unit.name
+            for unit in relation.units | {self.model.unit}
+            if relation.data[unit].get(LOCK_KEY) == REQUESTED
+        }
+
+    @property
+    def _granted_units(self) -> List[str]:
+        """Returns the names of the units the leader granted the lock to."""
+        relation = self.model.get_relation(self._relation_name)
+        if not relation:
+            return []
+        granted: Optional[str] = relation.data[self.model.app].get(GRANTED_KEY)
+        return json.loads(granted) if granted else []
+
+    @property
+    def _max_concurrent_units(self) -> int:
+        """Returns the maximum number of units allowed to hold the lock at once."""
+        return max(int(self.model.config.get("max-concurrent-restarts", 1)), 1)
@@ -0,0 +1,157 @@
+# Copyright 2022 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""CPU affinity and scheduling policy of the Magma services.
+
+Services are configured in groups (ex. `pipelined,sessiond=2-3 mme=4 *=0-1`), `*` setting
+the default of every Magma service. The settings are written as systemd drop-ins of the
+`magma@` units: the `*` group in a drop-in of the `magma@.service` template and the other
+groups in drop-ins of their instances, which are applied after the template ones.
+"""
+
+import logging
+import re
+from pathlib import Path
+from typing import Dict, List
+
+from command_policy import SERVICE_CONTROL_POLICY
+from dataplane_tuning import is_valid_cpu_list
+from host import Host
+
+logger = logging.getLogger(__name__)
+
+SYSTEMD_SYSTEM_DIR = Path("/etc/systemd/system")
+TEMPLATE_UNIT = "magma@.service"
+TEMPLATE_DROP_IN_NAME = "50-magma-access-gateway-cpu.conf"
+INSTANCE_DROP_IN_NAME = "60-magma-access-gateway-cpu.conf"
+DEFAULT_GROUP = "*"
+SCHEDULING_POLICIES = ["other", "batch", "idle", "fifo", "rr"]
+REALTIME_SCHEDULING_POLICIES = ["fifo", "rr"]
+SERVICE_GROUPS_REGEX = re.compile(r"^([a-z_]+|\*)(,([a-z_]+|\*))*=\S+$")
+
+
+def parse_service_groups(value: str) -> Dict[str, str]:
+    """Parses groups of services and their setting (ex. `pipelined,sessiond=2-3 mme=4`).
+
+    Args:
+        value: Space separated groups as set in the charm configuration
+
+    Returns:
+        dict: Setting of each service
+    """
+    settings = {}
+    for group in value.split():
+        services, _, setting = group.partition("=")
+        for service in services.split(","):
+            settings[service] = setting
+    return settings
+
+
+def is_valid_cpu_affinity(value: str) -> bool:
+    """Returns whether the string assigns valid CPU lists to groups of services."""
+    if not all(SERVICE_GROUPS_REGEX.match(group) for group in value.split()):
+        return False
+    return all(is_valid_cpu_list(cpus) for cpus in parse_service_groups(value).values())
+
+
+def is_valid_scheduling_policy(value: str) -> bool:
+    """Returns whether the string assigns valid scheduling policies to groups of services.
+
+    Real-time policies (`fifo` and `rr`) require a priority between 1 and 99 (ex. `fifo:50`).
+    """
+    if not all(SERVICE_GROUPS_REGEX.match(group) for group in value.split()):
+        return False
+    for scheduling in parse_service_groups(value).values():
+        policy, _, priority = scheduling.partition(":")
+        if policy not in SCHEDULING_POLICIES:
+            return False
+        if policy in REALTIME_SCHEDULING_POLICIES:
+            if not priority.isdigit() or not 1 <= int(priority) <= 99:
+                return False
+        elif priority:
+            return False
+    return True
+
+
+def drop_in_file(unit: str) -> Path:
+    """Returns the path of the drop-in managed by the charm for the unit."""
+    name = TEMPLATE_DROP_IN_NAME if unit == TEMPLATE_UNIT else INSTANCE_DROP_IN_NAME
+    return SYSTEMD_SYSTEM_DIR / f"{unit}.d" / name
+
+
+class ServicePinning:
+    """Writes the CPU affinity and scheduling drop-ins and restarts the affected services."""
+
+    def __init__(self, host: Host):
+        """Sets the machine the Magma services run on.
+
+        Args:
+            host: Machine the Magma services run on
+        """
+        self._host = host
+
+    def apply(self, cpu_affinity: str, scheduling_policy: str) -> List[str]:
+        """Reconciles the drop-ins with the configuration.
+
+        Args:
+            cpu_affinity: CPU list of each group of services
+            scheduling_policy: Scheduling policy of each group of services
+
+        Returns:
+            list: Units whose drop-in changed
+        """
+        drop_ins = self._drop_ins(
+            parse_service_groups(cpu_affinity), parse_service_groups(scheduling_policy)
+        )
+        changed = []
+        for unit, content in drop_ins.items():
+            if self._host.install(drop_in_file(unit), content):
+                changed.append(unit)
+        for file in self.managed_drop_ins():
+            unit = Path(file).parent.name[: -len(".d")]
+            if unit not in drop_ins:
+                self._host.unlink(file)
+                changed.append(unit)
+        return sorted(changed)
+
+    def reload(self, units: List[str]) -> List[str]:
+        """Reloads systemd so that the changed drop-ins apply once their services restart.
+
+        Restarting the services is disruptive, so it is left to the caller.
+
+        Args:
+            units: Units whose drop-in changed
+
+        Returns:
+            list: Services to restart. A change of the template restarts every Magma service.
+        """
+        if not units:
+            return []
+        self._host.run(["systemctl", "daemon-reload"], SERVICE_CONTROL_POLICY)
+        logger.info("Reloaded systemd to apply CPU pinning of %s", ", ".join(units))
+        return ["magma@*"] if TEMPLATE_UNIT in units else units
+
+    @staticmethod
+    def _drop_ins(cpu_affinity: Dict[str, str], scheduling: Dict[str, str]) -> Dict[str, str]:
+        """Returns the content of the drop-in of each unit."""
+        drop_ins = {}
+        for service in sorted(set(cpu_affinity) | set(scheduling)):
+            lines = ["# Managed by the magma-access-gateway-operator charm", "[Service]"]
+            if service in cpu_affinity:
+                lines += ["CPUAffinity=", f"CPUAffinity={cpu_affinity[service]}"]
+            if service in scheduling:
+                policy, _, priority = scheduling[service].partition(":")
+                lines.append(f"CPUSchedulingPolicy={policy}")
+                if priority:
+                    lines.append(f"CPUSchedulingPriority={priority}")
+            unit = TEMPLATE_UNIT if service == DEFAULT_GROUP else f"magma@{service}.service"
+            drop_ins[unit] = "\n".join(lines) + "\n"
+        return drop_ins
+
+    def managed_drop_ins(self) -> List[str]:
+        """Returns the drop-ins currently managed by the charm."""
+        drop_ins = self._host.glob(
+            SYSTEMD_SYSTEM_DIR / "magma@*.service.d" / INSTANCE_DROP_IN_NAME
+        )
+        template_drop_ins = self._host.glob(drop_in_file(TEMPLATE_UNIT))
+        return drop_ins + template_drop_ins
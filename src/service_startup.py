@@ -0,0 +1,191 @@
+# Copyright 2022 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Parallel startup of the Magma services and their time-to-active.
+
+Started through magmad, the Magma services come up one after the other. Instead, each service
+is started as soon as the services it is ordered after (`After=`) are active, so that
+independent services start concurrently. The state of the services being started is polled
+with a single query, which gives the time each service took to become active and the time the
+whole stack took.
+
+Timings can be exported in the Prometheus text format, to be collected by the node-exporter
+textfile collector.
+"""
+
+import logging
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from host import ACTIVE, FAILED, Host
+
+logger = logging.getLogger(__name__)
+
+MAGMA_SERVICES = "magma@*"
+MAGMAD = "magma@magmad"
+# Interval between two queries of the state of the services being started, in seconds
+POLL_INTERVAL = 0.5
+# Time after which the services which are not active yet are reported as failed, in seconds.
+# The startup runs inside a hook, so it is kept well under the time Juju waits for a hook: the
+# services are left starting and the restart lock is only released once magmad is active.
+STARTUP_TIMEOUT = 90.0
+
+
+class StartupTimings(NamedTuple):
+    """Time taken by the Magma services to become active.
+
+    Attributes:
+        services: Seconds each service took to become active, None if it didn't
+        total: Seconds the whole stack took to become active, None if a service didn't
+    """
+
+    services: Dict[str, Optional[float]]
+    total: Optional[float]
+
+    @property
+    def failed(self) -> List[str]:
+        """Returns the services which didn't become active."""
+        return [service for service, seconds in self.services.items() if seconds is None]
+
+
+def format_metrics(timings: StartupTimings) -> str:
+    """Returns the timings in the Prometheus text format."""
+    lines = [
+        "# HELP magma_service_time_to_active_seconds Time the service took to become active.",
+        "# TYPE magma_service_time_to_active_seconds gauge",
+    ]
+    for service, seconds in timings.services.items():
+        if seconds is not None:
+            lines.append(f'magma_service_time_to_active_seconds{{service="{service}"}} {seconds}')
+    lines.extend(
+        [
+            "# HELP magma_service_startup_failed Whether the service failed to become active.",
+            "# TYPE magma_service_startup_failed gauge",
+        ]
+    )
+    for service, seconds in timings.services.items():
+        lines.append(f'magma_service_startup_failed{{service="{service}"}} {int(seconds is None)}')
+    if timings.total is not None:
+        lines.extend(
+            [
+                "# HELP magma_stack_time_to_active_seconds Time all the services took to become"
+                " active.",
+                "# TYPE magma_stack_time_to_active_seconds gauge",
+                f"magma_stack_time_to_active_seconds {timings.total}",
+            ]
+        )
+    return "\n".join(lines) + "\n"
+
+
+class ServiceStartup:
+    """Restarts the Magma services, starting independent services concurrently."""
+
+    def __init__(
+        self,
+        host: Host,
+        timeout: float = STARTUP_TIMEOUT,
+        poll_interval: float = POLL_INTERVAL,
+    ):
+        """Sets the host running the services and the polling settings.
+
+        Args:
+            host: Host running the services
+            timeout: Time after which the services which are not active are reported as failed
+            poll_interval: Interval between two queries of the state of the services
+        """
+        self._host = host
+        self._timeout = timeout
+        self._poll_interval = poll_interval
+
+    def restart(self) -> StartupTimings:
+        """Stops the Magma services and starts the ones which were running along with magmad.
+
+        Returns:
+            StartupTimings: Time taken by the services to become active
+        """
+        units = sorted(set(self._host.active_units(MAGMA_SERVICES)) | {MAGMAD})
+        self._host.stop(MAGMA_SERVICES)
+        return self.start(units)
+
+    def start(self, units: List[str]) -> StartupTimings:
+        """Starts the services once the services they are ordered after are active.
+
+        Args:
+            units: Services to start
+
+        Returns:
+            StartupTimings: Time taken by the services to become active
+        """
+        ordering = {
+            unit: [dependency for dependency in after if dependency in units]
+            for unit, after in self._host.ordering(units).items()
+        }
+        pending = list(units)
+        activating: List[str] = []
+        timings: Dict[str, Optional[float]] = {}
+        started = time.monotonic()
+        while pending or activating:
+            ready, pending = self._ready(pending, ordering, timings)
+            if not ready and not activating:
+                logger.warning("Ordering cycle between %s, starting them together", pending)
+                ready, pending = pending, []
+            if ready:
+                self._host.start_no_block(ready)
+                activating.extend(ready)
+            if time.monotonic() - started > self._timeout:
+                break
+            time.sleep(self._poll_interval)
+            activating = self._poll(activating, started, timings)
+        services = {unit: timings.get(unit) for unit in units}
+        durations = [seconds for seconds in services.values() if seconds is not None]
+        if len(durations) < len(services):
+            result = StartupTimings(services=services, total=None)
+            logger.error("Services failed to become active: %s", ", ".join(result.failed))
+            return result
+        result = StartupTimings(services=services, total=max(durations, default=0.0))
+        logger.info("Magma services active after %s seconds", result.total)
+        return result
+
+    @staticmethod
+    def _ready(
+        pending: List[str], ordering: Dict[str, List[str]], timings: Dict[str, Optional[float]]
+    ) -> Tuple[List[str], List[str]]:
+        """Splits the pending services between the ones which can start and the others.
+
+        Services ordered after a service which failed are given up on.
+
+        Returns:
+            list: Services which can start
+            list: Services still waiting for the services they are ordered after
+        """
+        ready, waiting = [], []
+        for unit in pending:
+            after = ordering.get(unit, [])
+            if any(dependency in timings and timings[dependency] is None for dependency in after):
+                logger.error("Not starting %s: a service it is ordered after failed", unit)
+                timings[unit] = None
+            elif all(timings.get(dependency) is not None for dependency in after):
+                ready.append(unit)
+            else:
+                waiting.append(unit)
+        return ready, waiting
+
+    def _poll(
+        self, activating: List[str], started: float, timings: Dict[str, Optional[float]]
+    ) -> List[str]:
+        """Records the services which became active or failed.
+
+        Returns:
+            list: Services still activating
+        """
+        states = self._host.active_states(activating)
+        elapsed = round(time.monotonic() - started, 3)
+        still_activating = []
+        for unit in activating:
+            if states.get(unit) == ACTIVE:
+                timings[unit] = elapsed
+            elif states.get(unit) == FAILED:
+                timings[unit] = None
+            else:
+                still_activating.append(unit)
+        return still_activating
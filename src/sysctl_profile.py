@@ -0,0 +1,138 @@
+# Copyright 2022 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Kernel network tuning profiles sized to the expected number of UEs.
+
+A profile sets the conntrack table size, the socket buffer limits, the backlog of the network
+devices and the neighbour table thresholds. The sysctls are written to `/etc/sysctl.d` and
+applied live. The conntrack hash size is a module parameter: it is written to sysfs and
+persisted in `/etc/modprobe.d`, and the module is loaded at boot so that its sysctls can be
+applied.
+"""
+
+import logging
+from pathlib import Path
+from typing import Dict, List
+
+from command_policy import NETWORK_POLICY
+from host import Host
+
+logger = logging.getLogger(__name__)
+
+PROC_SYS = Path("/proc/sys")
+SYSCTL_FILE = Path("/etc/sysctl.d/60-magma-access-gateway.conf")
+CONNTRACK_HASHSIZE_FILE = Path("/sys/module/nf_conntrack/parameters/hashsize")
+MODPROBE_FILE = Path("/etc/modprobe.d/magma-access-gateway-conntrack.conf")
+MODULES_LOAD_FILE = Path("/etc/modules-load.d/magma-access-gateway-conntrack.conf")
+HEADER = "# Managed by the magma-access-gateway-operator charm\n"
+
+
+def _profile(conntrack_max: int, buffer_max: int, backlog: int, neighbours: int) -> Dict[str, int]:
+    """Returns the sysctls of a profile."""
+    return {
+        "net.netfilter.nf_conntrack_max": conntrack_max,
+        "net.core.rmem_max": buffer_max,
+        "net.core.wmem_max": buffer_max,
+        "net.core.rmem_default": buffer_max // 8,
+        "net.core.wmem_default": buffer_max // 8,
+        "net.core.netdev_max_backlog": backlog,
+        "net.ipv4.neigh.default.gc_thresh1": neighbours // 4,
+        "net.ipv4.neigh.default.gc_thresh2": neighbours // 2,
+        "net.ipv4.neigh.default.gc_thresh3": neighbours,
+        "net.ipv6.neigh.default.gc_thresh1": neighbours // 4,
+        "net.ipv6.neigh.default.gc_thresh2": neighbours // 2,
+        "net.ipv6.neigh.default.gc_thresh3": neighbours,
+    }
+
+
+# Profiles are named after the number of UEs they are sized for.
+PROFILES = {
+    "small": _profile(conntrack_max=262144, buffer_max=16777216, backlog=5000, neighbours=8192),
+    "medium": _profile(
+        conntrack_max=1048576, buffer_max=33554432, backlog=10000, neighbours=32768
+    ),
+    "large": _profile(conntrack_max=4194304, buffer_max=67108864, backlog=30000, neighbours=65536),
+}
+
+
+def sysctl_path(key: str) -> Path:
+    """Returns the /proc/sys file of the sysctl (ex. `net.core.rmem_max`)."""
+    return PROC_SYS / key.replace(".", "/")
+
+
+def conntrack_hashsize(conntrack_max: int) -> int:
+    """Returns the conntrack hash size for the table size, one bucket for 4 entries."""
+    return conntrack_max // 4
+
+
+class SysctlProfile:
+    """Writes, applies and verifies a kernel network tuning profile."""
+
+    def __init__(self, host: Host, profile: str):
+        """Sets the profile to apply.
+
+        Args:
+            host: Machine to tune
+            profile: Name of the profile or an empty string to remove the profile
+        """
+        self._host = host
+        self._sysctls = PROFILES.get(profile, {})
+
+    def apply(self) -> List[str]:
+        """Persists the profile and applies it live if the kernel values differ.
+
+        Returns:
+            list: Sysctls whose kernel value still differs from the profile
+        """
+        if not self._sysctls:
+            self._remove()
+            return []
+        self._persist()
+        mismatched = self.verify()
+        if not mismatched:
+            return []
+        if not self._host.exists(sysctl_path("net.netfilter.nf_conntrack_max")):
+            self._host.run(["modprobe", "nf_conntrack"], NETWORK_POLICY)
+        self._apply_conntrack_hashsize()
+        process = self._host.run(["sysctl", "-p", str(SYSCTL_FILE)], NETWORK_POLICY)
+        if process.returncode != 0:
+            logger.error("Failed to apply %s", SYSCTL_FILE)
+        return self.verify()
+
+    def verify(self) -> List[str]:
+        """Returns the sysctls whose kernel value differs from the profile."""
+        mismatched = []
+        for key, value in self._sysctls.items():
+            path = sysctl_path(key)
+            if not self._host.exists(path) or self._host.read_text(path).strip() != str(value):
+                mismatched.append(key)
+        return mismatched
+
+    def _persist(self) -> None:
+        """Writes the sysctls and the conntrack module configuration."""
+        hashsize = conntrack_hashsize(self._sysctls["net.netfilter.nf_conntrack_max"])
+        sysctls = "".join(f"{key} = {value}\n" for key, value in self._sysctls.items())
+        files = {
+            SYSCTL_FILE: HEADER + sysctls,
+            MODPROBE_FILE: HEADER + f"options nf_conntrack hashsize={hashsize}\n",
+            MODULES_LOAD_FILE: HEADER + "nf_conntrack\n",
+        }
+        for file, content in files.items():
+            if self._host.install(file, content):
+                logger.info("Wrote %s", file)
+
+    def _apply_conntrack_hashsize(self) -> None:
+        """Resizes the conntrack hash table if the module is loaded."""
+        if not self._host.exists(CONNTRACK_HASHSIZE_FILE):
+            return
+        hashsize = str(conntrack_hashsize(self._sysctls["net.netfilter.nf_conntrack_max"]))
+        if self._host.read_text(CONNTRACK_HASHSIZE_FILE).strip() != hashsize:
+            self._host.write_text(CONNTRACK_HASHSIZE_FILE, hashsize)
+            logger.info("Conntrack hash size set to %s", hashsize)
+
+    def _remove(self) -> None:
+        """Removes the profile files. Kernel values are restored at the next boot."""
+        for file in [SYSCTL_FILE, MODPROBE_FILE, MODULES_LOAD_FILE]:
+            if self._host.exists(file):
+                self._host.unlink(file)
+                logger.info("Removed %s", file)
@@ -0,0 +1,258 @@
+# Copyright 2022 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Test doubles shared by the unit tests and the fleet simulation.
+
+`InMemoryHost` keeps everything in memory and models the state transitions of the services,
+so that tests and simulations run without touching the machine.
+"""
+
+import fnmatch
+import subprocess
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from command_policy import CommandPolicy
+from host import ACTIVATING, ACTIVE, DEACTIVATING, FAILED, INACTIVE, FilePath, Host
+
+
+def _matches(names: List[str], patterns: List[str]) -> bool:
+    """Returns whether each component of a path matches the pattern of its level."""
+    if len(names) != len(patterns):
+        return False
+    return all(fnmatch.fnmatchcase(name, pattern) for name, pattern in zip(names, patterns))
+
+
+class InMemoryHost(Host):
+    """A machine kept in memory.
+
+    Services go through the same states as systemd units: `inactive`, `activating`,
+    `active`, `deactivating` and `failed`. Each transition is recorded. Starting a service
+    also starts the services it pulls in (ex. magmad starting the other Magma services).
+    Services started without blocking stay `activating` until their state is next queried.
+
+    Directories exist as long as they contain a file or were created with `mkdir`.
+
+    Attributes:
+        files: Content of each file, by absolute path
+        services: Active state of each service
+        enabled: Enabled services
+        network_interfaces: Names of the network interfaces
+        addresses: IPv4 addresses of each network interface
+        pulls_in: Services started along with each service
+        after: Units each service is ordered after
+        commands: Commands run, in order
+        results: Result of the commands, by command. Exceptions are raised instead of being
+            returned. Other commands succeed without output.
+        transitions: State transitions of the services, as (service, from, to)
+        fails_to_start: Services failing instead of becoming active when started without
+            blocking
+        modes: Permissions set on the files, by absolute path
+    """
+
+    def __init__(
+        self,
+        files: Optional[Dict[str, str]] = None,
+        services: Optional[Dict[str, str]] = None,
+        enabled: Iterable[str] = (),
+        interfaces: Iterable[str] = (),
+        pulls_in: Optional[Dict[str, List[str]]] = None,
+        after: Optional[Dict[str, List[str]]] = None,
+        addresses: Optional[Dict[str, List[str]]] = None,
+        clock: Callable[[], float] = time.time,
+    ):
+        """Sets the initial state of the machine.
+
+        Args:
+            files: Content of each file, by absolute path
+            services: Active state of each service
+            enabled: Enabled services
+            interfaces: Names of the network interfaces
+            pulls_in: Services started along with each service
+            after: Units each service is ordered after
+            addresses: IPv4 addresses of each network interface
+            clock: Wall clock the modification times are read from, in seconds
+        """
+        self.files = dict(files or {})
+        self.services = dict(services or {})
+        self.enabled = set(enabled)
+        self.network_interfaces = list(interfaces)
+        self.addresses = dict(addresses or {})
+        self.pulls_in = dict(pulls_in or {})
+        self.after = dict(after or {})
+        self.commands: List[List[str]] = []
+        self.results: Dict[Tuple[str, ...], Union[subprocess.CompletedProcess, Exception]] = {}
+        self.transitions: List[Tuple[str, str, str]] = []
+        self.fails_to_start: Set[str] = set()
+        self.modes: Dict[str, int] = {}
+        self._clock = clock
+        self._directories: Set[str] = set()
+        self._last_mtime = 0
+        self._mtimes = {path: self._next_mtime() for path in self.files}
+
+    def run(self, command: List[str], policy: CommandPolicy) -> subprocess.CompletedProcess:
+        """Records the command and returns its programmed result."""
+        self.commands.append(command)
+        result = self.results.get(
+            tuple(command), subprocess.CompletedProcess(command, 0, stdout=b"")
+        )
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def set_result(self, command: List[str], stdout: str = "", returncode: int = 0) -> None:
+        """Programs the result of a command.
+
+        Args:
+            command: Command and its arguments
+            stdout: Output of the command
+            returncode: Return code of the command
+        """
+        self.results[tuple(command)] = subprocess.CompletedProcess(
+            command, returncode, stdout=stdout.encode()
+        )
+
+    def is_active(self, unit: str) -> bool:
+        """Returns whether the service is active."""
+        return self.services.get(unit) == ACTIVE
+
+    def is_enabled(self, unit: str) -> bool:
+        """Returns whether the service is enabled."""
+        return unit in self.enabled
+
+    def start(self, unit: str) -> None:
+        """Starts the service and the services it pulls in."""
+        for service in [unit, *self.pulls_in.get(unit, [])]:
+            if self.services.get(service) == ACTIVE:
+                continue
+            self._transition(service, ACTIVATING)
+            self._transition(service, ACTIVE)
+
+    def stop(self, unit: str) -> None:
+        """Stops the services matching the pattern (ex. `magma@*`)."""
+        for service in fnmatch.filter(list(self.services), unit):
+            if self.services[service] != ACTIVE:
+                continue
+            self._transition(service, DEACTIVATING)
+            self._transition(service, INACTIVE)
+
+    def start_no_block(self, units: List[str]) -> None:
+        """Moves the services which aren't active to `activating`."""
+        for unit in units:
+            if self.services.get(unit) != ACTIVE:
+                self._transition(unit, ACTIVATING)
+
+    def active_units(self, pattern: str) -> List[str]:
+        """Returns the active services matching the pattern (ex. `magma@*`)."""
+        return [
+            unit for unit in fnmatch.filter(list(self.services), pattern) if self.is_active(unit)
+        ]
+
+    def active_states(self, units: List[str]) -> Dict[str, str]:
+        """Returns the active state of the services, completing their pending activation."""
+        for unit in units:
+            if self.services.get(unit) == ACTIVATING:
+                self._transition(unit, FAILED if unit in self.fails_to_start else ACTIVE)
+        return {unit: self.services[unit] for unit in units if unit in self.services}
+
+    def ordering(self, units: List[str]) -> Dict[str, List[str]]:
+        """Returns the units each service is ordered after (`After=`)."""
+        return {unit: list(self.after.get(unit, [])) for unit in units}
+
+    def fail(self, unit: str) -> None:
+        """Makes the service fail, as if it crashed."""
+        self._transition(unit, FAILED)
+
+    def interfaces(self) -> List[str]:
+        """Returns the names of the network interfaces."""
+        return list(self.network_interfaces)
+
+    def ipv4_addresses(self, interface: str) -> List[str]:
+        """Returns the IPv4 addresses assigned to the network interface.
+
+        Raises:
+            ValueError: If the network interface doesn't exist
+        """
+        if interface not in self.network_interfaces:
+            raise ValueError("You must specify a valid interface name.")
+        return list(self.addresses.get(interface, []))
+
+    def exists(self, path: FilePath) -> bool:
+        """Returns whether the file or directory exists."""
+        return str(path) in self.files or self._is_dir(str(path))
+
+    def read_text(self, path: FilePath) -> str:
+        """Returns the content of the file.
+
+        Raises:
+            FileNotFoundError: If the file doesn't exist
+        """
+        try:
+            return self.files[str(path)]
+        except KeyError:
+            raise FileNotFoundError(str(path))
+
+    def write_text(self, path: FilePath, content: str) -> None:
+        """Writes the file."""
+        self.files[str(path)] = content
+        self._mtimes[str(path)] = self._next_mtime()
+
+    def unlink(self, path: FilePath) -> None:
+        """Removes the file if it exists."""
+        self.files.pop(str(path), None)
+        self.modes.pop(str(path), None)
+
+    def chmod(self, path: FilePath, mode: int) -> None:
+        """Records the permissions of the file.
+
+        Raises:
+            FileNotFoundError: If the file doesn't exist
+        """
+        if str(path) not in self.files:
+            raise FileNotFoundError(str(path))
+        self.modes[str(path)] = mode
+
+    def mkdir(self, path: FilePath) -> None:
+        """Creates the directory."""
+        self._directories.add(str(path).rstrip("/"))
+
+    def list_dir(self, path: FilePath) -> List[str]:
+        """Returns the names of the entries of the directory, empty if it doesn't exist."""
+        prefix = str(path).rstrip("/") + "/"
+        entries = {
+            entry.split("/")[prefix.count("/")]
+            for entry in [*self.files, *self._directories]
+            if entry.startswith(prefix)
+        }
+        return sorted(entries)
+
+    def glob(self, pattern: FilePath) -> List[str]:
+        """Returns the files matching the pattern (ex. `/etc/netplan/*.yaml`), sorted."""
+        parts = str(pattern).split("/")
+        return sorted(file for file in self.files if _matches(file.split("/"), parts))
+
+    def mtime(self, path: FilePath) -> Optional[int]:
+        """Returns the modification time of the file in nanoseconds, None if it doesn't exist.
+
+        Modification times strictly increase with each write, even within a clock tick.
+        """
+        if str(path) not in self.files:
+            return None
+        return self._mtimes[str(path)]
+
+    def _is_dir(self, path: str) -> bool:
+        """Returns whether the directory exists."""
+        prefix = path.rstrip("/") + "/"
+        return path.rstrip("/") in self._directories or any(
+            entry.startswith(prefix) for entry in [*self.files, *self._directories]
+        )
+
+    def _next_mtime(self) -> int:
+        """Returns the modification time of a file written now, in nanoseconds."""
+        self._last_mtime = max(int(self._clock() * 1e9), self._last_mtime + 1)
+        return self._last_mtime
+
+    def _transition(self, unit: str, state: str) -> None:
+        """Moves the service to a new state and records the transition."""
+        self.transitions.append((unit, self.services.get(unit, INACTIVE), state))
+        self.services[unit] = state
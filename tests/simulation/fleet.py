@@ -0,0 +1,701 @@
+#!/usr/bin/env python3
+# Copyright 2022 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Fleet-scale simulation of the charm against simulated hosts.
+
+Each simulated unit runs `MagmaAccessGatewayOperatorCharm` in its own `ops.testing.Harness`,
+backed by a `SimulatedHost`: an in-memory host modelling the commands, services and clock of
+an AGW machine. The harnesses share an `agw-peers` relation whose databags are copied from unit
+to unit, so the restart lock coordinates the fleet as it would in a model.
+
+Events are processed in simulated time order. Every event carries the time at which it
+happens; commands and sleeps advance the clock of the host running them, and the events a
+hook causes on other units (peer relation changes, installer completion, reboots) happen no
+earlier than that. The simulated wall time of the fleet is the latest clock of its hosts.
+
+Run `python tests/simulation/fleet.py --units 100` to simulate a fleet going through
+deployment, orchestrator join, certificate rotation and config churn.
+"""
+
+import argparse
+import contextlib
+import fnmatch
+import functools
+import heapq
+import itertools
+import json
+import logging
+import subprocess
+import types
+from collections import Counter
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+from unittest.mock import patch
+
+from fakes import InMemoryHost
+from ops import testing
+from ops.framework import EventBase
+
+from agw_installer import INSTALL_UNIT, STATE_DIR
+from charm import CONFIG_PATH, GATEWAY_CERT_PATH, MagmaAccessGatewayOperatorCharm
+from command_policy import CommandPolicy
+from dataplane_tuning import ONLINE_CPUS_FILE
+from host import ACTIVE, INACTIVE
+from rolling_restart import BOOT_ID_FILE, GRANTED_KEY
+
+APP_NAME = "magma-access-gateway-operator"
+ORCHESTRATOR_APP_NAME = "orc8r-nginx-operator"
+PEER_RELATION = "agw-peers"
+ORCHESTRATOR_RELATION = "magma-orchestrator"
+# The Harness names its unit after the first unit of the application
+HARNESS_UNIT_NAME = f"{APP_NAME}/0"
+# Interface names before and after the installation renames them
+INSTALLER_INTERFACES = {"enp0s1": "eth0", "enp0s2": "eth1"}
+MAGMAD = "magma@magmad"
+MAGMA_SERVICES = [
+    MAGMAD,
+    "magma@mme",
+    "magma@pipelined",
+    "magma@sessiond",
+    "magma@mobilityd",
+    "magma@redis",
+]
+MAGMA_CONFIG_FILES = ["magmad.yml", "mme.yml", "sessiond.yml", "mobilityd.yml", "redis.yml"]
+PIPELINED_CONFIG_FILE = MagmaAccessGatewayOperatorCharm.PIPELINED_CONFIG_FILE
+PIPELINED_CONFIG = "access_control:\n  block_agw_local_ips: {block}\n"
+# Simulated duration of the commands and background tasks, in seconds
+COMMAND_DURATIONS = {
+    "snap": 60.0,
+    "service": 15.0,
+    "systemctl restart": 5.0,
+    "systemctl try-restart": 5.0,
+    "netplan": 2.0,
+    "sysctl": 0.5,
+}
+DEFAULT_COMMAND_DURATION = 0.05
+# Time the Magma services take to become active once started, in seconds
+SERVICE_STARTUP_DURATIONS = {
+    "magma@magmad": 5.0,
+    "magma@mme": 10.0,
+    "magma@pipelined": 8.0,
+    "magma@sessiond": 6.0,
+    "magma@mobilityd": 4.0,
+    "magma@redis": 2.0,
+}
+# Units each Magma service is ordered after
+SERVICE_ORDERING = {
+    "magma@sessiond": ["magma@redis", "network.target"],
+    "magma@mobilityd": ["magma@redis"],
+    "magma@mme": ["magma@sessiond", "magma@pipelined", "sctpd"],
+}
+INSTALLATION_DURATION = 1200.0
+# `shutdown --reboot +1` waits one minute before the machine goes down
+REBOOT_DURATION = 60.0 + 90.0
+UPDATE_STATUS_INTERVAL = 300.0
+DEFAULT_CHURN: List[dict] = [
+    {"ovs-flow-limit": 400000},
+    {"service-log-level": "*=WARNING"},
+    {"checkin-interval": 30},
+    {"sysctl-profile": "small"},
+    {"block-agw-local-ips": False},
+]
+
+logger = logging.getLogger(__name__)
+
+
+class SimulatedHost(InMemoryHost):
+    """In-memory AGW machine whose commands and services take simulated time.
+
+    Commands run against a model of the machine (snap, installer, Open vSwitch, sysctl...)
+    and advance the clock of the host, like the service queries and controls do. Services
+    started without blocking become active once their startup duration elapsed.
+    """
+
+    def __init__(self, name: str):
+        """Creates a freshly provisioned machine.
+
+        Args:
+            name: Name of the host, used in its boot ids
+        """
+        self.name = name
+        self.clock = 0.0
+        self.boots = 0
+        self.counters: Counter = Counter()
+        self.magma_installed = False
+        self.reboot_scheduled = False
+        # Time at which each service being started becomes active
+        self.activating: Dict[str, float] = {}
+        self.ovs_other_config: Dict[str, str] = {}
+        self.scheduled: List[Tuple[float, str]] = []
+        self._unblock_local_ips = False
+        files = {str(ONLINE_CPUS_FILE): "0-3\n", BOOT_ID_FILE: f"{self.boot_id}\n"}
+        for interface in [*INSTALLER_INTERFACES, *INSTALLER_INTERFACES.values()]:
+            files.update(
+                {
+                    f"/sys/class/net/{interface}/carrier": "1\n",
+                    f"/sys/class/net/{interface}/mtu": "1500\n",
+                    f"/sys/class/net/{interface}/address": "00:00:00:00:00:01\n",
+                }
+            )
+        super().__init__(
+            files=files,
+            interfaces=["lo", *INSTALLER_INTERFACES],
+            after=SERVICE_ORDERING,
+            clock=self.time,
+        )
+
+    @property
+    def boot_id(self) -> str:
+        """Returns the identifier of the current boot of the host."""
+        return f"{self.name}-boot-{self.boots}"
+
+    def sleep(self, seconds: float) -> None:
+        """Advances the clock of the host instead of sleeping."""
+        self.clock += seconds
+
+    def time(self) -> float:
+        """Returns the clock of the host."""
+        return self.clock
+
+    def run(self, command: List[str], policy: CommandPolicy) -> subprocess.CompletedProcess:
+        """Runs a command against the host model."""
+        self.commands.append(command)
+        self._spend(command)
+        handler = getattr(self, f"_run_{command[0].replace('-', '_').replace('.', '_')}", None)
+        returncode, stdout = handler(command[1:]) if handler else (0, "")
+        return subprocess.CompletedProcess(command, returncode, stdout=stdout.encode())
+
+    def is_active(self, unit: str) -> bool:
+        """Returns whether the service is active."""
+        self._spend(["systemctl", "is-active"])
+        return super().is_active(unit)
+
+    def is_enabled(self, unit: str) -> bool:
+        """Returns whether the service is enabled."""
+        self._spend(["systemctl", "is-enabled"])
+        return super().is_enabled(unit)
+
+    def stop(self, unit: str) -> None:
+        """Stops the services matching the pattern, including the ones still activating."""
+        self._spend(["service"])
+        for service in fnmatch.filter(list(self.activating), unit):
+            # Stopped from `active` like the others, the startup is not modelled further
+            self.services[service] = ACTIVE
+            del self.activating[service]
+        super().stop(unit)
+
+    def start_no_block(self, units: List[str]) -> None:
+        """Starts the services, which become active once their startup duration elapsed."""
+        self._spend(["systemctl", "start"])
+        if not self.magma_installed:
+            return
+        super().start_no_block(units)
+        for unit in units:
+            self.activating[unit] = self.clock + SERVICE_STARTUP_DURATIONS.get(unit, 1.0)
+        if MAGMAD in units:
+            self.counters["restarts"] += 1
+
+    def active_units(self, pattern: str) -> List[str]:
+        """Returns the active services matching the pattern."""
+        self._spend(["systemctl", "list-units"])
+        return super().active_units(pattern)
+
+    def active_states(self, units: List[str]) -> Dict[str, str]:
+        """Returns the active state of the services whose startup duration elapsed."""
+        self._spend(["systemctl", "show"])
+        for unit, active_at in list(self.activating.items()):
+            if active_at <= self.clock:
+                self.services[unit] = ACTIVE
+                del self.activating[unit]
+        if self.services.get(MAGMAD) == ACTIVE:
+            self._bootstrap()
+        return {unit: self.services.get(unit, INACTIVE) for unit in units}
+
+    def ordering(self, units: List[str]) -> Dict[str, List[str]]:
+        """Returns the units each service is ordered after."""
+        self._spend(["systemctl", "show"])
+        return super().ordering(units)
+
+    def finish_installation(self) -> None:
+        """Completes the background installation as `magma-access-gateway.install` would."""
+        self.services[INSTALL_UNIT] = INACTIVE
+        self.magma_installed = True
+        self.enabled.add(MAGMAD)
+        block = "false" if self._unblock_local_ips else "true"
+        self.write_text(PIPELINED_CONFIG_FILE, PIPELINED_CONFIG.format(block=block))
+        for file in MAGMA_CONFIG_FILES:
+            self.write_text(f"/etc/magma/{file}", "log_level: INFO\n")
+        self.write_text(STATE_DIR / "install.log", "AGW installation done\n")
+        self.write_text(STATE_DIR / "install.exit-status", "0\n")
+
+    def reboot(self) -> None:
+        """Reboots the host: the interfaces get renamed and the enabled services start."""
+        self.reboot_scheduled = False
+        self.boots += 1
+        self.counters["reboots"] += 1
+        self.write_text(BOOT_ID_FILE, f"{self.boot_id}\n")
+        if self.magma_installed:
+            self.network_interfaces = ["lo", *INSTALLER_INTERFACES.values()]
+            self.services.update({service: ACTIVE for service in MAGMA_SERVICES})
+            self.activating.clear()
+            self._bootstrap()
+
+    def _spend(self, command: List[str]) -> None:
+        """Counts a command and advances the clock by the time it takes."""
+        self.counters["subprocesses"] += 1
+        key = " ".join(command[:2])
+        self.clock += COMMAND_DURATIONS.get(
+            key, COMMAND_DURATIONS.get(command[0], DEFAULT_COMMAND_DURATION)
+        )
+
+    def _run_snap(self, args: List[str]) -> Tuple[int, str]:
+        return 0, ""
+
+    def _run_systemd_run(self, args: List[str]) -> Tuple[int, str]:
+        self.services[INSTALL_UNIT] = ACTIVE
+        self._unblock_local_ips = "--unblock-local-ips" in args[-1]
+        self.scheduled.append((self.clock + INSTALLATION_DURATION, "install"))
+        return 0, ""
+
+    def _run_shutdown(self, args: List[str]) -> Tuple[int, str]:
+        if not self.reboot_scheduled:
+            self.reboot_scheduled = True
+            self.scheduled.append((self.clock + REBOOT_DURATION, "reboot"))
+        return 0, ""
+
+    def _run_systemctl(self, args: List[str]) -> Tuple[int, str]:
+        action, units = args[0], [arg for arg in args[1:] if not arg.startswith("-")]
+        if action in ["restart", "try-restart"]:
+            restarted = [unit for unit in units if action == "restart" or self.services.get(unit)]
+            if restarted:
+                self.counters["restarts"] += 1
+        return 0, ""
+
+    def _run_ovs_vsctl(self, args: List[str]) -> Tuple[int, str]:
+        if not self.magma_installed:
+            return 1, ""
+        if args[0] == "get":
+            items = ", ".join(f'{key}="{value}"' for key, value in self.ovs_other_config.items())
+            return 0, f"{{{items}}}\n"
+        for setting in args:
+            if setting.startswith("other_config:"):
+                key, _, value = setting.partition(":")[2].partition("=")
+                self.ovs_other_config[key] = value
+        for index, arg in enumerate(args):
+            if arg == "remove":
+                self.ovs_other_config.pop(args[index + 4], None)
+        return 0, ""
+
+    def _run_sysctl(self, args: List[str]) -> Tuple[int, str]:
+        for line in self.read_text(args[-1]).splitlines():
+            key, separator, value = line.partition(" = ")
+            if separator and not key.startswith("#"):
+                self.write_text(f"/proc/sys/{key.replace('.', '/')}", f"{value}\n")
+        return 0, ""
+
+    def _run_ip(self, args: List[str]) -> Tuple[int, str]:
+        if "-details" in args:
+            return 0, json.dumps([{"min_mtu": 68, "max_mtu": 9000}])
+        return 0, "[]"
+
+    def _run_journalctl(self, args: List[str]) -> Tuple[int, str]:
+        if not self.exists(GATEWAY_CERT_PATH) or self.services.get(MAGMAD) != ACTIVE:
+            return 1, ""
+        return 0, f"{self.clock:.6f} {self.name} magmad[1]: Checkin Successful!\n"
+
+    def _bootstrap(self) -> None:
+        """Writes the gateway certificate as magmad does once it reaches the orchestrator."""
+        if self.exists(CONFIG_PATH) and not self.exists(GATEWAY_CERT_PATH):
+            self.write_text(GATEWAY_CERT_PATH, "gateway certificate\n")
+
+
+class PhaseReport(NamedTuple):
+    """Counters of a phase of the simulation.
+
+    Attributes:
+        name: Name of the phase
+        subprocesses: Number of commands run on the hosts
+        restarts: Number of service restarts
+        reboots: Number of reboots
+        deferred: Number of deferred events
+        wall_time: Simulated wall time of the phase, in seconds
+    """
+
+    name: str
+    subprocesses: int
+    restarts: int
+    reboots: int
+    deferred: int
+    wall_time: float
+
+
+class SimulatedUnit:
+    """A charm unit in its own Harness, running its hooks against its own simulated host.
+
+    The Harness always names its unit `<app>/0`. Each Harness sees the units of the fleet with
+    that name swapped with the name of the simulated unit, so that its peers keep distinct names
+    and the peer data it exchanges with them is renamed on the way in and out.
+    """
+
+    def __init__(self, name: str, peers: List[str], host: SimulatedHost, config: dict):
+        """Sets up the Harness of the unit, related to its peers.
+
+        Args:
+            name: Name of the unit (ex. `magma-access-gateway-operator/0`)
+            peers: Names of the other units of the application
+            host: Machine the unit runs on
+            config: Charm config of the application
+        """
+        self.name = name
+        self.host = host
+        self.harness = testing.Harness(MagmaAccessGatewayOperatorCharm)
+        # Like Juju, keep a single notice of an event deferred again
+        self.harness.framework.skip_duplicate_events = True
+        self.harness.update_config(config)
+        self.peer_relation_id = self.harness.add_relation(PEER_RELATION, APP_NAME)
+        for peer in peers:
+            self.harness.add_relation_unit(self.peer_relation_id, self.rename(peer))
+        self.orchestrator_relation_id: Optional[int] = None
+        self.deployed = False
+        self.published: Dict[str, Dict[str, str]] = {}
+
+    @property
+    def charm(self) -> MagmaAccessGatewayOperatorCharm:
+        """Returns the charm instance of the unit."""
+        return self.harness.charm
+
+    def rename(self, name: str) -> str:
+        """Swaps the name of a unit between the fleet and the Harness of this unit.
+
+        Args:
+            name: Name of a unit or of the application
+
+        Returns:
+            str: Name of the same unit on the other side
+        """
+        if name == self.name:
+            return HARNESS_UNIT_NAME
+        if name == HARNESS_UNIT_NAME:
+            return self.name
+        return name
+
+    def _rename_granted_units(self, data: Dict[str, str]) -> Dict[str, str]:
+        """Returns the peer databag with the units granted the restart lock renamed."""
+        if not data.get(GRANTED_KEY):
+            return data
+        granted = [self.rename(unit) for unit in json.loads(data[GRANTED_KEY])]
+        return {**data, GRANTED_KEY: json.dumps(granted)}
+
+    @contextlib.contextmanager
+    def on_host(self) -> Iterator[None]:
+        """Points the charm at the simulated host and its clock for the duration of a hook."""
+        host = self.host
+        clock = types.SimpleNamespace(sleep=host.sleep, time=host.time, monotonic=host.time)
+        original_defer = EventBase.defer
+
+        def defer(event: EventBase) -> None:
+            host.counters["deferred"] += 1
+            original_defer(event)
+
+        patches = {
+            "charm.time": clock,
+            "service_startup.time": clock,
+            "command_policy.time": clock,
+        }
+        with contextlib.ExitStack() as stack:
+            for target, value in patches.items():
+                stack.enter_context(patch(target, value))
+            stack.enter_context(patch.object(EventBase, "defer", defer))
+            stack.enter_context(patch.object(MagmaAccessGatewayOperatorCharm, "host", host))
+            yield
+
+    def dispatch(self, hook: Callable[[], None]) -> None:
+        """Runs a hook on the host, after the events deferred by previous hooks.
+
+        Args:
+            hook: Callable emitting the event of the hook through the Harness
+        """
+        with self.on_host():
+            if self.deployed:
+                self.harness.framework.reemit()
+            hook()
+            self.deployed = True
+
+    def peer_databags(self) -> Dict[str, Dict[str, str]]:
+        """Returns the peer databags this unit writes, its own and, if leader, the app's.
+
+        Units are named as in the fleet.
+        """
+        owners = [self.name, APP_NAME] if self.charm.unit.is_leader() else [self.name]
+        return {
+            owner: self._rename_granted_units(
+                dict(self.harness.get_relation_data(self.peer_relation_id, self.rename(owner)))
+            )
+            for owner in owners
+        }
+
+    def update_peer_data(self, owner: str, data: Dict[str, str]) -> None:
+        """Updates the peer databag of a unit or of the app with data published by a peer.
+
+        Args:
+            owner: Name of the unit, as in the fleet, or of the app owning the databag
+            data: Keys to update, units named as in the fleet
+        """
+        self.harness.update_relation_data(
+            self.peer_relation_id, self.rename(owner), self._rename_granted_units(data)
+        )
+
+
+class Fleet:
+    """Units of the application and the time-ordered queue of their events."""
+
+    def __init__(self, size: int, config: Optional[dict] = None):
+        """Creates the units and their hosts. The first unit is the leader.
+
+        Args:
+            size: Number of units
+            config: Charm config of the application
+        """
+        self.config = {"sgi": "enp0s1", "s1": "enp0s2"}
+        self.config.update(config or {})
+        names = [f"{APP_NAME}/{index}" for index in range(size)]
+        self.units = [
+            SimulatedUnit(
+                name,
+                [peer for peer in names if peer != name],
+                SimulatedHost(f"unit-{index}"),
+                self.config,
+            )
+            for index, name in enumerate(names)
+        ]
+        self.units[0].harness.set_leader(True)
+        self.phases: List[PhaseReport] = []
+        self._queue: List[
+            Tuple[float, int, SimulatedUnit, Callable[[], None], Optional[Callable[[], None]]]
+        ] = []
+        self._sequence = itertools.count()
+
+    @property
+    def now(self) -> float:
+        """Returns the simulated time, the latest clock of the hosts."""
+        return max(unit.host.clock for unit in self.units)
+
+    @property
+    def counters(self) -> Counter:
+        """Returns the sum of the counters of the hosts."""
+        return sum((unit.host.counters for unit in self.units), Counter())
+
+    def schedule(
+        self,
+        at: float,
+        unit: SimulatedUnit,
+        hook: Callable[[], None],
+        host_change: Optional[Callable[[], None]] = None,
+    ) -> None:
+        """Queues a hook to run on a unit at the given simulated time.
+
+        Args:
+            at: Simulated time of the hook
+            unit: Unit running the hook
+            hook: Callable emitting the event of the hook through the Harness
+            host_change: Change of the host happening just before the hook, like a reboot
+        """
+        heapq.heappush(self._queue, (at, next(self._sequence), unit, hook, host_change))
+
+    def broadcast(self, hook: Callable[[SimulatedUnit], None]) -> None:
+        """Queues a hook to run on every unit now, as Juju does for application-wide events."""
+        now = self.now
+        for unit in self.units:
+            self.schedule(now, unit, functools.partial(hook, unit))
+
+    def run(self) -> None:
+        """Runs the queued hooks and the ones they cause until the queue is empty."""
+        while self._queue:
+            at, _, unit, hook, host_change = heapq.heappop(self._queue)
+            unit.host.clock = max(unit.host.clock, at)
+            if host_change:
+                host_change()
+            unit.dispatch(hook)
+            self._schedule_background_tasks(unit)
+            self._publish_peer_data(unit)
+
+    def settle(self, max_rounds: int = 50) -> None:
+        """Runs update-status rounds until no unit has a disruptive operation pending."""
+        self.run()
+        for _ in range(max_rounds):
+            if not any(unit.charm._restart_lock.pending_operation for unit in self.units):
+                return
+            at = self.now + UPDATE_STATUS_INTERVAL
+            for unit in self.units:
+                self.schedule(at, unit, unit.charm.on.update_status.emit)
+            self.run()
+        logger.warning("Fleet did not settle after %d update-status rounds", max_rounds)
+
+    @contextlib.contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Records the counters of a phase of the simulation, settled at its end."""
+        counters, started = self.counters, self.now
+        yield
+        self.settle()
+        delta = self.counters - counters
+        self.phases.append(
+            PhaseReport(
+                name=name,
+                subprocesses=delta["subprocesses"],
+                restarts=delta["restarts"],
+                reboots=delta["reboots"],
+                deferred=delta["deferred"],
+                wall_time=self.now - started,
+            )
+        )
+
+    @property
+    def statuses(self) -> Counter:
+        """Returns the number of units in each status."""
+        return Counter(
+            f"{unit.charm.unit.status.name} {unit.charm.unit.status.message}".strip()
+            for unit in self.units
+        )
+
+    def deploy(self) -> None:
+        """Deploys the units, lets the installations run and the machines reboot."""
+        for unit in self.units:
+            self.schedule(self.now, unit, unit.harness.begin_with_initial_hooks)
+        self.run()
+
+    def relate_orchestrator(self, data: Dict[str, str]) -> None:
+        """Relates the units to an orchestrator publishing the given data."""
+
+        def relate(unit: SimulatedUnit) -> None:
+            unit.orchestrator_relation_id = unit.harness.add_relation(
+                ORCHESTRATOR_RELATION, ORCHESTRATOR_APP_NAME
+            )
+            unit.harness.add_relation_unit(
+                unit.orchestrator_relation_id, f"{ORCHESTRATOR_APP_NAME}/0"
+            )
+            unit.harness.update_relation_data(
+                unit.orchestrator_relation_id, ORCHESTRATOR_APP_NAME, data
+            )
+
+        self.broadcast(relate)
+
+    def update_orchestrator_data(self, data: Dict[str, str]) -> None:
+        """Changes the data the orchestrator publishes, for example to rotate certificates."""
+
+        def update(unit: SimulatedUnit) -> None:
+            if unit.orchestrator_relation_id is not None:
+                unit.harness.update_relation_data(
+                    unit.orchestrator_relation_id, ORCHESTRATOR_APP_NAME, data
+                )
+
+        self.broadcast(update)
+
+    def update_config(self, config: dict) -> None:
+        """Changes the charm config of the application."""
+        self.config.update(config)
+        self.broadcast(lambda unit: unit.harness.update_config(config))
+
+    def _schedule_background_tasks(self, unit: SimulatedUnit) -> None:
+        """Queues the completion of the tasks the hook started in the background."""
+        for at, task in unit.host.scheduled:
+            if task == "install":
+                self.schedule(
+                    at,
+                    unit,
+                    unit.charm.on.install_complete.emit,
+                    unit.host.finish_installation,
+                )
+            else:
+                # Juju runs the start hook once the machine is back
+                self.schedule(at, unit, unit.charm.on.start.emit, unit.host.reboot)
+        unit.host.scheduled.clear()
+
+    def _publish_peer_data(self, unit: SimulatedUnit) -> None:
+        """Copies the peer databags the unit changed to the other units."""
+        for owner, data in unit.peer_databags().items():
+            if unit.published.get(owner) == data:
+                continue
+            previous = unit.published.get(owner, {})
+            unit.published[owner] = dict(data)
+            update = {key: data.get(key, "") for key in set(previous) | set(data)}
+            for peer in self.units:
+                if peer is not unit:
+                    self.schedule(
+                        unit.host.clock,
+                        peer,
+                        functools.partial(peer.update_peer_data, owner, update),
+                    )
+
+
+def orchestrator_data(certifier_pem: str) -> Dict[str, str]:
+    """Returns the data an orchestrator publishes in the `magma-orchestrator` relation."""
+    return {
+        "root_ca_certificate": "root-ca",
+        "certifier_pem_certificate": certifier_pem,
+        "orchestrator_address": "orchestrator.example.com",
+        "orchestrator_port": "443",
+        "bootstrapper_address": "bootstrapper.example.com",
+        "bootstrapper_port": "443",
+        "fluentd_address": "fluentd.example.com",
+        "fluentd_port": "24224",
+    }
+
+
+def run_scenario(fleet: Fleet, churn: List[dict]) -> None:
+    """Takes the fleet through its lifecycle, one phase at a time.
+
+    Args:
+        fleet: Fleet to simulate
+        churn: Config changes applied one after the other
+    """
+    with fleet.phase("deploy"):
+        fleet.deploy()
+    with fleet.phase("orchestrator join"):
+        fleet.relate_orchestrator(orchestrator_data("certifier-1"))
+    with fleet.phase("certificate rotation"):
+        fleet.update_orchestrator_data(orchestrator_data("certifier-2"))
+    for config in churn:
+        with fleet.phase(f"config {', '.join(f'{k}={v}' for k, v in config.items())}"):
+            fleet.update_config(config)
+
+
+def format_report(fleet: Fleet) -> str:
+    """Returns the counters of each phase and their total as a table."""
+    header = ("phase", "subprocesses", "restarts", "reboots", "deferred", "wall time (s)")
+    rows = [
+        (phase.name, *(str(value) for value in phase[1:5]), f"{phase.wall_time:.0f}")
+        for phase in fleet.phases
+    ]
+    totals = [
+        sum(phase.subprocesses for phase in fleet.phases),
+        sum(phase.restarts for phase in fleet.phases),
+        sum(phase.reboots for phase in fleet.phases),
+        sum(phase.deferred for phase in fleet.phases),
+    ]
+    wall_time = sum(phase.wall_time for phase in fleet.phases)
+    rows.append(("total", *(str(value) for value in totals), f"{wall_time:.0f}"))
+    widths = [max(len(row[index]) for row in [header, *rows]) for index in range(len(header))]
+    lines = [
+        "  ".join(value.ljust(width) for value, width in zip(row, widths))
+        for row in [header, *rows]
+    ]
+    statuses = ", ".join(f"{count} {status}" for status, count in sorted(fleet.statuses.items()))
+    return "\n".join([*lines, "", f"{len(fleet.units)} units: {statuses}"])
+
+
+def main() -> None:
+    """Simulates a fleet and prints its report."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--units", type=int, default=10, help="number of units")
+    parser.add_argument(
+        "--max-concurrent-restarts", type=int, default=1, help="units restarting at once"
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+    fleet = Fleet(args.units, {"max-concurrent-restarts": args.max_concurrent_restarts})
+    run_scenario(fleet, DEFAULT_CHURN)
+    print(format_report(fleet))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+# Copyright 2022 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+import logging
+import unittest
+
+from fleet import Fleet, format_report, orchestrator_data, run_scenario
+
+
+class TestFleet(unittest.TestCase):
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        self.addCleanup(logging.disable, logging.NOTSET)
+
+    def test_given_fleet_when_deployed_then_every_unit_reboots_once_and_is_active(self):
+        fleet = Fleet(3)
+
+        with fleet.phase("deploy"):
+            fleet.deploy()
+
+        self.assertEqual(fleet.phases[0].reboots, 3)
+        self.assertEqual(fleet.statuses, {"active": 3})
+
+    def test_given_one_concurrent_restart_when_orchestrator_joins_then_restarts_are_serialized(
+        self,
+    ):
+        fleet = Fleet(3, {"max-concurrent-restarts": 1})
+        with fleet.phase("deploy"):
+            fleet.deploy()
+
+        with fleet.phase("orchestrator join"):
+            fleet.relate_orchestrator(orchestrator_data("certifier"))
+
+        restart_duration = 2 * 15.0
+        self.assertEqual(fleet.phases[1].restarts, 3)
+        self.assertGreaterEqual(fleet.phases[1].wall_time, 3 * restart_duration)
+        self.assertEqual(fleet.statuses, {"active": 3})
+
+    def test_when_run_scenario_then_report_has_a_row_per_phase_and_totals(self):
+        fleet = Fleet(2, {"max-concurrent-restarts": 2})
+
+        run_scenario(fleet, [{"block-agw-local-ips": False}])
+
+        self.assertEqual(
+            [phase.name for phase in fleet.phases],
+            [
+                "deploy",
+                "orchestrator join",
+                "certificate rotation",
+                "config block-agw-local-ips=False",
+            ],
+        )
+        self.assertEqual(sum(phase.reboots for phase in fleet.phases), 4)
+        report = format_report(fleet)
+        self.assertIn("total", report)
+        self.assertIn("2 units: 2 active", report)
@@ -0,0 +1,133 @@
+# Copyright 2022 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+import pathlib
+import subprocess
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from fakes import InMemoryHost
+
+from agw_installer import BackgroundInstaller, InstallPhases
+from host import SystemHost
+
+STATE_DIR = "/var/lib/magma-access-gateway-operator"
+CHARM_DIR = pathlib.Path("/var/lib/juju/agents/charm")
+
+
+class TestBackgroundInstaller(unittest.TestCase):
+    def setUp(self):
+        self.host = InMemoryHost()
+        self.installer = BackgroundInstaller(
+            self.host, "magma-access-gateway-operator/0", CHARM_DIR
+        )
+
+    def test_when_start_then_installer_runs_in_transient_systemd_unit(self):
+        self.assertTrue(self.installer.start(["magma-access-gateway.install", "--no-reboot"]))
+
+        self.assertEqual(
+            self.host.commands[-1][:4],
+            ["systemd-run", "--unit", "magma-access-gateway-install", "--collect"],
+        )
+        self.assertTrue(self.host.exists(STATE_DIR))
+
+    def test_given_previous_exit_status_when_start_then_exit_status_is_cleared(self):
+        self.host.write_text(f"{STATE_DIR}/install.exit-status", "1")
+
+        self.installer.start(["magma-access-gateway.install"])
+
+        self.assertIsNone(self.installer.exit_status)
+
+    def test_given_systemd_run_fails_when_start_then_false_is_returned(self):
+        with patch.object(self.host, "run", return_value=subprocess.CompletedProcess([], 1)):
+            self.assertFalse(self.installer.start(["magma-access-gateway.install"]))
+
+    def test_given_installer_unit_is_active_when_is_running_then_true_is_returned(self):
+        self.host.services["magma-access-gateway-install"] = "active"
+
+        self.assertTrue(self.installer.is_running)
+
+    def test_given_log_file_when_progress_then_last_non_empty_line_is_returned(self):
+        self.host.write_text(f"{STATE_DIR}/install.log", "Installing packages\nRebooting\n\n")
+
+        self.assertEqual(self.installer.progress, "Rebooting")
+
+    def test_given_no_installation_ran_when_exit_status_then_none_is_returned(self):
+        self.assertIsNone(self.installer.exit_status)
+        self.assertEqual(self.installer.progress, "")
+
+
+class TestBackgroundInstallerScript(unittest.TestCase):
+    def setUp(self):
+        state_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(state_dir.cleanup)
+        self.state_dir = pathlib.Path(state_dir.name) / "state"
+        state_dir_patcher = patch("agw_installer.STATE_DIR", self.state_dir)
+        state_dir_patcher.start()
+        self.addCleanup(state_dir_patcher.stop)
+        self.installer = BackgroundInstaller(
+            SystemHost(), "magma-access-gateway-operator/0", CHARM_DIR
+        )
+
+    def test_when_installation_script_runs_then_output_and_exit_status_are_persisted_and_completion_is_dispatched(  # noqa: E501
+        self,
+    ):
+        self.state_dir.mkdir()
+        bin_dir = self.state_dir / "bin"
+        bin_dir.mkdir()
+        juju_exec = bin_dir / "juju-exec"
+        juju_exec.write_text(f'#!/bin/sh\necho "$@" > {self.state_dir}/dispatched\n')
+        juju_exec.chmod(0o755)
+
+        script = self.installer._script(["sh", "-c", "echo Installing packages; exit 3"])
+        subprocess.run(["/bin/bash", "-c", script], env={"PATH": f"{bin_dir}:/usr/bin:/bin"})
+
+        self.assertEqual(self.installer.exit_status, 3)
+        self.assertEqual(self.installer.progress, "Installing packages")
+        self.assertEqual(
+            (self.state_dir / "dispatched").read_text(),
+            "magma-access-gateway-operator/0 "
+            "JUJU_DISPATCH_PATH=hooks/install_complete /var/lib/juju/agents/charm/dispatch\n",
+        )
+
+
+class TestInstallPhases(unittest.TestCase):
+    def setUp(self):
+        self.host = InMemoryHost(files={"/proc/sys/kernel/random/boot_id": "boot-1\n"})
+        self.phases = InstallPhases(self.host, ["snap-install", "agw-install"])
+
+    def test_given_no_phase_completed_when_next_phase_then_first_phase_is_returned(self):
+        self.assertEqual(self.phases.next_phase, "snap-install")
+
+    def test_given_phase_completed_when_next_phase_then_following_phase_is_returned(self):
+        self.phases.complete("snap-install")
+
+        self.assertTrue(
+            InstallPhases(self.host, ["snap-install", "agw-install"]).is_complete("snap-install")
+        )
+        self.assertEqual(self.phases.next_phase, "agw-install")
+
+    def test_given_all_phases_completed_when_next_phase_then_none_is_returned(self):
+        self.phases.complete("snap-install")
+        self.phases.complete("agw-install")
+
+        self.assertIsNone(self.phases.next_phase)
+
+    def test_given_machine_rebooted_when_completed_in_current_boot_then_false_is_returned(self):
+        self.phases.complete("agw-install")
+        self.assertTrue(self.phases.completed_in_current_boot("agw-install"))
+
+        self.host.write_text("/proc/sys/kernel/random/boot_id", "boot-2\n")
+
+        self.assertFalse(self.phases.completed_in_current_boot("agw-install"))
+        self.assertTrue(self.phases.is_complete("agw-install"))
+
+    def test_when_reset_then_phase_and_following_phases_are_incomplete(self):
+        self.phases.complete("snap-install")
+        self.phases.complete("agw-install")
+
+        self.phases.reset("agw-install")
+
+        self.assertTrue(self.phases.is_complete("snap-install"))
+        self.assertFalse(self.phases.is_complete("agw-install"))
@@ -1,20 +1,60 @@
 # Copyright 2021 Canonical Ltd.
 # See LICENSE file for licensing details.
 
-import os
-import pathlib
-import tempfile
+import json
+import time
 import unittest
-from unittest.mock import Mock, PropertyMock, call, mock_open, patch
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Tuple, Union
+from unittest.mock import Mock, call, patch
 
 import ruamel.yaml
+from fakes import InMemoryHost
 from ops import testing
 from ops.model import ActiveStatus, BlockedStatus, MaintenanceStatus, WaitingStatus
-
-from charm import MagmaAccessGatewayOperatorCharm, install_file
+from tls_helpers import ROOT_CA, start_tls_server
+
+from charm import (
+    ONBOARDING_METRICS_FILE,
+    STARTUP_METRICS_FILE,
+    MagmaAccessGatewayOperatorCharm,
+)
+from command_policy import CommandPolicy, CommandTimeoutError
+from dataplane_tuning import ONLINE_CPUS_FILE
+from health_check import HEALTH_SERVICES
+from interface_mtu import NETPLAN_MTU_FILE
+from maintenance import SUBSCRIBER_TABLE_COMMAND
+from network_config import NETPLAN_NETWORK_FILE
+from onboarding import OnboardingTimeline
+from redis_tuning import REDIS_TEMPLATE
+from rolling_restart import BOOT_ID_FILE
+from sysctl_profile import SYSCTL_FILE
 
 testing.SIMULATE_CAN_CONNECT = True  # type: ignore[attr-defined]
 
+STATE_DIR = "/var/lib/magma-access-gateway-operator"
+PIPELINED_CONFIG_FILE = "/etc/magma/pipelined.yml"
+SNAP_INSTALL = ["snap", "install", "magma-access-gateway", "--classic", "--edge"]
+OVS_GET_OTHER_CONFIG = ["ovs-vsctl", "get", "Open_vSwitch", ".", "other_config"]
+
+
+class OVSHost(InMemoryHost):
+    """In-memory host whose Open vSwitch keeps the settings set with `ovs-vsctl set`."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.other_config: Dict[str, str] = {}
+        self.set_result(OVS_GET_OTHER_CONFIG, stdout="{}\n")
+
+    def run(self, command: List[str], policy: CommandPolicy):
+        if command[:4] == ["ovs-vsctl", "set", "Open_vSwitch", "."]:
+            for setting in command[4:]:
+                key, value = setting.partition(":")[2].split("=", 1)
+                self.other_config[key] = value
+            rendered = ", ".join(f'{key}="{value}"' for key, value in self.other_config.items())
+            self.set_result(OVS_GET_OTHER_CONFIG, stdout=f"{{{rendered}}}\n")
+        return super().run(command, policy)
+
 
 class TestMagmaAccessGatewayOperatorCharm(unittest.TestCase):
     TEST_PIPELINED_CONFIG = """# Pipeline application level configs
@@ -23,29 +63,60 @@ access_control:
   block_agw_local_ips: true"""
 
     def setUp(self):
+        sleep_patcher = patch("time.sleep")
+        sleep_patcher.start()
+        self.addCleanup(sleep_patcher.stop)
+        # Modification times follow `time.time`, which some tests patch
+        self.host = OVSHost(
+            files={BOOT_ID_FILE: "boot-1\n", str(ONLINE_CPUS_FILE): "0-3\n"},
+            clock=lambda: time.time(),
+        )
+        host_patcher = patch.object(MagmaAccessGatewayOperatorCharm, "host", self.host)
+        host_patcher.start()
+        self.addCleanup(host_patcher.stop)
         self.yaml = ruamel.yaml.YAML()
         self.harness = testing.Harness(MagmaAccessGatewayOperatorCharm)
         self.addCleanup(self.harness.cleanup)
         self.harness.begin()
         self.charm = self.harness.charm
 
-    @patch("subprocess.run")
+    ORCHESTRATOR_RELATION_DATA = {
+        "root_ca_certificate": "root_ca_certificate_content",
+        "certifier_pem_certificate": "certifier_pem_certificate_content",
+        "orchestrator_address": "orchestrator.com",
+        "orchestrator_port": "42",
+        "bootstrapper_address": "bootstrapper.com",
+        "bootstrapper_port": "42",
+        "fluentd_address": "fluentd.com",
+        "fluentd_port": "42",
+    }
+
+    def _given_magma_installed(self):
+        self.host.enabled.add("magma@magmad")
+        self.host.write_text(PIPELINED_CONFIG_FILE, self.TEST_PIPELINED_CONFIG)
+
+    def _relate_to_orchestrator(self):
+        relation_id = self.harness.add_relation("magma-orchestrator", "orc8r-nginx-operator")
+        self.harness.add_relation_unit(relation_id, "orc8r-nginx-operator/0")
+        self.harness.update_relation_data(
+            relation_id, "orc8r-nginx-operator", self.ORCHESTRATOR_RELATION_DATA
+        )
+
+    def _background_installation_script(self) -> str:
+        """Returns the script run by the transient installation unit."""
+        for command in self.host.commands:
+            if command[0] == "systemd-run":
+                return command[-1]
+        raise AssertionError("Installation was not started")
+
     def test_given_no_config_provided_when_install_then_snap_is_installed_and_status_is_blocked(
-        self, patch_subprocess_run
+        self,
     ):
         event = Mock()
-        patch_subprocess_run.side_effect = [Mock(returncode=1), Mock(returncode=0)]
         with self.assertLogs() as captured:
             self.charm._on_install(event=event)
 
-        patch_subprocess_run.assert_has_calls(
-            [
-                call(["systemctl", "is-enabled", "magma@magmad"], stdout=-1),
-                call(
-                    ["snap", "install", "magma-access-gateway", "--classic", "--edge"], stdout=-1
-                ),
-            ]
-        )
+        self.assertEqual(self.host.commands, [SNAP_INSTALL])
         self.assertEqual(
             self.charm.unit.status,
             BlockedStatus("Configuration is invalid. Check logs for details"),
@@ -53,48 +124,44 @@ access_control:
         self.assertEqual("sgi interface name is required", captured.records[0].getMessage())
         self.assertEqual("s1 interface name is required", captured.records[1].getMessage())
 
-    @patch("subprocess.run")
-    @patch("charm.open", new_callable=mock_open, read_data=TEST_PIPELINED_CONFIG)
     def test_given_skip_networking_config_provided_when_install_then_snap_is_installed_and_status_is_maintenance(  # noqa: E501
-        self, _, patch_subprocess_run
+        self,
     ):
         event = Mock()
-        patch_subprocess_run.side_effect = [
-            Mock(returncode=1),
-            Mock(returncode=0),
-            Mock(returncode=0),
-            Mock(returncode=0),
-            Mock(returncode=0),
-        ]
+        self.host.write_text(PIPELINED_CONFIG_FILE, self.TEST_PIPELINED_CONFIG)
         self.harness.update_config({"skip-networking": True})
         self.charm._on_install(event=event)
 
-        patch_subprocess_run.assert_has_calls(
-            [
-                call(["systemctl", "is-enabled", "magma@magmad"], stdout=-1),
-                call(
-                    ["snap", "install", "magma-access-gateway", "--classic", "--edge"], stdout=-1
-                ),
-                call(
-                    ["magma-access-gateway.install", "--no-reboot", "--skip-networking"],
-                    stdout=-1,
-                ),
-                call(["shutdown", "--reboot", "+1"], stdout=-1),
-            ]
+        self.assertEqual(self.host.commands[0], SNAP_INSTALL)
+        self.assertIn(
+            "timeout 3600 magma-access-gateway.install --no-reboot --skip-networking > ",
+            self._background_installation_script(),
         )
-
         self.assertEqual(
             self.charm.unit.status,
-            MaintenanceStatus("Rebooting to apply changes"),
+            MaintenanceStatus("Installing AGW"),
         )
 
-    @patch("netifaces.interfaces")
-    @patch("subprocess.run")
-    def test_given_invalid_interfaces_config_when_install_then_status_is_blocked(
-        self, _, patch_interfaces
+    def test_given_snap_install_fails_when_install_then_status_is_blocked_and_agw_is_not_installed(  # noqa: E501
+        self,
     ):
         event = Mock()
-        patch_interfaces.return_value = ["enp0s1", "enp0s2"]
+        self.host.set_result(SNAP_INSTALL, returncode=1)
+        self.harness.update_config({"skip-networking": True})
+
+        with self.assertLogs():
+            self.charm._on_install(event=event)
+
+        self.assertEqual(
+            self.charm.unit.status,
+            BlockedStatus("Failed to install AGW snap. See logs for details"),
+        )
+        self.assertEqual(self.charm._install_phases.next_phase, "snap-install")
+        self.assertNotIn("systemd-run", [command[0] for command in self.host.commands])
+
+    def test_given_invalid_interfaces_config_when_install_then_status_is_blocked(self):
+        event = Mock()
+        self.host.network_interfaces = ["enp0s1", "enp0s2"]
         self.harness.update_config({"sgi": "nosuchinterface", "s1": "bananaphone"})
         with self.assertLogs() as captured:
             self.charm._on_install(event=event)
@@ -106,13 +173,11 @@ access_control:
         self.assertEqual("nosuchinterface interface not found", captured.records[0].getMessage())
         self.assertEqual("bananaphone interface not found", captured.records[1].getMessage())
 
-    @patch("netifaces.interfaces")
-    @patch("subprocess.run")
     def test_given_sgi_ipv4_address_and_no_gateway_in_config_when_install_then_status_is_blocked(
-        self, _, patch_interfaces
+        self,
     ):
         event = Mock()
-        patch_interfaces.return_value = ["enp0s1", "enp0s2"]
+        self.host.network_interfaces = ["enp0s1", "enp0s2"]
         self.harness.update_config({"sgi": "enp0s1", "s1": "enp0s2"})
         self.harness.update_config(
             {
@@ -131,13 +196,11 @@ access_control:
             captured.records[0].getMessage(),
         )
 
-    @patch("netifaces.interfaces")
-    @patch("subprocess.run")
     def test_given_sgi_ipv4_gateway_and_no_address_in_config_when_install_then_status_is_blocked(
-        self, _, patch_interfaces
+        self,
     ):
         event = Mock()
-        patch_interfaces.return_value = ["enp0s1", "enp0s2"]
+        self.host.network_interfaces = ["enp0s1", "enp0s2"]
         self.harness.update_config({"sgi": "enp0s1", "s1": "enp0s2"})
         self.harness.update_config(
             {
@@ -156,13 +219,11 @@ access_control:
             captured.records[0].getMessage(),
         )
 
-    @patch("netifaces.interfaces")
-    @patch("subprocess.run")
     def test_given_sgi_ipv6_address_and_no_gateway_in_config_when_install_then_status_is_blocked(
-        self, _, patch_interfaces
+        self,
     ):
         event = Mock()
-        patch_interfaces.return_value = ["enp0s1", "enp0s2"]
+        self.host.network_interfaces = ["enp0s1", "enp0s2"]
         self.harness.update_config({"sgi": "enp0s1", "s1": "enp0s2"})
         self.harness.update_config(
             {
@@ -181,13 +242,11 @@ access_control:
             captured.records[0].getMessage(),
         )
 
-    @patch("netifaces.interfaces")
-    @patch("subprocess.run")
     def test_given_sgi_ipv6_gateway_and_no_address_in_config_when_install_then_status_is_blocked(
-        self, _, patch_interfaces
+        self,
     ):
         event = Mock()
-        patch_interfaces.return_value = ["enp0s1", "enp0s2"]
+        self.host.network_interfaces = ["enp0s1", "enp0s2"]
         self.harness.update_config({"sgi": "enp0s1", "s1": "enp0s2"})
         self.harness.update_config(
             {
@@ -206,13 +265,9 @@ access_control:
             captured.records[0].getMessage(),
         )
 
-    @patch("netifaces.interfaces")
-    @patch("subprocess.run")
-    def test_given_only_ipv6_sgi_config_when_install_then_status_is_blocked(
-        self, _, patch_interfaces
-    ):
+    def test_given_only_ipv6_sgi_config_when_install_then_status_is_blocked(self):
         event = Mock()
-        patch_interfaces.return_value = ["enp0s1", "enp0s2"]
+        self.host.network_interfaces = ["enp0s1", "enp0s2"]
         self.harness.update_config({"sgi": "enp0s1", "s1": "enp0s2"})
         self.harness.update_config(
             {
@@ -232,13 +287,9 @@ access_control:
             captured.records[0].getMessage(),
         )
 
-    @patch("netifaces.interfaces")
-    @patch("subprocess.run")
-    def test_given_invalid_sgi_ipv4_address_config_when_install_then_status_is_blocked(
-        self, _, patch_interfaces
-    ):
+    def test_given_invalid_sgi_ipv4_address_config_when_install_then_status_is_blocked(self):
         event = Mock()
-        patch_interfaces.return_value = ["enp0s1", "enp0s2"]
+        self.host.network_interfaces = ["enp0s1", "enp0s2"]
         self.harness.update_config({"sgi": "enp0s1", "s1": "enp0s2"})
         self.harness.update_config(
             {
@@ -258,13 +309,11 @@ access_control:
             captured.records[0].getMessage(),
         )
 
-    @patch("netifaces.interfaces")
-    @patch("subprocess.run")
     def test_given_sgi_ipv4_address_missing_netmask_config_when_install_then_status_is_blocked(
-        self, _, patch_interfaces
+        self,
     ):
         event = Mock()
-        patch_interfaces.return_value = ["enp0s1", "enp0s2"]
+        self.host.network_interfaces = ["enp0s1", "enp0s2"]
         self.harness.update_config({"sgi": "enp0s1", "s1": "enp0s2"})
         self.harness.update_config(
             {
@@ -284,13 +333,9 @@ access_control:
             captured.records[0].getMessage(),
         )
 
-    @patch("netifaces.interfaces")
-    @patch("subprocess.run")
-    def test_given_invalid_sgi_ipv4_gateway_config_when_install_then_status_is_blocked(
-        self, _, patch_interfaces
-    ):
+    def test_given_invalid_sgi_ipv4_gateway_config_when_install_then_status_is_blocked(self):
         event = Mock()
-        patch_interfaces.return_value = ["enp0s1", "enp0s2"]
+        self.host.network_interfaces = ["enp0s1", "enp0s2"]
         self.harness.update_config({"sgi": "enp0s1", "s1": "enp0s2"})
         self.harness.update_config(
             {
@@ -310,13 +355,9 @@ access_control:
             captured.records[0].getMessage(),
         )
 
-    @patch("netifaces.interfaces")
-    @patch("subprocess.run")
-    def test_given_invalid_sgi_ipv6_address_config_when_install_then_status_is_blocked(
-        self, _, patch_interfaces
-    ):
+    def test_given_invalid_sgi_ipv6_address_config_when_install_then_status_is_blocked(self):
         event = Mock()
-        patch_interfaces.return_value = ["enp0s1", "enp0s2"]
+        self.host.network_interfaces = ["enp0s1", "enp0s2"]
         self.harness.update_config({"sgi": "enp0s1", "s1": "enp0s2"})
         self.harness.update_config(
             {
@@ -342,13 +383,11 @@ access_control:
             captured.records[0].getMessage(),
         )
 
-    @patch("netifaces.interfaces")
-    @patch("subprocess.run")
     def test_given_sgi_ipv6_address_missing_netmask_config_when_install_then_status_is_blocked(
-        self, _, patch_interfaces
+        self,
     ):
         event = Mock()
-        patch_interfaces.return_value = ["enp0s1", "enp0s2"]
+        self.host.network_interfaces = ["enp0s1", "enp0s2"]
         self.harness.update_config({"sgi": "enp0s1", "s1": "enp0s2"})
         self.harness.update_config(
             {
@@ -374,13 +413,9 @@ access_control:
             captured.records[0].getMessage(),
         )
 
-    @patch("netifaces.interfaces")
-    @patch("subprocess.run")
-    def test_given_invalid_sgi_ipv6_gateway_config_when_install_then_status_is_blocked(
-        self, _, patch_interfaces
-    ):
+    def test_given_invalid_sgi_ipv6_gateway_config_when_install_then_status_is_blocked(self):
         event = Mock()
-        patch_interfaces.return_value = ["enp0s1", "enp0s2"]
+        self.host.network_interfaces = ["enp0s1", "enp0s2"]
         self.harness.update_config({"sgi": "enp0s1", "s1": "enp0s2"})
         self.harness.update_config(
             {
@@ -406,13 +441,9 @@ access_control:
             captured.records[0].getMessage(),
         )
 
-    @patch("netifaces.interfaces")
-    @patch("subprocess.run")
-    def test_given_only_ipv6_s1_config_when_install_then_status_is_blocked(
-        self, _, patch_interfaces
-    ):
+    def test_given_only_ipv6_s1_config_when_install_then_status_is_blocked(self):
         event = Mock()
-        patch_interfaces.return_value = ["enp0s1", "enp0s2"]
+        self.host.network_interfaces = ["enp0s1", "enp0s2"]
         self.harness.update_config({"sgi": "enp0s1", "s1": "enp0s2"})
         self.harness.update_config(
             {
@@ -431,13 +462,9 @@ access_control:
             captured.records[0].getMessage(),
         )
 
-    @patch("netifaces.interfaces")
-    @patch("subprocess.run")
-    def test_given_invalid_s1_ipv4_address_config_when_install_then_status_is_blocked(
-        self, _, patch_interfaces
-    ):
+    def test_given_invalid_s1_ipv4_address_config_when_install_then_status_is_blocked(self):
         event = Mock()
-        patch_interfaces.return_value = ["enp0s1", "enp0s2"]
+        self.host.network_interfaces = ["enp0s1", "enp0s2"]
         self.harness.update_config({"sgi": "enp0s1", "s1": "enp0s2"})
         self.harness.update_config(
             {
@@ -456,13 +483,9 @@ access_control:
             captured.records[0].getMessage(),
         )
 
-    @patch("netifaces.interfaces")
-    @patch("subprocess.run")
-    def test_given_invalid_s1_ipv6_address_config_when_install_then_status_is_blocked(
-        self, _, patch_interfaces
-    ):
+    def test_given_invalid_s1_ipv6_address_config_when_install_then_status_is_blocked(self):
         event = Mock()
-        patch_interfaces.return_value = ["enp0s1", "enp0s2"]
+        self.host.network_interfaces = ["enp0s1", "enp0s2"]
         self.harness.update_config({"sgi": "enp0s1", "s1": "enp0s2"})
         self.harness.update_config(
             {
@@ -486,13 +509,9 @@ access_control:
             captured.records[0].getMessage(),
         )
 
-    @patch("netifaces.interfaces")
-    @patch("subprocess.run")
-    def test_given_invalid_dns_config_when_install_then_status_is_blocked(
-        self, _, patch_interfaces
-    ):
+    def test_given_invalid_dns_config_when_install_then_status_is_blocked(self):
         event = Mock()
-        patch_interfaces.return_value = ["enp0s1", "enp0s2"]
+        self.host.network_interfaces = ["enp0s1", "enp0s2"]
         self.harness.update_config({"sgi": "enp0s1", "s1": "enp0s2"})
         self.harness.update_config(
             {
@@ -511,13 +530,9 @@ access_control:
             captured.records[0].getMessage(),
         )
 
-    @patch("netifaces.interfaces")
-    @patch("subprocess.run")
-    def test_given_dns_config_not_list_when_install_then_status_is_blocked(
-        self, _, patch_interfaces
-    ):
+    def test_given_dns_config_not_list_when_install_then_status_is_blocked(self):
         event = Mock()
-        patch_interfaces.return_value = ["enp0s1", "enp0s2"]
+        self.host.network_interfaces = ["enp0s1", "enp0s2"]
         self.harness.update_config({"sgi": "enp0s1", "s1": "enp0s2"})
         self.harness.update_config(
             {
@@ -536,13 +551,9 @@ access_control:
             captured.records[0].getMessage(),
         )
 
-    @patch("netifaces.interfaces")
-    @patch("subprocess.run")
-    def test_given_dns_config_contains_non_ip_when_install_then_status_is_blocked(
-        self, _, patch_interfaces
-    ):
+    def test_given_dns_config_contains_non_ip_when_install_then_status_is_blocked(self):
         event = Mock()
-        patch_interfaces.return_value = ["enp0s1", "enp0s2"]
+        self.host.network_interfaces = ["enp0s1", "enp0s2"]
         self.harness.update_config({"sgi": "enp0s1", "s1": "enp0s2"})
         self.harness.update_config(
             {
@@ -561,21 +572,10 @@ access_control:
             captured.records[0].getMessage(),
         )
 
-    @patch("subprocess.run")
-    @patch("netifaces.interfaces")
-    @patch("charm.open", new_callable=mock_open, read_data=TEST_PIPELINED_CONFIG)
-    def test_given_valid_static_config_when_install_then_status_is_maintenance(
-        self, _, patch_interfaces, patch_subprocess_run
-    ):
+    def test_given_valid_static_config_when_install_then_status_is_maintenance(self):
         event = Mock()
-        patch_interfaces.return_value = ["enp0s1", "enp0s2"]
-        patch_subprocess_run.side_effect = [
-            Mock(returncode=1),
-            Mock(returncode=0),
-            Mock(returncode=0),
-            Mock(returncode=0),
-            Mock(returncode=0),
-        ]
+        self.host.network_interfaces = ["enp0s1", "enp0s2"]
+        self.host.write_text(PIPELINED_CONFIG_FILE, self.TEST_PIPELINED_CONFIG)
         self.harness.update_config(
             {
                 "sgi": "enp0s1",
@@ -590,61 +590,47 @@ access_control:
         )
         self.charm._on_install(event=event)
 
-        patch_subprocess_run.assert_has_calls(
-            [
-                call(["systemctl", "is-enabled", "magma@magmad"], stdout=-1),
-                call(
-                    ["snap", "install", "magma-access-gateway", "--classic", "--edge"], stdout=-1
-                ),
-                call(
-                    [
-                        "magma-access-gateway.install",
-                        "--no-reboot",
-                        "--dns",
-                        "8.8.8.8",
-                        "208.67.222.222",
-                        "--sgi",
-                        "enp0s1",
-                        "--s1",
-                        "enp0s2",
-                        "--sgi-ipv4-address",
-                        "10.0.0.2/24",
-                        "--sgi-ipv4-gateway",
-                        "10.0.0.1",
-                        "--sgi-ipv6-address",
-                        "2001:0db8:85a3:0000:0000:8a2e:0370:7334/64",
-                        "--sgi-ipv6-gateway",
-                        "2001:0db8:85a3:0000:0000:8a2e:0370:7331",
-                        "--s1-ipv4-address",
-                        "10.1.0.2/24",
-                        "--s1-ipv6-address",
-                        "2002:0db8:85a3:0000:0000:8a2e:0370:7334/64",
-                    ],
-                    stdout=-1,
-                ),
-                call(["shutdown", "--reboot", "+1"], stdout=-1),
-            ]
+        self.assertEqual(self.host.commands[0], SNAP_INSTALL)
+        self.assertIn(
+            " ".join(
+                [
+                    "timeout",
+                    "3600",
+                    "magma-access-gateway.install",
+                    "--no-reboot",
+                    "--dns",
+                    "8.8.8.8",
+                    "208.67.222.222",
+                    "--sgi",
+                    "enp0s1",
+                    "--s1",
+                    "enp0s2",
+                    "--sgi-ipv4-address",
+                    "10.0.0.2/24",
+                    "--sgi-ipv4-gateway",
+                    "10.0.0.1",
+                    "--sgi-ipv6-address",
+                    "2001:0db8:85a3:0000:0000:8a2e:0370:7334/64",
+                    "--sgi-ipv6-gateway",
+                    "2001:0db8:85a3:0000:0000:8a2e:0370:7331",
+                    "--s1-ipv4-address",
+                    "10.1.0.2/24",
+                    "--s1-ipv6-address",
+                    "2002:0db8:85a3:0000:0000:8a2e:0370:7334/64",
+                ]
+            ),
+            self._background_installation_script(),
         )
         self.assertEqual(
             self.charm.unit.status,
-            MaintenanceStatus("Rebooting to apply changes"),
+            MaintenanceStatus("Installing AGW"),
         )
 
-    @patch("subprocess.run")
-    @patch("netifaces.interfaces")
-    @patch("charm.open", new_callable=mock_open, read_data=TEST_PIPELINED_CONFIG)
     def test_given_block_agw_local_ips_config_is_false_when_install_then_unblock_local_ips_flag_is_added_to_the_snap_installation_command(  # noqa: E501
-        self, _, patch_interfaces, patch_subprocess_run
+        self,
     ):
-        event = Mock()
-        patch_interfaces.return_value = ["enp0s1", "enp0s2"]
-        patch_subprocess_run.side_effect = [
-            Mock(returncode=1),
-            Mock(returncode=0),
-            Mock(returncode=0),
-            Mock(returncode=0),
-            Mock(returncode=0),
-        ]
+        self.host.network_interfaces = ["enp0s1", "enp0s2"]
+        self.host.write_text(PIPELINED_CONFIG_FILE, self.TEST_PIPELINED_CONFIG)
         self.harness.update_config(
             {
                 "sgi": "enp0s1",
@@ -652,122 +638,386 @@ access_control:
                 "block-agw-local-ips": False,
             }
         )
-        patch_subprocess_run.assert_has_calls(
-            [
-                call(["systemctl", "is-enabled", "magma@magmad"], stdout=-1),
-                call(
-                    [
-                        "snap",
-                        "install",
-                        "magma-access-gateway",
-                        "--classic",
-                        "--edge",
-                    ],
-                    stdout=-1,
-                ),
-                call(
-                    [
-                        "magma-access-gateway.install",
-                        "--no-reboot",
-                        "--dns",
-                        "8.8.8.8",
-                        "208.67.222.222",
-                        "--unblock-local-ips",
-                        "--sgi",
-                        "enp0s1",
-                        "--s1",
-                        "enp0s2",
-                    ],
-                    stdout=-1,
-                ),
-                call(["shutdown", "--reboot", "+1"], stdout=-1),
-            ]
+
+        self.assertIn(
+            " ".join(
+                [
+                    "timeout",
+                    "3600",
+                    "magma-access-gateway.install",
+                    "--no-reboot",
+                    "--dns",
+                    "8.8.8.8",
+                    "208.67.222.222",
+                    "--unblock-local-ips",
+                    "--sgi",
+                    "enp0s1",
+                    "--s1",
+                    "enp0s2",
+                ]
+            ),
+            self._background_installation_script(),
         )
+
+    def test_given_installation_is_running_when_install_then_installation_is_not_started_again(
+        self,
+    ):
+        event = Mock()
+        self.host.services["magma-access-gateway-install"] = "active"
+        self.host.write_text(f"{STATE_DIR}/install.log", "Installing packages\n\n")
+
         self.charm._on_install(event=event)
 
-    @patch("subprocess.run")
-    @patch("netifaces.interfaces")
-    def test_given_magma_service_not_running_when_start_then_status_is_unchanged(
-        self, _, patch_subprocess_run
+        self.assertEqual(self.host.commands, [])
+        self.assertEqual(
+            self.charm.unit.status,
+            MaintenanceStatus("Installing AGW: Installing packages"),
+        )
+
+    def test_given_installation_succeeded_when_install_complete_then_machine_is_rebooted(self):
+        self.host.write_text(f"{STATE_DIR}/install.exit-status", "0\n")
+
+        self.charm.on.install_complete.emit()
+
+        self.assertEqual(self.host.commands, [["shutdown", "--reboot", "+1"]])
+        self.assertEqual(
+            self.charm.unit.status,
+            MaintenanceStatus("Rebooting to apply changes"),
+        )
+        self.assertFalse(self.host.exists(f"{STATE_DIR}/install.exit-status"))
+
+    def test_given_outside_of_maintenance_window_when_install_complete_then_machine_is_rebooted(  # noqa: E501
+        self,
+    ):
+        self.harness.disable_hooks()
+        self.harness.update_config({"maintenance-window": self._maintenance_window_later_today()})
+        self.harness.enable_hooks()
+        self.host.write_text(f"{STATE_DIR}/install.exit-status", "0\n")
+
+        self.charm.on.install_complete.emit()
+
+        self.assertEqual(self.host.commands, [["shutdown", "--reboot", "+1"]])
+        self.assertEqual(self.charm._restart_lock.pending_operation, "")
+
+    def test_given_drain_enabled_when_install_complete_then_machine_is_rebooted_without_draining(  # noqa: E501
+        self,
+    ):
+        self.harness.disable_hooks()
+        self.harness.update_config({"drain-timeout": 600, "drain-session-threshold": 1})
+        self.harness.enable_hooks()
+        self.host.write_text(f"{STATE_DIR}/install.exit-status", "0\n")
+
+        self.charm.on.install_complete.emit()
+
+        self.assertEqual(self.host.commands, [["shutdown", "--reboot", "+1"]])
+
+    def test_given_install_reboot_times_out_when_install_complete_then_reboot_is_retried_on_update_status(  # noqa: E501
+        self,
+    ):
+        self.host.write_text(f"{STATE_DIR}/install.exit-status", "0\n")
+        self.host.results[("shutdown", "--reboot", "+1")] = CommandTimeoutError(
+            ["shutdown", "--reboot", "+1"], 30
+        )
+        self.charm.on.install_complete.emit()
+        self.assertEqual(
+            self.charm.unit.status, WaitingStatus("Timed out trying to reboot. Will retry")
+        )
+        del self.host.results[("shutdown", "--reboot", "+1")]
+
+        self.charm.on.update_status.emit()
+
+        self.assertEqual(self.host.commands[-1], ["shutdown", "--reboot", "+1"])
+        self.assertEqual(self.charm._restart_lock.pending_operation, "")
+
+    def test_given_installation_failed_when_install_complete_then_status_is_blocked(self):
+        self.host.write_text(f"{STATE_DIR}/install.exit-status", "1\n")
+
+        self.charm.on.install_complete.emit()
+
+        self.assertEqual(self.host.commands, [])
+        self.assertEqual(
+            self.charm.unit.status,
+            BlockedStatus("Installation script failed. See logs for details"),
+        )
+
+    def test_given_installation_timed_out_when_install_complete_then_status_is_blocked(self):
+        self.host.write_text(f"{STATE_DIR}/install.exit-status", "124\n")
+
+        self.charm.on.install_complete.emit()
+
+        self.assertEqual(self.host.commands, [])
+        self.assertEqual(
+            self.charm.unit.status,
+            BlockedStatus("AGW installation timed out. See logs for details"),
+        )
+
+    def test_given_installation_completion_was_not_dispatched_when_install_then_machine_is_rebooted(  # noqa: E501
+        self,
     ):
         event = Mock()
-        expected_status = self.charm.unit.status
-        completed_process = Mock(returncode=1)
-        patch_subprocess_run.return_value = completed_process
+        self.host.write_text(f"{STATE_DIR}/install.exit-status", "0\n")
 
-        self.charm._on_start(event=event)
+        self.charm._on_install(event=event)
 
-        patch_subprocess_run.assert_has_calls(
-            [
-                call(
-                    ["systemctl", "is-active", "magma@magmad"],
-                    stdout=-1,
-                ),
-            ]
+        self.assertEqual(self.host.commands[-1], ["shutdown", "--reboot", "+1"])
+        self.assertEqual(
+            self.charm.unit.status,
+            MaintenanceStatus("Rebooting to apply changes"),
+        )
+
+    def test_given_installation_failed_after_snap_was_installed_when_install_then_snap_is_not_installed_again(  # noqa: E501
+        self,
+    ):
+        event = Mock()
+        self.host.write_text(PIPELINED_CONFIG_FILE, self.TEST_PIPELINED_CONFIG)
+        self.harness.disable_hooks()
+        self.harness.update_config({"skip-networking": True})
+        self.harness.enable_hooks()
+        self.charm._on_install(event=event)
+        self.host.write_text(f"{STATE_DIR}/install.exit-status", "1\n")
+        self.charm.on.install_complete.emit()
+        self.host.commands.clear()
+
+        self.charm._on_install(event=event)
+
+        self.assertNotIn(SNAP_INSTALL, self.host.commands)
+        self.assertIn(
+            "magma-access-gateway.install --no-reboot --skip-networking",
+            self._background_installation_script(),
         )
+        self.assertEqual(self.charm.unit.status, MaintenanceStatus("Installing AGW"))
+
+    def test_given_agw_installed_and_machine_not_rebooted_when_install_then_machine_is_rebooted(
+        self,
+    ):
+        event = Mock()
+        self.harness.disable_hooks()
+        self.harness.update_config({"skip-networking": True})
+        self.harness.enable_hooks()
+        for phase in ["snap-install", "agw-install"]:
+            self.charm._install_phases.complete(phase)
+
+        self.charm._on_install(event=event)
+
+        self.assertEqual(self.host.commands, [["shutdown", "--reboot", "+1"]])
+        self.assertEqual(self.charm.unit.status, MaintenanceStatus("Rebooting to apply changes"))
+
+    def test_given_snap_installation_times_out_when_install_then_status_is_waiting_and_event_is_deferred(  # noqa: E501
+        self,
+    ):
+        event = Mock()
+        self.host.results[tuple(SNAP_INSTALL)] = CommandTimeoutError(SNAP_INSTALL, 600)
+
+        self.charm._on_install(event=event)
+
         self.assertEqual(
             self.charm.unit.status,
-            expected_status,
+            WaitingStatus("Timed out running `snap`. Will retry"),
         )
+        event.defer.assert_called_once()
 
-    @patch("subprocess.run")
-    @patch("netifaces.interfaces")
-    def test_given_magma_service_running_when_start_then_status_is_active(
-        self, _, patch_subprocess_run
+    def test_given_systemctl_query_times_out_when_start_then_status_is_waiting_and_event_is_deferred(  # noqa: E501
+        self,
     ):
+        self._given_magma_installed()
+        event = Mock()
+        timeout = CommandTimeoutError(["systemctl", "is-active", "magma@magmad"], 10)
+
+        with patch.object(self.host, "is_active", side_effect=timeout):
+            self.charm._on_start(event=event)
+
+        self.assertEqual(
+            self.charm.unit.status,
+            WaitingStatus("Timed out running `systemctl`. Will retry"),
+        )
+        event.defer.assert_called_once()
+
+    def test_given_magma_service_not_running_when_start_then_status_is_unchanged(self):
+        self._given_magma_installed()
         event = Mock()
-        completed_process = Mock(returncode=0)
-        patch_subprocess_run.return_value = completed_process
+        expected_status = self.charm.unit.status
 
         self.charm._on_start(event=event)
 
-        patch_subprocess_run.assert_has_calls(
-            [
-                call(
-                    ["systemctl", "is-active", "magma@magmad"],
-                    stdout=-1,
-                ),
-            ]
+        event.defer.assert_called_once()
+        self.assertEqual(
+            self.charm.unit.status,
+            expected_status,
         )
+
+    def test_given_magma_service_running_when_start_then_status_is_active(self):
+        self._given_magma_installed()
+        event = Mock()
+        self.host.services["magma@magmad"] = "active"
+
+        self.charm._on_start(event=event)
+
+        event.defer.assert_not_called()
         self.assertEqual(
             self.charm.unit.status,
             ActiveStatus(),
         )
 
-    @patch("subprocess.check_output")
-    @patch("subprocess.run")
+    def _set_health(self, carriers: dict, failed: tuple = ()):
+        self._given_magma_installed()
+        self.host.network_interfaces = ["eth0", "eth1"]
+        for service in HEALTH_SERVICES:
+            self.host.services[service] = "failed" if service in failed else "active"
+        for interface, carrier in carriers.items():
+            self.host.write_text(f"/sys/class/net/{interface}/carrier", f"{carrier}\n")
+
+    def test_given_services_active_and_links_up_when_update_status_then_status_is_active(self):
+        self._set_health({"eth0": 1, "eth1": 1})
+        self.harness.charm.unit.status = ActiveStatus()
+
+        self.harness.charm.on.update_status.emit()
+
+        self.assertEqual(self.harness.charm.unit.status, ActiveStatus())
+
+    def test_given_failed_service_when_update_status_then_status_is_blocked(self):
+        self._set_health({"eth0": 1, "eth1": 1}, failed=("magma@mme",))
+        self.harness.charm.unit.status = ActiveStatus()
+
+        self.harness.charm.on.update_status.emit()
+
+        self.assertEqual(
+            self.harness.charm.unit.status, BlockedStatus("Magma services failed: magma@mme")
+        )
+
+    def test_given_s1_link_down_when_update_status_then_status_is_blocked(self):
+        self._set_health({"eth0": 1, "eth1": 0})
+        self.harness.charm.unit.status = ActiveStatus()
+
+        self.harness.charm.on.update_status.emit()
+
+        self.assertEqual(
+            self.harness.charm.unit.status, BlockedStatus("No carrier on s1 interface (eth1)")
+        )
+
+    def test_given_link_back_up_when_update_status_then_blocked_status_is_cleared(self):
+        self._set_health({"eth0": 1, "eth1": 0})
+        self.harness.charm.unit.status = ActiveStatus()
+        self.harness.charm.on.update_status.emit()
+        self._set_health({"eth1": 1})
+
+        self.harness.charm.on.update_status.emit()
+
+        self.assertEqual(self.harness.charm.unit.status, ActiveStatus())
+
+    def test_given_status_set_by_another_hook_when_update_status_then_status_is_unchanged(self):
+        status = BlockedStatus("Configuration is invalid. Check logs for details")
+        self.harness.charm.unit.status = status
+
+        with patch.object(self.host, "active_states") as patch_active_states:
+            self.harness.charm.on.update_status.emit()
+
+        patch_active_states.assert_not_called()
+        self.assertEqual(self.harness.charm.unit.status, status)
+
+    @staticmethod
+    def _maintenance_window_later_today() -> str:
+        now = datetime.now(timezone.utc)
+        return f"{now + timedelta(hours=2):%H:%M}-{now + timedelta(hours=3):%H:%M}"
+
+    def test_given_outside_of_maintenance_window_when_reboot_requested_then_reboot_waits_for_window(  # noqa: E501
+        self,
+    ):
+        self.harness.disable_hooks()
+        self.harness.update_config({"maintenance-window": self._maintenance_window_later_today()})
+        self.harness.enable_hooks()
+
+        self.charm._restart_lock.request("reboot")
+
+        self.assertEqual(self.host.commands, [])
+        self.assertEqual(
+            self.charm.unit.status, WaitingStatus("Waiting for maintenance window to reboot")
+        )
+
+    @patch("time.time", Mock(return_value=1000.0))
+    def test_given_active_sessions_above_threshold_when_reboot_requested_then_status_shows_drain(
+        self,
+    ):
+        self.host.set_result(
+            SUBSCRIBER_TABLE_COMMAND,
+            stdout="IMSI001010000000001\nIMSI001010000000002\nIMSI001010000000003\n",
+        )
+        self.harness.disable_hooks()
+        self.harness.update_config({"drain-timeout": 600, "drain-session-threshold": 1})
+        self.harness.enable_hooks()
+
+        self.charm._restart_lock.request("reboot")
+
+        self.assertEqual(self.host.commands, [SUBSCRIBER_TABLE_COMMAND])
+        self.assertEqual(
+            self.charm.unit.status,
+            WaitingStatus("Draining before reboot: 3 active sessions, 600s left"),
+        )
+
+    def test_given_zero_drain_timeout_and_threshold_when_reboot_requested_then_reboot_runs(self):
+        self.harness.disable_hooks()
+        self.harness.update_config({"drain-timeout": 0, "drain-session-threshold": 0})
+        self.harness.enable_hooks()
+
+        self.charm._restart_lock.request("reboot")
+
+        self.assertEqual(self.host.commands, [["shutdown", "--reboot", "+1"]])
+
+    def test_given_negative_drain_timeout_when_reboot_requested_then_status_is_blocked(self):
+        self.harness.disable_hooks()
+        self.harness.update_config({"drain-timeout": -1})
+        self.harness.enable_hooks()
+
+        self.charm._restart_lock.request("reboot")
+
+        self.assertEqual(self.host.commands, [])
+        self.assertEqual(
+            self.charm.unit.status,
+            BlockedStatus("Configuration is invalid. Check logs for details"),
+        )
+
+    @patch("time.time")
+    def test_given_drain_timed_out_when_update_status_then_pending_reboot_runs(self, patch_time):
+        self.host.set_result(SUBSCRIBER_TABLE_COMMAND, stdout="IMSI001010000000001\n")
+        patch_time.return_value = 1000.0
+        self.harness.disable_hooks()
+        self.harness.update_config({"drain-timeout": 600})
+        self.harness.enable_hooks()
+        self.charm._restart_lock.request("reboot")
+        patch_time.return_value = 1601.0
+
+        self.harness.charm.on.update_status.emit()
+
+        self.assertEqual(self.host.commands[-1], ["shutdown", "--reboot", "+1"])
+        self.assertEqual(self.charm._restart_lock.pending_operation, "")
+
     def test_given_magma_service_running_when_get_access_gateway_secrets_action_then_hardware_id_and_challenge_key_are_returned(  # noqa: E501
-        self, patch_subprocess_run, patched_check_output
+        self,
     ):
-        completed_process = Mock(returncode=0)
-        patch_subprocess_run.return_value = completed_process
         test_hw_id = "1234-abc-5678"
         test_challenge_key = "whatever"
         action_event = Mock()
-        patched_check_output.return_value = f"""Hardware ID
+        gateway_info = f"""Hardware ID
 ------------
 {test_hw_id}
 
 Challenge key
 -----------
 {test_challenge_key}
-""".encode(
-            "utf-8"
-        )
+"""
+        self.host.services["magma@magmad"] = "active"
+        self.host.set_result(["show_gateway_info.py"], stdout=gateway_info)
 
         self.charm._on_get_access_gateway_secrets(action_event)
 
+        self.assertEqual(self.host.commands, [["show_gateway_info.py"]])
         self.assertEqual(
             action_event.set_results.call_args,
             call({"hardware-id": test_hw_id, "challenge-key": test_challenge_key}),
         )
 
-    @patch("subprocess.run")
     def test_given_magma_service_not_running_when_get_access_gateway_secrets_action_then_action_fails(  # noqa: E501
-        self, patch_subprocess_run
+        self,
     ):
-        completed_process = Mock(returncode=1)
-        patch_subprocess_run.return_value = completed_process
         action_event = Mock()
 
         self.charm._on_get_access_gateway_secrets(action_event)
@@ -777,15 +1027,28 @@ Challenge key
             call("Magma is not running! Please start Magma and try again."),
         )
 
-    @patch("subprocess.check_output")
-    @patch("subprocess.run")
+    def test_given_magma_service_status_times_out_when_get_access_gateway_secrets_action_then_action_fails(  # noqa: E501
+        self,
+    ):
+        timeout = CommandTimeoutError(["systemctl", "is-active", "magma@magmad"], 10)
+        action_event = Mock()
+
+        with patch.object(self.host, "is_active", side_effect=timeout):
+            self.charm._on_get_access_gateway_secrets(action_event)
+
+        self.assertEqual(
+            action_event.fail.call_args,
+            call(
+                "Failed to get Magma Access Gateway secrets: Command "
+                "`systemctl is-active magma@magmad` timed out after 10 seconds"
+            ),
+        )
+
     def test_given_magma_service_running_but_gateway_info_doesnt_return_anything_when_get_access_gateway_secrets_action_then_action_fails(  # noqa: E501
-        self, patch_subprocess_run, patched_check_output
+        self,
     ):
-        completed_process = Mock(returncode=0)
-        patch_subprocess_run.return_value = completed_process
+        self.host.services["magma@magmad"] = "active"
         action_event = Mock()
-        patched_check_output.return_value = "".encode("utf-8")
 
         self.charm._on_get_access_gateway_secrets(action_event)
 
@@ -794,22 +1057,18 @@ Challenge key
             call("Failed to get Magma Access Gateway secrets!"),
         )
 
-    @patch("subprocess.check_output")
-    @patch("subprocess.run")
     def test_given_magma_service_running_but_gateway_info_doesnt_return_values_for_secrets_when_get_access_gateway_secrets_action_then_action_fails(  # noqa: E501
-        self, patch_subprocess_run, patched_check_output
+        self,
     ):
-        completed_process = Mock(returncode=0)
-        patch_subprocess_run.return_value = completed_process
         action_event = Mock()
-        patched_check_output.return_value = """Hardware ID
+        gateway_info = """Hardware ID
 ------------
 
 Challenge key
 -----------
-""".encode(
-            "utf-8"
-        )
+"""
+        self.host.services["magma@magmad"] = "active"
+        self.host.set_result(["show_gateway_info.py"], stdout=gateway_info)
 
         self.charm._on_get_access_gateway_secrets(action_event)
 
@@ -818,11 +1077,10 @@ Challenge key
             call("Failed to get Magma Access Gateway secrets!"),
         )
 
-    @patch("subprocess.run")
     def test_given_not_successful_post_install_checks_when_post_install_checks_action_then_error_message_is_set_in_action_results(  # noqa: E501
-        self, patch_subprocess_run
+        self,
     ):
-        patch_subprocess_run.return_value = Mock(returncode=1)
+        self.host.set_result(["magma-access-gateway.post-install"], returncode=1)
         failed_msg = "Post-installation checks failed. For more information, please check journalctl logs."  # noqa: E501
         action_event = Mock()
 
@@ -833,149 +1091,231 @@ Challenge key
             call({"post-install-checks-output": failed_msg}),
         )
 
-    @patch("subprocess.run")
     def test_given_successful_post_install_checks_when_post_install_checks_action_then_success_message_is_set_in_action_results(  # noqa: E501
-        self, patch_subprocess_run
+        self,
     ):
-        patch_subprocess_run.return_value = Mock(returncode=0)
         successful_msg = "Magma AGW post-installation checks finished successfully."
         action_event = Mock()
 
         self.charm._on_post_install_checks_action(event=action_event)
 
+        self.assertEqual(self.host.commands, [["magma-access-gateway.post-install"]])
         self.assertEqual(
             action_event.set_results.call_args,
             call({"post-install-checks-output": successful_msg}),
         )
 
-    @patch("subprocess.run")
-    @patch("charm.open", new_callable=mock_open, read_data=TEST_PIPELINED_CONFIG)
-    def test_given_magma_service_enabled_when_install_then_nothing_done(
-        self, _, patch_subprocess_run
-    ):
+    def test_given_magma_service_enabled_when_install_then_nothing_done(self):
         event = Mock()
-        patch_subprocess_run.side_effect = [Mock(returncode=0)]
+        self.host.enabled.add("magma@magmad")
 
         self.charm._on_install(event=event)
 
-        patch_subprocess_run.assert_has_calls(
-            [
-                call(
-                    ["systemctl", "is-enabled", "magma@magmad"],
-                    stdout=-1,
-                ),
-            ]
-        )
+        self.assertEqual(self.host.commands, [])
 
-    @patch("subprocess.run")
-    @patch("charm.Path")
     def test_given_certifier_pem_not_stored_when_certifier_pem_changed_then_remove_agw_certs_not_called(  # noqa: E501
-        self, patch_path, _
+        self,
     ):
-        patch_path.return_value.exists.return_value = False
-        relation_id = self.harness.add_relation("magma-orchestrator", "orc8r-nginx-operator")
-        self.harness.add_relation_unit(relation_id, "orc8r-nginx-operator/0")
-        self.harness.update_relation_data(
-            relation_id,
-            "orc8r-nginx-operator",
-            {
-                "root_ca_certificate": "root_ca_certificate_content",
-                "certifier_pem_certificate": "certifier_pem_certificate_content",
-                "orchestrator_address": "orchestrator.com",
-                "orchestrator_port": "42",
-                "bootstrapper_address": "bootstrapper.com",
-                "bootstrapper_port": "42",
-                "fluentd_address": "fluentd.com",
-                "fluentd_port": "42",
-            },
-        )
-        self.assertNotIn(call().unlink(), patch_path.mock_calls)
-
-    @patch("subprocess.run")
-    @patch("charm.Path")
+        self.host.write_text("/var/opt/magma/gateway.key", "key")
+
+        self._relate_to_orchestrator()
+
+        self.assertIn("/var/opt/magma/gateway.key", self.host.files)
+
     def test_given_certifier_pem_stored_when_certifier_pem_changed_then_remove_agw_certs_called(
-        self, patch_path, _
-    ):
-        relation_id = self.harness.add_relation("magma-orchestrator", "orc8r-nginx-operator")
-        self.harness.add_relation_unit(relation_id, "orc8r-nginx-operator/0")
-        self.harness.update_relation_data(
-            relation_id,
-            "orc8r-nginx-operator",
-            {
-                "root_ca_certificate": "root_ca_certificate_content",
-                "certifier_pem_certificate": "certifier_pem_certificate_content",
-                "orchestrator_address": "orchestrator.com",
-                "orchestrator_port": "42",
-                "bootstrapper_address": "bootstrapper.com",
-                "bootstrapper_port": "42",
-                "fluentd_address": "fluentd.com",
-                "fluentd_port": "42",
-            },
-        )
-        self.assertIn(call().unlink(), patch_path.mock_calls)
-
-    @patch("charm.Path")
-    @patch("subprocess.run")
-    def test_when_orchestrator_available_event_then_configuration_is_installed(
-        self, patch_subprocess_run, patch_path
+        self,
     ):
-        relation_id = self.harness.add_relation("magma-orchestrator", "orc8r-nginx-operator")
-        self.harness.add_relation_unit(relation_id, "orc8r-nginx-operator/0")
-        self.harness.update_relation_data(
-            relation_id,
-            "orc8r-nginx-operator",
+        self.host.write_text(
+            "/var/opt/magma/tmp/certs/certifier.pem", "old_certifier_pem_certificate_content"
+        )
+        self.host.write_text("/var/opt/magma/gateway.key", "key")
+
+        self._relate_to_orchestrator()
+
+        self.assertNotIn("/var/opt/magma/gateway.key", self.host.files)
+
+    def test_when_orchestrator_available_event_then_configuration_is_installed(self):
+        self.host.services.update({"magma@magmad": "active", "magma@mme": "active"})
+        self.host.after = {"magma@mme": ["magma@magmad"]}
+
+        self._relate_to_orchestrator()
+
+        self.assertLessEqual(
             {
-                "root_ca_certificate": "root_ca_certificate_content",
-                "certifier_pem_certificate": "certifier_pem_certificate_content",
-                "orchestrator_address": "orchestrator.com",
-                "orchestrator_port": "42",
-                "bootstrapper_address": "bootstrapper.com",
-                "bootstrapper_port": "42",
-                "fluentd_address": "fluentd.com",
-                "fluentd_port": "42",
-            },
-        )
-
-        mock_calls = patch_path.mock_calls
-        expected_calls = [
-            call("/var/opt/magma/tmp/certs/rootCA.pem"),
-            call().write_text("root_ca_certificate_content"),
-            call("/var/opt/magma/tmp/certs/certifier.pem"),
-            call().write_text("root_ca_certificate_content"),
-            call("/var/opt/magma/configs/control_proxy.yml"),
-            call().write_text(
-                "cloud_address: orchestrator.com\n"
-                "cloud_port: 42\n"
-                "bootstrap_address: bootstrapper.com\n"
-                "bootstrap_port: 42\n"
-                "fluentd_address: fluentd.com\n"
-                "fluentd_port: 42\n"
-                "\n"
-                "rootca_cert: /var/opt/magma/tmp/certs/rootCA.pem\n"
-            ),
-        ]
-        self.assertTrue(all(mock_call in mock_calls for mock_call in expected_calls))
+                "/var/opt/magma/tmp/certs/rootCA.pem": "root_ca_certificate_content",
+                "/var/opt/magma/tmp/certs/certifier.pem": "certifier_pem_certificate_content",
+                "/var/opt/magma/configs/control_proxy.yml": (
+                    "cloud_address: orchestrator.com\n"
+                    "cloud_port: 42\n"
+                    "bootstrap_address: bootstrapper.com\n"
+                    "bootstrap_port: 42\n"
+                    "fluentd_address: fluentd.com\n"
+                    "fluentd_port: 42\n"
+                    "\n"
+                    "rootca_cert: /var/opt/magma/tmp/certs/rootCA.pem\n"
+                ),
+            }.items(),
+            self.host.files.items(),
+        )
+        self.assertEqual(
+            self.host.transitions,
+            [
+                ("magma@magmad", "active", "deactivating"),
+                ("magma@magmad", "deactivating", "inactive"),
+                ("magma@mme", "active", "deactivating"),
+                ("magma@mme", "deactivating", "inactive"),
+                ("magma@magmad", "inactive", "activating"),
+                ("magma@magmad", "activating", "active"),
+                ("magma@mme", "inactive", "activating"),
+                ("magma@mme", "activating", "active"),
+            ],
+        )
+        self.assertEqual(
+            set(self.charm._stored.startup_timings["services"]), {"magma@magmad", "magma@mme"}
+        )
+
+    @patch("time.time", Mock(return_value=1000.0))
+    def test_given_gateway_not_bootstrapped_when_orchestrator_available_event_then_status_reports_bootstrap_wait(  # noqa: E501
+        self,
+    ):
+        self._given_magma_installed()
+        self.host.services["magma@magmad"] = "active"
+
+        self._relate_to_orchestrator()
+
+        self.assertEqual(
+            self.charm.unit.status, ActiveStatus("Waiting for orchestrator bootstrap")
+        )
 
-        patch_subprocess_run.assert_has_calls(
+    @patch("time.time")
+    def test_given_gateway_bootstraps_and_checks_in_when_update_status_then_onboarding_stage_durations_are_returned(  # noqa: E501
+        self, patch_time
+    ):
+        self._set_health({"eth0": 1, "eth1": 1})
+        patch_time.return_value = 1000.0
+        relation_id = self.harness.add_relation("magma-orchestrator", "orc8r-nginx-operator")
+        self.harness.add_relation_unit(relation_id, "orc8r-nginx-operator/0")
+        patch_time.return_value = 1010.0
+        self.harness.update_relation_data(
+            relation_id, "orc8r-nginx-operator", self.ORCHESTRATOR_RELATION_DATA
+        )
+        patch_time.return_value = 1040.0
+        self.host.write_text("/var/opt/magma/gateway.crt", "certificate")
+        self.harness.charm.on.update_status.emit()
+        self.assertEqual(self.charm.unit.status, ActiveStatus("Waiting for orchestrator check-in"))
+        patch_time.return_value = 1700.0
+        self.host.set_result(
             [
-                call(
-                    ["service", "magma@*", "stop"],
-                    stdout=-1,
-                ),
-                call(
-                    ["service", "magma@magmad", "start"],
-                    stdout=-1,
-                ),
-            ]
+                "journalctl",
+                "--unit",
+                "magma@magmad",
+                "--since",
+                "@1040",
+                "--grep",
+                "Checkin Successful",
+                "--output",
+                "short-unix",
+                "--quiet",
+                "--no-pager",
+            ],
+            stdout=(
+                "1100.000000 agw magmad[42]: INFO:root:Checkin Successful! "
+                "Successfully sent states to the cloud!\n"
+                "1160.000000 agw magmad[42]: INFO:root:Checkin Successful! "
+                "Successfully sent states to the cloud!\n"
+            ),
+        )
+        event = Mock()
+
+        self.harness.charm.on.update_status.emit()
+        self.charm._on_get_onboarding_timings_action(event)
+
+        self.assertEqual(self.charm.unit.status, ActiveStatus())
+        event.set_results.assert_called_once_with(
+            {
+                "stages": {
+                    "relation-data": "10.0",
+                    "config-install": "0.0",
+                    "restart": "0.0",
+                    "bootstrap": "30.0",
+                    "check-in": "60.0",
+                },
+                "total": "100.0",
+            }
+        )
+        self.assertIn(
+            "magma_onboarding_duration_seconds 100.0\n",
+            self.host.files[ONBOARDING_METRICS_FILE],
+        )
+
+    @patch("time.time", Mock(return_value=1100.0))
+    def test_given_magma_restarted_after_config_install_when_magma_restarted_at_then_startup_completion_time_is_returned(  # noqa: E501
+        self,
+    ):
+        self.host.services["magma@magmad"] = "active"
+        self.charm._stored.startup_timings = {
+            "services": {},
+            "total": 20.0,
+            "completed_at": 1050.0,
+        }
+        timeline = OnboardingTimeline({"relation-data": 1000.0, "config-install": 1030.0})
+
+        self.assertEqual(self.charm._magma_restarted_at(timeline), 1050.0)
+
+    @patch("time.time", Mock(return_value=1100.0))
+    def test_given_magma_back_through_a_reboot_when_magma_restarted_at_then_current_time_is_returned(  # noqa: E501
+        self,
+    ):
+        self.host.services["magma@magmad"] = "active"
+        self.charm._stored.startup_timings = {"services": {}, "total": 20.0, "completed_at": 900.0}
+        timeline = OnboardingTimeline({"relation-data": 1000.0, "config-install": 1030.0})
+
+        self.assertEqual(self.charm._magma_restarted_at(timeline), 1100.0)
+
+    def test_given_no_orchestrator_data_when_get_onboarding_timings_action_then_action_fails(
+        self,
+    ):
+        event = Mock()
+
+        self.charm._on_get_onboarding_timings_action(event)
+
+        event.fail.assert_called_once_with("No orchestrator data received yet.")
+
+    def test_given_orchestrator_configuration_not_installed_when_probe_orchestrator_action_then_action_fails(  # noqa: E501
+        self,
+    ):
+        event = Mock(params={"samples": 5, "timeout": 5})
+
+        self.charm._on_probe_orchestrator_action(event)
+
+        event.fail.assert_called_once_with("Orchestrator configuration is not installed yet.")
+
+    def test_given_installed_orchestrator_configuration_when_probe_orchestrator_action_then_percentiles_of_each_endpoint_are_returned(  # noqa: E501
+        self,
+    ):
+        port = start_tls_server(self)
+        self.host.write_text(
+            "/var/opt/magma/configs/control_proxy.yml",
+            self.charm._generate_config("localhost", port, "localhost", port, "localhost", port),
         )
+        self.host.write_text("/var/opt/magma/tmp/certs/rootCA.pem", ROOT_CA)
+        event = Mock(params={"samples": 3, "timeout": 2})
+
+        self.charm._on_probe_orchestrator_action(event)
+
+        results = event.set_results.call_args.args[0]
+        self.assertEqual(list(results), ["orchestrator", "bootstrapper", "fluentd"])
+        for result in results.values():
+            self.assertEqual(result["endpoint"], f"localhost:{port}")
+            self.assertEqual(result["failures"], "0")
+            self.assertRegex(result["tls"], r"^p50=[0-9.]+ms p90=[0-9.]+ms p99=[0-9.]+ms$")
 
-    @patch("netifaces.ifaddresses")
     def test_given_eth1_interface_is_available_and_unit_is_leader_when_lte_core_relation_joined_then_then_core_information_is_set(  # noqa: E501
         self,
-        patch_ip_address,
     ):
         self.harness.set_leader(True)
-        patch_ip_address.return_value = {2: [{"addr": "0.0.0.0"}]}
+        self.host.network_interfaces = ["eth0", "eth1"]
+        self.host.addresses = {"eth1": ["0.0.0.0"]}
         relation_id = self.harness.add_relation("lte-core", "srs-enb-ue-operator")
         self.harness.add_relation_unit(relation_id, "srs-enb-ue-operator/0")
         self.assertEqual(
@@ -983,13 +1323,12 @@ Challenge key
             {"mme_ipv4_address": "0.0.0.0"},
         )
 
-    @patch("netifaces.ifaddresses")
     def test_given_eth1_interface_is_available_and_unit_is_leader_when_lte_core_relation_joined_then_charm_is_active(  # noqa: E501
         self,
-        patch_ip_address,
     ):
         self.harness.set_leader(True)
-        patch_ip_address.return_value = {2: [{"addr": "0.0.0.0"}]}
+        self.host.network_interfaces = ["eth0", "eth1"]
+        self.host.addresses = {"eth1": ["0.0.0.0"]}
         relation_id = self.harness.add_relation("lte-core", "srs-enb-ue-operator")
         self.harness.add_relation_unit(relation_id, "srs-enb-ue-operator/0")
         self.assertEqual(
@@ -1030,60 +1369,735 @@ Challenge key
             WaitingStatus("Waiting for the MME interface to be ready"),
         )
 
-    def test_given_directory_does_not_exist_when_install_file_then_directory_is_created(self):
-        with tempfile.TemporaryDirectory() as directory:
-            file = pathlib.Path(directory) / "does_not_exist" / "file.txt"
+    def test_given_block_agw_local_ips_true_when_block_agw_local_ips_config_changed_to_false_then_block_agw_local_ips_value_updated(  # noqa: E501
+        self,
+    ):
+        self._given_magma_installed()
 
-            install_file(file, "content")
+        self.harness.update_config({"block-agw-local-ips": False})
 
-            self.assertTrue(file.parent.exists())
+        config = self.yaml.load(self.host.read_text(PIPELINED_CONFIG_FILE))
+        self.assertEqual(config["access_control"]["block_agw_local_ips"], False)
 
-    def test_given_file_exists_and_already_has_content_when_install_file_then_return_false(self):
-        with tempfile.TemporaryDirectory() as directory:
-            file = pathlib.Path(directory) / "exists" / "file.txt"
-            file.parent.mkdir()
-            file.write_text("content")
+    def test_given_restart_lock_held_by_peer_when_block_agw_local_ips_config_changed_then_reboot_waits_for_lock(  # noqa: E501
+        self,
+    ):
+        self._given_magma_installed()
+        self.harness.set_leader(True)
+        relation_id = self.harness.add_relation("agw-peers", self.charm.app.name)
+        peer = f"{self.charm.app.name}/1"
+        self.harness.add_relation_unit(relation_id, peer)
+        self.harness.update_relation_data(relation_id, peer, {"restart-lock": "requested"})
 
-            self.assertFalse(install_file(file, "content"))
+        self.harness.update_config({"block-agw-local-ips": False})
 
-    def test_given_file_exists_without_content_when_install_file_then_return_true_and_content_is_written(  # noqa: E501
+        self.assertNotIn(["shutdown", "--reboot", "+1"], self.host.commands)
+        self.assertEqual(self.charm.unit.status, WaitingStatus("Waiting for lock to reboot"))
+
+    def test_given_block_agw_local_ips_and_redis_options_changed_when_config_changed_then_only_reboot_runs(  # noqa: E501
         self,
     ):
-        with tempfile.TemporaryDirectory() as directory:
-            file = pathlib.Path(directory) / "exists" / "file.txt"
-            file.parent.mkdir()
-            file.write_text("")
+        self._given_magma_installed()
+        self.host.write_text(REDIS_TEMPLATE, "appendfsync always\n")
+        self.charm._stored.applied_config = dict(self.harness.model.config)
 
-            self.assertTrue(install_file(file, "content"))
-            self.assertEqual(file.read_text(), "content")
+        self.harness.update_config({"block-agw-local-ips": False, "redis-appendfsync": "no"})
 
-    def test_given_file_does_not_exist_when_install_file_then_return_true_and_content_is_written(  # noqa: E501
+        self.assertIn("appendfsync no\n", self.host.read_text(REDIS_TEMPLATE))
+        self.assertEqual(self.host.commands[-1], ["shutdown", "--reboot", "+1"])
+        self.assertNotIn(
+            "try-restart", [part for command in self.host.commands for part in command]
+        )
+
+    def test_given_restart_waits_for_lock_when_leader_grants_it_then_magma_is_restarted_and_status_is_active(  # noqa: E501
         self,
     ):
-        with tempfile.TemporaryDirectory() as directory:
-            file = pathlib.Path(directory) / "exists" / "file.txt"
+        self.host.services["magma@magmad"] = "active"
+        relation_id = self.harness.add_relation("agw-peers", self.charm.app.name)
+        self.harness.add_relation_unit(relation_id, f"{self.charm.app.name}/1")
+        self.charm._restart_lock.request("restart")
+        self.assertTrue(self.charm._restart_lock.is_waiting_for_lock)
+
+        self.harness.update_relation_data(
+            relation_id,
+            self.charm.app.name,
+            {"restart-lock-granted": json.dumps([self.charm.unit.name])},
+        )
 
-            self.assertTrue(install_file(file, "content"))
-            self.assertEqual(file.read_text(), "content")
+        self.assertIn(("magma@magmad", "activating", "active"), self.host.transitions)
+        self.assertEqual(self.charm.unit.status, ActiveStatus())
 
-    @patch(
-        "charm.MagmaAccessGatewayOperatorCharm.PIPELINED_CONFIG_FILE", new_callable=PropertyMock
-    )
-    @patch("subprocess.run")
-    def test_given_block_agw_local_ips_true_when_block_agw_local_ips_config_changed_to_false_then_block_agw_local_ips_value_updated(  # noqa: E501
-        self, patched_subprocess_run, patched_pipelined_config_file
+    def test_given_lock_held_after_restart_and_magma_active_when_update_status_then_lock_is_released(  # noqa: E501
+        self,
+    ):
+        self.host.services["magma@magmad"] = "active"
+        relation_id = self.harness.add_relation("agw-peers", self.charm.app.name)
+        self.harness.add_relation_unit(relation_id, f"{self.charm.app.name}/1")
+        self.harness.update_relation_data(
+            relation_id, self.charm.unit.name, {"restart-lock": "requested"}
+        )
+
+        self.charm.on.update_status.emit()
+
+        self.assertFalse(self.charm._restart_lock.is_held)
+
+    def test_given_invalid_irq_affinity_config_when_config_changed_then_status_is_blocked(self):
+        with self.assertLogs() as captured:
+            self.harness.update_config({"irq-affinity": "first-four"})
+
+        self.assertEqual(
+            self.charm.unit.status,
+            BlockedStatus("Configuration is invalid. Check logs for details"),
+        )
+        self.assertEqual(
+            "Invalid CPU list for irq-affinity: first-four", captured.records[0].getMessage()
+        )
+
+    def test_given_invalid_irq_affinity_config_fixed_when_config_changed_then_status_is_active(
+        self,
+    ):
+        self._given_magma_installed()
+        with self.assertLogs():
+            self.harness.update_config({"irq-affinity": "bad"})
+
+        self.harness.update_config({"irq-affinity": "auto"})
+
+        self.assertEqual(self.charm.unit.status, ActiveStatus())
+
+    def test_given_magma_installed_when_charm_only_option_is_invalid_then_status_is_blocked_and_config_is_not_applied(  # noqa: E501
+        self,
+    ):
+        self._given_magma_installed()
+        invalid_options: List[Tuple[str, Union[int, str]]] = [
+            ("gateway-check", "bogus"),
+            ("maintenance-window", "nonsense"),
+            ("drain-timeout", -5),
+            ("sysctl-profile", "bogus"),
+        ]
+        for option, value in invalid_options:
+            with self.subTest(option=option):
+                applied_config = dict(self.charm._stored.applied_config)
+                with self.assertLogs():
+                    self.harness.update_config({option: value})
+
+                self.assertEqual(
+                    self.charm.unit.status,
+                    BlockedStatus("Configuration is invalid. Check logs for details"),
+                )
+                self.assertEqual(dict(self.charm._stored.applied_config), applied_config)
+                self.harness.update_config(unset=[option])
+                self.assertEqual(self.charm.unit.status, ActiveStatus())
+
+    def test_given_lock_held_and_invalid_tuning_config_when_start_then_lock_is_released(self):
+        self.host.services["magma@magmad"] = "active"
+        relation_id = self.harness.add_relation("agw-peers", self.charm.app.name)
+        self.harness.add_relation_unit(relation_id, f"{self.charm.app.name}/1")
+        self.harness.update_relation_data(
+            relation_id, self.charm.unit.name, {"restart-lock": "requested"}
+        )
+        with self.assertLogs():
+            self.harness.update_config({"irq-affinity": "bad"})
+
+        self.charm.on.start.emit()
+
+        self.assertFalse(self.charm._restart_lock.is_held)
+        self.assertEqual(
+            self.charm.unit.status,
+            BlockedStatus("Configuration is invalid. Check logs for details"),
+        )
+
+    def test_given_magma_installed_when_start_then_rps_is_applied_to_sgi_and_s1_interfaces(self):
+        self._given_magma_installed()
+        self.host.services["magma@magmad"] = "active"
+        self.host.network_interfaces = ["lo", "eth0", "eth1"]
+        for interface in ["eth0", "eth1"]:
+            self.host.write_text(f"/sys/class/net/{interface}/queues/rx-0/rps_cpus", "0\n")
+        self.harness.update_config({"sgi": "enp0s1", "s1": "enp0s2", "rps-cpus": "3"})
+
+        self.charm.on.start.emit()
+
+        for interface in ["eth0", "eth1"]:
+            self.assertEqual(
+                self.host.files[f"/sys/class/net/{interface}/queues/rx-0/rps_cpus"], "3"
+            )
+        self.assertEqual(self.charm.unit.status, ActiveStatus())
+
+    def test_given_ovs_flow_limit_config_when_config_changed_then_ovs_other_config_is_set_without_reboot(  # noqa: E501
+        self,
+    ):
+        self._given_magma_installed()
+
+        self.harness.update_config({"ovs-flow-limit": 400000})
+
+        self.assertIn(
+            ["ovs-vsctl", "set", "Open_vSwitch", ".", "other_config:flow-limit=400000"],
+            self.host.commands,
+        )
+        self.assertNotIn(["shutdown", "--reboot", "+1"], self.host.commands)
+        self.assertEqual(self.host.other_config, {"flow-limit": "400000"})
+
+    def test_given_inputs_unchanged_since_last_reconciliation_when_config_changed_then_nothing_is_run(  # noqa: E501
+        self,
+    ):
+        self._given_magma_installed()
+        self.harness.update_config({"ovs-flow-limit": 400000})
+        self.host.commands.clear()
+
+        self.harness.charm.on.config_changed.emit()
+
+        self.assertEqual(self.host.commands, [])
+
+    def test_given_inputs_unchanged_since_last_reconciliation_when_update_status_then_settings_are_not_applied_again(  # noqa: E501
+        self,
+    ):
+        self._given_magma_installed()
+        self.harness.update_config({"ovs-flow-limit": 400000})
+        self.host.commands.clear()
+
+        self.harness.charm.on.update_status.emit()
+
+        self.assertNotIn(OVS_GET_OTHER_CONFIG, self.host.commands)
+
+    def test_given_only_restart_lock_changed_since_last_reconciliation_when_config_changed_then_nothing_is_run(  # noqa: E501
+        self,
+    ):
+        self._given_magma_installed()
+        relation_id = self.harness.add_relation("agw-peers", self.charm.app.name)
+        self.harness.add_relation_unit(relation_id, f"{self.charm.app.name}/1")
+        self.harness.update_config({"ovs-flow-limit": 400000})
+        self.harness.update_relation_data(
+            relation_id, f"{self.charm.app.name}/1", {"restart-lock": "requested"}
+        )
+        self.host.commands.clear()
+
+        self.harness.charm.on.config_changed.emit()
+
+        self.assertEqual(self.host.commands, [])
+
+    def test_given_managed_file_changed_since_last_reconciliation_when_update_status_then_machine_is_reconciled(  # noqa: E501
+        self,
+    ):
+        self._given_magma_installed()
+        self.harness.update_config({"ovs-flow-limit": 400000})
+        self.host.write_text(SYSCTL_FILE, "net.core.somaxconn = 1\n")
+        self.host.commands.clear()
+
+        self.harness.charm.on.update_status.emit()
+
+        self.assertIn(OVS_GET_OTHER_CONFIG, self.host.commands)
+
+    def test_given_rps_reset_by_a_reboot_when_start_then_rps_is_applied_again(self):
+        self._given_magma_installed()
+        self.host.services["magma@magmad"] = "active"
+        self.host.network_interfaces = ["eth0"]
+        rps_file = "/sys/class/net/eth0/queues/rx-0/rps_cpus"
+        self.host.write_text(rps_file, "0\n")
+        self.harness.update_config({"sgi": "enp0s1", "rps-cpus": "3"})
+        self.host.write_text(rps_file, "0\n")
+
+        self.charm.on.start.emit()
+
+        self.assertEqual(self.host.files[rps_file], "3")
+
+    def test_given_charm_code_unchanged_when_upgrade_charm_then_nothing_is_run(self):
+        self._given_magma_installed()
+        self.harness.update_config({"ovs-flow-limit": 400000})
+        self.host.commands.clear()
+
+        self.harness.charm.on.upgrade_charm.emit()
+
+        self.assertEqual(self.host.commands, [])
+
+    def test_given_unit_is_not_leader_and_related_to_orchestrator_when_config_changed_then_config_is_applied(  # noqa: E501
+        self,
     ):
-        patched_subprocess_run.side_effect = [Mock(returncode=0), Mock(returncode=0)]
-        test_config = {"block-agw-local-ips": False}
-        with tempfile.TemporaryDirectory() as tempdir:
-            tmpfilepath = os.path.join(tempdir, "fake_pipelined.yml")
-            with open(tmpfilepath, "w") as fake_pipelined:
-                fake_pipelined.write(self.TEST_PIPELINED_CONFIG)
+        self._given_magma_installed()
+        self.harness.set_leader(False)
+        relation_id = self.harness.add_relation("magma-orchestrator", "orc8r-nginx-operator")
+        self.harness.add_relation_unit(relation_id, "orc8r-nginx-operator/0")
+
+        self.harness.update_config({"ovs-flow-limit": 400000})
+
+        self.assertIn(
+            ["ovs-vsctl", "set", "Open_vSwitch", ".", "other_config:flow-limit=400000"],
+            self.host.commands,
+        )
+
+    def test_given_config_changed_since_last_reconciliation_when_config_changed_then_config_is_applied(  # noqa: E501
+        self,
+    ):
+        self._given_magma_installed()
+        self.harness.update_config({"ovs-flow-limit": 400000})
+        self.host.commands.clear()
+
+        self.harness.update_config({"ovs-flow-limit": 500000})
+
+        self.assertIn(
+            ["ovs-vsctl", "set", "Open_vSwitch", ".", "other_config:flow-limit=500000"],
+            self.host.commands,
+        )
+
+    def test_given_last_reconciliation_deferred_when_config_changed_then_reconciliation_runs_again(  # noqa: E501
+        self,
+    ):
+        self.host.enabled.add("magma@magmad")
+        self.harness.update_config({"ovs-flow-limit": 400000})
+
+        with self.assertLogs(level="DEBUG") as captured:
+            self.harness.charm.on.config_changed.emit()
+
+        self.assertIn(
+            f"{PIPELINED_CONFIG_FILE} doesn't exist yet. Deferring...",
+            [record.getMessage() for record in captured.records],
+        )
+
+    def test_given_only_no_op_option_changed_when_config_changed_then_no_setting_is_applied(
+        self,
+    ):
+        self._given_magma_installed()
+        self.harness.update_config({"ovs-flow-limit": 400000})
+        self.host.commands.clear()
+
+        self.harness.update_config({"max-concurrent-restarts": 2})
+
+        self.assertEqual(self.host.commands, [])
+
+    def test_given_only_redis_option_changed_when_config_changed_then_ovs_is_not_tuned_again(
+        self,
+    ):
+        self._given_magma_installed()
+        self.host.write_text(REDIS_TEMPLATE, "appendonly yes\n")
+        self.harness.update_config({"ovs-flow-limit": 400000})
+        self.host.commands.clear()
+
+        self.harness.update_config({"redis-appendfsync": "no"})
+
+        self.assertIn("appendfsync no", self.host.read_text(REDIS_TEMPLATE))
+        for command in self.host.commands:
+            self.assertNotEqual(command[0], "ovs-vsctl")
+
+    def test_given_interface_changed_after_installation_when_config_changed_then_status_is_blocked(  # noqa: E501
+        self,
+    ):
+        self._given_magma_installed()
+        self.harness.update_config({"ovs-flow-limit": 400000})
+
+        self.harness.update_config({"sgi": "enp0s3"})
+
+        self.assertEqual(
+            self.harness.charm.unit.status,
+            BlockedStatus("Options can't be changed after installation: sgi"),
+        )
 
-            patched_pipelined_config_file.return_value = tmpfilepath
-            self.harness.update_config(test_config)
+    def test_given_sgi_address_changed_after_installation_when_config_changed_then_netplan_is_applied_and_bound_services_are_restarted(  # noqa: E501
+        self,
+    ):
+        self._given_magma_installed()
+        self.host.network_interfaces = ["lo", "eth0", "eth1"]
+        self.host.set_result(
+            ["ip", "-json", "address", "show", "dev", "eth0"],
+            stdout='[{"addr_info":[{"local":"192.168.0.3","prefixlen":24}]}]',
+        )
+        self.host.set_result(["ip", "-json", "address", "show", "dev", "eth1"], stdout="[]")
+        for interface, mac_address in [
+            ("eth0", "00:00:00:00:00:01"),
+            ("eth1", "00:00:00:00:00:02"),
+        ]:
+            self.host.write_text(f"/sys/class/net/{interface}/address", f"{mac_address}\n")
+        self.host.write_text(
+            "/etc/netplan/50-installer.yaml",
+            "network:\n"
+            "  ethernets:\n"
+            "    enp0s1:\n"
+            "      set-name: eth0\n"
+            "      dhcp4: true\n"
+            "    enp0s2:\n"
+            "      set-name: eth1\n"
+            "      dhcp4: true\n",
+        )
+        self.harness.disable_hooks()
+        self.harness.update_config({"sgi": "enp0s1", "s1": "enp0s2"})
+        self.harness.enable_hooks()
+        self.charm._stored.applied_config = dict(self.harness.model.config)
+
+        self.harness.update_config(
+            {"sgi-ipv4-address": "192.168.0.3/24", "sgi-ipv4-gateway": "192.168.0.1"}
+        )
+
+        netplan = self.yaml.load(self.host.read_text(NETPLAN_NETWORK_FILE))
+        self.assertEqual(netplan["network"]["ethernets"]["eth0"]["addresses"], ["192.168.0.3/24"])
+        self.assertNotIn("enp0s1", self.host.read_text("/etc/netplan/50-installer.yaml"))
+        for command in [
+            ["netplan", "apply"],
+            ["ping", "-c", "1", "-W", "2", "-I", "eth0", "192.168.0.1"],
+            ["systemctl", "try-restart", "magma@pipelined", "magma@mme", "sctpd"],
+        ]:
+            self.assertIn(command, self.host.commands)
+
+    def test_given_invalid_gateway_check_config_when_config_changed_then_status_is_blocked(self):
+        with self.assertLogs() as captured:
+            self.harness.update_config({"gateway-check": "arp"})
+
+        self.assertEqual(
+            self.charm.unit.status,
+            BlockedStatus("Configuration is invalid. Check logs for details"),
+        )
+        self.assertIn(
+            "Invalid gateway-check: arp. Valid checks are ping, route",
+            [record.getMessage() for record in captured.records],
+        )
+
+    def test_given_s1_mtu_config_when_config_changed_then_mtu_is_applied_and_persisted(self):
+        self.host.network_interfaces = ["lo", "eth0", "eth1"]
+        self.host.set_result(
+            ["ip", "-details", "-json", "link", "show", "dev", "eth1"],
+            stdout='[{"ifname":"eth1","min_mtu":68,"max_mtu":9710}]',
+        )
+        self.host.write_text("/sys/class/net/eth1/mtu", "1500\n")
+
+        self.harness.update_config({"s1-mtu": 9000})
+
+        self.assertIn(["ip", "link", "set", "dev", "eth1", "mtu", "9000"], self.host.commands)
+        self.assertIn("eth1:\n      mtu: 9000", self.host.read_text(NETPLAN_MTU_FILE))
+
+    def test_given_interfaces_not_renamed_yet_when_config_changed_then_mtu_is_persisted_under_installed_name(  # noqa: E501
+        self,
+    ):
+        self.host.network_interfaces = ["lo", "ens3", "ens4"]
+        self.host.set_result(
+            ["ip", "-details", "-json", "link", "show", "dev", "ens4"],
+            stdout='[{"ifname":"ens4","min_mtu":68,"max_mtu":9710}]',
+        )
+        self.host.write_text("/sys/class/net/ens4/mtu", "1500\n")
+
+        self.harness.update_config({"sgi": "ens3", "s1": "ens4", "s1-mtu": 9000})
+
+        self.assertIn(["ip", "link", "set", "dev", "ens4", "mtu", "9000"], self.host.commands)
+        self.assertIn("eth1:\n      mtu: 9000", self.host.read_text(NETPLAN_MTU_FILE))
+        self.assertNotIn("ens4", self.host.read_text(NETPLAN_MTU_FILE))
+
+    def test_given_mtu_not_supported_by_nic_when_config_changed_then_status_is_blocked(self):
+        self.host.network_interfaces = ["lo", "eth0", "eth1"]
+        self.host.set_result(
+            ["ip", "-details", "-json", "link", "show", "dev", "eth1"],
+            stdout='[{"ifname":"eth1","min_mtu":68,"max_mtu":1500}]',
+        )
+
+        with self.assertLogs() as captured:
+            self.harness.update_config({"s1-mtu": 9000})
+
+        self.assertEqual(
+            self.charm.unit.status,
+            BlockedStatus("Configuration is invalid. Check logs for details"),
+        )
+        self.assertIn(
+            "MTU 9000 is not supported by interface eth1 (68-1500)",
+            [record.getMessage() for record in captured.records],
+        )
+
+    def test_given_s1_offloads_config_when_config_changed_then_offloads_are_applied_and_persisted(  # noqa: E501
+        self,
+    ):
+        self.host.network_interfaces = ["lo", "eth0", "eth1"]
+        self.host.set_result(
+            ["/sbin/ethtool", "-k", "eth1"], stdout="generic-receive-offload: off\n"
+        )
+
+        self.harness.update_config({"s1-offloads": "gro=on"})
+
+        self.assertIn(["/sbin/ethtool", "-K", "eth1", "gro", "on"], self.host.commands)
+        self.assertIn(
+            "ExecStart=/sbin/ethtool -K eth1 gro on",
+            self.host.read_text("/etc/systemd/system/magma-access-gateway-nic-tuning.service"),
+        )
+
+    def test_given_invalid_ring_sizes_config_when_config_changed_then_status_is_blocked(self):
+        with self.assertLogs() as captured:
+            self.harness.update_config({"sgi-ring-sizes": "rx=large"})
+
+        self.assertEqual(
+            self.charm.unit.status,
+            BlockedStatus("Configuration is invalid. Check logs for details"),
+        )
+        self.assertEqual("Invalid ring sizes for sgi: rx=large", captured.records[0].getMessage())
+
+    def test_given_s1_interface_present_when_get_nic_settings_action_then_settings_are_returned(
+        self,
+    ):
+        self.host.network_interfaces = ["lo", "eth1"]
+        self.host.set_result(
+            ["/sbin/ethtool", "-k", "eth1"], stdout="generic-receive-offload: on\n"
+        )
+        self.host.set_result(
+            ["/sbin/ethtool", "-g", "eth1"],
+            stdout="Pre-set maximums:\nRX:\t4096\nTX:\t4096\n"
+            "Current hardware settings:\nRX:\t512\nTX:\t512\n",
+        )
+        event = Mock()
+
+        self.charm._on_get_nic_settings_action(event)
+
+        event.set_results.assert_called_once_with(
+            {
+                "s1": {
+                    "interface": "eth1",
+                    "offloads": "gro=on",
+                    "ring-sizes": "rx=512,tx=512",
+                    "max-ring-sizes": "rx=4096,tx=4096",
+                }
+            }
+        )
+
+    def test_given_magma_not_restarted_when_get_startup_timings_action_then_action_fails(self):
+        event = Mock()
+
+        self.charm._on_get_startup_timings_action(event)
+
+        event.fail.assert_called_once_with("Magma has not been restarted by the charm yet.")
+
+    @patch("time.monotonic", Mock(return_value=10.0))
+    def test_given_magma_restarted_when_get_startup_timings_action_then_timings_are_returned_and_exported(  # noqa: E501
+        self,
+    ):
+        self.host.services.update({"magma@magmad": "active", "magma@mme": "active"})
+        self.host.after = {"magma@mme": ["magma@magmad"]}
+        self.host.fails_to_start.add("magma@mme")
+        event = Mock()
+
+        self.charm._restart_magma()
+        self.charm._on_get_startup_timings_action(event)
+
+        event.set_results.assert_called_once_with(
+            {"services": "magma@magmad=0.0", "failed": "magma@mme"}
+        )
+        self.assertIn(
+            'magma_service_startup_failed{service="magma@mme"} 1\n',
+            self.host.files[STARTUP_METRICS_FILE],
+        )
+
+    def test_given_service_cpu_affinity_config_when_config_changed_then_only_affected_services_are_restarted(  # noqa: E501
+        self,
+    ):
+        self._given_magma_installed()
+
+        self.harness.update_config({"service-cpu-affinity": "mme=4"})
+
+        self.assertEqual(
+            self.host.commands[-2:],
+            [["systemctl", "daemon-reload"], ["systemctl", "try-restart", "magma@mme.service"]],
+        )
+        self.assertNotIn(["shutdown", "--reboot", "+1"], self.host.commands)
+
+    def test_given_outside_of_maintenance_window_when_service_cpu_affinity_changed_then_restart_waits_for_window(  # noqa: E501
+        self,
+    ):
+        self._given_magma_installed()
+        self.harness.update_config({"maintenance-window": self._maintenance_window_later_today()})
+
+        self.harness.update_config({"service-cpu-affinity": "mme=4"})
+
+        self.assertNotIn(["systemctl", "try-restart", "magma@mme.service"], self.host.commands)
+        self.assertEqual(
+            self.charm.unit.status,
+            WaitingStatus("Waiting for maintenance window to restart services"),
+        )
+
+    def test_given_services_restart_waits_for_window_when_window_opens_then_services_are_restarted(  # noqa: E501
+        self,
+    ):
+        self._given_magma_installed()
+        self.harness.update_config({"maintenance-window": self._maintenance_window_later_today()})
+        self.harness.update_config({"service-cpu-affinity": "mme=4"})
+        self.harness.disable_hooks()
+        self.harness.update_config({"maintenance-window": ""})
+        self.harness.enable_hooks()
+
+        self.harness.charm.on.update_status.emit()
+
+        self.assertEqual(self.host.commands[-1], ["systemctl", "try-restart", "magma@mme.service"])
+        self.assertEqual(self.charm._restart_lock.pending_operation, "")
+
+    def test_given_config_overlay_when_config_changed_then_overlay_is_merged_and_only_its_service_is_restarted(  # noqa: E501
+        self,
+    ):
+        self._given_magma_installed()
+        self.host.write_text("/etc/magma/mme.yml", "# MME\nlog_level: INFO\n")
+
+        self.harness.update_config({"config-overlay": "mme.yml:\n  log_level: WARNING\n"})
+
+        self.assertEqual(self.host.files["/etc/magma/mme.yml"], "# MME\nlog_level: WARNING\n")
+        self.assertIn(["systemctl", "try-restart", "magma@mme"], self.host.commands)
+
+    def test_given_config_overlay_sets_block_agw_local_ips_when_config_changed_then_status_is_blocked(  # noqa: E501
+        self,
+    ):
+        self._given_magma_installed()
+
+        self.harness.update_config(
+            {
+                "config-overlay": "pipelined.yml:\n"
+                "  access_control:\n"
+                "    block_agw_local_ips: false\n"
+            }
+        )
+
+        self.assertEqual(
+            self.charm.unit.status,
+            BlockedStatus("Configuration is invalid. Check logs for details"),
+        )
+
+    def test_given_sysctl_profile_not_applied_by_kernel_when_config_changed_then_status_is_blocked(  # noqa: E501
+        self,
+    ):
+        self.harness.update_config({"sysctl-profile": "small"})
+
+        self.assertIn("net.netfilter.nf_conntrack_max = 262144", self.host.read_text(SYSCTL_FILE))
+        self.assertEqual(
+            self.charm.unit.status,
+            BlockedStatus("Failed to apply sysctl profile. See logs for details"),
+        )
+
+    def test_given_unknown_sysctl_profile_when_config_changed_then_status_is_blocked(self):
+        with self.assertLogs() as captured:
+            self.harness.update_config({"sysctl-profile": "huge"})
+
+        self.assertEqual(
+            self.charm.unit.status,
+            BlockedStatus("Configuration is invalid. Check logs for details"),
+        )
+        self.assertEqual(
+            "Invalid sysctl-profile: huge. Valid profiles are small, medium, large",
+            captured.records[0].getMessage(),
+        )
+
+    def test_given_redis_appendfsync_config_when_config_changed_then_redis_and_dependents_are_restarted(  # noqa: E501
+        self,
+    ):
+        self._given_magma_installed()
+        self.host.set_result(
+            ["systemctl", "list-dependencies", "--reverse", "--plain", "magma@redis.service"],
+            stdout="magma@redis.service\nmagma@mobilityd.service\n",
+        )
+        self.host.write_text(REDIS_TEMPLATE, "appendfsync always\n")
+
+        self.harness.update_config({"redis-appendfsync": "everysec"})
+
+        self.assertIn("appendfsync everysec\n", self.host.read_text(REDIS_TEMPLATE))
+        self.assertIn(
+            ["systemctl", "try-restart", "magma@redis.service", "magma@mobilityd.service"],
+            self.host.commands,
+        )
+
+    def test_given_log_forwarder_flush_interval_config_when_config_changed_then_log_forwarder_is_restarted(  # noqa: E501
+        self,
+    ):
+        self._given_magma_installed()
+        self.host.write_text(
+            "/etc/magma/templates/td-agent-bit.conf.template", "[SERVICE]\n    Flush 5\n"
+        )
+
+        self.harness.update_config({"log-forwarder-flush-interval": 1})
+
+        self.assertEqual(
+            self.host.commands[-1], ["systemctl", "try-restart", "magma@td-agent-bit"]
+        )
+
+    def test_given_service_log_level_config_when_config_changed_then_log_level_is_set_and_only_its_service_is_restarted(  # noqa: E501
+        self,
+    ):
+        self._given_magma_installed()
+        self.host.write_text("/etc/magma/mme.yml", "log_level: INFO\n")
+        self.host.write_text("/etc/magma/sessiond.yml", "log_level: INFO\n")
+
+        self.harness.update_config(
+            {
+                "service-log-level": "*=WARNING",
+                "config-overlay": "sessiond.yml:\n  log_level: INFO\n",
+            }
+        )
+
+        self.assertEqual(self.host.files["/etc/magma/mme.yml"], "log_level: WARNING\n")
+        self.assertEqual(self.host.files["/etc/magma/sessiond.yml"], "log_level: INFO\n")
+        self.assertIn(["systemctl", "try-restart", "magma@mme"], self.host.commands)
+
+    def test_given_control_proxy_config_when_orchestrator_available_event_then_settings_are_rendered_in_control_proxy_config(  # noqa: E501
+        self,
+    ):
+        self._given_magma_installed()
+        self.harness.update_config({"control-proxy-config": "proxy_cloud_connections: true"})
+
+        self._relate_to_orchestrator()
+
+        self.assertEqual(
+            self.host.files["/var/opt/magma/configs/control_proxy.yml"],
+            "cloud_address: orchestrator.com\n"
+            "cloud_port: 42\n"
+            "bootstrap_address: bootstrapper.com\n"
+            "bootstrap_port: 42\n"
+            "fluentd_address: fluentd.com\n"
+            "fluentd_port: 42\n"
+            "\n"
+            "rootca_cert: /var/opt/magma/tmp/certs/rootCA.pem\n"
+            "\n"
+            "proxy_cloud_connections: true\n",
+        )
+
+    def test_given_orchestrator_available_when_control_proxy_config_changes_then_control_proxy_config_is_rendered_and_magma_is_restarted(  # noqa: E501
+        self,
+    ):
+        self._given_magma_installed()
+        self.host.services["magma@magmad"] = "active"
+        self.charm._stored.control_proxy = {
+            "orchestrator_address": "orchestrator.com",
+            "orchestrator_port": 443,
+            "bootstrapper_address": "bootstrapper.com",
+            "bootstrapper_port": 443,
+            "fluentd_address": "fluentd.com",
+            "fluentd_port": 24224,
+        }
+
+        self.harness.update_config({"control-proxy-config": "local_port: 8444"})
+
+        self.assertTrue(
+            self.host.files["/var/opt/magma/configs/control_proxy.yml"].endswith(
+                "\n\nlocal_port: 8444\n"
+            )
+        )
+        self.assertEqual(
+            self.host.transitions,
+            [
+                ("magma@magmad", "active", "deactivating"),
+                ("magma@magmad", "deactivating", "inactive"),
+                ("magma@magmad", "inactive", "activating"),
+                ("magma@magmad", "activating", "active"),
+            ],
+        )
+
+    def test_given_control_proxy_config_overrides_cloud_address_when_config_changed_then_status_is_blocked(  # noqa: E501
+        self,
+    ):
+        self._given_magma_installed()
+        self.charm._stored.control_proxy = {"orchestrator_address": "orchestrator.com"}
+
+        with self.assertLogs() as captured:
+            self.harness.update_config({"control-proxy-config": "cloud_address: evil.com"})
+
+        self.assertEqual(
+            self.charm.unit.status,
+            BlockedStatus("Configuration is invalid. Check logs for details"),
+        )
+        self.assertEqual(
+            "cloud_address is set by the magma-orchestrator relation",
+            captured.records[0].getMessage(),
+        )
+
+    def test_given_metrics_upload_interval_config_when_config_changed_then_jittered_interval_is_set_and_magmad_is_restarted(  # noqa: E501
+        self,
+    ):
+        self._given_magma_installed()
+        self.host.write_text("/etc/magma/metricsd.yml", "sync_interval: 60\n")
 
-            with open(tmpfilepath, "r") as fake_pipelined:
-                config = self.yaml.load(fake_pipelined)
+        self.harness.update_config({"metrics-upload-interval": 600, "interval-jitter": 50})
 
-            self.assertEqual(config["access_control"]["block_agw_local_ips"], False)
+        self.assertEqual(self.host.files["/etc/magma/metricsd.yml"], "sync_interval: 724\n")
+        self.assertIn(["systemctl", "try-restart", "magma@magmad"], self.host.commands)
@@ -0,0 +1,84 @@
+# Copyright 2022 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+import subprocess
+import unittest
+from unittest.mock import Mock, call, patch
+
+from command_policy import CommandPolicy, CommandTimeoutError, run_command
+
+
+class TestCommandPolicy(unittest.TestCase):
+    @patch("time.sleep")
+    @patch("subprocess.run")
+    def test_given_command_succeeds_when_run_command_then_command_is_run_once_with_timeout(
+        self, patch_subprocess_run, patch_sleep
+    ):
+        patch_subprocess_run.return_value = Mock(returncode=0)
+
+        process = run_command(["true"], CommandPolicy(timeout=5, retries=3))
+
+        self.assertEqual(process.returncode, 0)
+        patch_subprocess_run.assert_called_once_with(["true"], stdout=-1, timeout=5)
+        patch_sleep.assert_not_called()
+
+    @patch("time.sleep")
+    @patch("subprocess.run")
+    def test_given_command_times_out_once_when_run_command_then_command_is_retried(
+        self, patch_subprocess_run, patch_sleep
+    ):
+        patch_subprocess_run.side_effect = [
+            subprocess.TimeoutExpired(["snap"], 5),
+            Mock(returncode=0),
+        ]
+
+        process = run_command(["snap"], CommandPolicy(timeout=5, retries=1, backoff=2))
+
+        self.assertEqual(process.returncode, 0)
+        self.assertEqual(patch_subprocess_run.call_count, 2)
+        patch_sleep.assert_called_once_with(2)
+
+    @patch("time.sleep")
+    @patch("subprocess.run")
+    def test_given_command_always_times_out_when_run_command_then_command_timeout_error_is_raised(  # noqa: E501
+        self, patch_subprocess_run, patch_sleep
+    ):
+        patch_subprocess_run.side_effect = subprocess.TimeoutExpired(["snap"], 5)
+
+        with self.assertRaises(CommandTimeoutError) as context:
+            run_command(["snap"], CommandPolicy(timeout=5, retries=2, backoff=1))
+
+        self.assertEqual(context.exception.command, ["snap"])
+        self.assertEqual(patch_subprocess_run.call_count, 3)
+        patch_sleep.assert_has_calls([call(1), call(2)])
+
+    @patch("time.sleep")
+    @patch("subprocess.run")
+    def test_given_policy_retries_on_failure_when_command_fails_then_command_is_retried_with_exponential_backoff(  # noqa: E501
+        self, patch_subprocess_run, patch_sleep
+    ):
+        patch_subprocess_run.side_effect = [
+            Mock(returncode=1),
+            Mock(returncode=1),
+            Mock(returncode=0),
+        ]
+
+        process = run_command(
+            ["snap"], CommandPolicy(timeout=5, retries=3, backoff=10, retry_on_failure=True)
+        )
+
+        self.assertEqual(process.returncode, 0)
+        patch_sleep.assert_has_calls([call(10), call(20)])
+
+    @patch("time.sleep")
+    @patch("subprocess.run")
+    def test_given_policy_does_not_retry_on_failure_when_command_fails_then_failed_process_is_returned(  # noqa: E501
+        self, patch_subprocess_run, patch_sleep
+    ):
+        patch_subprocess_run.return_value = Mock(returncode=3)
+
+        process = run_command(["systemctl"], CommandPolicy(timeout=5, retries=3))
+
+        self.assertEqual(process.returncode, 3)
+        patch_subprocess_run.assert_called_once()
+        patch_sleep.assert_not_called()
@@ -0,0 +1,56 @@
+# Copyright 2022 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+import pathlib
+import unittest
+
+import ruamel.yaml
+
+from config_impact import (
+    HOT_RELOAD,
+    NETWORK_REAPPLY,
+    NO_OP,
+    OPTION_IMPACTS,
+    REINSTALL_OR_REBOOT,
+    SERVICE_RESTART,
+    classify_changes,
+    options_with_impact,
+    required_impact,
+)
+
+CONFIG_YAML = pathlib.Path(__file__).parents[2] / "config.yaml"
+
+
+class TestConfigImpact(unittest.TestCase):
+    def test_given_charm_config_when_option_impacts_then_every_option_is_classified(self):
+        options = ruamel.yaml.YAML(typ="safe").load(CONFIG_YAML.read_text())["options"]
+
+        self.assertEqual(sorted(OPTION_IMPACTS), sorted(options))
+
+    def test_given_changed_options_when_classify_changes_then_only_changed_options_are_classified(  # noqa: E501
+        self,
+    ):
+        old = {"dns": '["8.8.8.8"]', "redis-save": "", "max-concurrent-restarts": 1}
+        new = {"dns": '["1.1.1.1"]', "redis-save": "off", "max-concurrent-restarts": 1}
+
+        self.assertEqual(
+            classify_changes(old, new), {"dns": NETWORK_REAPPLY, "redis-save": SERVICE_RESTART}
+        )
+
+    def test_given_unknown_option_when_classify_changes_then_option_requires_reboot(self):
+        self.assertEqual(
+            classify_changes({}, {"new-option": 1}), {"new-option": REINSTALL_OR_REBOOT}
+        )
+
+    def test_given_impacts_when_required_impact_then_most_disruptive_impact_is_returned(self):
+        impacts = {"ovs-flow-limit": HOT_RELOAD, "redis-save": SERVICE_RESTART}
+
+        self.assertEqual(required_impact(impacts), SERVICE_RESTART)
+
+    def test_given_no_change_when_required_impact_then_impact_is_no_op(self):
+        self.assertEqual(required_impact({}), NO_OP)
+
+    def test_given_impacts_when_options_with_impact_then_options_of_the_class_are_returned(self):
+        impacts = {"dns": NETWORK_REAPPLY, "sgi-mtu": HOT_RELOAD, "s1-mtu": HOT_RELOAD}
+
+        self.assertEqual(options_with_impact(impacts, HOT_RELOAD), ["sgi-mtu", "s1-mtu"])
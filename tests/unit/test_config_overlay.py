@@ -0,0 +1,77 @@
+# Copyright 2022 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+import unittest
+from unittest.mock import patch
+
+from fakes import InMemoryHost
+
+from config_overlay import (
+    ConfigOverlay,
+    InvalidOverlayError,
+    affected_services,
+    deep_merge,
+    parse_overlay,
+)
+
+PIPELINED_CONFIG = """# Pipeline application level configs
+access_control:
+  # Blocks access to all AGW local IPs from UEs.
+  block_agw_local_ips: true
+enable_nat: true
+"""
+
+
+class TestConfigOverlay(unittest.TestCase):
+    def setUp(self):
+        self.host = InMemoryHost(files={"/etc/magma/pipelined.yml": PIPELINED_CONFIG})
+
+    def test_given_overlay_when_parse_overlay_then_values_of_each_file_are_returned(self):
+        self.assertEqual(
+            parse_overlay("pipelined.yml:\n  enable_nat: false\n"),
+            {"pipelined.yml": {"enable_nat": False}},
+        )
+        self.assertEqual(parse_overlay(""), {})
+
+    def test_given_invalid_overlay_when_parse_overlay_then_invalid_overlay_error_is_raised(self):
+        for overlay in ["pipelined.yml: [", "- pipelined.yml", "../passwd: {}", "mme.yml: 1"]:
+            with self.assertRaises(InvalidOverlayError):
+                parse_overlay(overlay)
+
+    def test_given_nested_overlay_when_deep_merge_then_only_overlay_values_are_replaced(self):
+        target = {"a": {"b": 1, "c": [1, 2]}, "d": 3}
+
+        self.assertTrue(deep_merge(target, {"a": {"c": [3]}, "e": 4}))
+        self.assertEqual(target, {"a": {"b": 1, "c": [3]}, "d": 3, "e": 4})
+        self.assertFalse(deep_merge(target, {"a": {"b": 1}}))
+
+    def test_given_overlay_when_apply_then_file_is_merged_and_comments_are_preserved(self):
+        changed = ConfigOverlay(self.host, {"pipelined.yml": {"enable_nat": False}}).apply()
+
+        self.assertEqual(changed, ["pipelined.yml"])
+        self.assertEqual(
+            self.host.files["/etc/magma/pipelined.yml"],
+            PIPELINED_CONFIG.replace("enable_nat: true", "enable_nat: false"),
+        )
+
+    def test_given_overlay_already_applied_when_apply_then_file_is_not_written(self):
+        overlay = ConfigOverlay(self.host, {"pipelined.yml": {"enable_nat": False}})
+        overlay.apply()
+
+        with patch("ruamel.yaml.YAML.dump") as patch_dump:
+            changed = overlay.apply()
+
+        self.assertEqual(changed, [])
+        patch_dump.assert_not_called()
+
+    def test_given_overlay_for_unknown_file_when_missing_files_then_file_is_returned(self):
+        overlay = ConfigOverlay(self.host, {"pipelined.yml": {}, "pipeline.yml": {}})
+
+        self.assertEqual(overlay.missing_files, ["pipeline.yml"])
+
+    def test_given_changed_files_when_affected_services_then_services_reading_them_are_returned(
+        self,
+    ):
+        services = affected_services(["pipelined.yml", "metricsd.yml"])
+
+        self.assertEqual(services, ["magma@magmad", "magma@pipelined"])
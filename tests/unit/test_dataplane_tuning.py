@@ -0,0 +1,189 @@
+# Copyright 2022 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+import unittest
+from unittest.mock import patch
+
+from fakes import InMemoryHost
+
+from dataplane_tuning import (
+    DataplaneTuning,
+    cpu_mask,
+    is_valid_cpu_list,
+    is_valid_cpu_mask,
+    parse_cpu_list,
+)
+
+SYS_CLASS_NET = "/sys/class/net"
+PROC_IRQ = "/proc/irq"
+HUGEPAGES_FILE = "/proc/sys/vm/nr_hugepages"
+HUGEPAGES_SYSCTL_FILE = "/etc/sysctl.d/60-magma-access-gateway-hugepages.conf"
+
+
+class TestDataplaneTuning(unittest.TestCase):
+    def setUp(self):
+        self.host = InMemoryHost(
+            files={"/sys/devices/system/cpu/online": "0-3\n", HUGEPAGES_FILE: "0\n"}
+        )
+
+    def _create_interface(self, name: str, irqs: list, rx_queues: int, tx_queues: int):
+        for irq in irqs:
+            self.host.files[f"{SYS_CLASS_NET}/{name}/device/msi_irqs/{irq}"] = "msix"
+            self.host.files[f"{PROC_IRQ}/{irq}/smp_affinity_list"] = "0-3\n"
+        for queue in range(rx_queues):
+            self.host.files[f"{SYS_CLASS_NET}/{name}/queues/rx-{queue}/rps_cpus"] = "0\n"
+        for queue in range(tx_queues):
+            self.host.files[f"{SYS_CLASS_NET}/{name}/queues/tx-{queue}/xps_cpus"] = "0\n"
+
+    def test_given_cpu_list_when_parse_cpu_list_then_cpus_are_returned(self):
+        self.assertEqual(parse_cpu_list("0-2,5,7-8\n"), [0, 1, 2, 5, 7, 8])
+
+    def test_given_cpus_when_cpu_mask_then_mask_is_grouped_by_32_bits(self):
+        self.assertEqual(cpu_mask([0, 1, 2, 3]), "f")
+        self.assertEqual(cpu_mask([32]), "1,00000000")
+
+    def test_given_invalid_values_when_validate_then_false_is_returned(self):
+        self.assertTrue(is_valid_cpu_list("0-3,6"))
+        self.assertFalse(is_valid_cpu_list("0-"))
+        self.assertTrue(is_valid_cpu_mask("ff,00000000"))
+        self.assertFalse(is_valid_cpu_mask("0xff"))
+
+    def test_given_irq_affinity_auto_when_apply_then_irqs_are_spread_over_online_cpus_and_irqbalance_is_disabled(  # noqa: E501
+        self,
+    ):
+        self.host.services["irqbalance"] = "active"
+        self._create_interface("eth0", [30, 31, 32], 0, 0)
+        self._create_interface("eth1", [40, 41], 0, 0)
+
+        failed = DataplaneTuning(self.host, ["eth0", "eth1"]).apply("auto", "", "", 0)
+
+        self.assertEqual(failed, [])
+        affinities = [
+            self.host.files[f"{PROC_IRQ}/{irq}/smp_affinity_list"] for irq in [30, 31, 32, 40, 41]
+        ]
+        self.assertEqual(affinities, ["0", "1", "2", "3", "0"])
+        self.assertEqual(self.host.commands, [["systemctl", "disable", "--now", "irqbalance"]])
+
+    def test_given_irq_affinity_cpu_list_when_apply_then_irqs_are_spread_over_listed_cpus(self):
+        self._create_interface("eth0", [30, 31, 32], 0, 0)
+
+        DataplaneTuning(self.host, ["eth0"]).apply("2-3", "", "", 0)
+
+        affinities = [
+            self.host.files[f"{PROC_IRQ}/{irq}/smp_affinity_list"] for irq in [30, 31, 32]
+        ]
+        self.assertEqual(affinities, ["2", "3", "2"])
+        self.assertEqual(self.host.commands, [])
+
+    def test_given_fewer_rx_queues_than_cpus_when_apply_rps_auto_then_rps_uses_all_cpus(self):
+        self._create_interface("eth0", [], 2, 0)
+
+        DataplaneTuning(self.host, ["eth0"]).apply("", "auto", "", 0)
+
+        for queue in ["rx-0", "rx-1"]:
+            self.assertEqual(self.host.files[f"{SYS_CLASS_NET}/eth0/queues/{queue}/rps_cpus"], "f")
+
+    def test_given_as_many_rx_queues_as_cpus_when_apply_rps_auto_then_rps_is_left_disabled(
+        self,
+    ):
+        self._create_interface("eth0", [], 4, 0)
+
+        DataplaneTuning(self.host, ["eth0"]).apply("", "auto", "", 0)
+
+        self.assertEqual(self.host.files[f"{SYS_CLASS_NET}/eth0/queues/rx-0/rps_cpus"], "0\n")
+
+    def test_given_xps_auto_when_apply_then_each_tx_queue_is_mapped_to_one_cpu(self):
+        self._create_interface("eth0", [], 0, 6)
+
+        DataplaneTuning(self.host, ["eth0"]).apply("", "", "auto", 0)
+
+        masks = [
+            self.host.files[f"{SYS_CLASS_NET}/eth0/queues/tx-{queue}/xps_cpus"]
+            for queue in range(6)
+        ]
+        self.assertEqual(masks, ["1", "2", "4", "8", "1", "2"])
+
+    def test_given_explicit_xps_mask_when_apply_then_mask_is_applied_to_every_tx_queue(self):
+        self._create_interface("eth0", [], 0, 2)
+
+        DataplaneTuning(self.host, ["eth0"]).apply("", "", "c", 0)
+
+        for queue in ["tx-0", "tx-1"]:
+            self.assertEqual(self.host.files[f"{SYS_CLASS_NET}/eth0/queues/{queue}/xps_cpus"], "c")
+
+    def test_given_hugepages_when_apply_then_hugepages_are_reserved_and_persisted(self):
+        DataplaneTuning(self.host, []).apply("", "", "", 512)
+
+        self.assertEqual(self.host.files[HUGEPAGES_FILE], "512")
+        self.assertEqual(self.host.files[HUGEPAGES_SYSCTL_FILE], "vm.nr_hugepages = 512\n")
+
+    def test_given_hugepages_reserved_when_hugepages_cleared_then_hugepages_are_released(self):
+        tuning = DataplaneTuning(self.host, [])
+        tuning.apply("", "", "", 64)
+
+        tuning.apply("", "", "", 0)
+
+        self.assertEqual(self.host.files[HUGEPAGES_FILE], "0")
+        self.assertNotIn(HUGEPAGES_SYSCTL_FILE, self.host.files)
+
+    def test_given_hugepages_not_reserved_by_charm_when_hugepages_is_zero_then_reservation_is_left_alone(  # noqa: E501
+        self,
+    ):
+        self.host.files[HUGEPAGES_FILE] = "128\n"
+
+        DataplaneTuning(self.host, []).apply("", "", "", 0)
+
+        self.assertEqual(self.host.files[HUGEPAGES_FILE], "128\n")
+
+    def test_given_irqbalance_disabled_by_charm_when_irq_affinity_cleared_then_irqbalance_is_started(  # noqa: E501
+        self,
+    ):
+        self.host.services["irqbalance"] = "active"
+        self._create_interface("eth0", [30], 0, 0)
+        tuning = DataplaneTuning(self.host, ["eth0"])
+        tuning.apply("auto", "", "", 0)
+        self.host.commands.clear()
+
+        tuning.apply("", "", "", 0)
+        tuning.apply("", "", "", 0)
+
+        self.assertEqual(self.host.commands, [["systemctl", "enable", "--now", "irqbalance"]])
+
+    def test_given_irqbalance_not_disabled_by_charm_when_irq_affinity_is_empty_then_irqbalance_is_left_alone(  # noqa: E501
+        self,
+    ):
+        DataplaneTuning(self.host, []).apply("", "", "", 0)
+
+        self.assertEqual(self.host.commands, [])
+
+    def test_given_settings_already_applied_when_apply_then_files_are_not_written_again(self):
+        self._create_interface("eth0", [], 2, 0)
+        tuning = DataplaneTuning(self.host, ["eth0"])
+        tuning.apply("", "00000000,0000000f", "", 0)
+
+        with patch.object(self.host, "write_text") as patch_write_text:
+            tuning.apply("", "f", "", 0)
+
+        patch_write_text.assert_not_called()
+
+    def test_given_sysfs_write_fails_when_apply_then_failed_setting_is_returned(self):
+        self._create_interface("eth0", [], 1, 0)
+
+        with patch.object(self.host, "write_text", side_effect=PermissionError("denied")):
+            failed = DataplaneTuning(self.host, ["eth0"]).apply("", "3", "", 0)
+
+        self.assertEqual(failed, ["rps-cpus"])
+
+    def test_given_rps_and_hugepages_set_when_live_files_then_only_their_files_are_returned(self):
+        self._create_interface("eth0", [30], 2, 1)
+
+        files = DataplaneTuning(self.host, ["eth0"]).live_files("", "f", "", 512)
+
+        self.assertEqual(
+            [str(file) for file in files],
+            [
+                HUGEPAGES_FILE,
+                f"{SYS_CLASS_NET}/eth0/queues/rx-0/rps_cpus",
+                f"{SYS_CLASS_NET}/eth0/queues/rx-1/rps_cpus",
+            ],
+        )
@@ -0,0 +1,23 @@
+# Copyright 2022 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+import unittest
+
+from fakes import InMemoryHost
+
+from health_check import has_carrier
+
+
+class TestHealthCheck(unittest.TestCase):
+    def test_given_link_up_when_has_carrier_then_true_is_returned(self):
+        host = InMemoryHost(files={"/sys/class/net/eth1/carrier": "1\n"})
+
+        self.assertTrue(has_carrier(host, "eth1"))
+
+    def test_given_link_down_when_has_carrier_then_false_is_returned(self):
+        host = InMemoryHost(files={"/sys/class/net/eth1/carrier": "0\n"})
+
+        self.assertFalse(has_carrier(host, "eth1"))
+
+    def test_given_carrier_not_readable_when_has_carrier_then_false_is_returned(self):
+        self.assertFalse(has_carrier(InMemoryHost(), "eth1"))
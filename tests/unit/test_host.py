@@ -0,0 +1,222 @@
+# Copyright 2022 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+import pathlib
+import tempfile
+import unittest
+from unittest.mock import Mock, call, patch
+
+from fakes import InMemoryHost
+
+from command_policy import SYSTEMCTL_QUERY_POLICY
+from host import SystemHost
+
+
+class TestSystemHost(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = pathlib.Path(directory.name)
+        self.host = SystemHost()
+
+    def test_given_directory_does_not_exist_when_install_then_directory_is_created(self):
+        file = self.directory / "does_not_exist" / "file.txt"
+
+        self.host.install(str(file), "content")
+
+        self.assertTrue(file.parent.exists())
+
+    def test_given_file_exists_and_already_has_content_when_install_then_return_false(self):
+        file = self.directory / "file.txt"
+        file.write_text("content")
+
+        self.assertFalse(self.host.install(str(file), "content"))
+
+    def test_given_file_exists_without_content_when_install_then_return_true_and_content_is_written(  # noqa: E501
+        self,
+    ):
+        file = self.directory / "file.txt"
+        file.write_text("")
+
+        self.assertTrue(self.host.install(str(file), "content"))
+        self.assertEqual(file.read_text(), "content")
+
+    def test_given_file_does_not_exist_when_install_then_return_true_and_content_is_written(
+        self,
+    ):
+        file = self.directory / "file.txt"
+
+        self.assertTrue(self.host.install(str(file), "content"))
+        self.assertEqual(file.read_text(), "content")
+
+    def test_given_file_does_not_exist_when_unlink_then_nothing_happens(self):
+        self.host.unlink(str(self.directory / "file.txt"))
+
+    def test_given_file_does_not_exist_when_mtime_then_none_is_returned(self):
+        self.assertIsNone(self.host.mtime(str(self.directory / "file.txt")))
+
+    @patch("subprocess.run")
+    def test_given_unit_is_inactive_when_is_active_then_false_is_returned(
+        self, patch_subprocess_run
+    ):
+        patch_subprocess_run.return_value = Mock(returncode=3)
+
+        self.assertFalse(self.host.is_active("magma@magmad"))
+        patch_subprocess_run.assert_called_once_with(
+            ["systemctl", "is-active", "magma@magmad"],
+            stdout=-1,
+            timeout=SYSTEMCTL_QUERY_POLICY.timeout,
+        )
+
+    @patch("subprocess.run")
+    def test_when_stop_then_services_matching_the_pattern_are_stopped(self, patch_subprocess_run):
+        self.host.stop("magma@*")
+
+        patch_subprocess_run.assert_has_calls(
+            [call(["service", "magma@*", "stop"], stdout=-1, timeout=120)]
+        )
+
+    @patch("subprocess.run")
+    def test_given_several_units_when_active_states_then_units_are_queried_in_one_call(
+        self, patch_subprocess_run
+    ):
+        patch_subprocess_run.return_value = Mock(
+            returncode=0, stdout=b"ActiveState=active\n\nActiveState=failed\n"
+        )
+
+        states = self.host.active_states(["magma@magmad", "magma@mme"])
+
+        self.assertEqual(states, {"magma@magmad": "active", "magma@mme": "failed"})
+        patch_subprocess_run.assert_called_once_with(
+            ["systemctl", "show", "--property=ActiveState", "magma@magmad", "magma@mme"],
+            stdout=-1,
+            timeout=5,
+        )
+
+    @patch("subprocess.run")
+    def test_given_systemctl_fails_when_active_states_then_no_state_is_returned(
+        self, patch_subprocess_run
+    ):
+        patch_subprocess_run.return_value = Mock(returncode=1, stdout=b"")
+
+        self.assertEqual(self.host.active_states(["magma@magmad"]), {})
+
+    @patch("subprocess.run")
+    def test_when_active_units_then_first_column_of_listed_units_is_returned(
+        self, patch_subprocess_run
+    ):
+        patch_subprocess_run.return_value = Mock(
+            returncode=0,
+            stdout=b"magma@magmad.service loaded active running Magma magmad service\n"
+            b"magma@mme.service    loaded active running Magma mme service\n",
+        )
+
+        self.assertEqual(self.host.active_units("magma@*"), ["magma@magmad", "magma@mme"])
+
+    @patch("subprocess.run")
+    def test_when_ordering_then_after_property_of_each_unit_is_returned(
+        self, patch_subprocess_run
+    ):
+        patch_subprocess_run.return_value = Mock(
+            returncode=0,
+            stdout=b"Id=magma@mme.service\nAfter=magma@sessiond.service network.target\n\n"
+            b"Id=magma@sessiond.service\nAfter=\n",
+        )
+
+        ordering = self.host.ordering(["magma@mme", "magma@sessiond"])
+
+        self.assertEqual(
+            ordering,
+            {
+                "magma@mme": ["magma@sessiond", "network.target"],
+                "magma@sessiond": [],
+            },
+        )
+
+
+class TestInMemoryHost(unittest.TestCase):
+    def test_when_start_then_service_and_the_services_it_pulls_in_go_through_activating(self):
+        host = InMemoryHost(pulls_in={"magma@magmad": ["magma@mme"]})
+
+        host.start("magma@magmad")
+
+        self.assertEqual(
+            host.transitions,
+            [
+                ("magma@magmad", "inactive", "activating"),
+                ("magma@magmad", "activating", "active"),
+                ("magma@mme", "inactive", "activating"),
+                ("magma@mme", "activating", "active"),
+            ],
+        )
+        self.assertTrue(host.is_active("magma@mme"))
+
+    def test_given_failed_service_when_stop_pattern_then_only_active_matching_services_stop(
+        self,
+    ):
+        host = InMemoryHost(
+            services={"magma@magmad": "active", "magma@mme": "active", "sctpd": "active"}
+        )
+        host.fail("magma@mme")
+
+        host.stop("magma@*")
+
+        self.assertEqual(
+            host.services,
+            {"magma@magmad": "inactive", "magma@mme": "failed", "sctpd": "active"},
+        )
+
+    def test_when_write_text_then_mtime_increases_in_nanoseconds(self):
+        host = InMemoryHost(files={"/etc/magma/pipelined.yml": "a"}, clock=lambda: 1000.0)
+        before = host.mtime("/etc/magma/pipelined.yml")
+
+        host.write_text("/etc/magma/pipelined.yml", "b")
+
+        self.assertEqual(before, 1000 * 10**9)
+        self.assertEqual(host.mtime("/etc/magma/pipelined.yml"), 1000 * 10**9 + 1)
+        self.assertIsNone(host.mtime("/etc/magma/mme.yml"))
+
+    def test_given_file_does_not_exist_when_read_text_then_file_not_found_error_is_raised(self):
+        with self.assertRaises(FileNotFoundError):
+            InMemoryHost().read_text("/etc/magma/pipelined.yml")
+
+    def test_given_programmed_result_when_run_then_result_is_returned_and_command_recorded(self):
+        host = InMemoryHost()
+        host.results[("checkin_cli.py",)] = Mock(returncode=1)
+
+        result = host.run(["checkin_cli.py"], SYSTEMCTL_QUERY_POLICY)
+
+        self.assertEqual(result.returncode, 1)
+        self.assertEqual(host.commands, [["checkin_cli.py"]])
+
+    def test_given_programmed_exception_when_run_then_exception_is_raised(self):
+        host = InMemoryHost()
+        host.results[("ovs-vsctl", "show")] = FileNotFoundError("ovs-vsctl")
+
+        with self.assertRaises(FileNotFoundError):
+            host.run(["ovs-vsctl", "show"], SYSTEMCTL_QUERY_POLICY)
+
+    def test_when_glob_then_files_matching_each_path_component_are_returned(self):
+        host = InMemoryHost(
+            files={
+                "/etc/netplan/50-cloud-init.yaml": "",
+                "/etc/netplan/backup/00-old.yaml": "",
+                "/etc/netplan/README": "",
+            }
+        )
+
+        self.assertEqual(host.glob("/etc/netplan/*.yaml"), ["/etc/netplan/50-cloud-init.yaml"])
+
+    def test_when_list_dir_then_files_and_directories_of_the_directory_are_returned(self):
+        host = InMemoryHost(files={"/sys/class/net/eth0/queues/rx-0/rps_cpus": "0"})
+        host.mkdir("/sys/class/net/eth0/queues/tx-0")
+
+        self.assertEqual(host.list_dir("/sys/class/net/eth0/queues"), ["rx-0", "tx-0"])
+        self.assertEqual(host.list_dir("/sys/class/net/eth1/queues"), [])
+
+    def test_given_interface_does_not_exist_when_ipv4_addresses_then_value_error_is_raised(self):
+        host = InMemoryHost(interfaces=["eth1"], addresses={"eth1": ["192.168.0.2"]})
+
+        self.assertEqual(host.ipv4_addresses("eth1"), ["192.168.0.2"])
+        with self.assertRaises(ValueError):
+            host.ipv4_addresses("eth2")
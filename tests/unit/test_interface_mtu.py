@@ -0,0 +1,65 @@
+# Copyright 2022 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+import unittest
+
+from fakes import InMemoryHost
+
+from interface_mtu import apply_mtu, mtu_limits, persist_mtus
+
+NETPLAN_MTU_FILE = "/etc/netplan/99-magma-access-gateway-mtu.yaml"
+IP_LINK_DETAILS = ["ip", "-details", "-json", "link", "show", "dev", "eth1"]
+
+
+class TestInterfaceMTU(unittest.TestCase):
+    def setUp(self):
+        self.host = InMemoryHost()
+
+    def test_given_ip_link_details_when_mtu_limits_then_min_and_max_mtu_are_returned(self):
+        self.host.set_result(
+            IP_LINK_DETAILS, stdout='[{"ifname":"eth1","mtu":1500,"min_mtu":68,"max_mtu":9710}]'
+        )
+
+        self.assertEqual(mtu_limits(self.host, "eth1"), (68, 9710))
+        self.assertEqual(self.host.commands, [IP_LINK_DETAILS])
+
+    def test_given_driver_does_not_report_limits_when_mtu_limits_then_none_is_returned(self):
+        self.host.set_result(IP_LINK_DETAILS, stdout='[{"ifname":"eth1"}]')
+
+        self.assertIsNone(mtu_limits(self.host, "eth1"))
+
+    def test_given_different_mtu_when_apply_mtu_then_mtu_is_set_with_ip_link(self):
+        self.host.write_text("/sys/class/net/eth1/mtu", "1500\n")
+
+        self.assertTrue(apply_mtu(self.host, "eth1", 9000))
+        self.assertEqual(self.host.commands, [["ip", "link", "set", "dev", "eth1", "mtu", "9000"]])
+
+    def test_given_mtu_already_set_when_apply_mtu_then_ip_link_is_not_called(self):
+        self.host.write_text("/sys/class/net/eth1/mtu", "9000\n")
+
+        self.assertTrue(apply_mtu(self.host, "eth1", 9000))
+        self.assertEqual(self.host.commands, [])
+
+    def test_given_mtus_when_persist_mtus_then_netplan_drop_in_is_written(self):
+        self.assertTrue(persist_mtus(self.host, {"eth1": 9000, "eth0": 1500}))
+
+        self.assertEqual(
+            self.host.files[NETPLAN_MTU_FILE],
+            "# Managed by the magma-access-gateway-operator charm\n"
+            "network:\n"
+            "  version: 2\n"
+            "  ethernets:\n"
+            "    eth0:\n"
+            "      mtu: 1500\n"
+            "    eth1:\n"
+            "      mtu: 9000\n",
+        )
+        self.assertEqual(self.host.modes[NETPLAN_MTU_FILE], 0o600)
+        self.assertFalse(persist_mtus(self.host, {"eth0": 1500, "eth1": 9000}))
+
+    def test_given_no_mtu_when_persist_mtus_then_netplan_drop_in_is_removed(self):
+        persist_mtus(self.host, {"eth1": 9000})
+
+        self.assertTrue(persist_mtus(self.host, {}))
+        self.assertFalse(self.host.exists(NETPLAN_MTU_FILE))
+        self.assertFalse(persist_mtus(self.host, {}))
@@ -0,0 +1,116 @@
+# Copyright 2022 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+import unittest
+
+from fakes import InMemoryHost
+
+from log_volume import (
+    LogForwarderBuffering,
+    apply_journald_rate_limit,
+    is_valid_log_levels,
+    log_level_overlay,
+    set_section_option,
+)
+
+FLUENT_BIT_TEMPLATE = """[SERVICE]
+    Flush        5
+    Log_Level    info
+
+[INPUT]
+    Name         tail
+    Path         /var/log/syslog
+
+[INPUT]
+    Name         systemd
+    Mem_Buf_Limit 1MB
+"""
+FLUENT_BIT_TEMPLATE_FILE = "/etc/magma/templates/td-agent-bit.conf.template"
+JOURNALD_DROP_IN = "/etc/systemd/journald.conf.d/60-magma-access-gateway.conf"
+
+
+class TestLogVolume(unittest.TestCase):
+    def setUp(self):
+        self.host = InMemoryHost(files={FLUENT_BIT_TEMPLATE_FILE: FLUENT_BIT_TEMPLATE})
+
+    def test_given_invalid_log_levels_when_validate_then_false_is_returned(self):
+        self.assertTrue(is_valid_log_levels("mme,pipelined=WARNING *=ERROR"))
+        self.assertFalse(is_valid_log_levels("mme=VERBOSE"))
+
+    def test_given_log_levels_when_log_level_overlay_then_default_applies_to_files_with_log_level(  # noqa: E501
+        self,
+    ):
+        self.host.write_text("/etc/magma/mme.yml", "log_level: INFO\n")
+        self.host.write_text("/etc/magma/sessiond.yml", "log_level: INFO\n")
+        self.host.write_text("/etc/magma/redis.yml", "port: 6380\n")
+
+        self.assertEqual(
+            log_level_overlay(self.host, "mme=WARNING *=ERROR"),
+            {
+                "mme.yml": {"log_level": "WARNING"},
+                "sessiond.yml": {"log_level": "ERROR"},
+            },
+        )
+
+    def test_given_rate_limits_when_apply_journald_rate_limit_then_drop_in_is_written_and_journald_restarted(  # noqa: E501
+        self,
+    ):
+        self.assertTrue(apply_journald_rate_limit(self.host, "30s", 1000))
+
+        self.assertEqual(
+            self.host.files[JOURNALD_DROP_IN],
+            "# Managed by the magma-access-gateway-operator charm\n"
+            "[Journal]\n"
+            "RateLimitIntervalSec=30s\n"
+            "RateLimitBurst=1000\n",
+        )
+        self.assertEqual(self.host.commands, [["systemctl", "restart", "systemd-journald"]])
+        self.assertFalse(apply_journald_rate_limit(self.host, "30s", 1000))
+        self.assertTrue(apply_journald_rate_limit(self.host, "", 0))
+        self.assertFalse(self.host.exists(JOURNALD_DROP_IN))
+
+    def test_given_section_option_when_set_section_option_then_option_is_replaced_in_each_section(  # noqa: E501
+        self,
+    ):
+        lines = set_section_option(
+            FLUENT_BIT_TEMPLATE.splitlines(), "INPUT", "Mem_Buf_Limit", "5MB"
+        )
+
+        self.assertEqual(
+            lines,
+            [
+                "[SERVICE]",
+                "    Flush        5",
+                "    Log_Level    info",
+                "",
+                "[INPUT]",
+                "    Mem_Buf_Limit 5MB",
+                "    Name         tail",
+                "    Path         /var/log/syslog",
+                "",
+                "[INPUT]",
+                "    Mem_Buf_Limit 5MB",
+                "    Name         systemd",
+            ],
+        )
+
+    def test_given_buffering_settings_when_apply_then_template_is_rendered_from_original(self):
+        forwarder = LogForwarderBuffering(self.host)
+
+        self.assertTrue(forwarder.apply(30, ""))
+        self.assertTrue(forwarder.apply(10, ""))
+        self.assertFalse(forwarder.apply(10, ""))
+
+        self.assertIn(
+            "[SERVICE]\n    Flush 10\n    Log_Level", self.host.files[FLUENT_BIT_TEMPLATE_FILE]
+        )
+        self.assertNotIn("Flush        5", self.host.files[FLUENT_BIT_TEMPLATE_FILE])
+
+    def test_given_buffering_settings_removed_when_apply_then_original_template_is_restored(self):
+        forwarder = LogForwarderBuffering(self.host)
+        forwarder.apply(30, "5MB")
+
+        self.assertTrue(forwarder.apply(0, ""))
+
+        self.assertEqual(self.host.files[FLUENT_BIT_TEMPLATE_FILE], FLUENT_BIT_TEMPLATE)
+        self.assertEqual(self.host.glob("/etc/magma/templates/*.orig"), [])
@@ -0,0 +1,39 @@
+# Copyright 2022 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+import unittest
+
+from magmad_intervals import (
+    jitter_fraction,
+    jittered_interval,
+    magmad_intervals_overlay,
+)
+
+
+class TestMagmadIntervals(unittest.TestCase):
+    def test_given_unit_name_when_jitter_fraction_then_fraction_is_deterministic_and_below_one(
+        self,
+    ):
+        fraction = jitter_fraction("agw/0")
+
+        self.assertEqual(fraction, jitter_fraction("agw/0"))
+        self.assertNotEqual(fraction, jitter_fraction("agw/1"))
+        self.assertTrue(0 <= fraction < 1)
+
+    def test_given_jitter_when_jittered_interval_then_interval_is_never_shortened(self):
+        for unit in range(50):
+            interval = jittered_interval(600, 20, f"agw/{unit}")
+
+            self.assertTrue(600 <= interval < 720)
+
+    def test_given_no_jitter_when_jittered_interval_then_interval_is_unchanged(self):
+        self.assertEqual(jittered_interval(60, 0, "agw/0"), 60)
+
+    def test_given_intervals_when_magmad_intervals_overlay_then_magmad_and_metricsd_are_set(
+        self,
+    ):
+        self.assertEqual(
+            magmad_intervals_overlay(600, 300, 50, "agw/0"),
+            {"magmad.yml": {"checkin_interval": 849}, "metricsd.yml": {"sync_interval": 424}},
+        )
+        self.assertEqual(magmad_intervals_overlay(0, 0, 50, "agw/0"), {})
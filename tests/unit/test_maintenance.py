@@ -0,0 +1,64 @@
+# Copyright 2022 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+import unittest
+from datetime import datetime, time
+
+from fakes import InMemoryHost
+
+from maintenance import (
+    active_sessions,
+    in_maintenance_window,
+    is_valid_maintenance_window,
+    parse_maintenance_window,
+)
+
+# 2022-10-15 is a Saturday
+SATURDAY = datetime(2022, 10, 15)
+
+
+class TestMaintenance(unittest.TestCase):
+    def test_given_window_with_days_when_parse_maintenance_window_then_days_and_times_are_returned(  # noqa: E501
+        self,
+    ):
+        self.assertEqual(
+            parse_maintenance_window("sat,sun 02:00-04:30"), ([5, 6], time(2, 0), time(4, 30))
+        )
+
+    def test_given_invalid_windows_when_is_valid_maintenance_window_then_false_is_returned(self):
+        for window in ["02:00", "someday 02:00-04:00", "25:00-26:00", "2:00-4:00"]:
+            self.assertFalse(is_valid_maintenance_window(window), window)
+
+    def test_given_empty_window_when_in_maintenance_window_then_true_is_returned(self):
+        self.assertTrue(in_maintenance_window("", SATURDAY.replace(hour=12)))
+
+    def test_given_daily_window_when_in_maintenance_window_then_only_times_within_it_match(self):
+        self.assertTrue(in_maintenance_window("02:00-04:00", SATURDAY.replace(hour=3)))
+        self.assertFalse(in_maintenance_window("02:00-04:00", SATURDAY.replace(hour=4)))
+
+    def test_given_window_on_other_days_when_in_maintenance_window_then_false_is_returned(self):
+        self.assertFalse(in_maintenance_window("mon,tue 02:00-04:00", SATURDAY.replace(hour=3)))
+
+    def test_given_window_spanning_midnight_when_in_maintenance_window_then_it_continues_the_next_day(  # noqa: E501
+        self,
+    ):
+        self.assertTrue(in_maintenance_window("fri 23:00-01:00", SATURDAY.replace(hour=0)))
+        self.assertFalse(in_maintenance_window("sat 23:00-01:00", SATURDAY.replace(hour=0)))
+        self.assertTrue(in_maintenance_window("sat 23:00-01:00", SATURDAY.replace(hour=23)))
+
+    def test_given_subscriber_table_when_active_sessions_then_subscribers_are_counted(self):
+        host = InMemoryHost()
+        host.set_result(
+            ["mobility_cli.py", "get_subscriber_table"],
+            stdout="SID\t\tIP\t\tAPN\nIMSI001010000000001\t192.168.128.12\tinternet\n"
+            "IMSI001010000000002\t192.168.128.13\tinternet\n",
+        )
+
+        self.assertEqual(active_sessions(host), 2)
+        self.assertEqual(host.commands, [["mobility_cli.py", "get_subscriber_table"]])
+
+    def test_given_mobility_cli_fails_when_active_sessions_then_none_is_returned(self):
+        host = InMemoryHost()
+        host.set_result(["mobility_cli.py", "get_subscriber_table"], returncode=1)
+
+        self.assertIsNone(active_sessions(host))
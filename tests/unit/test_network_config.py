@@ -0,0 +1,138 @@
+# Copyright 2022 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+import unittest
+
+from fakes import InMemoryHost
+
+from network_config import (
+    ROUTE,
+    InterfaceAddressing,
+    NetworkApplyError,
+    NetworkConfiguration,
+    interface_services,
+    render_interface,
+)
+
+INSTALLER_NETPLAN = """network:
+  ethernets:
+    enp0s1:
+      set-name: eth0
+      dhcp4: true
+    enp0s3:
+      dhcp4: true
+"""
+INSTALLER_NETPLAN_FILE = "/etc/netplan/50-installer.yaml"
+NETPLAN_NETWORK_FILE = "/etc/netplan/90-magma-access-gateway-network.yaml"
+IP_ADDRESS_SHOW = ["ip", "-json", "address", "show", "dev", "eth0"]
+PING_GATEWAY = ["ping", "-c", "1", "-W", "2", "-I", "eth0", "192.168.0.1"]
+IP_ROUTE_SHOW = ["ip", "-4", "-json", "route", "show", "default", "dev", "eth0"]
+
+
+class TestNetworkConfig(unittest.TestCase):
+    def setUp(self):
+        self.host = InMemoryHost(
+            files={
+                INSTALLER_NETPLAN_FILE: INSTALLER_NETPLAN,
+                "/sys/class/net/eth0/address": "00:00:00:00:00:01\n",
+            }
+        )
+        self.host.set_result(
+            IP_ADDRESS_SHOW, stdout='[{"addr_info":[{"local":"192.168.0.3","prefixlen":24}]}]'
+        )
+        self.addressing = InterfaceAddressing(
+            name="eth0",
+            ipv4_address="192.168.0.3/24",
+            ipv4_gateway="192.168.0.1",
+            dns=["8.8.8.8"],
+        )
+
+    def test_given_static_addressing_when_render_interface_then_addresses_routes_and_dns_are_set(  # noqa: E501
+        self,
+    ):
+        self.assertEqual(
+            render_interface(self.host, self.addressing),
+            {
+                "match": {"macaddress": "00:00:00:00:00:01"},
+                "set-name": "eth0",
+                "dhcp4": False,
+                "addresses": ["192.168.0.3/24"],
+                "routes": [{"to": "default", "via": "192.168.0.1"}],
+                "nameservers": {"addresses": ["8.8.8.8"]},
+            },
+        )
+
+    def test_given_no_ipv4_address_when_render_interface_then_dhcp_is_used(self):
+        self.assertEqual(
+            render_interface(self.host, InterfaceAddressing(name="eth0")),
+            {"match": {"macaddress": "00:00:00:00:00:01"}, "set-name": "eth0", "dhcp4": True},
+        )
+
+    def test_given_installer_netplan_when_apply_then_interface_is_taken_over_and_applied(self):
+        changed = NetworkConfiguration(self.host, [self.addressing]).apply()
+
+        self.assertEqual(changed, ["eth0"])
+        self.assertIn("192.168.0.3/24", self.host.files[NETPLAN_NETWORK_FILE])
+        self.assertEqual(self.host.modes[NETPLAN_NETWORK_FILE], 0o600)
+        self.assertEqual(
+            self.host.files[INSTALLER_NETPLAN_FILE],
+            "network:\n  ethernets:\n    enp0s3:\n      dhcp4: true\n",
+        )
+        self.assertEqual(self.host.commands, [["netplan", "apply"], IP_ADDRESS_SHOW, PING_GATEWAY])
+
+    def test_given_configuration_already_applied_when_apply_then_netplan_is_not_applied(self):
+        NetworkConfiguration(self.host, [self.addressing]).apply()
+        self.host.commands.clear()
+
+        self.assertEqual(NetworkConfiguration(self.host, [self.addressing]).apply(), [])
+        self.assertEqual(self.host.commands, [])
+
+    def test_given_gateway_unreachable_when_apply_then_previous_configuration_is_restored(self):
+        self.host.set_result(PING_GATEWAY, returncode=1)
+
+        with self.assertRaises(NetworkApplyError):
+            NetworkConfiguration(self.host, [self.addressing]).apply()
+
+        self.assertEqual(self.host.files[INSTALLER_NETPLAN_FILE], INSTALLER_NETPLAN)
+        self.assertFalse(self.host.exists(NETPLAN_NETWORK_FILE))
+        self.assertEqual(self.host.commands[-1], ["netplan", "apply"])
+
+    def test_given_gateway_filters_icmp_when_apply_with_route_check_then_configuration_is_kept(
+        self,
+    ):
+        self.host.write_text("/sys/class/net/eth0/carrier", "1\n")
+        self.host.set_result(PING_GATEWAY, returncode=1)
+        self.host.set_result(IP_ROUTE_SHOW, stdout='[{"dst":"default","gateway":"192.168.0.1"}]')
+
+        changed = NetworkConfiguration(self.host, [self.addressing], gateway_check=ROUTE).apply()
+
+        self.assertEqual(changed, ["eth0"])
+        self.assertEqual(
+            self.host.commands, [["netplan", "apply"], IP_ADDRESS_SHOW, IP_ROUTE_SHOW]
+        )
+
+    def test_given_no_default_route_through_gateway_when_apply_with_route_check_then_previous_configuration_is_restored(  # noqa: E501
+        self,
+    ):
+        self.host.write_text("/sys/class/net/eth0/carrier", "1\n")
+        self.host.set_result(IP_ROUTE_SHOW, stdout='[{"dst":"default","gateway":"192.168.0.254"}]')
+
+        with self.assertRaises(NetworkApplyError):
+            NetworkConfiguration(self.host, [self.addressing], gateway_check=ROUTE).apply()
+
+        self.assertEqual(self.host.files[INSTALLER_NETPLAN_FILE], INSTALLER_NETPLAN)
+
+    def test_given_no_carrier_when_apply_with_route_check_then_previous_configuration_is_restored(
+        self,
+    ):
+        self.host.write_text("/sys/class/net/eth0/carrier", "0\n")
+
+        with self.assertRaises(NetworkApplyError):
+            NetworkConfiguration(self.host, [self.addressing], gateway_check=ROUTE).apply()
+
+        self.assertNotIn(IP_ROUTE_SHOW, self.host.commands)
+
+    def test_given_changed_interfaces_when_interface_services_then_bound_services_are_returned(
+        self,
+    ):
+        self.assertEqual(interface_services(["s1"]), ["magma@mme", "sctpd"])
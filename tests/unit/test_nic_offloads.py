@@ -0,0 +1,125 @@
+# Copyright 2022 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+import unittest
+
+from fakes import InMemoryHost
+
+from nic_offloads import (
+    NICOffloads,
+    is_valid_offloads,
+    is_valid_ring_sizes,
+    persist_nic_settings,
+)
+
+ETHTOOL_FEATURES = """Features for eth1:
+rx-checksumming: on
+tx-checksumming: on
+\ttx-checksum-ipv4: off [fixed]
+scatter-gather: on
+tcp-segmentation-offload: on
+generic-segmentation-offload: on
+generic-receive-offload: off
+large-receive-offload: off [fixed]
+"""
+
+ETHTOOL_RINGS = """Ring parameters for eth1:
+Pre-set maximums:
+RX:\t\t4096
+RX Mini:\tn/a
+RX Jumbo:\t0
+TX:\t\t4096
+Current hardware settings:
+RX:\t\t512
+RX Mini:\tn/a
+RX Jumbo:\t0
+TX:\t\t4096
+"""
+NIC_TUNING_UNIT_FILE = "/etc/systemd/system/magma-access-gateway-nic-tuning.service"
+
+
+class TestNICOffloads(unittest.TestCase):
+    def setUp(self):
+        self.host = InMemoryHost()
+        self.host.set_result(["/sbin/ethtool", "-k", "eth1"], stdout=ETHTOOL_FEATURES)
+        self.host.set_result(["/sbin/ethtool", "-g", "eth1"], stdout=ETHTOOL_RINGS)
+
+    def test_given_settings_when_validate_then_only_known_features_and_rings_are_valid(self):
+        self.assertTrue(is_valid_offloads("gro=on,tso=off"))
+        self.assertFalse(is_valid_offloads("gro=yes"))
+        self.assertFalse(is_valid_offloads("turbo=on"))
+        self.assertTrue(is_valid_ring_sizes("rx=4096,tx=1024"))
+        self.assertFalse(is_valid_ring_sizes("rx=0"))
+        self.assertFalse(is_valid_ring_sizes("rx-jumbo=4096"))
+
+    def test_given_ethtool_output_when_read_settings_then_features_and_ring_sizes_are_returned(
+        self,
+    ):
+        nic = NICOffloads(self.host, "eth1")
+
+        self.assertEqual(
+            nic.features(),
+            {
+                "rx": "on",
+                "tx": "on",
+                "sg": "on",
+                "tso": "on",
+                "gso": "on",
+                "gro": "off",
+                "lro": "off",
+            },
+        )
+        self.assertEqual(nic.ring_sizes(), ({"rx": 4096, "tx": 4096}, {"rx": 512, "tx": 4096}))
+
+    def test_given_settings_differ_when_apply_then_only_changed_settings_are_applied(self):
+        nic = NICOffloads(self.host, "eth1")
+
+        applied = nic.apply({"gro": "on", "tso": "on"}, {"rx": 4096, "tx": 4096})
+
+        self.assertTrue(applied)
+        self.assertEqual(
+            self.host.commands[-2:],
+            [
+                ["/sbin/ethtool", "-K", "eth1", "gro", "on"],
+                ["/sbin/ethtool", "-G", "eth1", "rx", "4096"],
+            ],
+        )
+
+    def test_given_ring_size_exceeds_maximum_when_apply_then_nothing_is_applied(self):
+        with self.assertLogs() as captured:
+            applied = NICOffloads(self.host, "eth1").apply({}, {"rx": 8192})
+
+        self.assertFalse(applied)
+        self.assertEqual(self.host.commands, [["/sbin/ethtool", "-g", "eth1"]])
+        self.assertEqual(
+            "rx ring size 8192 exceeds the maximum of eth1 (4096)",
+            captured.records[0].getMessage(),
+        )
+
+    def test_given_settings_when_persist_then_boot_unit_is_written_and_enabled(self):
+        persist_nic_settings(self.host, {"eth1": ({"gro": "on"}, {"rx": 4096})})
+
+        unit = self.host.files[NIC_TUNING_UNIT_FILE]
+        self.assertIn("After=sys-subsystem-net-devices-eth1.device\n", unit)
+        self.assertIn("ExecStart=/sbin/ethtool -K eth1 gro on\n", unit)
+        self.assertIn("ExecStart=/sbin/ethtool -G eth1 rx 4096\n", unit)
+        self.assertEqual(
+            self.host.commands,
+            [
+                ["systemctl", "daemon-reload"],
+                ["systemctl", "enable", "magma-access-gateway-nic-tuning.service"],
+            ],
+        )
+        self.host.commands.clear()
+        self.assertFalse(persist_nic_settings(self.host, {"eth1": ({"gro": "on"}, {"rx": 4096})}))
+        self.assertEqual(self.host.commands, [])
+
+    def test_given_no_settings_when_persist_then_boot_unit_is_disabled_and_removed(self):
+        persist_nic_settings(self.host, {"eth1": ({"gro": "on"}, {})})
+
+        self.assertTrue(persist_nic_settings(self.host, {}))
+
+        self.assertFalse(self.host.exists(NIC_TUNING_UNIT_FILE))
+        self.assertIn(
+            ["systemctl", "disable", "magma-access-gateway-nic-tuning.service"], self.host.commands
+        )
@@ -0,0 +1,92 @@
+# Copyright 2022 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+import unittest
+
+from onboarding import OnboardingTimeline, first_check_in, onboarding_metrics
+
+
+class TestOnboardingTimeline(unittest.TestCase):
+    def test_given_relation_created_when_start_then_creation_time_is_kept(self):
+        timeline = OnboardingTimeline({"relation-created": 100.0})
+
+        timeline.start(110.0)
+
+        self.assertEqual(timeline.marks, {"relation-created": 100.0, "relation-data": 110.0})
+        self.assertEqual(timeline.next_stage, "config-install")
+
+    def test_given_completed_onboarding_when_start_then_previous_marks_are_dropped(self):
+        timeline = OnboardingTimeline(
+            {
+                "relation-created": 100.0,
+                "relation-data": 110.0,
+                "config-install": 111.0,
+                "restart": 140.0,
+                "bootstrap": 150.0,
+                "check-in": 160.0,
+            }
+        )
+        self.assertIsNone(timeline.next_stage)
+
+        timeline.start(500.0)
+
+        self.assertEqual(timeline.marks, {"relation-data": 500.0})
+
+    def test_given_stage_not_in_progress_when_mark_then_value_error_is_raised(self):
+        timeline = OnboardingTimeline({"relation-data": 110.0})
+
+        with self.assertRaises(ValueError):
+            timeline.mark("bootstrap", 120.0)
+
+    def test_given_onboarding_in_progress_when_durations_then_unknown_stages_are_none(self):
+        timeline = OnboardingTimeline({"relation-data": 110.0, "config-install": 111.5})
+
+        self.assertEqual(
+            timeline.durations(),
+            {
+                "relation-data": None,
+                "config-install": 1.5,
+                "restart": None,
+                "bootstrap": None,
+                "check-in": None,
+            },
+        )
+        self.assertIsNone(timeline.total)
+
+    def test_given_completed_onboarding_when_onboarding_metrics_then_stages_and_total_are_exported(  # noqa: E501
+        self,
+    ):
+        timeline = OnboardingTimeline(
+            {
+                "relation-data": 110.0,
+                "config-install": 111.0,
+                "restart": 140.0,
+                "bootstrap": 150.0,
+                "check-in": 160.0,
+            }
+        )
+
+        metrics = onboarding_metrics(timeline)
+
+        self.assertNotIn('stage="relation-data"', metrics)
+        self.assertIn('magma_onboarding_stage_duration_seconds{stage="restart"} 29.0\n', metrics)
+        self.assertIn("magma_onboarding_duration_seconds 50.0\n", metrics)
+
+
+class TestFirstCheckIn(unittest.TestCase):
+    def test_given_magmad_journal_when_first_check_in_then_time_of_first_check_in_is_returned(
+        self,
+    ):
+        journal = (
+            "1700000000.500000 agw magmad[42]: INFO:root:Checkin Successful! "
+            "Successfully sent states to the cloud!\n"
+            "1700000060.500000 agw magmad[42]: INFO:root:Checkin Successful! "
+            "Successfully sent states to the cloud!\n"
+        )
+
+        self.assertEqual(first_check_in(journal), 1700000000.5)
+
+    def test_given_journal_without_check_in_when_first_check_in_then_none_is_returned(self):
+        journal = "1700000000.500000 agw magmad[42]: ERROR:root:Checkin Error! Failed to sync\n"
+
+        self.assertIsNone(first_check_in(journal))
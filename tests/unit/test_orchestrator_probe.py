@@ -0,0 +1,117 @@
+# Copyright 2022 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+import socket
+import unittest
+
+from tls_helpers import ROOT_CA, start_tls_server
+
+from orchestrator_probe import (
+    Endpoint,
+    OrchestratorProbe,
+    ProbeReport,
+    control_proxy_endpoints,
+    format_report,
+    percentile,
+)
+
+
+def unused_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class TestOrchestratorProbe(unittest.TestCase):
+    def test_given_stand_in_servers_when_probe_then_every_sample_of_every_endpoint_succeeds(
+        self,
+    ):
+        endpoints = {
+            "orchestrator": Endpoint("localhost", start_tls_server(self)),
+            "bootstrapper": Endpoint("localhost", start_tls_server(self)),
+        }
+
+        reports = OrchestratorProbe(root_ca=ROOT_CA, timeout=2).probe(endpoints, samples=3)
+
+        self.assertEqual(list(reports), ["orchestrator", "bootstrapper"])
+        for report in reports.values():
+            self.assertEqual(report.errors, [])
+            self.assertEqual(
+                [len(report.samples[step]) for step in ("dns", "tcp", "tls")], [3] * 3
+            )
+
+    def test_given_endpoint_refuses_connections_when_probe_then_failures_are_reported(self):
+        endpoints = {
+            "orchestrator": Endpoint("localhost", start_tls_server(self)),
+            "fluentd": Endpoint("localhost", unused_port()),
+        }
+
+        reports = OrchestratorProbe(root_ca=ROOT_CA, timeout=2).probe(endpoints, samples=2)
+
+        self.assertEqual(reports["orchestrator"].errors, [])
+        self.assertEqual(len(reports["fluentd"].errors), 2)
+        self.assertEqual(reports["fluentd"].samples["tcp"], [])
+
+    def test_given_certificate_not_signed_by_root_ca_when_probe_then_handshake_fails(self):
+        endpoints = {"orchestrator": Endpoint("localhost", start_tls_server(self))}
+
+        reports = OrchestratorProbe(root_ca=None, timeout=2).probe(endpoints, samples=1)
+
+        self.assertIn("CERTIFICATE_VERIFY_FAILED", reports["orchestrator"].errors[0])
+
+    def test_given_control_proxy_configuration_when_control_proxy_endpoints_then_endpoints_are_returned(  # noqa: E501
+        self,
+    ):
+        endpoints = control_proxy_endpoints(
+            "cloud_address: controller.example.com\n"
+            "cloud_port: 443\n"
+            "bootstrap_address: bootstrapper-controller.example.com\n"
+            "bootstrap_port: 443\n"
+            "fluentd_address: fluentd.example.com\n"
+            "fluentd_port: 24224\n"
+            "\n"
+            "rootca_cert: /var/opt/magma/tmp/certs/rootCA.pem\n"
+        )
+
+        self.assertEqual(
+            endpoints,
+            {
+                "orchestrator": Endpoint("controller.example.com", 443),
+                "bootstrapper": Endpoint("bootstrapper-controller.example.com", 443),
+                "fluentd": Endpoint("fluentd.example.com", 24224),
+            },
+        )
+
+    def test_given_invalid_yaml_when_control_proxy_endpoints_then_value_error_is_raised(self):
+        with self.assertRaises(ValueError):
+            control_proxy_endpoints("- a list")
+
+    def test_when_percentile_then_nearest_rank_is_returned(self):
+        values = [float(value) for value in range(10, 0, -1)]
+
+        self.assertEqual(
+            [percentile(values, rank) for rank in (50, 90, 99)],
+            [5.0, 9.0, 10.0],
+        )
+
+    def test_given_failed_samples_when_format_report_then_failures_and_last_error_are_reported(
+        self,
+    ):
+        report = ProbeReport(
+            endpoint=Endpoint("controller.example.com", 443),
+            samples={"dns": [1.0, 3.0], "tcp": [10.0, 20.0], "tls": [30.0, 40.0]},
+            errors=["timed out"],
+        )
+
+        self.assertEqual(
+            format_report(report),
+            {
+                "endpoint": "controller.example.com:443",
+                "samples": "2",
+                "failures": "1",
+                "dns": "p50=1.0ms p90=3.0ms p99=3.0ms",
+                "tcp": "p50=10.0ms p90=20.0ms p99=20.0ms",
+                "tls": "p50=30.0ms p90=40.0ms p99=40.0ms",
+                "last-error": "timed out",
+            },
+        )
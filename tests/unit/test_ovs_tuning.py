@@ -0,0 +1,97 @@
+# Copyright 2022 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+import subprocess
+import unittest
+from unittest.mock import call, patch
+
+from fakes import InMemoryHost
+
+from command_policy import OVS_POLICY
+from ovs_tuning import OVSTuning, parse_other_config
+
+OVS_GET_COMMAND = ["ovs-vsctl", "get", "Open_vSwitch", ".", "other_config"]
+
+
+def ovs_result(stdout: str = "") -> subprocess.CompletedProcess:
+    return subprocess.CompletedProcess([], 0, stdout=stdout.encode())
+
+
+class TestOVSTuning(unittest.TestCase):
+    def setUp(self):
+        self.host = InMemoryHost()
+
+    def test_given_ovs_vsctl_map_when_parse_other_config_then_keys_and_values_are_returned(self):
+        self.assertEqual(
+            parse_other_config('{flow-limit="200000", max-idle="10000", dpdk-init=false}\n'),
+            {"flow-limit": "200000", "max-idle": "10000", "dpdk-init": "false"},
+        )
+        self.assertEqual(parse_other_config("{}\n"), {})
+
+    def test_given_new_settings_when_apply_then_settings_are_set_and_verified(self):
+        results = [
+            ovs_result("{}\n"),
+            ovs_result(),
+            ovs_result('{flow-limit="400000", n-handler-threads="4"}\n'),
+        ]
+
+        with patch.object(self.host, "run", side_effect=results) as patch_run:
+            applied = OVSTuning(self.host).apply(
+                {
+                    "ovs-n-handler-threads": 4,
+                    "ovs-n-revalidator-threads": 0,
+                    "ovs-flow-limit": 400000,
+                    "ovs-max-idle": 0,
+                }
+            )
+
+        self.assertTrue(applied)
+        patch_run.assert_has_calls(
+            [
+                call(OVS_GET_COMMAND, OVS_POLICY),
+                call(
+                    [
+                        "ovs-vsctl",
+                        "set",
+                        "Open_vSwitch",
+                        ".",
+                        "other_config:n-handler-threads=4",
+                        "other_config:flow-limit=400000",
+                    ],
+                    OVS_POLICY,
+                ),
+                call(OVS_GET_COMMAND, OVS_POLICY),
+            ]
+        )
+
+    def test_given_setting_reset_to_zero_when_apply_then_setting_is_removed(self):
+        results = [ovs_result('{max-idle="10000"}\n'), ovs_result(), ovs_result("{}\n")]
+
+        with patch.object(self.host, "run", side_effect=results) as patch_run:
+            applied = OVSTuning(self.host).apply({"ovs-max-idle": 0})
+
+        self.assertTrue(applied)
+        patch_run.assert_has_calls(
+            [
+                call(
+                    ["ovs-vsctl", "remove", "Open_vSwitch", ".", "other_config", "max-idle"],
+                    OVS_POLICY,
+                )
+            ]
+        )
+
+    def test_given_settings_already_applied_when_apply_then_nothing_is_changed(self):
+        self.host.set_result(OVS_GET_COMMAND, stdout='{max-idle="10000"}\n')
+
+        self.assertTrue(OVSTuning(self.host).apply({"ovs-max-idle": 10000, "ovs-flow-limit": 0}))
+        self.assertEqual(self.host.commands, [OVS_GET_COMMAND])
+
+    def test_given_setting_did_not_take_effect_when_apply_then_false_is_returned(self):
+        self.host.set_result(OVS_GET_COMMAND, stdout="{}\n")
+
+        self.assertFalse(OVSTuning(self.host).apply({"ovs-flow-limit": 1000}))
+
+    def test_given_ovs_is_not_installed_when_apply_then_none_is_returned(self):
+        self.host.results[tuple(OVS_GET_COMMAND)] = FileNotFoundError("ovs-vsctl")
+
+        self.assertIsNone(OVSTuning(self.host).apply({"ovs-flow-limit": 1000}))
@@ -0,0 +1,106 @@
+# Copyright 2022 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+import unittest
+
+from fakes import InMemoryHost
+
+from redis_tuning import (
+    RedisTuning,
+    is_valid_maxmemory,
+    is_valid_save,
+    redis_directives,
+)
+
+REDIS_TEMPLATE = """# Redis configuration
+save 900 1
+appendfsync always
+"""
+REDIS_TEMPLATE_FILE = "/etc/magma/templates/redis.conf.template"
+
+
+class TestRedisTuning(unittest.TestCase):
+    def setUp(self):
+        self.host = InMemoryHost(files={REDIS_TEMPLATE_FILE: REDIS_TEMPLATE})
+
+    def test_given_invalid_values_when_validate_then_false_is_returned(self):
+        self.assertTrue(is_valid_save("900 1 300 10"))
+        self.assertTrue(is_valid_save("off"))
+        self.assertFalse(is_valid_save("900"))
+        self.assertTrue(is_valid_maxmemory("2GB"))
+        self.assertFalse(is_valid_maxmemory("2 gb"))
+
+    def test_given_settings_when_redis_directives_then_save_points_are_reset_first(self):
+        self.assertEqual(
+            redis_directives("900 1 300 10", "everysec", "2GB"),
+            ['save ""', "save 900 1", "save 300 10", "appendfsync everysec", "maxmemory 2gb"],
+        )
+        self.assertEqual(redis_directives("off", "", ""), ['save ""'])
+
+    def test_given_settings_when_apply_then_block_is_appended_to_template(self):
+        self.assertTrue(RedisTuning(self.host).apply("off", "no", ""))
+
+        self.assertEqual(
+            self.host.files[REDIS_TEMPLATE_FILE],
+            REDIS_TEMPLATE + "# BEGIN magma-access-gateway-operator\n"
+            'save ""\n'
+            "appendfsync no\n"
+            "# END magma-access-gateway-operator\n",
+        )
+
+    def test_given_block_in_template_when_apply_new_settings_then_block_is_replaced(self):
+        redis = RedisTuning(self.host)
+        redis.apply("off", "no", "")
+
+        self.assertTrue(redis.apply("", "", "1gb"))
+        self.assertFalse(redis.apply("", "", "1gb"))
+
+        self.assertEqual(
+            self.host.files[REDIS_TEMPLATE_FILE],
+            REDIS_TEMPLATE + "# BEGIN magma-access-gateway-operator\n"
+            "maxmemory 1gb\n"
+            "# END magma-access-gateway-operator\n",
+        )
+
+    def test_given_settings_removed_when_apply_then_template_is_restored(self):
+        redis = RedisTuning(self.host)
+        redis.apply("off", "no", "")
+
+        self.assertTrue(redis.apply("", "", ""))
+
+        self.assertEqual(self.host.files[REDIS_TEMPLATE_FILE], REDIS_TEMPLATE)
+
+    def test_given_no_block_in_template_when_apply_without_settings_then_template_is_not_written(
+        self,
+    ):
+        self.host.files[REDIS_TEMPLATE_FILE] = REDIS_TEMPLATE + "\n\n"
+
+        self.assertFalse(RedisTuning(self.host).apply("", "", ""))
+
+        self.assertEqual(self.host.files[REDIS_TEMPLATE_FILE], REDIS_TEMPLATE + "\n\n")
+
+    def test_given_block_up_to_date_when_apply_then_template_is_not_written(self):
+        redis = RedisTuning(self.host)
+        redis.apply("off", "no", "")
+        self.host.files[REDIS_TEMPLATE_FILE] += "# Local addition\n"
+        template = self.host.files[REDIS_TEMPLATE_FILE]
+
+        self.assertFalse(redis.apply("off", "no", ""))
+
+        self.assertEqual(self.host.files[REDIS_TEMPLATE_FILE], template)
+
+    def test_given_services_depend_on_redis_when_affected_services_then_redis_and_dependents_are_returned(  # noqa: E501
+        self,
+    ):
+        self.host.set_result(
+            ["systemctl", "list-dependencies", "--reverse", "--plain", "magma@redis.service"],
+            stdout="magma@redis.service\nmagma@mobilityd.service\n"
+            "magma@sessiond.service\nmulti-user.target\n",
+        )
+
+        services = RedisTuning(self.host).affected_services()
+
+        self.assertEqual(
+            services,
+            ["magma@redis.service", "magma@mobilityd.service", "magma@sessiond.service"],
+        )
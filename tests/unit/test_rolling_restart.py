@@ -0,0 +1,239 @@
+# Copyright 2022 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+import json
+import unittest
+from typing import List
+from unittest.mock import patch
+
+from fakes import InMemoryHost
+from ops import testing
+from ops.charm import CharmBase
+from ops.model import WaitingStatus
+
+from command_policy import CommandTimeoutError
+from rolling_restart import (
+    BOOT_ID_FILE,
+    REBOOT,
+    RESTART,
+    RESTART_SERVICES,
+    RollingRestartLock,
+)
+
+METADATA = """
+name: agw
+peers:
+  agw-peers:
+    interface: agw-peers
+"""
+
+CONFIG = """
+options:
+  max-concurrent-restarts:
+    type: int
+    default: 1
+"""
+
+
+class DummyCharm(CharmBase):
+    host = InMemoryHost()
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.operations: List[str] = []
+        self.ready = False
+        self.can_run = True
+        self.times_out = False
+        self.lock = RollingRestartLock(
+            self,
+            "agw-peers",
+            self.host,
+            self._run_operation,
+            self._is_ready,
+            self._can_run,
+        )
+
+    def _run_operation(self, operation: str) -> None:
+        if self.times_out:
+            raise CommandTimeoutError(["shutdown", "--reboot", "+1"], 30)
+        self.operations.append(operation)
+
+    def _is_ready(self) -> bool:
+        return self.ready
+
+    def _can_run(self, operation: str) -> bool:
+        return self.can_run
+
+
+class TestRollingRestartLock(unittest.TestCase):
+    def setUp(self):
+        self.host = InMemoryHost(files={BOOT_ID_FILE: "boot-1\n"})
+        host_patcher = patch.object(DummyCharm, "host", self.host)
+        host_patcher.start()
+        self.addCleanup(host_patcher.stop)
+        self.harness = testing.Harness(DummyCharm, meta=METADATA, config=CONFIG)
+        self.addCleanup(self.harness.cleanup)
+        self.harness.set_leader(True)
+        self.harness.begin()
+        self.charm = self.harness.charm
+
+    def _add_peers(self, *units: str) -> int:
+        relation_id = self.harness.add_relation("agw-peers", "agw")
+        for unit in units:
+            self.harness.add_relation_unit(relation_id, unit)
+        return relation_id
+
+    def test_given_no_peer_relation_when_request_then_operation_runs_immediately(self):
+        self.charm.lock.request(RESTART)
+
+        self.assertEqual(self.charm.operations, [RESTART])
+
+    def test_given_lock_is_free_when_leader_requests_then_lock_is_granted_and_operation_runs(self):
+        relation_id = self._add_peers("agw/1")
+
+        self.charm.lock.request(REBOOT)
+
+        self.assertEqual(self.charm.operations, [REBOOT])
+        self.assertEqual(
+            json.loads(self.harness.get_relation_data(relation_id, "agw")["restart-lock-granted"]),
+            ["agw/0"],
+        )
+        self.assertTrue(self.charm.lock.is_held)
+
+    def test_given_lock_is_held_by_peer_when_request_then_operation_waits_for_the_lock(self):
+        relation_id = self._add_peers("agw/1")
+        self.harness.update_relation_data(relation_id, "agw/1", {"restart-lock": "requested"})
+
+        self.charm.lock.request(RESTART)
+
+        self.assertEqual(self.charm.operations, [])
+        self.assertEqual(self.charm.lock.pending_operation, RESTART)
+
+    def test_given_operation_waits_for_the_lock_when_peer_releases_it_then_operation_runs(self):
+        relation_id = self._add_peers("agw/1")
+        self.harness.update_relation_data(relation_id, "agw/1", {"restart-lock": "requested"})
+        self.charm.lock.request(RESTART)
+
+        self.harness.update_relation_data(relation_id, "agw/1", {"restart-lock": ""})
+
+        self.assertEqual(self.charm.operations, [RESTART])
+        self.assertEqual(self.charm.lock.pending_operation, "")
+
+    def test_given_max_concurrent_restarts_is_two_when_peer_holds_the_lock_then_operation_runs(
+        self,
+    ):
+        self.harness.update_config({"max-concurrent-restarts": 2})
+        relation_id = self._add_peers("agw/1")
+        self.harness.update_relation_data(relation_id, "agw/1", {"restart-lock": "requested"})
+
+        self.charm.lock.request(RESTART)
+
+        self.assertEqual(self.charm.operations, [RESTART])
+
+    def test_given_unit_is_not_leader_when_lock_is_granted_by_leader_then_operation_runs(self):
+        self.harness.set_leader(False)
+        relation_id = self._add_peers("agw/1")
+        self.charm.lock.request(RESTART)
+        self.assertEqual(self.charm.operations, [])
+
+        self.harness.update_relation_data(
+            relation_id, "agw", {"restart-lock-granted": json.dumps(["agw/0"])}
+        )
+
+        self.assertEqual(self.charm.operations, [RESTART])
+
+    def test_given_unit_is_not_leader_when_granted_operation_times_out_then_operation_stays_pending(  # noqa: E501
+        self,
+    ):
+        self.harness.set_leader(False)
+        relation_id = self._add_peers("agw/1")
+        self.charm.lock.request(REBOOT)
+        self.charm.times_out = True
+
+        self.harness.update_relation_data(
+            relation_id, "agw", {"restart-lock-granted": json.dumps(["agw/0"])}
+        )
+
+        self.assertEqual(self.charm.lock.pending_operation, REBOOT)
+        self.assertEqual(
+            self.charm.unit.status, WaitingStatus("Timed out trying to reboot. Will retry")
+        )
+        self.charm.times_out = False
+        self.charm.lock.process_pending()
+        self.assertEqual(self.charm.operations, [REBOOT])
+        self.assertTrue(self.charm.lock.is_held)
+
+    def test_given_restart_ran_when_magma_is_back_in_service_then_lock_is_released(self):
+        relation_id = self._add_peers("agw/1")
+        self.charm.lock.request(RESTART)
+
+        self.charm.ready = True
+        self.charm.lock.release_if_ready()
+
+        self.assertFalse(self.charm.lock.is_held)
+        self.assertEqual(
+            json.loads(self.harness.get_relation_data(relation_id, "agw")["restart-lock-granted"]),
+            [],
+        )
+
+    def test_given_reboot_was_requested_when_machine_did_not_reboot_yet_then_lock_is_kept(self):
+        self._add_peers("agw/1")
+        self.charm.ready = True
+
+        self.charm.lock.request(REBOOT)
+
+        self.assertTrue(self.charm.lock.is_held)
+
+    def test_given_reboot_was_requested_when_machine_rebooted_and_magma_is_back_in_service_then_lock_is_released(  # noqa: E501
+        self,
+    ):
+        self._add_peers("agw/1")
+        self.charm.ready = True
+        self.charm.lock.request(REBOOT)
+
+        self.host.write_text(BOOT_ID_FILE, "boot-2\n")
+        self.charm.lock.release_if_ready()
+
+        self.assertFalse(self.charm.lock.is_held)
+
+    def test_given_operation_cannot_run_yet_when_lock_is_granted_then_operation_stays_pending(
+        self,
+    ):
+        self._add_peers("agw/1")
+        self.charm.can_run = False
+
+        self.charm.lock.request(RESTART)
+
+        self.assertEqual(self.charm.operations, [])
+        self.assertEqual(self.charm.lock.pending_operation, RESTART)
+        self.assertFalse(self.charm.lock.is_waiting_for_lock)
+
+    def test_given_pending_operation_when_it_can_run_and_process_pending_then_operation_runs(
+        self,
+    ):
+        self.charm.can_run = False
+        self.charm.lock.request(REBOOT)
+        self.charm.can_run = True
+
+        self.charm.lock.process_pending()
+
+        self.assertEqual(self.charm.operations, [REBOOT])
+        self.assertEqual(self.charm.lock.pending_operation, "")
+
+    def test_given_pending_restart_when_services_restart_requested_then_restart_stays_pending(
+        self,
+    ):
+        self.charm.can_run = False
+        self.charm.lock.request(RESTART)
+
+        self.charm.lock.request(RESTART_SERVICES)
+
+        self.assertEqual(self.charm.lock.pending_operation, RESTART)
+
+    def test_given_pending_services_restart_when_reboot_requested_then_reboot_is_pending(self):
+        self.charm.can_run = False
+        self.charm.lock.request(RESTART_SERVICES)
+
+        self.charm.lock.request(REBOOT)
+
+        self.assertEqual(self.charm.lock.pending_operation, REBOOT)
@@ -0,0 +1,87 @@
+# Copyright 2022 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+import unittest
+
+from fakes import InMemoryHost
+
+from service_pinning import (
+    ServicePinning,
+    is_valid_cpu_affinity,
+    is_valid_scheduling_policy,
+    parse_service_groups,
+)
+
+
+class TestServicePinning(unittest.TestCase):
+    def setUp(self):
+        self.host = InMemoryHost()
+
+    def _drop_in(self, unit: str, name: str = "60-magma-access-gateway-cpu.conf") -> str:
+        return f"/etc/systemd/system/{unit}.d/{name}"
+
+    def test_given_service_groups_when_parse_service_groups_then_setting_of_each_service_is_returned(  # noqa: E501
+        self,
+    ):
+        self.assertEqual(
+            parse_service_groups("pipelined,sessiond=2-3 mme=4,5 *=0-1"),
+            {"pipelined": "2-3", "sessiond": "2-3", "mme": "4,5", "*": "0-1"},
+        )
+
+    def test_given_invalid_values_when_validate_then_false_is_returned(self):
+        self.assertTrue(is_valid_cpu_affinity("pipelined,sessiond=2-3 *=0-1"))
+        self.assertFalse(is_valid_cpu_affinity("pipelined=two"))
+        self.assertFalse(is_valid_cpu_affinity("=2-3"))
+        self.assertTrue(is_valid_scheduling_policy("pipelined=fifo:50 *=batch"))
+        self.assertFalse(is_valid_scheduling_policy("mme=rr"))
+        self.assertFalse(is_valid_scheduling_policy("mme=rr:100"))
+        self.assertFalse(is_valid_scheduling_policy("mme=batch:10"))
+
+    def test_given_service_groups_when_apply_then_drop_ins_are_written_for_each_service(self):
+        changed = ServicePinning(self.host).apply(
+            "pipelined,sessiond=2-3 *=0-1", "pipelined=fifo:50"
+        )
+
+        self.assertEqual(
+            changed, ["magma@.service", "magma@pipelined.service", "magma@sessiond.service"]
+        )
+        self.assertEqual(
+            self.host.files[self._drop_in("magma@pipelined.service")],
+            "# Managed by the magma-access-gateway-operator charm\n"
+            "[Service]\n"
+            "CPUAffinity=\n"
+            "CPUAffinity=2-3\n"
+            "CPUSchedulingPolicy=fifo\n"
+            "CPUSchedulingPriority=50\n",
+        )
+        self.assertTrue(
+            self.host.exists(self._drop_in("magma@.service", "50-magma-access-gateway-cpu.conf"))
+        )
+
+    def test_given_drop_ins_applied_when_apply_again_then_only_changed_units_are_returned(self):
+        pinning = ServicePinning(self.host)
+        pinning.apply("pipelined,sessiond=2-3", "")
+
+        changed = pinning.apply("pipelined=2-3", "")
+
+        self.assertEqual(changed, ["magma@sessiond.service"])
+        self.assertFalse(self.host.exists(self._drop_in("magma@sessiond.service")))
+
+    def test_given_changed_units_when_reload_then_systemd_is_reloaded_and_only_those_services_are_returned(  # noqa: E501
+        self,
+    ):
+        services = ServicePinning(self.host).reload(["magma@pipelined.service"])
+
+        self.assertEqual(services, ["magma@pipelined.service"])
+        self.assertEqual(self.host.commands, [["systemctl", "daemon-reload"]])
+
+    def test_given_template_changed_when_reload_then_every_magma_service_is_returned(self):
+        services = ServicePinning(self.host).reload(["magma@.service", "magma@mme.service"])
+
+        self.assertEqual(services, ["magma@*"])
+
+    def test_given_no_changed_units_when_reload_then_systemd_is_not_reloaded(self):
+        services = ServicePinning(self.host).reload([])
+
+        self.assertEqual(services, [])
+        self.assertEqual(self.host.commands, [])
@@ -0,0 +1,146 @@
+# Copyright 2022 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+import unittest
+from unittest.mock import Mock, patch
+
+from fakes import InMemoryHost
+
+from service_startup import (
+    POLL_INTERVAL,
+    STARTUP_TIMEOUT,
+    ServiceStartup,
+    StartupTimings,
+    format_metrics,
+)
+
+
+class TestServiceStartup(unittest.TestCase):
+    def setUp(self):
+        self.clock = 0.0
+        sleep_patcher = patch("time.sleep", Mock(side_effect=self._sleep))
+        sleep_patcher.start()
+        self.addCleanup(sleep_patcher.stop)
+        monotonic_patcher = patch("time.monotonic", Mock(side_effect=lambda: self.clock))
+        monotonic_patcher.start()
+        self.addCleanup(monotonic_patcher.stop)
+
+    def _sleep(self, seconds):
+        self.clock += seconds
+
+    def test_given_independent_services_when_start_then_services_are_started_together(self):
+        host = InMemoryHost()
+
+        timings = ServiceStartup(host).start(["magma@magmad", "magma@mme", "magma@redis"])
+
+        self.assertEqual(
+            [transition[0] for transition in host.transitions if transition[2] == "activating"],
+            ["magma@magmad", "magma@mme", "magma@redis"],
+        )
+        self.assertEqual(
+            timings,
+            StartupTimings(
+                services={"magma@magmad": 0.5, "magma@mme": 0.5, "magma@redis": 0.5}, total=0.5
+            ),
+        )
+
+    def test_given_service_ordered_after_another_when_start_then_it_starts_once_the_other_is_active(  # noqa: E501
+        self,
+    ):
+        host = InMemoryHost(
+            after={
+                "magma@sessiond": ["magma@redis", "sys-fs-fuse-connections.mount"],
+                "magma@mme": ["magma@sessiond"],
+            }
+        )
+
+        timings = ServiceStartup(host).start(["magma@mme", "magma@redis", "magma@sessiond"])
+
+        self.assertEqual(
+            host.transitions,
+            [
+                ("magma@redis", "inactive", "activating"),
+                ("magma@redis", "activating", "active"),
+                ("magma@sessiond", "inactive", "activating"),
+                ("magma@sessiond", "activating", "active"),
+                ("magma@mme", "inactive", "activating"),
+                ("magma@mme", "activating", "active"),
+            ],
+        )
+        self.assertEqual(
+            timings.services, {"magma@mme": 1.5, "magma@redis": 0.5, "magma@sessiond": 1.0}
+        )
+        self.assertEqual(timings.total, 1.5)
+
+    def test_given_service_fails_when_start_then_services_ordered_after_it_are_not_started(self):
+        host = InMemoryHost(after={"magma@mme": ["magma@sessiond"]})
+        host.fails_to_start.add("magma@sessiond")
+
+        timings = ServiceStartup(host).start(["magma@mme", "magma@sessiond"])
+
+        self.assertNotIn("magma@mme", host.services)
+        self.assertEqual(timings.services, {"magma@mme": None, "magma@sessiond": None})
+        self.assertIsNone(timings.total)
+        self.assertEqual(timings.failed, ["magma@mme", "magma@sessiond"])
+
+    def test_given_ordering_cycle_when_start_then_services_are_started_together(self):
+        host = InMemoryHost(
+            after={"magma@mme": ["magma@sessiond"], "magma@sessiond": ["magma@mme"]}
+        )
+
+        timings = ServiceStartup(host).start(["magma@mme", "magma@sessiond"])
+
+        self.assertEqual(timings.total, 0.5)
+
+    def test_given_service_never_becomes_active_when_start_then_it_is_reported_as_failed(self):
+        host = InMemoryHost()
+
+        with patch.object(host, "active_states", return_value={"magma@mme": "activating"}):
+            timings = ServiceStartup(host, timeout=10).start(["magma@mme"])
+
+        self.assertEqual(timings.failed, ["magma@mme"])
+
+    def test_given_service_never_becomes_active_when_start_then_startup_ends_within_the_hook_budget(  # noqa: E501
+        self,
+    ):
+        host = InMemoryHost()
+
+        with patch.object(host, "active_states", return_value={"magma@mme": "activating"}):
+            ServiceStartup(host).start(["magma@mme"])
+
+        self.assertLessEqual(self.clock, STARTUP_TIMEOUT + POLL_INTERVAL)
+
+    def test_given_running_services_when_restart_then_they_are_stopped_and_started_with_magmad(
+        self,
+    ):
+        host = InMemoryHost(
+            services={"magma@mme": "active", "magma@sessiond": "failed", "sctpd": "active"}
+        )
+
+        timings = ServiceStartup(host).restart()
+
+        self.assertEqual(list(timings.services), ["magma@magmad", "magma@mme"])
+        self.assertEqual(
+            host.services,
+            {
+                "magma@magmad": "active",
+                "magma@mme": "active",
+                "magma@sessiond": "failed",
+                "sctpd": "active",
+            },
+        )
+
+    def test_given_failed_service_when_format_metrics_then_it_is_reported_and_total_is_left_out(
+        self,
+    ):
+        metrics = format_metrics(
+            StartupTimings(services={"magma@magmad": 1.5, "magma@mme": None}, total=None)
+        )
+
+        self.assertIn(
+            'magma_service_time_to_active_seconds{service="magma@magmad"} 1.5\n', metrics
+        )
+        self.assertNotIn('magma_service_time_to_active_seconds{service="magma@mme"}', metrics)
+        self.assertIn('magma_service_startup_failed{service="magma@mme"} 1\n', metrics)
+        self.assertIn('magma_service_startup_failed{service="magma@magmad"} 0\n', metrics)
+        self.assertNotIn("magma_stack_time_to_active_seconds", metrics)
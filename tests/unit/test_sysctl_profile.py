@@ -0,0 +1,80 @@
+# Copyright 2022 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+import subprocess
+import unittest
+from typing import List
+
+from fakes import InMemoryHost
+
+from command_policy import CommandPolicy
+from sysctl_profile import PROFILES, SysctlProfile, sysctl_path
+
+SYSCTL_FILE = "/etc/sysctl.d/60-magma-access-gateway.conf"
+HASHSIZE_FILE = "/sys/module/nf_conntrack/parameters/hashsize"
+MODPROBE_FILE = "/etc/modprobe.d/magma-access-gateway-conntrack.conf"
+MODULES_LOAD_FILE = "/etc/modules-load.d/magma-access-gateway-conntrack.conf"
+
+
+class SysctlHost(InMemoryHost):
+    """Machine applying the sysctl file to /proc/sys when `sysctl -p` runs."""
+
+    def run(self, command: List[str], policy: CommandPolicy) -> subprocess.CompletedProcess:
+        result = super().run(command, policy)
+        if command == ["sysctl", "-p", SYSCTL_FILE] and result.returncode == 0:
+            for line in self.read_text(SYSCTL_FILE).splitlines()[1:]:
+                key, _, value = line.partition(" = ")
+                self.write_text(sysctl_path(key), f"{value}\n")
+        return result
+
+
+class TestSysctlProfile(unittest.TestCase):
+    def setUp(self):
+        self.host = SysctlHost(files={HASHSIZE_FILE: "65536\n"})
+        for key in PROFILES["small"]:
+            self.host.write_text(sysctl_path(key), "0\n")
+
+    def test_given_profile_when_apply_then_profile_is_persisted_applied_and_verified(self):
+        mismatched = SysctlProfile(self.host, "small").apply()
+
+        self.assertEqual(mismatched, [])
+        self.assertIn("net.netfilter.nf_conntrack_max = 262144\n", self.host.files[SYSCTL_FILE])
+        self.assertIn("options nf_conntrack hashsize=65536\n", self.host.files[MODPROBE_FILE])
+        self.assertIn("nf_conntrack\n", self.host.files[MODULES_LOAD_FILE])
+        self.assertEqual(self.host.commands, [["sysctl", "-p", SYSCTL_FILE]])
+
+    def test_given_profile_already_applied_when_apply_then_sysctl_is_not_run(self):
+        SysctlProfile(self.host, "small").apply()
+        self.host.commands.clear()
+
+        SysctlProfile(self.host, "small").apply()
+
+        self.assertEqual(self.host.commands, [])
+
+    def test_given_larger_profile_when_apply_then_conntrack_hash_table_is_resized(self):
+        SysctlProfile(self.host, "large").apply()
+
+        self.assertEqual(self.host.files[HASHSIZE_FILE], "1048576")
+
+    def test_given_kernel_rejects_values_when_apply_then_mismatched_sysctls_are_returned(self):
+        self.host.set_result(["sysctl", "-p", SYSCTL_FILE], returncode=255)
+
+        mismatched = SysctlProfile(self.host, "medium").apply()
+
+        self.assertIn("net.netfilter.nf_conntrack_max", mismatched)
+
+    def test_given_conntrack_module_not_loaded_when_apply_then_module_is_loaded(self):
+        self.host.unlink(sysctl_path("net.netfilter.nf_conntrack_max"))
+
+        SysctlProfile(self.host, "small").apply()
+
+        self.assertEqual(self.host.commands[0], ["modprobe", "nf_conntrack"])
+
+    def test_given_no_profile_when_apply_then_profile_files_are_removed(self):
+        SysctlProfile(self.host, "small").apply()
+
+        self.assertEqual(SysctlProfile(self.host, "").apply(), [])
+
+        self.assertFalse(self.host.exists(SYSCTL_FILE))
+        self.assertFalse(self.host.exists(MODPROBE_FILE))
+        self.assertFalse(self.host.exists(MODULES_LOAD_FILE))
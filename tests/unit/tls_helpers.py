@@ -0,0 +1,34 @@
+# Copyright 2022 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Stand-in TLS servers for the tests probing the orchestrator endpoints."""
+
+import pathlib
+import socketserver
+import ssl
+import threading
+import unittest
+
+CERTS_DIR = pathlib.Path(__file__).parent / "certs"
+ROOT_CA = (CERTS_DIR / "rootCA.pem").read_text()
+
+
+class _TLSHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        try:
+            with self.server.context.wrap_socket(self.request, server_side=True):  # type: ignore
+                pass
+        except (OSError, ssl.SSLError):
+            pass
+
+
+def start_tls_server(test: unittest.TestCase) -> int:
+    """Starts a stand-in TLS server for localhost on 127.0.0.1, returns its port."""
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), _TLSHandler)
+    server.daemon_threads = True
+    server.context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)  # type: ignore[attr-defined]
+    server.context.load_cert_chain(str(CERTS_DIR / "server.pem"))  # type: ignore[attr-defined]
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    test.addCleanup(server.server_close)
+    test.addCleanup(server.shutdown)
+    return server.server_address[1]